@@ -32,36 +32,15 @@ from src.config.bot_config import BotConfig, create_bot
 from src.database.db_manager import initialize_pool, refresh_pool, DBManager, setup_database
 from src.utils.translations import load_translations, get, validate_translation_completeness
 from src.utils.localization import get_localized_text, detect_user_language, set_default_language
+from src.utils.logging_setup import configure_logging, shutdown_logging
+from src.utils.metrics import registry as metrics_registry, MetricsServer, MESSAGES_TOTAL, ERRORS_TOTAL, FEATURE_USAGE, UPTIME
 
 # Note: Handler modules will be imported on-demand to avoid startup delays
 
 # 📊 Enhanced Logging Configuration | پیکربندی پیشرفته لاگ‌گیری
-log_format = '%(asctime)s | %(name)s | %(levelname)s | %(message)s'
-log_date_format = '%Y-%m-%d %H:%M:%S'
-
-# Create logs directory if it doesn't exist
+# Records are queued and written by a listener thread so logging never blocks the event loop
 logs_dir = Path('logs')
-logs_dir.mkdir(exist_ok=True)
-
-# Create file handlers
-error_handler = logging.FileHandler(logs_dir / 'bot_errors.log', encoding='utf-8')
-error_handler.setLevel(logging.ERROR)
-
-logging.basicConfig(
-    format=log_format,
-    datefmt=log_date_format,
-    level=logging.INFO,
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler(logs_dir / 'bot.log', encoding='utf-8'),
-        error_handler
-    ]
-)
-
-# Set specific log levels for different components
-logging.getLogger('telebot').setLevel(logging.WARNING)
-logging.getLogger('urllib3').setLevel(logging.WARNING)
-logging.getLogger('asyncpg').setLevel(logging.WARNING)
+configure_logging(BotConfig.logging_settings, logs_dir)
 
 logger = logging.getLogger(__name__)
 
@@ -82,14 +61,17 @@ class ApplicationMetrics:
         self.message_count += 1
         self.last_activity = time.time()
         self.language_stats[language] = self.language_stats.get(language, 0) + 1
+        MESSAGES_TOTAL.inc(language=language)
     
     def record_error(self):
         """Record error occurrence"""
         self.error_count += 1
+        ERRORS_TOTAL.inc()
     
     def record_feature_usage(self, feature: str):
         """Record feature usage statistics"""
         self.feature_usage[feature] = self.feature_usage.get(feature, 0) + 1
+        FEATURE_USAGE.inc(feature=feature)
     
     def get_uptime(self) -> float:
         """Get application uptime in seconds"""
@@ -162,6 +144,7 @@ class BotApplication:
         self.is_running = False
         self.shutdown_requested = False
         self.default_language = 'en'
+        self.metrics_server: Optional[MetricsServer] = None
         self._setup_signal_handlers()
     
     def _setup_signal_handlers(self):
@@ -306,7 +289,7 @@ class BotApplication:
             
             # Import command modules dynamically to avoid startup delays
             logger.debug("Importing command modules...")
-            from src.commands import general, attack, shop, inventory, status, stats, stars, help
+            from src.commands import general, attack, shop, inventory, status, stats, stars, help, admin
             
             # Register command handlers with error tracking
             command_modules = [
@@ -317,7 +300,8 @@ class BotApplication:
                 ('status', status),
                 ('stats', stats),
                 ('stars', stars),
-                ('help', help)
+                ('help', help),
+                ('admin', admin)
             ]
             
             for module_name, module in command_modules:
@@ -348,7 +332,15 @@ class BotApplication:
             except Exception as e:
                 logger.error(f"❌ Failed to register message handlers: {e}")
                 raise
-            
+
+            # نصب مسیریاب مرکزی روی ربات - Install central router dispatchers on the bot
+            from src.handlers.router import router
+            router.install(self.bot)
+
+            # پیش‌ساخت منوها و کیبوردهای ثابت - Pre-render static menus and keyboards
+            from src.utils.render_cache import render_cache
+            logger.debug(f"Pre-rendered {render_cache.warm(['en', 'fa'])} screens")
+
             logger.info(f"All {handlers_registered} handler modules registered successfully")
             logger.info(f"تمام {handlers_registered} ماژول کنترل‌کننده با موفقیت ثبت شدند")
             return True
@@ -442,7 +434,9 @@ class BotApplication:
                         self.health_status['database'] = 'healthy' if db_healthy else 'unhealthy'
                         
                         # Run database maintenance tasks periodically (every ~30 minutes)
-                        if db_healthy and time.time() % 1800 < 60:  # Run in a 60-second window every 30 minutes
+                        # unless the expiry scheduler already deletes cooldowns as they expire
+                        from src.utils.expiry import expiry_scheduler
+                        if db_healthy and not expiry_scheduler.running and time.time() % 1800 < 60:
                             try:
                                 # Clean up expired cooldowns
                                 removed = await self.db_manager.cleanup_expired_cooldowns()
@@ -523,12 +517,15 @@ class BotApplication:
                 
                 # Clean up expired cooldowns periodically
                 # This helps prevent the cooldowns table from growing too large
-                try:
-                    removed = await self.db_manager.cleanup_expired_cooldowns()
-                    if removed > 0:
-                        logger.info(f"Health check: Cleaned up {removed} expired cooldowns")
-                except Exception as cleanup_error:
-                    logger.warning(f"Failed to clean up cooldowns during health check: {cleanup_error}")
+                # (the expiry scheduler does this continuously while it runs)
+                from src.utils.expiry import expiry_scheduler
+                if not expiry_scheduler.running:
+                    try:
+                        removed = await self.db_manager.cleanup_expired_cooldowns()
+                        if removed > 0:
+                            logger.info(f"Health check: Cleaned up {removed} expired cooldowns")
+                    except Exception as cleanup_error:
+                        logger.warning(f"Failed to clean up cooldowns during health check: {cleanup_error}")
                 
                 return True
             else:
@@ -684,9 +681,117 @@ class BotApplication:
             self.metrics.record_error()
             return False
     
+    def _register_metrics_collectors(self) -> None:
+        """📊 Register scrape-time metric collectors | ثبت جمع‌آورنده‌های معیار"""
+        from src.database.db_manager import collect_pool_metrics
+        from src.utils.helpers import smart_cache
+        from src.handlers.callbacks import callback_cache
+        from src.utils.metrics import observe_cache_stats
+        
+        def collect_cache_metrics():
+            cache_stats = smart_cache.get_stats()
+            observe_cache_stats('smart_cache', cache_stats['stats']['hits'],
+                                cache_stats['stats']['misses'], cache_stats['size'])
+            for namespace, ns_stats in cache_stats['namespaces'].items():
+                observe_cache_stats(f"smart_cache:{namespace.rstrip('_')}", ns_stats['hits'],
+                                    ns_stats['misses'], ns_stats['entries'])
+            observe_cache_stats('callback_cache', callback_cache.hits,
+                                callback_cache.misses, len(callback_cache.cache))
+        
+        metrics_registry.register_collector(collect_pool_metrics)
+        metrics_registry.register_collector(collect_cache_metrics)
+        metrics_registry.register_collector(lambda: UPTIME.set(self.metrics.get_uptime()))
+    
+    async def start_background_services(self) -> None:
+        """📡 Start services bound to the polling loop | راه‌اندازی سرویس‌های پس‌زمینه"""
+        perf = self.config.performance_settings
+        if perf.metrics_enabled:
+            self._register_metrics_collectors()
+            self.metrics_server = MetricsServer(metrics_registry, perf.metrics_host, perf.metrics_port)
+            await self.metrics_server.start()
+        if perf.loop_monitor_enabled:
+            from src.utils.loop_monitor import loop_monitor
+            loop_monitor.interval = perf.loop_lag_interval
+            loop_monitor.lag_threshold = perf.loop_lag_threshold
+            loop_monitor.slow_callback_threshold = perf.slow_callback_threshold
+            loop_monitor.start()
+            metrics_registry.register_collector(loop_monitor.collect)
+        from src.utils.memory_budget import memory_governor
+        memory_governor.budget_bytes = perf.memory_budget_mb * 1024 * 1024
+        memory_governor.interval = perf.memory_check_interval
+        memory_governor.start()
+        if perf.metrics_enabled:
+            metrics_registry.register_collector(memory_governor.collect)
+        from src.handlers.messages import analytics_collector
+        analytics_collector.start(self.db_manager, perf.analytics_flush_interval)
+        from src.utils.events import event_bus
+        event_bus.shards = perf.event_bus_shards
+        event_bus.queue_size = perf.event_queue_size
+        event_bus.redeliver_interval = perf.outbox_redeliver_interval
+        event_bus.max_attempts = perf.outbox_max_attempts
+        event_bus.start(self.db_manager)
+        from src.utils.expiry import expiry_scheduler
+        expiry_scheduler.tick_interval = perf.expiry_tick_interval
+        expiry_scheduler.notify = perf.expiry_notifications
+        await expiry_scheduler.start(self.db_manager, self.bot)
+        from src.utils.cooldowns import cooldown_engine
+        cooldown_engine.flush_interval = perf.cooldown_flush_interval
+        await cooldown_engine.start(self.db_manager)
+        if perf.analysis_offload_enabled:
+            await self._start_analysis_pool(perf)
+        if perf.cache_enabled and perf.cache_backend != 'local':
+            await self._attach_shared_cache(perf)
+        if self.config.security_settings.rate_limit_backend != 'local':
+            await self._attach_shared_rate_limits(perf)
+    
+    async def _start_analysis_pool(self, perf) -> None:
+        """🧮 Start the analysis process pool | راه‌اندازی استخر پروسه تحلیل"""
+        from src.utils.analysis_pool import analysis_executor
+        from src.handlers.router import router
+        from src.utils.loop_monitor import loop_monitor
+        analysis_executor.workers = perf.analysis_workers
+        analysis_executor.lag_threshold = perf.analysis_offload_lag
+        analysis_executor.depth_threshold = perf.analysis_offload_depth
+        
+        def loop_lag() -> float:
+            return loop_monitor.last_lag
+        # Without the loop monitor nothing samples lag, so only queue depth is probed
+        analysis_executor.set_probes(lag=loop_lag if perf.loop_monitor_enabled else None,
+                                     depth=lambda: router.in_flight)
+        await analysis_executor.start()
+    
+    async def _attach_shared_cache(self, perf) -> None:
+        """🗄️ Attach the shared L2 cache tier | اتصال لایه دوم کش مشترک"""
+        from src.utils.cache import smart_cache
+        from src.utils.cache_backends import create_backend
+        try:
+            backend = create_backend(perf.cache_backend, perf.redis_url)
+            await smart_cache.attach(backend, namespace=perf.cache_namespace)
+            logger.info(f"🗄️ Shared cache tier enabled: {perf.cache_backend}")
+            logger.info(f"🗄️ لایه کش مشترک فعال شد: {perf.cache_backend}")
+        except Exception as e:
+            logger.warning(f"Shared cache unavailable, using per-process cache only: {e}")
+            logger.warning(f"کش مشترک در دسترس نیست، فقط کش محلی استفاده می‌شود: {e}")
+    
+    async def _attach_shared_rate_limits(self, perf) -> None:
+        """🚦 Share rate limit state between bot processes | اشتراک محدودیت نرخ بین پروسه‌ها"""
+        from src.utils.ratelimit import rate_limit_store
+        from src.utils.cache_backends import create_backend
+        backend_kind = self.config.security_settings.rate_limit_backend
+        try:
+            backend = create_backend(backend_kind, perf.redis_url)
+            await rate_limit_store.attach(backend, namespace=perf.cache_namespace)
+            logger.info(f"🚦 Shared rate limits enabled: {backend_kind}")
+            logger.info(f"🚦 محدودیت نرخ مشترک فعال شد: {backend_kind}")
+        except Exception as e:
+            logger.warning(f"Shared rate limits unavailable, using per-process limits: {e}")
+            logger.warning(f"محدودیت نرخ مشترک در دسترس نیست، از محدودیت محلی استفاده می‌شود: {e}")
+    
     async def start_polling(self) -> None:
         """Start bot polling with error handling"""
         try:
+            await self.start_background_services()
+            
             # Get bot info now that we're in async context
             try:
                 bot_info = await self.bot.get_me()
@@ -702,6 +807,29 @@ class BotApplication:
         except Exception as e:
             logger.error(f"Error during polling: {e}")
             raise
+        finally:
+            from src.utils.cache import smart_cache
+            from src.utils.ratelimit import rate_limit_store
+            from src.handlers.messages import analytics_collector, join_batcher
+            from src.utils.analysis_pool import analysis_executor
+            from src.utils.events import event_bus
+            from src.utils.expiry import expiry_scheduler
+            from src.utils.cooldowns import cooldown_engine
+            from src.utils.loop_monitor import loop_monitor
+            from src.utils.memory_budget import memory_governor
+            await join_batcher.stop()
+            await cooldown_engine.stop()
+            expiry_scheduler.stop()
+            await event_bus.stop()
+            await analytics_collector.stop()
+            await analysis_executor.stop()
+            await smart_cache.detach()
+            await rate_limit_store.detach()
+            loop_monitor.stop()
+            memory_governor.stop()
+            if self.metrics_server is not None:
+                await self.metrics_server.stop()
+                self.metrics_server = None
     
 
 
@@ -737,6 +865,7 @@ class BotApplication:
         finally:
             logger.info("🏁 Bot application terminated")
             logger.info("🏁 اپلیکیشن ربات خاتمه یافت")
+            shutdown_logging()
 
     def shutdown(self):
         """🛑 Graceful shutdown with cleanup | خاموش شدن نرم با پاکسازی"""
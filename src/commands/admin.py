@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Admin diagnostics commands module with bilingual support
+Exposes event-loop health, slow-callback captures and per-route statistics to bot admins
+"""
+
+import html
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+from telebot.async_telebot import AsyncTeleBot
+from src.config.bot_config import BotConfig
+from src.database.db_manager import DBManager
+from src.handlers.router import router
+from src.utils.loop_monitor import loop_monitor
+from src.utils.singleflight import get_singleflight_stats
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def is_admin(user_id: int) -> bool:
+    """Check whether a user is a configured bot admin"""
+    return user_id in BotConfig.security_settings.admin_user_ids
+
+
+def format_loop_report(top_routes: int = 5) -> str:
+    """Build the bilingual loop health report"""
+    report = loop_monitor.get_report()
+    lines: List[str] = [
+        "🩺 <b>Event loop health | سلامت حلقه رویداد</b>",
+        "",
+        f"Last lag | آخرین تأخیر: <code>{report['last_lag'] * 1000:.1f}ms</code>",
+        f"p50 / p99 / max: <code>{report['lag_p50'] * 1000:.1f} / {report['lag_p99'] * 1000:.1f} / "
+        f"{report['lag_max'] * 1000:.1f}ms</code>",
+        f"Lag warnings | هشدارهای تأخیر: <code>{report['lag_warnings']}</code>",
+        f"Slow callbacks | کالبک‌های کند: <code>{report['slow_callbacks']}</code>",
+    ]
+
+    if report['recent_slow']:
+        lines += ["", "<b>Recent slow callbacks | کالبک‌های کند اخیر</b>"]
+        for event in reversed(report['recent_slow']):
+            at = datetime.fromtimestamp(event['timestamp']).strftime('%H:%M:%S')
+            lines.append(f"• {at} <code>{html.escape(event['route'])}</code> {event['duration'] * 1000:.0f}ms")
+
+    flights = get_singleflight_stats()
+    if flights:
+        lines += ["", "<b>Coalesced lookups | درخواست‌های ادغام‌شده</b>"]
+        for name, stats in flights.items():
+            lines.append(
+                f"• <code>{name}</code> {stats['executions']} queries, "
+                f"{stats['coalesced']} coalesced, {stats['negative_hits']} negative hits"
+            )
+
+    routes: Dict[str, Dict[str, Any]] = router.get_stats()['routes']
+    busiest = sorted(routes.items(), key=lambda item: item[1]['total_s'], reverse=True)[:top_routes]
+    if busiest:
+        lines += ["", "<b>Busiest routes | پرکارترین مسیرها</b>"]
+        for name, stats in busiest:
+            lines.append(
+                f"• <code>{html.escape(name)}</code> {stats['hits']} hits, "
+                f"avg {stats['avg_ms']}ms, max {stats['max_ms']}ms"
+            )
+    return "\n".join(lines)
+
+
+def format_last_stack() -> str:
+    """Build the report for the most recent slow-callback stack"""
+    if not loop_monitor.slow_events:
+        return "✅ No slow callbacks captured | کالبک کندی ثبت نشده است"
+    event = loop_monitor.slow_events[-1]
+    # Telegram messages are limited to 4096 characters
+    stack = html.escape(event['stack'][-3500:])
+    return (
+        f"🐢 <b>{html.escape(event['route'])}</b> {event['duration'] * 1000:.0f}ms\n"
+        f"<pre>{stack}</pre>"
+    )
+
+
+def register_handlers(bot: AsyncTeleBot, db_manager: DBManager):
+    """Registers admin diagnostics handlers."""
+
+    @router.command('admin')
+    async def handle_admin_command(message):
+        """Handle /admin [slow] to show loop diagnostics"""
+        try:
+            if not is_admin(message.from_user.id):
+                await bot.reply_to(message, "⛔ Admins only | فقط برای مدیران")
+                return
+
+            args = message.text.split()[1:]
+            text = format_last_stack() if args and args[0].lower() == 'slow' else format_loop_report()
+            await bot.send_message(message.chat.id, text, parse_mode="HTML")
+        except Exception as e:
+            logger.error(f"Error in admin command: {e}")
+            await bot.reply_to(message, "❌ Error building admin report | خطا در ساخت گزارش مدیریت")
+
+    logger.info("Admin handlers registered successfully")
@@ -9,13 +9,22 @@ import asyncio
 import logging
 import random
 import re
-from typing import Optional, Tuple, Dict, Any
+import time
+from dataclasses import dataclass, field, replace
+from typing import Optional, Tuple, Dict, Any, List
 from telebot import types
 from telebot.async_telebot import AsyncTeleBot
-from src.config.bot_config import BotConfig
+from src.config.bot_config import BotConfig, BOT_CONFIG
 from src.config.items import ITEMS, get_weapon_items, get_item_display_name, get_item_emoji, is_weapon, get_item_stats
 from src.database.db_manager import DBManager
+from src.database.mutations import Mutation, mutation_bus, PLAYER, INVENTORY, DEFENSE, BOOST
+from src.handlers.router import router
 from src.utils import helpers
+from src.utils.cache import smart_cache
+from src.utils.singleflight import single_flight
+from src.utils.ratelimit import get_limiter
+from src.utils.events import event_bus, current_delivery, AttackResolved
+from src.utils.cooldowns import cooldown_engine, ATTACK
 from src.utils.translations import T
 
 # Set up logging
@@ -33,13 +42,164 @@ def escape_markdown(text: str) -> str:
         text = text.replace(char, f'\\{char}')
     return text
 
+# =============================================================================
+# Combat snapshot
+# =============================================================================
+
+# Seconds a snapshot may stay cached when none of its boosts/defenses expire sooner
+COMBAT_CACHE_TTL = 600
+
+DAMAGE_BOOSTS = ('vip_damage',)
+EXPERIENCE_BOOSTS = ('experience_multiplier', 'vip_experience')
+COOLDOWN_BOOSTS = ('cooldown_reduction', 'vip_cooldown')
+
+COMBAT_SNAPSHOT_QUERY = """
+    SELECT p.level, p.hp,
+           (SELECT json_agg(json_build_object('type', b.boost_type, 'value', b.boost_value,
+                                              'expires_at', b.expires_at))
+              FROM active_boosts b
+             WHERE b.chat_id = p.chat_id AND b.user_id = p.user_id AND b.expires_at > %s) AS boosts,
+           (SELECT json_build_object('type', d.defense_type, 'expires_at', d.expires_at)
+              FROM active_defenses d
+             WHERE d.chat_id = p.chat_id AND d.user_id = p.user_id AND d.expires_at > %s
+             ORDER BY d.expires_at DESC LIMIT 1) AS defense,
+           (SELECT json_object_agg(i.item, i.qty) FROM inventories i
+             WHERE i.chat_id = p.chat_id AND i.user_id = p.user_id AND i.qty > 0) AS inventory
+      FROM players p
+     WHERE p.chat_id = %s AND p.user_id = %s
+"""
+
+@dataclass
+class CombatSnapshot:
+    """Combat-relevant state of one player: level, HP, boosts, defense and weapons"""
+    chat_id: int
+    user_id: int
+    level: int = 1
+    hp: int = 100
+    boosts: List[Tuple[str, float, int]] = field(default_factory=list)  # (type, value, expires_at)
+    defense: Optional[Tuple[str, int]] = None  # (type, expires_at)
+    inventory: Dict[str, int] = field(default_factory=dict)
+    cache_until: float = 0.0
+
+    @classmethod
+    def from_row(cls, chat_id: int, user_id: int, row: Dict[str, Any]) -> 'CombatSnapshot':
+        """Build a snapshot from the combined snapshot query row"""
+        defense = row.get('defense')
+        return cls(
+            chat_id=chat_id,
+            user_id=user_id,
+            level=row.get('level') or 1,
+            hp=row['hp'] if row.get('hp') is not None else 100,
+            boosts=[(b['type'], float(b['value']), int(b['expires_at'])) for b in row.get('boosts') or []],
+            defense=(defense['type'], int(defense['expires_at'])) if defense else None,
+            inventory={item: int(qty) for item, qty in (row.get('inventory') or {}).items()},
+        )
+
+    def _boost_values(self, boost_types: Tuple[str, ...], now: int) -> List[float]:
+        return [value for boost_type, value, expires_at in self.boosts
+                if boost_type in boost_types and expires_at > now]
+
+    def damage_bonus(self, now: int) -> float:
+        """Sum of damage bonuses, capped at 100%"""
+        return min(sum(self._boost_values(DAMAGE_BOOSTS, now)), 1.0)
+
+    def experience_multiplier(self, now: int) -> float:
+        """Highest experience multiplier (multipliers don't stack)"""
+        return max(self._boost_values(EXPERIENCE_BOOSTS, now), default=1.0)
+
+    def cooldown_reduction(self, now: int) -> float:
+        """Sum of cooldown reductions, capped at 80%"""
+        return min(sum(self._boost_values(COOLDOWN_BOOSTS, now)), 0.8)
+
+    def active_defense(self, now: int) -> Tuple[bool, Optional[str]]:
+        """Active defense as (has_defense, defense_type)"""
+        if self.defense and self.defense[1] > now:
+            return True, self.defense[0]
+        return False, None
+
+    def next_expiry(self) -> Optional[int]:
+        """Earliest expiry among boosts and defense"""
+        expiries = [expires_at for _, _, expires_at in self.boosts]
+        if self.defense:
+            expiries.append(self.defense[1])
+        return min(expiries, default=None)
+
+
+def _combat_cache_key(chat_id: int, user_id: int) -> str:
+    return f"combat_{chat_id}_{user_id}"
+
+
+def _on_combat_mutation(mutation: Mutation) -> None:
+    """Patch the cached snapshot with known values, or drop it"""
+    cache_key = _combat_cache_key(mutation.chat_id, mutation.user_id)
+    snapshot = smart_cache.get(cache_key)
+    if snapshot is None:
+        return
+    values = mutation.values
+    if values is None or mutation.entity in (DEFENSE, BOOST):
+        smart_cache.delete(cache_key)
+        return
+
+    changes: Dict[str, Any] = {}
+    if mutation.entity == PLAYER:
+        changes = {name: values[name] for name in ('level', 'hp') if name in values}
+    elif mutation.entity == INVENTORY:
+        if 'item' not in values or 'qty' not in values:
+            smart_cache.delete(cache_key)
+            return
+        inventory = dict(snapshot.inventory)
+        inventory[values['item']] = values['qty']
+        changes = {'inventory': inventory}
+    if changes:
+        smart_cache.set(cache_key, replace(snapshot, **changes), ttl=snapshot.cache_until - time.time())
+
+
+for _entity in (PLAYER, INVENTORY, DEFENSE, BOOST):
+    mutation_bus.subscribe(_entity, _on_combat_mutation)
+
 class AttackManager:
     """Manages attack mechanics and damage calculations"""
     
     def __init__(self, db_manager: DBManager):
         self.db_manager = db_manager
         self.config = BotConfig
-        
+
+    async def get_combat_snapshot(self, chat_id: int, user_id: int) -> CombatSnapshot:
+        """Get the cached combat snapshot, loading it with one query on a miss"""
+        cache_key = _combat_cache_key(chat_id, user_id)
+        snapshot = smart_cache.get(cache_key)
+        if snapshot is not None:
+            return snapshot
+        return await single_flight("combat").do(cache_key, self._load_combat_snapshot, chat_id, user_id, cache_key)
+
+    async def _load_combat_snapshot(self, chat_id: int, user_id: int, cache_key: str) -> CombatSnapshot:
+        """Load a snapshot and cache it until its earliest boost/defense expiry"""
+        try:
+            shared = await smart_cache.fetch_shared([cache_key])
+            if cache_key in shared:
+                return shared[cache_key]
+
+            current_time = helpers.now()
+            row = await self.db_manager.db(
+                COMBAT_SNAPSHOT_QUERY,
+                (current_time, current_time, chat_id, user_id),
+                fetch="one_dict"
+            )
+            if not row:
+                return CombatSnapshot(chat_id=chat_id, user_id=user_id)
+
+            snapshot = CombatSnapshot.from_row(chat_id, user_id, row)
+            cache_until = time.time() + COMBAT_CACHE_TTL
+            next_expiry = snapshot.next_expiry()
+            if next_expiry is not None:
+                cache_until = min(cache_until, next_expiry)
+            snapshot.cache_until = cache_until
+            smart_cache.set(cache_key, snapshot, ttl=cache_until - time.time())
+            return snapshot
+        except Exception as e:
+            logger.error(f"Error loading combat snapshot: {e}")
+            return CombatSnapshot(chat_id=chat_id, user_id=user_id)
+
     async def calculate_damage(self, weapon: str, attacker_level: int, target_level: int, chat_id: int, user_id: int) -> int:
         """Calculate damage based on weapon and level difference, including boosts"""
         # Get weapon info from items configuration
@@ -69,26 +229,9 @@ class AttackManager:
     
     async def _get_active_damage_bonus(self, chat_id: int, user_id: int) -> float:
         """Get current damage bonus from active boosts"""
-        try:
-            boosts = await self.db_manager.db(
-                """SELECT boost_value FROM active_boosts 
-                   WHERE chat_id=%s AND user_id=%s 
-                   AND boost_type = 'vip_damage' 
-                   AND expires_at > %s""",
-                (chat_id, user_id, helpers.now()),
-                fetch="all_dict"
-            )
-            
-            # Handle None result and sum all damage bonuses (cap at 100% bonus)
-            if boosts:
-                total_bonus = sum(boost['boost_value'] for boost in boosts)
-                return min(total_bonus, 1.0)
-            return 0.0
-            
-        except Exception as e:
-            logger.error(f"Error getting damage bonus: {e}")
-            return 0.0
-    
+        snapshot = await self.get_combat_snapshot(chat_id, user_id)
+        return snapshot.damage_bonus(helpers.now())
+
     async def cleanup_expired_boosts(self, chat_id: int) -> None:
         """Clean up expired boosts from the database"""
         try:
@@ -101,84 +244,48 @@ class AttackManager:
     
     async def _get_active_experience_multiplier(self, chat_id: int, user_id: int) -> float:
         """Get current experience multiplier from active boosts"""
-        try:
-            boosts = await self.db_manager.db(
-                """SELECT boost_value FROM active_boosts 
-                   WHERE chat_id=%s AND user_id=%s 
-                   AND boost_type IN ('experience_multiplier', 'vip_experience') 
-                   AND expires_at > %s""",
-                (chat_id, user_id, helpers.now()),
-                fetch="all_dict"
-            )
-            
-            # Use the highest multiplier (don't stack)
-            if boosts:
-                return max(boost['boost_value'] for boost in boosts)
-            return 1.0
-            
-        except Exception as e:
-            logger.error(f"Error getting experience multiplier: {e}")
-            return 1.0
-    
+        snapshot = await self.get_combat_snapshot(chat_id, user_id)
+        return snapshot.experience_multiplier(helpers.now())
+
     async def check_defense(self, target_chat_id: int, target_user_id: int) -> Tuple[bool, Optional[str]]:
         """Check if target has active defense"""
-        try:
-            defense_row = await self.db_manager.db(
-                "SELECT defense_type FROM active_defenses WHERE chat_id=%s AND user_id=%s AND expires_at > %s",
-                (target_chat_id, target_user_id, helpers.now()), 
-                fetch="one_dict"
-            )
-            return (True, defense_row['defense_type']) if defense_row else (False, None)
-        except Exception as e:
-            logger.error(f"Error checking defense: {e}")
-            return False, None
-    
+        snapshot = await self.get_combat_snapshot(target_chat_id, target_user_id)
+        return snapshot.active_defense(helpers.now())
+
+    async def effective_cooldown(self, chat_id: int, user_id: int) -> int:
+        """Attack cooldown after active cooldown reduction boosts"""
+        cooldown_reduction = await self._get_active_cooldown_reduction(chat_id, user_id)
+        return max(5, int(self.config.game_mechanics.attack_cooldown * (1 - cooldown_reduction)))  # Minimum 5 seconds
+
     async def check_cooldown(self, chat_id: int, user_id: int) -> Optional[int]:
-        """Check if user is in attack cooldown, considering cooldown reduction boosts"""
+        """Check if user is in attack cooldown"""
         try:
-            last_attack = await self.db_manager.db(
-                "SELECT MAX(attack_time) as last_attack FROM attacks WHERE chat_id=%s AND attacker_id=%s",
-                (chat_id, user_id), 
-                fetch="one_dict"
-            )
-            
-            if last_attack and last_attack['last_attack']:
-                time_since = helpers.now() - last_attack['last_attack']
-                base_cooldown = self.config.game_mechanics.attack_cooldown
-                
-                # Check for active cooldown reduction boosts
-                cooldown_reduction = await self._get_active_cooldown_reduction(chat_id, user_id)
-                effective_cooldown = max(5, int(base_cooldown * (1 - cooldown_reduction)))  # Minimum 5 seconds
-                
-                if time_since < effective_cooldown:
-                    return effective_cooldown - time_since
-            return None
+            return await cooldown_engine.remaining(chat_id, user_id, ATTACK) or None
         except Exception as e:
             logger.error(f"Error checking cooldown: {e}")
             return None
-    
-    async def _get_active_cooldown_reduction(self, chat_id: int, user_id: int) -> float:
-        """Get current cooldown reduction from active boosts"""
+
+    async def acquire_cooldown(self, chat_id: int, user_id: int) -> Optional[int]:
+        """Start the attack cooldown, or return the seconds left if one is running"""
         try:
-            boosts = await self.db_manager.db(
-                """SELECT boost_value FROM active_boosts 
-                   WHERE chat_id=%s AND user_id=%s 
-                   AND boost_type IN ('cooldown_reduction', 'vip_cooldown') 
-                   AND expires_at > %s""",
-                (chat_id, user_id, helpers.now()),
-                fetch="all_dict"
-            )
-            
-            # Handle None result and sum all cooldown reductions (cap at 80% total reduction)
-            if boosts:
-                total_reduction = sum(boost['boost_value'] for boost in boosts)
-                return min(total_reduction, 0.8)
-            return 0.0
-            
+            duration = await self.effective_cooldown(chat_id, user_id)
+            return await cooldown_engine.acquire(chat_id, user_id, ATTACK, duration) or None
         except Exception as e:
-            logger.error(f"Error getting cooldown reduction: {e}")
-            return 0.0
-    
+            logger.error(f"Error starting attack cooldown: {e}")
+            return None
+
+    async def release_cooldown(self, chat_id: int, user_id: int) -> None:
+        """Give back a cooldown taken for an attack that was not applied"""
+        try:
+            await cooldown_engine.clear(chat_id, user_id, ATTACK)
+        except Exception as e:
+            logger.error(f"Error releasing attack cooldown: {e}")
+
+    async def _get_active_cooldown_reduction(self, chat_id: int, user_id: int) -> float:
+        """Get current cooldown reduction from active boosts"""
+        snapshot = await self.get_combat_snapshot(chat_id, user_id)
+        return snapshot.cooldown_reduction(helpers.now())
+
     async def check_weapon_availability(self, chat_id: int, user_id: int, weapon: str) -> bool:
         """Check if user has the specified weapon"""
         # Check if weapon exists and is actually a weapon
@@ -189,32 +296,19 @@ class AttackManager:
         if self.config.feature_flags.unlimited_missiles and weapon == "moab":
             return True
             
-        try:
-            weapon_qty = await self.db_manager.db(
-                "SELECT qty FROM inventories WHERE chat_id=%s AND user_id=%s AND item=%s",
-                (chat_id, user_id, weapon), 
-                fetch="one_dict"
-            )
-            return weapon_qty and weapon_qty['qty'] > 0
-        except Exception as e:
-            logger.error(f"Error checking weapon availability: {e}")
-            return False
+        snapshot = await self.get_combat_snapshot(chat_id, user_id)
+        return snapshot.inventory.get(weapon, 0) > 0
     
     async def get_available_weapons(self, chat_id: int, user_id: int) -> Dict[str, int]:
         """Get all available weapons for a user"""
         try:
-            inventory_rows = await self.db_manager.db(
-                "SELECT item, qty FROM inventories WHERE chat_id=%s AND user_id=%s AND qty > 0",
-                (chat_id, user_id), 
-                fetch="all_dicts"
-            )
-            
+            snapshot = await self.get_combat_snapshot(chat_id, user_id)
+
             # Filter only weapons
             weapons = {}
-            for row in inventory_rows:
-                item_id = row['item']
-                if is_weapon(item_id):
-                    weapons[item_id] = row['qty']
+            for item_id, qty in snapshot.inventory.items():
+                if qty > 0 and is_weapon(item_id):
+                    weapons[item_id] = qty
             
             # Add unlimited missiles if enabled
             if self.config.feature_flags.unlimited_missiles:
@@ -290,16 +384,8 @@ class AttackManager:
 
     async def get_user_level(self, chat_id: int, user_id: int) -> int:
         """Get user level with fallback"""
-        try:
-            user_info = await self.db_manager.db(
-                "SELECT level FROM players WHERE chat_id=%s AND user_id=%s",
-                (chat_id, user_id), 
-                fetch="one_dict"
-            )
-            return user_info['level'] if user_info else 1
-        except Exception as e:
-            logger.error(f"Error getting user level: {e}")
-            return 1
+        snapshot = await self.get_combat_snapshot(chat_id, user_id)
+        return snapshot.level
 
 async def show_weapon_comparison(message: types.Message, bot: AsyncTeleBot, db_manager: DBManager, lang: str) -> None:
     """Show weapon comparison table"""
@@ -422,13 +508,30 @@ async def show_attack_menu(message: types.Message, bot: AsyncTeleBot, db_manager
         logger.error(f"Error showing attack menu: {e}")
         await bot.send_message(message.chat.id, "Error displaying attack menu.")
 
+async def award_attack_experience(event: AttackResolved, db_manager: DBManager) -> None:
+    """Award the attacker's experience, with active boosts, once an attack is resolved"""
+    base_exp = 10 + (5 if event.defeated else 0)  # Base 10 exp, +5 for defeats
+    experience_multiplier = await AttackManager(db_manager)._get_active_experience_multiplier(event.chat_id, event.user_id)
+    final_exp = int(base_exp * experience_multiplier)
+    
+    # Claimed per event, so a replayed AttackResolved does not award it twice
+    await db_manager.apply_once(
+        current_delivery(),
+        "UPDATE players SET experience = experience + %s WHERE chat_id=%s AND user_id=%s",
+        (final_exp, event.chat_id, event.user_id),
+        touches=[Mutation(PLAYER, event.chat_id, event.user_id, {'experience_gained': final_exp})]
+    )
+
+event_bus.subscribe(AttackResolved, award_attack_experience)
+
 async def execute_attack(message: types.Message, bot: AsyncTeleBot, db_manager: DBManager, 
-                       target_user: types.User, weapon: str, lang: str) -> None:
-    """Execute the actual attack with enhanced reporting"""
+                       target_user: types.User, weapon: str, lang: str) -> bool:
+    """Execute the actual attack with enhanced reporting; returns whether the hit was applied"""
     attack_manager = AttackManager(db_manager)
+    applied = False
     
     try:
-        # Get user levels
+        # Get user levels (served from the cached combat snapshots)
         attacker_level = await attack_manager.get_user_level(message.chat.id, message.from_user.id)
         target_level = await attack_manager.get_user_level(message.chat.id, target_user.id)
         
@@ -444,32 +547,48 @@ async def execute_attack(message: types.Message, bot: AsyncTeleBot, db_manager:
             defense_reduced = int(damage * defense_effectiveness)
             final_damage = damage - defense_reduced
         
-        # Update target HP
-        await db_manager.db(
-            "UPDATE players SET hp = GREATEST(0, hp - %s) WHERE chat_id=%s AND user_id=%s",
-            (final_damage, message.chat.id, target_user.id)
-        )
-        
-        # Get remaining HP
-        remaining_hp_row = await db_manager.db(
-            "SELECT hp FROM players WHERE chat_id=%s AND user_id=%s",
-            (message.chat.id, target_user.id), 
-            fetch="one_dict"
-        )
-        remaining_hp = remaining_hp_row['hp'] if remaining_hp_row else 0
+        # Update target HP in one statement; a defeated target is restored to 50 HP
+        hp_row = await db_manager.db("""
+            WITH hit AS (
+                SELECT GREATEST(0, hp - %s) AS remaining_hp FROM players
+                WHERE chat_id=%s AND user_id=%s FOR UPDATE
+            )
+            UPDATE players p SET hp = CASE WHEN hit.remaining_hp <= 0 THEN 50 ELSE hit.remaining_hp END
+            FROM hit WHERE p.chat_id=%s AND p.user_id=%s
+            RETURNING hit.remaining_hp, p.hp
+        """, (final_damage, message.chat.id, target_user.id, message.chat.id, target_user.id), fetch="one_dict")
+        if not hp_row:
+            # No target row was hit: nothing is recorded, consumed or rewarded
+            logger.warning(f"Attack target {target_user.id} has no player row in chat {message.chat.id}")
+            await bot.send_message(
+                message.chat.id,
+                T[lang].get('target_not_found_error', "❌ Target user @{username} not found in this group.").format(
+                    username=target_user.username or target_user.first_name)
+            )
+            return False
+        applied = True
+        remaining_hp = hp_row['remaining_hp']
+        db_manager.publish_mutations(Mutation(PLAYER, message.chat.id, target_user.id, {'hp': hp_row['hp']}))
         
         # Record attack
+        attack_time = helpers.now()
         await db_manager.db(
             "INSERT INTO attacks (chat_id, attacker_id, victim_id, weapon, damage, attack_time) VALUES (%s, %s, %s, %s, %s, %s)",
-            (message.chat.id, message.from_user.id, target_user.id, weapon, final_damage, helpers.now())
+            (message.chat.id, message.from_user.id, target_user.id, weapon, final_damage, attack_time),
+            touches=[Mutation(PLAYER, message.chat.id, message.from_user.id, {'last_attack': attack_time})]
         )
-        
+
         # Consume weapon if not unlimited
         if not (attack_manager.config.feature_flags.unlimited_missiles and weapon == "moab"):
-            await db_manager.db(
-                "UPDATE inventories SET qty = qty - 1 WHERE chat_id=%s AND user_id=%s AND item=%s",
-                (message.chat.id, message.from_user.id, weapon)
+            qty_row = await db_manager.db(
+                "UPDATE inventories SET qty = qty - 1 WHERE chat_id=%s AND user_id=%s AND item=%s RETURNING qty",
+                (message.chat.id, message.from_user.id, weapon),
+                fetch="one_dict"
             )
+            db_manager.publish_mutations(Mutation(
+                INVENTORY, message.chat.id, message.from_user.id,
+                {'item': weapon, 'qty': qty_row['qty']} if qty_row else None
+            ))
         
         # Award medals with improved calculation
         is_defeat = remaining_hp <= 0
@@ -481,20 +600,25 @@ async def execute_attack(message: types.Message, bot: AsyncTeleBot, db_manager:
         adjusted_medal_reward = max(1, round(medal_reward * level_medal_modifier))
         
         # Apply the medal reward
-        await db_manager.db(
-            "UPDATE players SET score = score + %s WHERE chat_id=%s AND user_id=%s",
-            (adjusted_medal_reward, message.chat.id, message.from_user.id)
+        score_row = await db_manager.db(
+            "UPDATE players SET score = score + %s WHERE chat_id=%s AND user_id=%s RETURNING score",
+            (adjusted_medal_reward, message.chat.id, message.from_user.id),
+            fetch="one_dict"
         )
+        if score_row:
+            db_manager.publish_mutations(Mutation(PLAYER, message.chat.id, message.from_user.id, dict(score_row)))
         
-        # Award experience with boosts
-        base_exp = 10 + (5 if is_defeat else 0)  # Base 10 exp, +5 for defeats
-        experience_multiplier = await attack_manager._get_active_experience_multiplier(message.chat.id, message.from_user.id)
-        final_exp = int(base_exp * experience_multiplier)
-        
-        await db_manager.db(
-            "UPDATE players SET experience = experience + %s WHERE chat_id=%s AND user_id=%s",
-            (final_exp, message.chat.id, message.from_user.id)
-        )
+        # Experience, achievements and other side effects run in event subscribers
+        await event_bus.publish(AttackResolved(
+            chat_id=message.chat.id,
+            user_id=message.from_user.id,
+            target_id=target_user.id,
+            weapon=weapon,
+            damage=final_damage,
+            remaining_hp=remaining_hp,
+            defeated=is_defeat,
+            medals=adjusted_medal_reward,
+        ))
         
         # Generate attack report with improved formatting
         weapon_emoji = get_item_emoji(weapon)
@@ -591,13 +715,6 @@ async def execute_attack(message: types.Message, bot: AsyncTeleBot, db_manager:
             if weapon_stats.get('stars', 0) >= 4:
                 msg += f"\n💎 Premium weapon used!"
         
-        # Handle defeat with bonus rewards
-        if remaining_hp <= 0:
-            await db_manager.db(
-                "UPDATE players SET hp = 50 WHERE chat_id=%s AND user_id=%s",
-                (message.chat.id, target_user.id)
-            )
-
         # Create enhanced keyboard with multiple options
         keyboard = types.InlineKeyboardMarkup(row_width=2)
         
@@ -635,10 +752,12 @@ async def execute_attack(message: types.Message, bot: AsyncTeleBot, db_manager:
             except Exception as plain_error:
                 logger.error(f"Failed to send attack message: {plain_error}")
                 await bot.send_message(message.chat.id, "Attack completed successfully! Use /stats to see your progress.")
+        return True
         
     except Exception as e:
         logger.error(f"Error executing attack: {e}")
         await bot.send_message(message.chat.id, "Error executing attack.")
+        return applied
 
 async def attack_command(message: types.Message, bot: AsyncTeleBot, db_manager: DBManager) -> None:
     """Handle /attack command with improved error handling"""
@@ -741,8 +860,8 @@ async def attack_command(message: types.Message, bot: AsyncTeleBot, db_manager:
             )
             return
 
-        # Check cooldown
-        wait_time = await attack_manager.check_cooldown(message.chat.id, message.from_user.id)
+        # Check and start the cooldown in one step, so concurrent attacks cannot both pass
+        wait_time = await attack_manager.acquire_cooldown(message.chat.id, message.from_user.id)
         if wait_time is not None:
             await bot.send_message(
                 message.chat.id, 
@@ -750,11 +869,15 @@ async def attack_command(message: types.Message, bot: AsyncTeleBot, db_manager:
             )
             return
 
-        # Ensure target player exists
-        await helpers.ensure_player(message.chat.id, target_user, db_manager)
-        
-        # Execute attack
-        await execute_attack(message, bot, db_manager, target_user, weapon, lang)
+        # Execute attack; give the cooldown back if the hit was never applied
+        attacked = False
+        try:
+            # Ensure target player exists
+            await helpers.ensure_player(message.chat.id, target_user, db_manager)
+            attacked = await execute_attack(message, bot, db_manager, target_user, weapon, lang)
+        finally:
+            if not attacked:
+                await attack_manager.release_cooldown(message.chat.id, message.from_user.id)
         
         # Reset selected weapon after use
         await db_manager.db(
@@ -901,41 +1024,41 @@ async def handle_attack_callback(call: types.CallbackQuery, bot: AsyncTeleBot, d
 def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
     """Registers all command handlers for the attack module"""
     group_only = helpers.ensure_group_command(bot, db_manager)
+    security = BOT_CONFIG.security_settings
+    attack_limit = helpers.ensure_rate_limit(bot, db_manager, get_limiter(
+        'cmd:attack',
+        rate=security.command_rate_limits.get('attack', 6),
+        enabled=security.rate_limit_enabled
+    ))
 
-    @bot.message_handler(commands=['attack'])
+    @router.command('attack')
     @group_only
+    @attack_limit
     async def attack_handler(message: types.Message) -> None:
         await attack_command(message, bot, db_manager)
     
-    @bot.message_handler(commands=['weapons'])
+    @router.command('weapons')
     @group_only
     async def weapons_handler(message: types.Message) -> None:
         lang = await helpers.get_lang(message.chat.id, message.from_user.id, db_manager)
         await show_weapon_comparison(message, bot, db_manager, lang)
     
-    @bot.message_handler(commands=['battle_stats'])
+    @router.command('battle_stats')
     @group_only
     async def battle_stats_handler(message: types.Message) -> None:
         lang = await helpers.get_lang(message.chat.id, message.from_user.id, db_manager)
         await show_battle_stats(message, bot, db_manager, lang)
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('attack:'))
+    @router.callback('attack:')
     async def attack_callback_handler(call: types.CallbackQuery) -> None:
         await handle_attack_callback(call, bot, db_manager)
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('weapon_info:'))
+    @router.callback('weapon_info:')
     async def weapon_info_callback_handler(call: types.CallbackQuery) -> None:
         await handle_attack_callback(call, bot, db_manager)
 
     # --- NEW: Text trigger for attack ---
-    @bot.message_handler(
-        func=lambda m: (
-            m.text and (
-                m.text.strip().lower() in ['شلیک', 'حمله', 'attack', 'shoot']
-            )
-        ),
-        content_types=['text']
-    )
+    @router.text_trigger('شلیک', 'حمله', 'attack', 'shoot')
     @group_only
     async def attack_text_trigger_handler(message: types.Message) -> None:
         await attack_command(message, bot, db_manager)
@@ -12,12 +12,22 @@ from telebot.async_telebot import AsyncTeleBot
 from src.config.bot_config import BotConfig
 from src.config.items import get_item_display_name, get_item_emoji
 from src.utils import helpers
+from src.utils.events import event_bus, BonusClaimed
+from src.utils.cooldowns import cooldown_engine, DAILY_BONUS
+from src.utils.render_cache import render_cache, Rendered, freeze_markup, literal
 from src.database.db_manager import DBManager
+from src.handlers.router import router
 from src.utils.translations import T
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+async def record_bonus_activity(event: BonusClaimed, db_manager: DBManager) -> None:
+    """Credit activity points for a claimed bonus"""
+    await helpers.update_activity_score(event.chat_id, event.user_id, event.bonus, db_manager)
+
+event_bus.subscribe(BonusClaimed, record_bonus_activity)
+
 class GeneralManager:
     """Manages general bot operations and user interactions"""
     
@@ -132,79 +142,95 @@ class GeneralManager:
             logger.error(f"Error getting chat statistics: {e}")
             return {"total_players": 0, "total_attacks": 0, "top_attacker_id": None, "top_attacker_attacks": 0, "average_level": 1}
 
+# Placeholder kept through the first format pass of start_message
+_FIRST_NAME = "\x00first_name\x00"
+
+@render_cache.screen('general:main_menu', variants=())
+def _build_main_menu(lang: str, bot_name: str) -> Rendered:
+    """Build the main menu; the user's name and quick stats are interpolated per request"""
+    welcome = T[lang].get('start_message', "🤖 Welcome to {bot_name}!\n\nGet ready to play.").format(
+        first_name=_FIRST_NAME,
+        bot_name=bot_name
+    )
+    text = literal(welcome).replace(_FIRST_NAME, "{first_name}")
+
+    # Add quick stats
+    text += f"\n\n📊 **{literal(T[lang].get('quick_stats', 'Quick Stats'))}:**"
+    text += f"\n• {literal(T[lang].get('level', 'Level'))}: {{level}}"
+    text += f"\n• {literal(T[lang].get('score', 'Score'))}: {{score}}"
+    text += f"\n• {literal(T[lang].get('hp', 'HP'))}: {{hp}}"
+
+    # Create enhanced keyboard
+    markup = types.InlineKeyboardMarkup(row_width=2)
+
+    # First row - Core commands
+    attack_btn = types.InlineKeyboardButton(
+        f"⚔️ {T[lang].get('attack_button', 'Attack')}",
+        callback_data='quick:attack'
+    )
+    stats_btn = types.InlineKeyboardButton(
+        f"📊 {T[lang].get('stats_button', 'Stats')}",
+        callback_data='quick:stats'
+    )
+    markup.add(attack_btn, stats_btn)
+
+    # Second row - Management
+    shop_btn = types.InlineKeyboardButton(
+        f"🛒 {T[lang].get('shop_button', 'Shop')}",
+        callback_data='quick:shop'
+    )
+    inventory_btn = types.InlineKeyboardButton(
+        f"🎒 {T[lang].get('inventory_button', 'Inventory')}",
+        callback_data='quick:inventory'
+    )
+    markup.add(shop_btn, inventory_btn)
+
+    # Third row - Information
+    help_btn = types.InlineKeyboardButton(
+        f"❓ {T[lang].get('help_button', 'Help')}",
+        callback_data='help:main'
+    )
+    lang_btn = types.InlineKeyboardButton(
+        f"🌐 {T[lang].get('language_button', 'Language')}",
+        callback_data='lang:main'
+    )
+    markup.add(help_btn, lang_btn)
+
+    # Fourth row - Leaderboard
+    leaderboard_btn = types.InlineKeyboardButton(
+        f"🏆 {T[lang].get('leaderboard_button', 'Leaderboard')}",
+        callback_data='quick:leaderboard'
+    )
+    markup.add(leaderboard_btn)
+
+    return Rendered(text, freeze_markup(markup), 'Markdown')
+
 async def show_main_menu(message: types.Message, bot: AsyncTeleBot, db_manager: DBManager, lang: str) -> None:
     """Show enhanced main menu with quick access buttons"""
     try:
         general_manager = GeneralManager(db_manager, bot)
         await general_manager.ensure_user_exists(message.chat.id, message.from_user)
-        
-        bot_info = await bot.get_me()
-        text = T[lang].get('start_message', "🤖 Welcome to {bot_name}!\n\nGet ready to play.").format(
-            first_name=message.from_user.first_name or "User",
-            bot_name=bot_info.first_name or "TrumpBot"
-        )
-        
-        # Add quick stats
+
+        bot_info = await helpers.get_bot_info(bot)
+        screen = render_cache.get('general:main_menu', lang, bot_info.first_name or "TrumpBot")
         stats = await general_manager.get_user_stats(message.chat.id, message.from_user.id)
-        text += f"\n\n📊 **{T[lang].get('quick_stats', 'Quick Stats')}:**"
-        text += f"\n• {T[lang].get('level', 'Level')}: {stats['level']}"
-        text += f"\n• {T[lang].get('score', 'Score')}: {stats['score']}"
-        text += f"\n• {T[lang].get('hp', 'HP')}: {stats['hp']}"
-            
-        # Create enhanced keyboard
-        markup = types.InlineKeyboardMarkup(row_width=2)
-        
-        # First row - Core commands
-        attack_btn = types.InlineKeyboardButton(
-            f"⚔️ {T[lang].get('attack_button', 'Attack')}", 
-            callback_data='quick:attack'
-        )
-        stats_btn = types.InlineKeyboardButton(
-            f"📊 {T[lang].get('stats_button', 'Stats')}", 
-            callback_data='quick:stats'
-        )
-        markup.add(attack_btn, stats_btn)
-        
-        # Second row - Management
-        shop_btn = types.InlineKeyboardButton(
-            f"🛒 {T[lang].get('shop_button', 'Shop')}", 
-            callback_data='quick:shop'
-        )
-        inventory_btn = types.InlineKeyboardButton(
-            f"🎒 {T[lang].get('inventory_button', 'Inventory')}", 
-            callback_data='quick:inventory'
-        )
-        markup.add(shop_btn, inventory_btn)
-        
-        # Third row - Information
-        help_btn = types.InlineKeyboardButton(
-            f"❓ {T[lang].get('help_button', 'Help')}", 
-            callback_data='help:main'
-        )
-        lang_btn = types.InlineKeyboardButton(
-            f"🌐 {T[lang].get('language_button', 'Language')}", 
-            callback_data='lang:main'
-        )
-        markup.add(help_btn, lang_btn)
-        
-        # Fourth row - Leaderboard
-        leaderboard_btn = types.InlineKeyboardButton(
-            f"🏆 {T[lang].get('leaderboard_button', 'Leaderboard')}", 
-            callback_data='quick:leaderboard'
-        )
-        markup.add(leaderboard_btn)
-        
+
         await bot.send_message(
-            message.chat.id, 
-            text, 
-            reply_markup=markup,
-            parse_mode='Markdown'
+            message.chat.id,
+            screen.format(
+                first_name=message.from_user.first_name or "User",
+                level=stats['level'],
+                score=stats['score'],
+                hp=stats['hp']
+            ),
+            reply_markup=screen.markup,
+            parse_mode=screen.parse_mode
         )
-        
+
     except Exception as e:
         logger.error(f"Error showing main menu: {e}")
         await bot.send_message(
-            message.chat.id, 
+            message.chat.id,
             T[lang].get('error_generic', {})
         )
 
@@ -525,7 +551,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
     """
     group_only = helpers.ensure_group_command(bot, db_manager)
 
-    @bot.message_handler(commands=['start'])
+    @router.command('start')
     async def start_command(message: types.Message) -> None:
         """
         Handles the /start command - welcomes new users and shows main menu.
@@ -544,7 +570,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
                 "Sorry, there was an error processing your request."
             )
 
-    @bot.message_handler(commands=['menu', 'main'])
+    @router.command('menu', 'main')
     @group_only
     async def menu_command(message: types.Message) -> None:
         """Show main menu"""
@@ -559,7 +585,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             logger.error(f"Error in menu command: {e}")
             await bot.send_message(message.chat.id, "Error displaying menu.")
 
-    @bot.message_handler(commands=['profile', 'me'])
+    @router.command('profile', 'me')
     @group_only
     async def profile_command(message: types.Message) -> None:
         """Show user profile"""
@@ -574,7 +600,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             logger.error(f"Error in profile command: {e}")
             await bot.send_message(message.chat.id, "Error displaying profile.")
 
-    @bot.message_handler(commands=['leaderboard', 'top'])
+    @router.command('leaderboard', 'top')
     @group_only
     async def leaderboard_command(message: types.Message) -> None:
         """Show chat leaderboard"""
@@ -589,7 +615,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             logger.error(f"Error in leaderboard command: {e}")
             await bot.send_message(message.chat.id, "Error displaying leaderboard.")
 
-    @bot.message_handler(commands=['chat_stats'])
+    @router.command('chat_stats')
     @group_only
     async def chat_stats_command(message: types.Message) -> None:
         """Show chat statistics"""
@@ -604,7 +630,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             logger.error(f"Error in chat stats command: {e}")
             await bot.send_message(message.chat.id, "Error displaying chat statistics.")
 
-    @bot.message_handler(commands=['help'])
+    @router.command('help')
     async def help_command(message: types.Message) -> None:
         """Show help message - delegate to help module"""
         try:
@@ -621,7 +647,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             logger.error(f"Error in help command: {e}")
             await bot.send_message(message.chat.id, "Error displaying help.")
 
-    @bot.message_handler(commands=['language', 'lang'])
+    @router.command('language', 'lang')
     async def language_command(message: types.Message) -> None:
         """
         Handles the /language command - shows language selection menu.
@@ -649,7 +675,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
                 "Error setting language. Please try again."
             )
     
-    @bot.message_handler(commands=['bonus'])
+    @router.command('bonus')
     async def bonus_command(message: types.Message) -> None:
         """Daily bonus command to receive medals"""
         try:
@@ -660,8 +686,8 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             chat_id = message.chat.id
             lang = await helpers.get_lang(chat_id, user_id, db_manager)
             
-            # Check if user has already claimed bonus today
-            cooldown = await helpers.check_cooldown(chat_id, user_id, 'daily_bonus', db_manager)
+            # Claim the 23 hour cooldown first, so concurrent /bonus commands cannot both pass
+            cooldown = await cooldown_engine.acquire(chat_id, user_id, DAILY_BONUS, 23 * 3600, write_through=True)
             
             if cooldown > 0:
                 # Calculate remaining hours
@@ -681,14 +707,14 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             if has_vip:
                 bonus_amount = 120  # Double bonus for VIP users
             
-            # Add medals to user account
-            await helpers.add_medals(user_id, chat_id, bonus_amount, db_manager)
-            
-            # Set cooldown for 23 hours
-            await helpers.set_cooldown(chat_id, user_id, 'daily_bonus', 23 * 3600, db_manager)
+            # Add medals to user account; give the claim back if that failed
+            if not await helpers.add_medals(chat_id, user_id, bonus_amount, db_manager):
+                await cooldown_engine.clear(chat_id, user_id, DAILY_BONUS)
+                await bot.reply_to(message, T[lang].get("error_generic", "Sorry, an error occurred while processing your request."))
+                return
             
-            # Update activity score
-            await helpers.update_activity_score(chat_id, user_id, "daily_bonus", db_manager)
+            # Activity score and other side effects follow from the event
+            await event_bus.publish(BonusClaimed(chat_id=chat_id, user_id=user_id, bonus="daily_bonus", amount=bonus_amount))
             
             # Send confirmation message
             await bot.reply_to(
@@ -702,15 +728,15 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             await bot.reply_to(message, T[lang].get("error_generic", "Sorry, an error occurred while processing your request."))
             
     # Callback query handlers
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('quick:'))
+    @router.callback('quick:')
     async def quick_callback_handler(call: types.CallbackQuery) -> None:
         await handle_quick_callback(call, bot, db_manager)
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('lang:'))
+    @router.callback('lang:')
     async def language_callback_handler(call: types.CallbackQuery) -> None:
         await handle_language_callback(call, bot, db_manager)
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('help:'))
+    @router.callback('help:')
     async def help_callback_handler(call: types.CallbackQuery) -> None:
         """Enhanced help callback handler - delegate to help module"""
         try:
@@ -6,13 +6,15 @@ Provides comprehensive help and documentation for all bot features
 """
 
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from telebot import types
 from telebot.async_telebot import AsyncTeleBot
 from src.utils.translations import T
 from src.utils import translations
 from src.utils import helpers
+from src.utils.render_cache import render_cache, Rendered, freeze_markup, literal
 from src.database.db_manager import DBManager
+from src.handlers.router import router
 from src.config.items import get_weapon_items, get_item_display_name, get_item_emoji, get_item_stats
 
 # Set up logging
@@ -94,8 +96,19 @@ async def handle_help_callback(call: types.CallbackQuery, bot: AsyncTeleBot, db_
         logger.error(f"Error handling help callback: {e}")
         await bot.answer_callback_query(call.id, "Error displaying help.")
 
-async def _show_commands_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str):
-    """Show comprehensive commands help"""
+async def _edit_to_screen(call: types.CallbackQuery, bot: AsyncTeleBot, screen: Rendered):
+    """Show a pre-rendered screen in place of the callback's message"""
+    await bot.edit_message_text(
+        screen.text,
+        call.message.chat.id,
+        call.message.message_id,
+        reply_markup=screen.markup,
+        parse_mode=screen.parse_mode
+    )
+
+@render_cache.screen('help:commands')
+def _build_commands_help(lang: str, variant=None) -> Rendered:
+    """Build comprehensive commands help"""
     if lang == "fa":
         help_text = f"""
 🤖 **{T[lang].get('comprehensive_commands', {})}**
@@ -180,17 +193,16 @@ async def _show_commands_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_m
     )
     keyboard.add(back_btn)
     
-    await bot.edit_message_text(
-        help_text,
-        call.message.chat.id,
-        call.message.message_id,
-        reply_markup=keyboard,
-        parse_mode='Markdown'
-    )
+    return Rendered(help_text, freeze_markup(keyboard), 'Markdown')
 
-async def _show_combat_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str, subsection: Optional[str]):
-    """Show detailed combat help"""
-    if subsection == "weapons":
+async def _show_commands_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str):
+    """Show comprehensive commands help"""
+    await _edit_to_screen(call, bot, render_cache.get('help:commands', lang))
+
+@render_cache.screen('help:combat', variants=(None, 'weapons'))
+def _build_combat_help(lang: str, variant=None) -> Rendered:
+    """Build detailed combat help"""
+    if variant == "weapons":
         # Show weapon-specific help
         weapons = get_weapon_items()
         
@@ -288,16 +300,15 @@ async def _show_combat_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_man
             types.InlineKeyboardButton(f"🔙 {T[lang].get('back_to_help', lang)}", callback_data='help:main')
         )
     
-    await bot.edit_message_text(
-        help_text,
-        call.message.chat.id,
-        call.message.message_id,
-        reply_markup=keyboard,
-        parse_mode='Markdown'
-    )
+    return Rendered(help_text, freeze_markup(keyboard), 'Markdown')
 
-async def _show_items_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str, subsection: Optional[str]):
-    """Show items and shop help"""
+async def _show_combat_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str, subsection: Optional[str]):
+    """Show detailed combat help"""
+    await _edit_to_screen(call, bot, render_cache.get('help:combat', lang, 'weapons' if subsection == 'weapons' else None))
+
+@render_cache.screen('help:items')
+def _build_items_help(lang: str, variant=None) -> Rendered:
+    """Build items and shop help"""
     help_text = f"""
 🛒 **{T[lang].get('shop_system_guide', lang)}**
 
@@ -339,16 +350,15 @@ async def _show_items_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_mana
         types.InlineKeyboardButton(f"🔙 {T[lang].get('back_to_help', lang)}", callback_data='help:main')
     )
     
-    await bot.edit_message_text(
-        help_text,
-        call.message.chat.id,
-        call.message.message_id,
-        reply_markup=keyboard,
-        parse_mode='Markdown'
-    )
+    return Rendered(help_text, freeze_markup(keyboard), 'Markdown')
 
-async def _show_stats_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str):
-    """Show statistics and progression help"""
+async def _show_items_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str, subsection: Optional[str]):
+    """Show items and shop help"""
+    await _edit_to_screen(call, bot, render_cache.get('help:items', lang))
+
+@render_cache.screen('help:stats')
+def _build_stats_help(lang: str, variant=None) -> Rendered:
+    """Build statistics and progression help"""
     help_text = f"""
 📊 **{T[lang].get('statistics_guide', {})}**
 
@@ -392,19 +402,17 @@ async def _show_stats_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_mana
         types.InlineKeyboardButton(f"🔙 {T[lang].get('back_to_help', lang)}", callback_data='help:main')
     )
     
-    await bot.edit_message_text(
-        help_text,
-        call.message.chat.id,
-        call.message.message_id,
-        reply_markup=keyboard,
-        parse_mode='Markdown'
-    )
+    return Rendered(help_text, freeze_markup(keyboard), 'Markdown')
 
-async def _show_faq_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str):
-    """Show frequently asked questions"""
-    try:
-        if lang == "fa":
-            help_text = f"""
+async def _show_stats_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str):
+    """Show statistics and progression help"""
+    await _edit_to_screen(call, bot, render_cache.get('help:stats', lang))
+
+@render_cache.screen('help:faq')
+def _build_faq_help(lang: str, variant=None) -> Rendered:
+    """Build the frequently asked questions screen"""
+    if lang == "fa":
+        help_text = f"""
 ✓ **{T[lang].get('faq_title', {})}**
 
 • چگونه بازی را شروع کنم؟
@@ -418,9 +426,9 @@ async def _show_faq_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manage
 
 • ستاره‌های تلگرام چیست؟
 ارز ویژه‌ای که از طریق تلگرام قابل کسب یا خرید برای آیتم‌های انحصاری است.
-            """
-        else:
-            help_text = f"""
+        """
+    else:
+        help_text = f"""
 ✓ **{T[lang].get('faq_title', {})}**
 
 **Q: How do I start playing?**
@@ -458,115 +466,122 @@ A: Use `/use` command or browse your `/inventory` for item usage options.
 
 **Q: What's the difference between weapons and defense items?**
 A: Weapons increase attack damage, while defense items reduce incoming damage or provide protection.
-            """
+        """
 
-        keyboard = types.InlineKeyboardMarkup()
-        keyboard.add(
-            types.InlineKeyboardButton(f"🆘 {T[lang].get('contact_support', {})}", url="https://t.me/bettercallninja"),
-            types.InlineKeyboardButton(f"🔙 {T[lang].get('back_to_help', lang)}", callback_data='help:main')
-        )
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(
+        types.InlineKeyboardButton(f"🆘 {T[lang].get('contact_support', {})}", url="https://t.me/bettercallninja"),
+        types.InlineKeyboardButton(f"🔙 {T[lang].get('back_to_help', lang)}", callback_data='help:main')
+    )
 
-        await bot.edit_message_text(
-            help_text,
-            call.message.chat.id,
-            call.message.message_id,
-            reply_markup=keyboard,
-            parse_mode='Markdown'
-        )
+    return Rendered(help_text, freeze_markup(keyboard), 'Markdown')
+
+async def _show_faq_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str):
+    """Show frequently asked questions"""
+    try:
+        await _edit_to_screen(call, bot, render_cache.get('help:faq', lang))
     except Exception as e:
         logger.error(f"Error showing FAQ help: {e}")
         await bot.answer_callback_query(call.id, "Error displaying FAQ.")
 
-async def _show_traditional_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str, help_section: str):
-    """Show traditional help sections for backward compatibility"""
+@render_cache.screen('help:section', variants=())
+def _build_traditional_help(lang: str, variant=None) -> Rendered:
+    """Build a traditional help section"""
+    # Get the appropriate help text for the requested section
+    help_text = T[lang].get('help_sections', {}).get(variant, f"Help section '{variant}' not found.")
+
+    # Create a "Back" button to return to the main help menu
+    keyboard = types.InlineKeyboardMarkup()
+    back_btn = types.InlineKeyboardButton(
+        T[lang].get('back_button', {}),
+        callback_data='help:main'
+    )
+    keyboard.add(back_btn)
+    return Rendered(help_text, freeze_markup(keyboard), 'HTML')
 
 async def _show_traditional_help(call: types.CallbackQuery, bot: AsyncTeleBot, db_manager: DBManager, lang: str, help_section: str):
     """Show traditional help sections for backward compatibility"""
     try:
-        # Get the appropriate help text for the requested section
-        help_text = T[lang].get('help_sections', {}).get(help_section, f"Help section '{help_section}' not found.")
-        
-        # Create a "Back" button to return to the main help menu
-        keyboard = types.InlineKeyboardMarkup()
-        back_btn = types.InlineKeyboardButton(
-            T[lang].get('back_button', {}),
-            callback_data='help:main'
-        )
-        keyboard.add(back_btn)
-        
-        # Update the message with the selected help section's text
-        await bot.edit_message_text(
-            help_text,
-            call.message.chat.id,
-            call.message.message_id,
-            reply_markup=keyboard,
-            parse_mode='HTML'
-        )
+        # Unknown sections are rendered on demand too and bounded by the cache size
+        await _edit_to_screen(call, bot, render_cache.get('help:section', lang, help_section))
     except Exception as e:
         logger.error(f"Error showing traditional help: {e}")
 
-async def _send_main_help_menu(message: types.Message, bot: AsyncTeleBot, db_manager: DBManager, lang: str):
-    """Sends the enhanced main help menu as a new message."""
-    try:
-        help_manager = HelpManager(db_manager, bot)
-        user_stats = await help_manager.get_user_stats_for_help(message.chat.id, message.from_user.id)
-        recommendations = help_manager.get_contextual_help_recommendations(user_stats)
-
-        # Build contextual intro
-        intro_text = f"📚 **{T[lang].get('help_welcome', {})}**\n\n"
-
-        if recommendations:
-            intro_text += f"💡 **{T[lang].get('recommendations_for_you', {})}:**\n"
-            for rec in recommendations[:2]:  # Show max 2 recommendations
-                intro_text += f"• {rec}\n"
-            intro_text += "\n"
-
-        intro_text += T[lang].get('help_intro', {})
+@render_cache.screen('help:main', variants=('send', 'edit'))
+def _build_main_help_menu(lang: str, variant=None) -> Rendered:
+    """Build the main help menu; ``send`` adds the main-menu shortcut row"""
+    text = (
+        f"📚 **{literal(T[lang].get('help_welcome', {}))}**\n\n"
+        "{recommendations}"
+        f"{literal(T[lang].get('help_intro', {}))}"
+    )
 
-        # Create enhanced keyboard with modern categories
-        keyboard = types.InlineKeyboardMarkup(row_width=2)
+    # Create enhanced keyboard with modern categories
+    keyboard = types.InlineKeyboardMarkup(row_width=2)
 
-        # First row - Core help
-        commands_btn = types.InlineKeyboardButton(
-            f"🧠 {T[lang].get('commands_help', {})}",
-            callback_data='help:commands'
-        )
-        combat_btn = types.InlineKeyboardButton(
-            f"⚔️ {T[lang].get('combat_help', {})}",
-            callback_data='help:combat'
-        )
-        keyboard.add(commands_btn, combat_btn)
+    # First row - Core help
+    commands_btn = types.InlineKeyboardButton(
+        f"🧠 {T[lang].get('commands_help', {})}",
+        callback_data='help:commands'
+    )
+    combat_btn = types.InlineKeyboardButton(
+        f"⚔️ {T[lang].get('combat_help', {})}",
+        callback_data='help:combat'
+    )
+    keyboard.add(commands_btn, combat_btn)
 
-        # Second row - Management
-        items_btn = types.InlineKeyboardButton(
-            f"🛒 {T[lang].get('items_help', {})}",
-            callback_data='help:items'
-        )
-        stats_btn = types.InlineKeyboardButton(
-            f"📊 {T[lang].get('stats_help', {})}",
-            callback_data='help:stats'
-        )
-        keyboard.add(items_btn, stats_btn)
+    # Second row - Management
+    items_btn = types.InlineKeyboardButton(
+        f"🛒 {T[lang].get('items_help', {})}",
+        callback_data='help:items'
+    )
+    stats_btn = types.InlineKeyboardButton(
+        f"📊 {T[lang].get('stats_help', {})}",
+        callback_data='help:stats'
+    )
+    keyboard.add(items_btn, stats_btn)
 
-        # Third row - Additional help
-        faq_btn = types.InlineKeyboardButton(
-            f"✓ {T[lang].get('faq_help', {})}",
-            callback_data='help:faq'
-        )
-        keyboard.add(faq_btn)
+    # Third row - Additional help
+    faq_btn = types.InlineKeyboardButton(
+        f"✓ {T[lang].get('faq_help', {})}",
+        callback_data='help:faq'
+    )
+    keyboard.add(faq_btn)
 
-        # Fourth row - Quick actions
+    # Fourth row - Quick actions
+    if variant == 'send':
         menu_btn = types.InlineKeyboardButton(
             f"📋 {T[lang].get('main_menu', {})}",
             callback_data='quick:menu'
         )
         keyboard.add(menu_btn)
 
+    return Rendered(text, freeze_markup(keyboard), 'Markdown')
+
+async def _render_main_help_menu(message: types.Message, bot: AsyncTeleBot, db_manager: DBManager,
+                                 lang: str, variant: str) -> Tuple[str, Rendered]:
+    """Interpolate the user's recommendations into the cached main help menu"""
+    help_manager = HelpManager(db_manager, bot)
+    user_stats = await help_manager.get_user_stats_for_help(message.chat.id, message.from_user.id)
+    recommendations = help_manager.get_contextual_help_recommendations(user_stats)
+
+    screen = render_cache.get('help:main', lang, variant)
+    block = ""
+    if recommendations:
+        block = f"💡 **{T[lang].get('recommendations_for_you', {})}:**\n"
+        block += "".join(f"• {rec}\n" for rec in recommendations[:2])  # Show max 2 recommendations
+        block += "\n"
+    return screen.format(recommendations=block), screen
+
+async def _send_main_help_menu(message: types.Message, bot: AsyncTeleBot, db_manager: DBManager, lang: str):
+    """Sends the enhanced main help menu as a new message."""
+    try:
+        text, screen = await _render_main_help_menu(message, bot, db_manager, lang, 'send')
         await bot.send_message(
             message.chat.id,
-            intro_text,
-            reply_markup=keyboard,
-            parse_mode='Markdown'
+            text,
+            reply_markup=screen.markup,
+            parse_mode=screen.parse_mode
         )
 
     except Exception as e:
@@ -580,59 +595,13 @@ async def _send_main_help_menu(message: types.Message, bot: AsyncTeleBot, db_man
 async def _edit_to_main_help_menu(message: types.Message, bot: AsyncTeleBot, db_manager: DBManager, lang: str):
     """Edits an existing message to show the enhanced main help menu."""
     try:
-        help_manager = HelpManager(db_manager, bot)
-        user_stats = await help_manager.get_user_stats_for_help(message.chat.id, message.from_user.id)
-        recommendations = help_manager.get_contextual_help_recommendations(user_stats)
-
-        # Build contextual intro
-        intro_text = f"📚 **{T[lang].get('help_welcome', {})}**\n\n"
-
-        if recommendations:
-            intro_text += f"💡 **{T[lang].get('recommendations_for_you', {})}:**\n"
-            for rec in recommendations[:2]:  # Show max 2 recommendations
-                intro_text += f"• {rec}\n"
-            intro_text += "\n"
-
-        intro_text += T[lang].get('help_intro', {})
-
-        # Create enhanced keyboard
-        keyboard = types.InlineKeyboardMarkup(row_width=2)
-
-        # First row - Core help
-        commands_btn = types.InlineKeyboardButton(
-            f"🧠 {T[lang].get('commands_help', {})}",
-            callback_data='help:commands'
-        )
-        combat_btn = types.InlineKeyboardButton(
-            f"⚔️ {T[lang].get('combat_help', {})}",
-            callback_data='help:combat'
-        )
-        keyboard.add(commands_btn, combat_btn)
-
-        # Second row - Management
-        items_btn = types.InlineKeyboardButton(
-            f"🛒 {T[lang].get('items_help', {})}",
-            callback_data='help:items'
-        )
-        stats_btn = types.InlineKeyboardButton(
-            f"📊 {T[lang].get('stats_help', {})}",
-            callback_data='help:stats'
-        )
-        keyboard.add(items_btn, stats_btn)
-
-        # Third row - Additional help
-        faq_btn = types.InlineKeyboardButton(
-            f"✓ {T[lang].get('faq_help', {})}",
-            callback_data='help:faq'
-        )
-        keyboard.add(faq_btn)
-
+        text, screen = await _render_main_help_menu(message, bot, db_manager, lang, 'edit')
         await bot.edit_message_text(
-            intro_text,
+            text,
             message.chat.id,
             message.message_id,
-            reply_markup=keyboard,
-            parse_mode='Markdown'
+            reply_markup=screen.markup,
+            parse_mode=screen.parse_mode
         )
 
     except Exception as e:
@@ -641,7 +610,7 @@ async def _edit_to_main_help_menu(message: types.Message, bot: AsyncTeleBot, db_
 def register_handlers(bot: AsyncTeleBot, db_manager: DBManager):
     """Registers enhanced command handlers for the help module."""
 
-    @bot.message_handler(commands=['help'])
+    @router.command('help')
     async def help_command(message: types.Message):
         """Enhanced help command with contextual recommendations"""
         try:
@@ -652,12 +621,12 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager):
             logger.error(f"Error in help command: {e}")
             await bot.send_message(message.chat.id, "Error displaying help.")
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('help:'))
+    @router.callback('help:')
     async def help_callback_handler(call: types.CallbackQuery):
         """Enhanced help callback handler"""
         await handle_help_callback(call, bot, db_manager)
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('quick:'))
+    @router.callback('quick:')
     async def quick_action_handler(call: types.CallbackQuery):
         """Handle quick action callbacks from help system"""
         try:
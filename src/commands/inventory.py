@@ -10,8 +10,11 @@ from typing import Dict, List, Any, Optional
 from telebot import types
 from telebot.async_telebot import AsyncTeleBot
 from src.utils import helpers
+from src.utils.events import event_bus, ItemUsed
 from src.utils.translations import T
 from src.database.db_manager import DBManager
+from src.database.economy import Outcome, item_effects
+from src.handlers.router import router
 from src.config.items import (
     ITEMS, get_item_display_name, get_item_emoji, get_item_stats, 
     get_item_description, ItemCategory, is_weapon, is_defense_item,
@@ -95,190 +98,31 @@ class InventoryManager:
             logger.error(f"Error getting inventory stats: {e}")
             return {"total_items": 0, "total_quantity": 0, "categories": {}, "most_valuable": None, "total_value": 0}
     
-    async def use_item(self, chat_id: int, user_id: int, item_id: str) -> bool:
+    async def use_item(self, chat_id: int, user_id: int, item_id: str) -> Outcome:
         """Use an item from inventory with comprehensive effects"""
         try:
-            # Check if user has the item
-            item_row = await self.db_manager.db(
-                "SELECT qty FROM inventories WHERE chat_id=%s AND user_id=%s AND item=%s",
-                (chat_id, user_id, item_id),
-                fetch="one_dict"
-            )
-            
-            if not item_row or item_row['qty'] <= 0:
-                logger.warning(f"User {user_id} tried to use item {item_id} but has none")
-                return False
-            
             # Get item data
             item_stats = get_item_stats(item_id)
             item_type = item_stats.get('type', '')
             
-            # Start transaction
-            queries = []
-            
-            # Consume the item (if consumable)
-            if item_stats.get('consumable', True):  # Default to consumable unless specified
-                queries.append((
-                    "UPDATE inventories SET qty = qty - 1 WHERE chat_id=%s AND user_id=%s AND item=%s AND qty > 0",
-                    (chat_id, user_id, item_id)
-                ))
-            
-            # Apply item effects based on type
-            if item_type == 'shield' or item_type == 'intercept':
-                # DEFENSE ITEMS - Activate shield/intercept protection
-                
-                # Remove any existing defense
-                queries.append((
-                    "DELETE FROM active_defenses WHERE chat_id=%s AND user_id=%s",
-                    (chat_id, user_id)
-                ))
-                
-                # Calculate expiration time based on item duration
-                duration = item_stats.get('duration_seconds', 14400)  # Default 4 hours
-                expires_at = helpers.now() + duration
-                
-                # Insert new defense
-                queries.append((
-                    "INSERT INTO active_defenses (chat_id, user_id, defense_type, expires_at, activated_at) VALUES (%s, %s, %s, %s, %s)",
-                    (chat_id, user_id, item_id, expires_at, helpers.now())
-                ))
-                
-            elif item_type == 'boost':
-                # BOOST ITEMS - Various temporary effects
-                
-                if item_id in ['medal_boost_small', 'medal_boost', 'mega_medal_boost']:
-                    # Medal boost items - instant medal reward
-                    medal_reward = item_stats.get('medals_reward', 250)
-                    queries.append((
-                        "UPDATE players SET score = score + %s WHERE chat_id=%s AND user_id=%s",
-                        (medal_reward, chat_id, user_id)
-                    ))
-                    
-                elif item_id in ['energy_drink', 'adrenaline_shot']:
-                    # Cooldown reduction items - add to active boosts table
-                    duration = item_stats.get('duration_seconds', 3600)
-                    expires_at = helpers.now() + duration
-                    
-                    # Remove existing cooldown boost
-                    queries.append((
-                        "DELETE FROM active_boosts WHERE chat_id=%s AND user_id=%s AND boost_type='cooldown_reduction'",
-                        (chat_id, user_id)
-                    ))
-                    
-                    # Add new cooldown boost
-                    cooldown_reduction = item_stats.get('cooldown_reduction', 0.5)
-                    queries.append((
-                        """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                           VALUES (%s, %s, 'cooldown_reduction', %s, %s, %s)
-                           ON CONFLICT (chat_id, user_id, boost_type) 
-                           DO UPDATE SET boost_value = %s, expires_at = %s, activated_at = %s""",
-                        (chat_id, user_id, cooldown_reduction, expires_at, helpers.now(), 
-                         cooldown_reduction, expires_at, helpers.now())
-                    ))
-                    
-                elif item_id == 'experience_boost':
-                    # Experience multiplier boost
-                    duration = item_stats.get('duration_seconds', 14400)  # 4 hours
-                    expires_at = helpers.now() + duration
-                    multiplier = item_stats.get('experience_multiplier', 2.0)
-                    
-                    queries.append((
-                        """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                           VALUES (%s, %s, 'experience_multiplier', %s, %s, %s)
-                           ON CONFLICT (chat_id, user_id, boost_type) 
-                           DO UPDATE SET boost_value = %s, expires_at = %s, activated_at = %s""",
-                        (chat_id, user_id, multiplier, expires_at, helpers.now(), 
-                         multiplier, expires_at, helpers.now())
-                    ))
-                    
-            elif item_type == 'utility':
-                # UTILITY ITEMS - Instant effects
-                
-                if item_id in ['repair_kit', 'nano_repair']:
-                    # HP restoration items
-                    hp_restore = item_stats.get('hp_restore', 100)
-                    
-                    if item_id == 'nano_repair':
-                        # Nano repair can overheal beyond max_hp
-                        queries.append((
-                            "UPDATE players SET hp = LEAST(hp + %s, max_hp + 50) WHERE chat_id=%s AND user_id=%s",
-                            (hp_restore, chat_id, user_id)
-                        ))
-                    else:
-                        # Regular repair kit restores to max_hp
-                        queries.append((
-                            "UPDATE players SET hp = LEAST(hp + %s, max_hp) WHERE chat_id=%s AND user_id=%s",
-                            (hp_restore, chat_id, user_id)
-                        ))
-                        
-            elif item_type == 'status':
-                # STATUS ITEMS - Long-term effects (VIP, Elite membership)
-                
-                if item_id in ['vip_status', 'elite_membership']:
-                    # VIP/Elite membership activation
-                    days = item_stats.get('days', 30)
-                    expires_at = helpers.now() + (days * 24 * 60 * 60)  # Convert days to seconds
-                    
-                    # Remove existing VIP status
-                    queries.append((
-                        "DELETE FROM active_boosts WHERE chat_id=%s AND user_id=%s AND boost_type IN ('vip_status', 'elite_membership')",
-                        (chat_id, user_id)
-                    ))
-                    
-                    # Add VIP/Elite status
-                    experience_mult = item_stats.get('experience_multiplier', 1.5)
-                    damage_bonus = item_stats.get('damage_bonus', 0.2)
-                    
-                    # Add experience multiplier
-                    queries.append((
-                        """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                           VALUES (%s, %s, 'vip_experience', %s, %s, %s)""",
-                        (chat_id, user_id, experience_mult, expires_at, helpers.now())
-                    ))
-                    
-                    # Add damage bonus
-                    queries.append((
-                        """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                           VALUES (%s, %s, 'vip_damage', %s, %s, %s)""",
-                        (chat_id, user_id, damage_bonus, expires_at, helpers.now())
-                    ))
-                    
-                    # Add cooldown reduction if elite
-                    if item_id == 'elite_membership':
-                        cooldown_reduction = item_stats.get('cooldown_reduction', 0.25)
-                        queries.append((
-                            """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                               VALUES (%s, %s, 'vip_cooldown', %s, %s, %s)""",
-                            (chat_id, user_id, cooldown_reduction, expires_at, helpers.now())
-                        ))
-                        
-            elif item_type == 'arsenal':
-                # ARSENAL ITEMS - Increase weapon capacity (persistent effect)
-                
-                if item_id in ['carrier', 'military_base']:
-                    capacity_increase = item_stats.get('capacity', 10)
-                    
-                    # Add to player's arsenal capacity (stored in settings)
-                    queries.append((
-                        """UPDATE players SET settings = COALESCE(settings, '{}') || jsonb_build_object('arsenal_capacity', 
-                           COALESCE((settings->>'arsenal_capacity')::int, 0) + %s) 
-                           WHERE chat_id=%s AND user_id=%s""",
-                        (capacity_increase, chat_id, user_id)
-                    ))
-            
-            # Execute transaction
-            success = await self.db_manager.transaction(queries)
+            # Consuming the item (if consumable) and applying its effects is one
+            # statement, which does nothing unless the user has the item
+            result = await self.db_manager.consume_and_apply(
+                chat_id, user_id, item_id, item_effects(item_id, helpers.now()),
+                consumable=item_stats.get('consumable', True)  # Default to consumable unless specified
+            )
+            if not result.applied:
+                if result.outcome is Outcome.SHORT:
+                    logger.warning(f"User {user_id} tried to use item {item_id} but has none")
+                return result.outcome
             
-            if success:
-                logger.info(f"User {user_id} used item {item_id} successfully")
-                return True
-            else:
-                logger.error(f"Transaction failed for user {user_id} using item {item_id}")
-                return False
+            logger.info(f"User {user_id} used item {item_id} successfully")
+            await event_bus.publish(ItemUsed(chat_id=chat_id, user_id=user_id, item=item_id, item_type=item_type))
+            return Outcome.APPLIED
                 
         except Exception as e:
             logger.error(f"Error using item {item_id}: {e}")
-            return False
+            return Outcome.ERROR
     
     async def show_inventory_overview(self, bot: AsyncTeleBot, message: types.Message):
         """Show comprehensive inventory overview"""
@@ -635,9 +479,9 @@ class InventoryManager:
             lang = await helpers.get_lang(call.message.chat.id, call.from_user.id, self.db_manager)
             
             # Use the item
-            success = await self.use_item(call.message.chat.id, call.from_user.id, item_id)
+            outcome = await self.use_item(call.message.chat.id, call.from_user.id, item_id)
             
-            if success:
+            if outcome is Outcome.APPLIED:
                 item_name = get_item_display_name(item_id, lang)
                 emoji = get_item_emoji(item_id)
                 
@@ -698,11 +542,12 @@ class InventoryManager:
                     parse_mode="Markdown"
                 )
             else:
-                await bot.answer_callback_query(
-                    call.id, 
-                    T[lang].get('item_use_failed', "❌ Failed to use item."),
-                    show_alert=True
-                )
+                if outcome is Outcome.SHORT:
+                    failure = T[lang].get('item_not_owned', "❌ You don't have {item_name}").format(
+                        item_name=get_item_display_name(item_id, lang))
+                else:
+                    failure = T[lang].get('item_use_failed', "❌ Failed to use item.")
+                await bot.answer_callback_query(call.id, failure, show_alert=True)
                 
                 # Refresh the use item menu
                 await self.show_use_item_menu(bot, call)
@@ -791,12 +636,12 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
     # Initialize InventoryManager
     inventory_manager = InventoryManager(db_manager)
     
-    @bot.message_handler(commands=['inventory', 'inv'])
+    @router.command('inventory', 'inv')
     async def handle_inventory_command(message):
         """Handle /inventory command with enhanced features"""
         await inventory_manager.show_inventory_overview(bot, message)
     
-    @bot.message_handler(commands=['use'])
+    @router.command('use')
     async def handle_use_command(message):
         """Handle /use command for item usage"""
         try:
@@ -820,13 +665,13 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             logger.error(f"Error handling use command: {e}")
             await bot.send_message(message.chat.id, "Error showing use menu.")
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('inventory:'))
+    @router.callback('inventory:')
     async def handle_inventory_callbacks(call):
         """Handle all inventory-related callbacks"""
         await inventory_manager.handle_inventory_callback(bot, call)
     
     # Legacy support for direct item usage
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('use_item:'))
+    @router.callback('use_item:')
     async def handle_use_item_callbacks(call):
         """Handle item usage callbacks (legacy support)"""
         item_id = call.data.replace('use_item:', '')
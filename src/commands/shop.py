@@ -6,12 +6,16 @@ Provides advanced shop functionality with categories, TG Stars, and bilingual su
 """
 
 import logging
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Dict, List, NamedTuple, Optional, Tuple, Any
 from telebot import types
 from telebot.async_telebot import AsyncTeleBot
 from src.utils import helpers
+from src.utils.events import event_bus, ItemPurchased
+from src.utils.render_cache import render_cache, Rendered, freeze_markup, literal
 from src.utils.translations import T
 from src.database.db_manager import DBManager
+from src.database.economy import AUTO_USE_ITEMS, ItemEffects, Outcome, item_effects
+from src.handlers.router import router
 from src.config.items import (
     ITEMS, ItemType, PaymentType, ItemCategory,
     get_item_display_name, get_item_description, get_item_emoji,
@@ -21,6 +25,87 @@ from src.config.items import (
 # Set up logging
 logger = logging.getLogger(__name__)
 
+def item_price(item_id: str) -> Tuple[int, str]:
+    """Get item price and payment type"""
+    item = ITEMS.get(item_id, {})
+    payment_type = item.get('payment', PaymentType.MEDALS.value)
+
+    if payment_type == PaymentType.TG_STARS.value:
+        return item.get('stars_price', 1), 'tg_stars'
+
+    # Calculate medal price - prefer medals_price over stars calculation
+    if 'medals_price' in item:
+        price = item['medals_price']
+    elif 'price' in item:
+        price = item['price']
+    else:
+        # Fallback calculation based on stars
+        stars = item.get('stars', 1)
+        base_price = 50
+        price = base_price * (2 ** (stars - 1))
+    return price, 'medals'
+
+class CategoryListing(NamedTuple):
+    """Pre-rendered shop category: header template and item rows"""
+    header: Rendered
+    items: Tuple[Tuple[str, int, str, str], ...]  # (item_id, price, payment_type, label)
+
+@render_cache.screen('shop:category', variants=('all', 'weapons', 'defense', 'utilities'))
+def _build_shop_category(lang: str, category: str) -> Optional[CategoryListing]:
+    """Build the static part of a shop category; only balances and affordability vary per user"""
+    if category == "all":
+        items = ITEMS
+        title = T[lang].get('all_items', 'All Items')
+    else:
+        items = get_items_by_category(category)  # Pass string directly, not enum
+        title = T[lang].get(f'category_{category}', category.capitalize())
+
+    if not items:
+        return None
+
+    header = (
+        f"🛍️ <b>{literal(title)}</b>\n\n"
+        f"💰 {literal(T[lang].get('medals', 'Medals'))}: <b>{{medals}}</b> | "
+        f"⭐ {literal(T[lang].get('tg_stars', 'TG Stars'))}: <b>{{tg_stars}}</b>\n\n"
+    )
+
+    rows = []
+    for item_id in items:
+        price, payment_type = item_price(item_id)
+        # Format price with appropriate currency
+        price_text = f"{price} 🏅" if payment_type == 'medals' else f"{price} ⭐"
+        label = f"{get_item_emoji(item_id)} {get_item_display_name(item_id, lang)} - {price_text}"
+        rows.append((item_id, price, payment_type, label))
+
+    return CategoryListing(Rendered(header, parse_mode="HTML"), tuple(rows))
+
+@render_cache.screen('shop:category_keyboard', variants=())
+def _build_shop_category_keyboard(lang: str, variant: Tuple[str, int]):
+    """Build a category keyboard for one affordability mask (bit i set = item i affordable)"""
+    category, mask = variant
+    listing = render_cache.get('shop:category', lang, category)
+    keyboard = types.InlineKeyboardMarkup(row_width=1)
+
+    # Add item buttons
+    for index, (item_id, _, _, label) in enumerate(listing.items):
+        prefix = "✅" if mask >> index & 1 else "❌"
+        keyboard.add(types.InlineKeyboardButton(
+            f"{prefix} {label}",
+            callback_data=f"shop:item:{item_id}"
+        ))
+
+    # Navigation buttons
+    back_btn = types.InlineKeyboardButton(
+        f"🔙 {T[lang].get('back_to_shop', 'Back to Shop')}",
+        callback_data="shop:main"
+    )
+    close_btn = types.InlineKeyboardButton(
+        f"❌ {T[lang].get('close_button', 'Close')}",
+        callback_data="shop:close"
+    )
+    keyboard.add(back_btn, close_btn)
+    return freeze_markup(keyboard)
+
 class ShopManager:
     """Manages comprehensive shop system with categories and payment types"""
     
@@ -50,24 +135,7 @@ class ShopManager:
     async def get_item_price(self, item_id: str) -> Tuple[int, str]:
         """Get item price and payment type"""
         try:
-            item = ITEMS.get(item_id, {})
-            payment_type = item.get('payment', PaymentType.MEDALS.value)
-            
-            if payment_type == PaymentType.TG_STARS.value:
-                price = item.get('stars_price', 1)
-                return price, 'tg_stars'
-            else:
-                # Calculate medal price - prefer medals_price over stars calculation
-                if 'medals_price' in item:
-                    price = item['medals_price']
-                elif 'price' in item:
-                    price = item['price']
-                else:
-                    # Fallback calculation based on stars
-                    stars = item.get('stars', 1)
-                    base_price = 50
-                    price = base_price * (2 ** (stars - 1))
-                return price, 'medals'
+            return item_price(item_id)
         except Exception as e:
             logger.error(f"Error getting item price for {item_id}: {e}")
             return 0, 'medals'
@@ -83,182 +151,38 @@ class ShopManager:
             logger.error(f"Error checking affordability: {e}")
             return False
     
-    async def purchase_item(self, chat_id: int, user_id: int, item_id: str) -> bool:
+    async def purchase_item(self, chat_id: int, user_id: int, item_id: str) -> Outcome:
         """Purchase an item and add to inventory or auto-use if it's a boost"""
         try:
-            price, payment_type = await self.get_item_price(item_id)
-            
-            # Check if user can afford it
-            if not await self.can_afford_item(chat_id, user_id, item_id):
-                logger.warning(f"User {user_id} cannot afford item {item_id}")
-                return False
-            
             # Check if the item exists
             if item_id not in ITEMS:
                 logger.warning(f"Item {item_id} does not exist")
-                return False
-            
-            item_data = ITEMS[item_id]
-            item_type = item_data.get('type', '')
-            
-            # Check if this is an auto-use item (medal boosts, instant utility items)
-            auto_use_items = [
-                'medal_boost_small', 'medal_boost', 'mega_medal_boost',  # Medal boost items
-                'energy_drink', 'adrenaline_shot',  # Cooldown reduction items  
-                'experience_boost',  # Experience multiplier
-                'repair_kit', 'nano_repair',  # HP restoration items
-                'first_aid', 'field_medic',  # Basic healing items
-                'vip_status', 'elite_membership'  # Status items - activate immediately
-            ]
-            
-            # Start transaction
-            queries = []
-            
-            # Deduct currency
-            if payment_type == 'medals':
-                queries.append((
-                    "UPDATE players SET score = score - %s WHERE chat_id=%s AND user_id=%s AND score >= %s",
-                    (price, chat_id, user_id, price)
-                ))
-            else:  # TG Stars
-                queries.append((
-                    "UPDATE players SET tg_stars = tg_stars - %s WHERE chat_id=%s AND user_id=%s AND tg_stars >= %s",
-                    (price, chat_id, user_id, price)
-                ))
+                return Outcome.ERROR
             
-            # Apply immediate effects for auto-use items
-            if item_id in auto_use_items:
-                # Apply the item's effect immediately without adding to inventory
-                
-                if item_id in ['medal_boost_small', 'medal_boost', 'mega_medal_boost']:
-                    # Medal boost items - instant medal reward
-                    medal_reward = item_data.get('medals_reward', 250)
-                    queries.append((
-                        "UPDATE players SET score = score + %s WHERE chat_id=%s AND user_id=%s",
-                        (medal_reward, chat_id, user_id)
-                    ))
-                    
-                elif item_id in ['energy_drink', 'adrenaline_shot']:
-                    # Cooldown reduction items - add to active boosts table
-                    duration = item_data.get('duration_seconds', 3600)
-                    expires_at = helpers.now() + duration
-                    cooldown_reduction = item_data.get('cooldown_reduction', 0.5)
-                    
-                    # Remove existing cooldown boost
-                    queries.append((
-                        "DELETE FROM active_boosts WHERE chat_id=%s AND user_id=%s AND boost_type='cooldown_reduction'",
-                        (chat_id, user_id)
-                    ))
-                    
-                    # Add new cooldown boost
-                    queries.append((
-                        """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                           VALUES (%s, %s, 'cooldown_reduction', %s, %s, %s)""",
-                        (chat_id, user_id, cooldown_reduction, expires_at, helpers.now())
-                    ))
-                    
-                elif item_id == 'experience_boost':
-                    # Experience multiplier boost
-                    duration = item_data.get('duration_seconds', 14400)  # 4 hours
-                    expires_at = helpers.now() + duration
-                    multiplier = item_data.get('experience_multiplier', 2.0)
-                    
-                    # Remove existing experience boost
-                    queries.append((
-                        "DELETE FROM active_boosts WHERE chat_id=%s AND user_id=%s AND boost_type='experience_multiplier'",
-                        (chat_id, user_id)
-                    ))
-                    
-                    queries.append((
-                        """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                           VALUES (%s, %s, 'experience_multiplier', %s, %s, %s)""",
-                        (chat_id, user_id, multiplier, expires_at, helpers.now())
-                    ))
-                    
-                elif item_id in ['repair_kit', 'nano_repair', 'first_aid', 'field_medic']:
-                    # HP restoration items
-                    hp_restore = item_data.get('hp_restore', 100)
-                    
-                    if item_id == 'nano_repair':
-                        # Nano repair can overheal beyond max_hp
-                        queries.append((
-                            "UPDATE players SET hp = LEAST(hp + %s, max_hp + 50) WHERE chat_id=%s AND user_id=%s",
-                            (hp_restore, chat_id, user_id)
-                        ))
-                    else:
-                        # Regular repair items restore to max_hp
-                        queries.append((
-                            "UPDATE players SET hp = LEAST(hp + %s, max_hp) WHERE chat_id=%s AND user_id=%s",
-                            (hp_restore, chat_id, user_id)
-                        ))
-                        
-                elif item_id in ['vip_status', 'elite_membership']:
-                    # VIP/Elite membership activation
-                    days = item_data.get('days', 30)
-                    expires_at = helpers.now() + (days * 24 * 60 * 60)  # Convert days to seconds
-                    
-                    # Remove existing VIP status
-                    queries.append((
-                        "DELETE FROM active_boosts WHERE chat_id=%s AND user_id=%s AND boost_type IN ('vip_experience', 'vip_damage', 'vip_cooldown')",
-                        (chat_id, user_id)
-                    ))
-                    
-                    # Add VIP/Elite status
-                    experience_mult = item_data.get('experience_multiplier', 1.5)
-                    damage_bonus = item_data.get('damage_bonus', 0.2)
-                    
-                    # Add experience multiplier
-                    queries.append((
-                        """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                           VALUES (%s, %s, 'vip_experience', %s, %s, %s)""",
-                        (chat_id, user_id, experience_mult, expires_at, helpers.now())
-                    ))
-                    
-                    # Add damage bonus
-                    queries.append((
-                        """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                           VALUES (%s, %s, 'vip_damage', %s, %s, %s)""",
-                        (chat_id, user_id, damage_bonus, expires_at, helpers.now())
-                    ))
-                    
-                    # Add cooldown reduction if elite
-                    if item_id == 'elite_membership':
-                        cooldown_reduction = item_data.get('cooldown_reduction', 0.25)
-                        queries.append((
-                            """INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at) 
-                               VALUES (%s, %s, 'vip_cooldown', %s, %s, %s)""",
-                            (chat_id, user_id, cooldown_reduction, expires_at, helpers.now())
-                        ))
-            else:
-                # For non-auto-use items (weapons, shields, status items), add to inventory
-                queries.append((
-                    """INSERT INTO inventories (chat_id, user_id, item, qty)
-                       VALUES (%s, %s, %s, 1)
-                       ON CONFLICT (chat_id, user_id, item) 
-                       DO UPDATE SET qty = inventories.qty + 1""",
-                    (chat_id, user_id, item_id)
-                ))
-            
-            # Record purchase in purchase history
-            current_time = helpers.now()
-            queries.append((
-                "INSERT INTO purchases (chat_id, user_id, item, price, purchase_time) VALUES (%s, %s, %s, %s, %s)",
-                (chat_id, user_id, item_id, price, current_time)
-            ))
-            
-            # Execute transaction
-            success = await self.db_manager.transaction(queries)
+            price, payment_type = await self.get_item_price(item_id)
             
-            if success:
-                logger.info(f"User {user_id} purchased item {item_id} for {price} {payment_type}")
-                return True
+            # Auto-use items (medal boosts, instant utility items) apply immediately,
+            # everything else (weapons, shields, status items) goes to the inventory
+            if item_id in AUTO_USE_ITEMS:
+                effects = item_effects(item_id, helpers.now())
             else:
-                logger.error(f"Transaction failed for user {user_id} purchasing item {item_id}")
-                return False
+                effects = ItemEffects(grant_item=item_id, grant_qty=1)
+            
+            # The balance check, debit, effects and purchase record are one statement
+            result = await self.db_manager.debit_and_grant(chat_id, user_id, item_id, price, payment_type, effects)
+            if not result.applied:
+                if result.outcome is Outcome.SHORT:
+                    logger.warning(f"User {user_id} cannot afford item {item_id}")
+                return result.outcome
+            
+            logger.info(f"User {user_id} purchased item {item_id} for {price} {payment_type}")
+            await event_bus.publish(ItemPurchased(
+                chat_id=chat_id, user_id=user_id, item=item_id, price=price, currency=payment_type))
+            return Outcome.APPLIED
                 
         except Exception as e:
             logger.error(f"Error purchasing item {item_id}: {e}")
-            return False
+            return Outcome.ERROR
     
     async def show_shop_overview(self, bot: AsyncTeleBot, message: types.Message):
         """Display comprehensive shop overview with categories"""
@@ -328,76 +252,36 @@ class ShopManager:
         """Display items in a specific category"""
         try:
             lang = await helpers.get_lang(call.message.chat.id, call.from_user.id, self.db_manager)
-            user_currency = await self.get_user_currency(call.message.chat.id, call.from_user.id)
-            
-            # Get items by category
-            if category == "all":
-                items = ITEMS
-                title = T[lang].get('all_items', 'All Items')
-            else:
-                items = get_items_by_category(category)  # Pass string directly, not enum
-                title = T[lang].get(f'category_{category}', category.capitalize())
-            
-            if not items:
+            listing = render_cache.get('shop:category', lang, category)
+
+            if listing is None:
                 await bot.answer_callback_query(
-                    call.id, 
-                    T[lang].get('no_items_in_category', 'No items in this category'), 
+                    call.id,
+                    T[lang].get('no_items_in_category', 'No items in this category'),
                     show_alert=True
                 )
                 return
-            
-            # Build category message
-            shop_text = f"🛍️ <b>{title}</b>\n\n"
-            shop_text += f"💰 {T[lang].get('medals', 'Medals')}: <b>{user_currency['medals']}</b> | "
-            shop_text += f"⭐ {T[lang].get('tg_stars', 'TG Stars')}: <b>{user_currency['tg_stars']}</b>\n\n"
-            
-            keyboard = types.InlineKeyboardMarkup(row_width=1)
-            
-            # Add item buttons
-            for item_id, item_data in items.items():
-                item_name = get_item_display_name(item_id, lang)
-                emoji = get_item_emoji(item_id)
-                price, payment_type = await self.get_item_price(item_id)
-                
-                # Format price with appropriate currency
-                if payment_type == 'medals':
-                    price_text = f"{price} 🏅"
-                else:
-                    price_text = f"{price} ⭐"
-                
-                # Check affordability
-                can_afford = await self.can_afford_item(call.message.chat.id, call.from_user.id, item_id)
-                prefix = "✅" if can_afford else "❌"
-                
-                button_text = f"{prefix} {emoji} {item_name} - {price_text}"
-                keyboard.add(types.InlineKeyboardButton(
-                    button_text, 
-                    callback_data=f"shop:item:{item_id}"
-                ))
-            
-            # Navigation buttons
-            back_btn = types.InlineKeyboardButton(
-                f"🔙 {T[lang].get('back_to_shop', 'Back to Shop')}", 
-                callback_data="shop:main"
-            )
-            close_btn = types.InlineKeyboardButton(
-                f"❌ {T[lang].get('close_button', 'Close')}", 
-                callback_data="shop:close"
-            )
-            keyboard.add(back_btn, close_btn)
-            
+
+            # Only the balances and the affordability marks are per user
+            user_currency = await self.get_user_currency(call.message.chat.id, call.from_user.id)
+            mask = 0
+            for index, (_, price, payment_type, _) in enumerate(listing.items):
+                if user_currency.get(payment_type, 0) >= price:
+                    mask |= 1 << index
+            keyboard = render_cache.get('shop:category_keyboard', lang, (category, mask))
+
             await bot.edit_message_text(
-                shop_text,
+                listing.header.format(**user_currency),
                 call.message.chat.id,
                 call.message.message_id,
                 reply_markup=keyboard,
-                parse_mode="HTML"
+                parse_mode=listing.header.parse_mode
             )
-            
+
         except Exception as e:
             logger.error(f"Error showing shop category {category}: {e}")
             await bot.answer_callback_query(call.id, "❌ Error loading category.")
-    
+
     async def show_shop_payment_type(self, bot: AsyncTeleBot, call: types.CallbackQuery, payment_type: str):
         """Display items by payment type (medals/TG Stars)"""
         try:
@@ -563,23 +447,16 @@ class ShopManager:
             lang = await helpers.get_lang(call.message.chat.id, call.from_user.id, self.db_manager)
             
             # Attempt purchase
-            success = await self.purchase_item(call.message.chat.id, call.from_user.id, item_id)
+            outcome = await self.purchase_item(call.message.chat.id, call.from_user.id, item_id)
             
-            if success:
+            if outcome is Outcome.APPLIED:
                 item_name = get_item_display_name(item_id, lang)
                 emoji = get_item_emoji(item_id)
                 price, payment_type = await self.get_item_price(item_id)
                 currency_name = T[lang].get('medals', 'Medals') if payment_type == 'medals' else T[lang].get('tg_stars', 'TG Stars')
                 
                 # Check if this was an auto-use item
-                auto_use_items = [
-                    'medal_boost_small', 'medal_boost', 'mega_medal_boost',
-                    'energy_drink', 'adrenaline_shot', 'experience_boost',
-                    'repair_kit', 'nano_repair', 'first_aid', 'field_medic',
-                    'vip_status', 'elite_membership'
-                ]
-                
-                is_auto_use = item_id in auto_use_items
+                is_auto_use = item_id in AUTO_USE_ITEMS
                 
                 # Create success message with appropriate effect description
                 if is_auto_use:
@@ -656,7 +533,14 @@ class ShopManager:
                     parse_mode="HTML"
                 )
             else:
-                error_msg = T[lang].get('purchase_failed', '❌ Purchase failed. Please try again.')
+                if outcome is Outcome.SHORT:
+                    _, payment_type = await self.get_item_price(item_id)
+                    if payment_type == 'medals':
+                        error_msg = T[lang].get('insufficient_medals', '❌ Not enough medals!')
+                    else:
+                        error_msg = T[lang].get('stars_error_insufficient', '❌ Insufficient TG Stars balance.')
+                else:
+                    error_msg = T[lang].get('purchase_failed', '❌ Purchase failed. Please try again.')
                 await bot.answer_callback_query(call.id, error_msg, show_alert=True)
                 
                 # Return to item details to try again
@@ -721,12 +605,12 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager):
     # Initialize ShopManager
     shop_manager = ShopManager(db_manager)
     
-    @bot.message_handler(commands=['shop', 'store'])
+    @router.command('shop', 'store')
     async def handle_shop_command(message):
         """Handle /shop command with enhanced features"""
         await shop_manager.show_shop_overview(bot, message)
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('shop:'))
+    @router.callback('shop:')
     async def handle_shop_callbacks(call):
         """Handle all shop-related callbacks"""
         await shop_manager.handle_shop_callback(bot, call)
@@ -11,8 +11,13 @@ from datetime import datetime, timedelta
 from telebot import types
 from telebot.async_telebot import AsyncTeleBot
 from src.utils import helpers
+from src.utils.events import event_bus, ItemPurchased, PaymentCompleted
+from src.utils.cooldowns import cooldown_engine, FREE_STARS
 from src.utils.translations import T
 from src.database.db_manager import DBManager
+from src.database.economy import ItemEffects, Outcome
+from src.database.mutations import Mutation, PLAYER, INVENTORY
+from src.handlers.router import router
 from src.config.items import ITEMS, PaymentType, get_items_by_payment_type, get_item_display_name, get_item_emoji, get_item_stats
 from src.config.bot_config import BotConfig
 
@@ -41,10 +46,15 @@ class StarsManager:
     async def add_stars_to_user(self, chat_id: int, user_id: int, amount: int) -> bool:
         """Add TG Stars to user's balance"""
         try:
-            await self.db_manager.db(
-                "UPDATE players SET tg_stars = tg_stars + %s WHERE chat_id=%s AND user_id=%s",
-                (amount, chat_id, user_id)
+            row = await self.db_manager.db(
+                "UPDATE players SET tg_stars = tg_stars + %s WHERE chat_id=%s AND user_id=%s RETURNING tg_stars",
+                (amount, chat_id, user_id),
+                fetch="one"
             )
+            if not row:
+                logger.warning(f"No player {user_id} in chat {chat_id} to add TG Stars to")
+                return False
+            self.db_manager.publish_mutations(Mutation(PLAYER, chat_id, user_id, {'tg_stars': row[0]}))
             logger.info(f"Added {amount} TG Stars to user {user_id} in chat {chat_id}")
             return True
         except Exception as e:
@@ -107,10 +117,22 @@ class StarsManager:
         try:
             if not BotConfig.feature_flags.free_stars_enabled:
                 return
+            
+            # One claim per cooldown period
+            wait_time = await cooldown_engine.acquire(
+                chat_id, user_id, FREE_STARS, BotConfig.game_mechanics.free_stars_cooldown, write_through=True
+            )
+            if wait_time > 0:
+                hours_left = wait_time // 3600 + 1
+                await bot.send_message(chat_id, T[lang].get('free_stars_already', T['en']['free_stars_already']).format(hours=hours_left))
+                return
                 
-            # Add 10 free stars
+            # Add 10 free stars; give the claim back if that failed
             free_stars_amount = 10
-            await self.add_stars_to_user(chat_id, user_id, free_stars_amount)
+            if not await self.add_stars_to_user(chat_id, user_id, free_stars_amount):
+                await cooldown_engine.clear(chat_id, user_id, FREE_STARS)
+                await bot.send_message(chat_id, T[lang].get('stars_error_generic', T['en']['stars_error_generic']))
+                return
             
             # Get updated balance
             new_balance = await self.get_user_stars_balance(chat_id, user_id)
@@ -128,55 +150,38 @@ class StarsManager:
         except Exception as e:
             logger.error(f"Error processing free stars: {e}")
     
-    async def purchase_premium_item(self, chat_id: int, user_id: int, item_id: str) -> bool:
+    async def purchase_premium_item(self, chat_id: int, user_id: int, item_id: str) -> Outcome:
         """Process a premium item purchase"""
         try:
             # Check if the item exists and is a premium item
             if item_id not in ITEMS:
-                return False
+                return Outcome.ERROR
                 
             item = ITEMS[item_id]
             if item.get('payment') != PaymentType.TG_STARS.value:
-                return False
+                return Outcome.ERROR
                 
             # Get item price
             price = item.get('stars_price', 0)
             
-            # Check if user can afford it
-            user_stars = await self.get_user_stars_balance(chat_id, user_id)
-            if user_stars < price:
-                return False
-                
-            # Deduct stars from user's balance
-            await self.db_manager.db(
-                "UPDATE players SET tg_stars = tg_stars - %s WHERE chat_id=%s AND user_id=%s",
-                (price, chat_id, user_id)
-            )
-            
-            # Add item to user's inventory
-            await self.db_manager.db(
-                """INSERT INTO inventories (chat_id, user_id, item, qty) 
-                   VALUES (%s, %s, %s, 1) 
-                   ON CONFLICT (chat_id, user_id, item) 
-                   DO UPDATE SET qty = inventories.qty + 1""",
-                (chat_id, user_id, item_id)
-            )
-            
-            # Record transaction
-            payment_id = f"stars_{helpers.now().strftime('%Y%m%d%H%M%S')}_{user_id}"
-            await self.db_manager.db(
-                """INSERT INTO tg_stars_purchases 
-                   (payment_id, chat_id, user_id, item_id, stars_amount, purchase_time, status)
-                   VALUES (%s, %s, %s, %s, %s, %s, 'completed')""",
-                (payment_id, chat_id, user_id, item_id, price, helpers.now())
+            # Deduct stars, add the item to the inventory and record the
+            # transaction in one statement; nothing happens if stars are short
+            payment_id = f"stars_{helpers.now()}_{user_id}_{item_id}"
+            result = await self.db_manager.debit_and_grant(
+                chat_id, user_id, item_id, price, PaymentType.TG_STARS.value,
+                ItemEffects(grant_item=item_id, grant_qty=1), payment_id=payment_id
             )
+            if not result.applied:
+                return result.outcome
             
             logger.info(f"User {user_id} purchased {item_id} for {price} TG Stars")
-            return True
+            await event_bus.publish(ItemPurchased(
+                chat_id=chat_id, user_id=user_id, item=item_id, price=price, currency=PaymentType.TG_STARS.value))
+            return Outcome.APPLIED
             
         except Exception as e:
             logger.error(f"Error processing premium purchase: {e}")
-            return False
+            return Outcome.ERROR
     
     async def show_stars_dashboard(self, bot: AsyncTeleBot, message: types.Message):
         """Display comprehensive TG Stars dashboard"""
@@ -516,13 +521,13 @@ TG Stars cannot be transferred to other users.
                     return
                 
                 # Process the purchase
-                success = await self.purchase_premium_item(
+                outcome = await self.purchase_premium_item(
                     call.message.chat.id, 
                     call.from_user.id, 
                     item_id
                 )
                 
-                if success:
+                if outcome is Outcome.APPLIED:
                     item_name = get_item_display_name(item_id, lang)
                     price = ITEMS.get(item_id, {}).get('stars_price', 0)
                     
@@ -572,6 +577,12 @@ TG Stars cannot be transferred to other users.
                         call.message.message_id,
                         reply_markup=keyboard
                     )
+                elif outcome is Outcome.SHORT:
+                    await bot.answer_callback_query(
+                        call.id,
+                        T[lang].get('stars_error_insufficient', '❌ Insufficient TG Stars balance.'),
+                        show_alert=True
+                    )
                 else:
                     # Purchase failed
                     await bot.answer_callback_query(
@@ -788,7 +799,8 @@ async def handle_successful_payment(message: types.Message, bot: AsyncTeleBot, d
             VALUES (%s, %s, %s, 1)
             ON CONFLICT (chat_id, user_id, item) DO UPDATE
             SET qty = inventories.qty + 1
-        """, (message.chat.id, message.from_user.id, item_id))
+        """, (message.chat.id, message.from_user.id, item_id),
+            touches=[Mutation(INVENTORY, message.chat.id, message.from_user.id)])
 
         # Log the successful transaction
         await db_manager.db("""
@@ -802,6 +814,13 @@ async def handle_successful_payment(message: types.Message, bot: AsyncTeleBot, d
             payment_info.total_amount, 
             helpers.now()
         ))
+        await event_bus.publish(PaymentCompleted(
+            chat_id=message.chat.id,
+            user_id=message.from_user.id,
+            stars=payment_info.total_amount,
+            item=item_id,
+            charge_id=payment_info.telegram_payment_charge_id,
+        ))
 
         # Send success message with both languages
         item_name = get_item_display_name(item_id, lang)
@@ -872,12 +891,12 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager):
     # Initialize StarsManager
     stars_manager = StarsManager(db_manager)
     
-    @bot.message_handler(commands=['stars'])
+    @router.command('stars')
     async def handle_stars_command(message):
         """Handle /stars command to show TG Stars dashboard"""
         await stars_manager.show_stars_dashboard(bot, message)
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('stars:'))
+    @router.callback('stars:')
     async def handle_stars_callbacks(call):
         """Handle all TG Stars related callback queries"""
         await stars_manager.handle_stars_callback(bot, call)
@@ -888,7 +907,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager):
         await handle_pre_checkout_query(query, bot, db_manager)
 
     # This handler runs after the payment is successfully processed by Telegram
-    @bot.message_handler(content_types=['successful_payment'])
+    @router.content('successful_payment')
     async def successful_payment_handler(message: types.Message):
         await handle_successful_payment(message, bot, db_manager)
 
@@ -13,6 +13,9 @@ from telebot.async_telebot import AsyncTeleBot
 from src.utils import helpers
 from src.utils.translations import T
 from src.database.db_manager import DBManager
+from src.handlers.router import router
+from src.utils.ratelimit import get_limiter
+from src.config.bot_config import BOT_CONFIG
 from src.config.items import ITEMS, get_item_display_name, get_item_emoji
 
 # Set up logging
@@ -624,9 +627,16 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager):
     # Initialize StatsManager
     stats_manager = StatsManager(db_manager)
     group_only = helpers.ensure_group_command(bot, db_manager)
+    security = BOT_CONFIG.security_settings
+    stats_limit = helpers.ensure_rate_limit(bot, db_manager, get_limiter(
+        'cmd:stats',
+        rate=security.command_rate_limits.get('stats', 10),
+        enabled=security.rate_limit_enabled
+    ))
 
-    @bot.message_handler(commands=['stats'])
+    @router.command('stats')
     @group_only
+    @stats_limit
     async def handle_stats_command(message):
         """Handle /stats command to show statistics dashboard"""
         try:
@@ -637,7 +647,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager):
             lang = await helpers.get_lang(message.chat.id, message.from_user.id, db_manager)
             await bot.send_message(message.chat.id, T[lang].get('stats_error', 'Error displaying stats'))
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('stats:'))
+    @router.callback('stats:')
     async def handle_stats_callbacks(call):
         """Handle all statistics related callback queries"""
         try:
@@ -648,7 +658,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager):
             await bot.answer_callback_query(call.id, T[lang].get('stats_error', 'Error processing stats request'))
             
     # Add support for 'quick:stats' callback to support the button from attack reports
-    @bot.callback_query_handler(func=lambda call: call.data == 'quick:stats')
+    @router.callback('quick:stats', exact=True)
     async def handle_quick_stats_callback(call):
         """Handle quick stats button from attack reports"""
         try:
@@ -13,6 +13,8 @@ from telebot.async_telebot import AsyncTeleBot
 from src.utils import helpers
 from src.utils.translations import T
 from src.database.db_manager import DBManager
+from src.database.mutations import Mutation, INVENTORY, DEFENSE
+from src.handlers.router import router
 from src.config.items import ITEMS, ItemType, get_item_display_name, get_item_emoji
 from src.config.bot_config import BotConfig
 
@@ -303,13 +305,15 @@ class StatusManager:
             # Deactivate any existing defense first
             await self.db_manager.db(
                 "DELETE FROM active_defenses WHERE chat_id=%s AND user_id=%s",
-                (chat_id, user_id)
+                (chat_id, user_id),
+                touches=[Mutation(DEFENSE, chat_id, user_id)]
             )
             
             # Use one item
             await self.db_manager.db(
                 "UPDATE inventories SET qty = qty - 1 WHERE chat_id=%s AND user_id=%s AND item=%s",
-                (chat_id, user_id, item_id)
+                (chat_id, user_id, item_id),
+                touches=[Mutation(INVENTORY, chat_id, user_id)]
             )
             
             # Get item details
@@ -320,7 +324,8 @@ class StatusManager:
             # Activate defense
             await self.db_manager.db(
                 "INSERT INTO active_defenses (chat_id, user_id, defense_type, expires_at, activated_at) VALUES (%s, %s, %s, %s, %s)",
-                (chat_id, user_id, item_id, expires_at, helpers.now())
+                (chat_id, user_id, item_id, expires_at, helpers.now()),
+                touches=[Mutation(DEFENSE, chat_id, user_id)]
             )
             
             return True
@@ -773,7 +778,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
     """Registers enhanced command handlers for the status module"""
     group_only = helpers.ensure_group_command(bot, db_manager)
 
-    @bot.message_handler(commands=['status'])
+    @router.command('status')
     @group_only
     async def status_command(message: types.Message) -> None:
         """Enhanced status command with comprehensive analytics"""
@@ -785,7 +790,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             logger.error(f"Error in status command: {e}")
             await bot.send_message(message.chat.id, "Error displaying status. Please try again.")
     
-    @bot.message_handler(commands=['shield', 'defense'])
+    @router.command('shield', 'defense')
     @group_only
     async def shield_command(message: types.Message) -> None:
         """Shortcut command to activate shields"""
@@ -848,7 +853,7 @@ def register_handlers(bot: AsyncTeleBot, db_manager: DBManager) -> None:
             logger.error(f"Error in shield command: {e}")
             await bot.send_message(message.chat.id, "Error processing defense activation. Please try again.")
     
-    @bot.callback_query_handler(func=lambda call: call.data.startswith('status:'))
+    @router.callback('status:')
     async def status_callback_handler(call: types.CallbackQuery):
         """Enhanced callback handler for status interactions"""
         await handle_status_callback(call, bot, db_manager)
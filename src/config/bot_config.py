@@ -59,6 +59,7 @@ class GameMechanics:
     super_aegis_cost: int = 200
     daily_bonus: int = 20
     level_up_bonus: int = 50
+    free_stars_cooldown: int = 86400  # 24 hours
     
     # Advanced mechanics
     critical_hit_chance: float = 0.1  # 10%
@@ -87,8 +88,14 @@ class SecuritySettings:
     """Security and anti-abuse settings"""
     rate_limit_enabled: bool = True
     max_requests_per_minute: int = 30
+    rate_limit_block_seconds: int = 300
+    # Per-user limits for expensive commands, requests per minute
+    command_rate_limits: Dict[str, int] = field(default_factory=lambda: {"attack": 6, "stats": 10})
+    # local = per-process limits, redis = limits shared by every bot process (uses REDIS_URL)
+    rate_limit_backend: str = "local"
     anti_spam_enabled: bool = True
     admin_only_commands: List[str] = field(default_factory=lambda: ["/admin", "/reset", "/broadcast"])
+    admin_user_ids: List[int] = field(default_factory=list)
     
     # Anti-cheat
     damage_validation: bool = True
@@ -121,6 +128,65 @@ class PerformanceSettings:
     query_optimization: bool = True
     batch_processing: bool = True
     lazy_loading: bool = True
+    
+    # Observability
+    metrics_enabled: bool = True
+    # The endpoint is unauthenticated, so it is only exposed beyond localhost on request
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9108
+    loop_monitor_enabled: bool = True
+    loop_lag_interval: float = 0.5
+    loop_lag_threshold: float = 0.1
+    slow_callback_threshold: float = 0.25
+    
+    # Shared cache tier: "local" (L1 only), "redis", or "memory" (in-process fake)
+    cache_backend: str = "local"
+    redis_url: str = "redis://localhost:6379/0"
+    cache_namespace: str = "trumpbot"
+    
+    # Memory budget for in-process per-user maps (analytics, anti-spam, caches)
+    memory_budget_mb: int = 256
+    memory_check_interval: float = 30.0
+    
+    # Seconds between flushes of message analytics rollups to the database
+    analytics_flush_interval: float = 60.0
+    
+    # Seconds new-member joins in a chat are gathered into one upsert and one welcome
+    welcome_burst_window: float = 3.0
+    
+    # Domain event bus: per-chat ordered queues backed by the event_outbox table
+    event_bus_shards: int = 8
+    event_queue_size: int = 1000
+    outbox_redeliver_interval: float = 30.0
+    outbox_max_attempts: int = 5
+    
+    # Timer wheel that deletes expired defenses, boosts and cooldowns as they fall due
+    expiry_tick_interval: float = 1.0
+    expiry_notifications: bool = False
+    
+    # Attack, daily bonus and free stars cooldowns are checked in memory and written behind
+    cooldown_flush_interval: float = 1.0
+    
+    # Process pool for keyword analysis, used only while the loop lags or handlers pile up
+    analysis_offload_enabled: bool = False
+    analysis_workers: int = 2
+    analysis_offload_lag: float = 0.05
+    analysis_offload_depth: int = 32
+
+@dataclass
+class LoggingSettings:
+    """Logging pipeline settings"""
+    level: str = "INFO"
+    json_format: bool = False
+    module_levels: Dict[str, str] = field(default_factory=lambda: {
+        "telebot": "WARNING",
+        "urllib3": "WARNING",
+        "asyncpg": "WARNING",
+    })
+    debug_sample_rate: float = 0.1  # Keep 1 in 10 debug records per call site
+    queue_size: int = 10000
+    merge_bilingual: bool = True
+    pair_window: float = 0.05  # Seconds to wait for the Persian half of a pair
 
 class EnhancedBotConfig:
     """Enhanced bot configuration management system"""
@@ -142,6 +208,7 @@ class EnhancedBotConfig:
         self.security_settings = SecuritySettings()
         self.notification_settings = NotificationSettings()
         self.performance_settings = PerformanceSettings()
+        self.logging_settings = LoggingSettings()
         
         # Load custom configurations
         self._load_environment_overrides()
@@ -237,6 +304,8 @@ class EnhancedBotConfig:
                 self.game_mechanics.attack_cooldown = int(os.getenv("ATTACK_COOLDOWN"))
             if os.getenv("DAILY_BONUS"):
                 self.game_mechanics.daily_bonus = int(os.getenv("DAILY_BONUS"))
+            if os.getenv("FREE_STARS_COOLDOWN"):
+                self.game_mechanics.free_stars_cooldown = int(os.getenv("FREE_STARS_COOLDOWN"))
                 
             # Feature flags overrides
             if os.getenv("UNLIMITED_MISSILES"):
@@ -251,6 +320,82 @@ class EnhancedBotConfig:
                 self.security_settings.rate_limit_enabled = os.getenv("RATE_LIMIT_ENABLED").lower() == "true"
             if os.getenv("MAX_REQUESTS_PER_MINUTE"):
                 self.security_settings.max_requests_per_minute = int(os.getenv("MAX_REQUESTS_PER_MINUTE"))
+            if os.getenv("RATE_LIMIT_BLOCK_SECONDS"):
+                self.security_settings.rate_limit_block_seconds = int(os.getenv("RATE_LIMIT_BLOCK_SECONDS"))
+            if os.getenv("COMMAND_RATE_LIMITS"):
+                for pair in os.getenv("COMMAND_RATE_LIMITS").split(","):
+                    command, _, limit = pair.partition("=")
+                    if limit.strip().isdigit():
+                        self.security_settings.command_rate_limits[command.strip().lstrip("/")] = int(limit)
+            if os.getenv("RATE_LIMIT_BACKEND"):
+                self.security_settings.rate_limit_backend = os.getenv("RATE_LIMIT_BACKEND").lower()
+            if os.getenv("ADMIN_USER_IDS"):
+                self.security_settings.admin_user_ids = [
+                    int(uid) for uid in os.getenv("ADMIN_USER_IDS").split(",") if uid.strip().isdigit()
+                ]
+                
+            # Performance settings overrides
+            if os.getenv("METRICS_ENABLED"):
+                self.performance_settings.metrics_enabled = os.getenv("METRICS_ENABLED").lower() == "true"
+            if os.getenv("METRICS_HOST"):
+                self.performance_settings.metrics_host = os.getenv("METRICS_HOST")
+            if os.getenv("METRICS_PORT"):
+                self.performance_settings.metrics_port = int(os.getenv("METRICS_PORT"))
+            if os.getenv("LOOP_MONITOR_ENABLED"):
+                self.performance_settings.loop_monitor_enabled = os.getenv("LOOP_MONITOR_ENABLED").lower() == "true"
+            if os.getenv("LOOP_LAG_THRESHOLD"):
+                self.performance_settings.loop_lag_threshold = float(os.getenv("LOOP_LAG_THRESHOLD"))
+            if os.getenv("SLOW_CALLBACK_THRESHOLD"):
+                self.performance_settings.slow_callback_threshold = float(os.getenv("SLOW_CALLBACK_THRESHOLD"))
+            if os.getenv("MEMORY_BUDGET_MB"):
+                self.performance_settings.memory_budget_mb = int(os.getenv("MEMORY_BUDGET_MB"))
+            if os.getenv("MEMORY_CHECK_INTERVAL"):
+                self.performance_settings.memory_check_interval = float(os.getenv("MEMORY_CHECK_INTERVAL"))
+            if os.getenv("ANALYTICS_FLUSH_INTERVAL"):
+                self.performance_settings.analytics_flush_interval = float(os.getenv("ANALYTICS_FLUSH_INTERVAL"))
+            if os.getenv("WELCOME_BURST_WINDOW"):
+                self.performance_settings.welcome_burst_window = float(os.getenv("WELCOME_BURST_WINDOW"))
+            if os.getenv("EVENT_BUS_SHARDS"):
+                self.performance_settings.event_bus_shards = int(os.getenv("EVENT_BUS_SHARDS"))
+            if os.getenv("EVENT_QUEUE_SIZE"):
+                self.performance_settings.event_queue_size = int(os.getenv("EVENT_QUEUE_SIZE"))
+            if os.getenv("OUTBOX_REDELIVER_INTERVAL"):
+                self.performance_settings.outbox_redeliver_interval = float(os.getenv("OUTBOX_REDELIVER_INTERVAL"))
+            if os.getenv("OUTBOX_MAX_ATTEMPTS"):
+                self.performance_settings.outbox_max_attempts = int(os.getenv("OUTBOX_MAX_ATTEMPTS"))
+            if os.getenv("EXPIRY_TICK_INTERVAL"):
+                self.performance_settings.expiry_tick_interval = float(os.getenv("EXPIRY_TICK_INTERVAL"))
+            if os.getenv("EXPIRY_NOTIFICATIONS"):
+                self.performance_settings.expiry_notifications = os.getenv("EXPIRY_NOTIFICATIONS").lower() == "true"
+            if os.getenv("COOLDOWN_FLUSH_INTERVAL"):
+                self.performance_settings.cooldown_flush_interval = float(os.getenv("COOLDOWN_FLUSH_INTERVAL"))
+            if os.getenv("ANALYSIS_OFFLOAD_ENABLED"):
+                self.performance_settings.analysis_offload_enabled = os.getenv("ANALYSIS_OFFLOAD_ENABLED").lower() == "true"
+            if os.getenv("ANALYSIS_WORKERS"):
+                self.performance_settings.analysis_workers = int(os.getenv("ANALYSIS_WORKERS"))
+            if os.getenv("ANALYSIS_OFFLOAD_LAG"):
+                self.performance_settings.analysis_offload_lag = float(os.getenv("ANALYSIS_OFFLOAD_LAG"))
+            if os.getenv("ANALYSIS_OFFLOAD_DEPTH"):
+                self.performance_settings.analysis_offload_depth = int(os.getenv("ANALYSIS_OFFLOAD_DEPTH"))
+            if os.getenv("CACHE_BACKEND"):
+                self.performance_settings.cache_backend = os.getenv("CACHE_BACKEND").lower()
+            if os.getenv("REDIS_URL"):
+                self.performance_settings.redis_url = os.getenv("REDIS_URL")
+            if os.getenv("CACHE_NAMESPACE"):
+                self.performance_settings.cache_namespace = os.getenv("CACHE_NAMESPACE")
+                
+            # Logging settings overrides
+            if os.getenv("LOG_LEVEL"):
+                self.logging_settings.level = os.getenv("LOG_LEVEL").upper()
+            if os.getenv("LOG_JSON"):
+                self.logging_settings.json_format = os.getenv("LOG_JSON").lower() == "true"
+            if os.getenv("LOG_MODULE_LEVELS"):
+                for entry in os.getenv("LOG_MODULE_LEVELS").split(","):
+                    if "=" in entry:
+                        module, level = entry.split("=", 1)
+                        self.logging_settings.module_levels[module.strip()] = level.strip().upper()
+            if os.getenv("LOG_DEBUG_SAMPLE_RATE"):
+                self.logging_settings.debug_sample_rate = float(os.getenv("LOG_DEBUG_SAMPLE_RATE"))
                 
         except Exception as e:
             logger.error(f"Error loading environment overrides: {e}")
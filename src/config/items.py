@@ -533,7 +533,7 @@ ITEMS: Dict[str, Dict[str, Any]] = {
         "stars": 4,
         "stars_price": 15,
         "title": "Nano Repair System",
-        "description": "Advanced nanotechnology healing (+150 HP, overheal possible)",
+        "description": "Advanced nanotechnology healing (+150 HP)",
         "emoji": "🔬",
         "level_required": 12,
         "max_stack": 5
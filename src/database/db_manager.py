@@ -10,7 +10,7 @@ import logging
 import time
 import json
 import asyncio
-from typing import Any, Dict, List, Optional, Tuple, Union, AsyncGenerator
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, AsyncGenerator
 from datetime import datetime, timedelta
 from psycopg_pool import AsyncConnectionPool
 from dotenv import load_dotenv
@@ -18,6 +18,14 @@ import psycopg
 from dataclasses import dataclass
 from enum import Enum
 
+from src.utils.metrics import DB_POOL, DB_QUERY_ERRORS, DB_QUERY_LATENCY
+from src.utils.cache import smart_cache
+from src.utils.singleflight import single_flight
+from src.database.mutations import (
+    Mutation, mutation_bus, PLAYER, LANGUAGE, INVENTORY, DEFENSE, BOOST, COOLDOWN,
+)
+from src.database.economy import EconomyResult, ItemEffects, Outcome
+
 # Load environment variables
 load_dotenv()
 
@@ -33,6 +41,19 @@ DB_RETRY_ATTEMPTS = int(os.getenv("DB_RETRY_ATTEMPTS", "3"))
 
 pool: Optional[AsyncConnectionPool] = None
 
+def _query_operation(query: str) -> str:
+    """نوع عملیات کوئری برای معیارها - Leading SQL verb used as a metrics label"""
+    head = query.lstrip().split(None, 1)
+    return head[0].upper() if head else "UNKNOWN"
+
+def collect_pool_metrics() -> None:
+    """انتشار آمار استخر اتصالات - Publish connection pool statistics"""
+    if pool is None:
+        return
+    for stat, value in pool.get_stats().items():
+        if isinstance(value, (int, float)):
+            DB_POOL.set(value, stat=stat)
+
 class DatabaseError(Exception):
     """خطای پایگاه داده - Database Error"""
     pass
@@ -185,7 +206,36 @@ class DBManager:
             self._last_pool_refresh = current_time
     
     async def db(self, query: str, params: Optional[Tuple] = None, fetch: Optional[str] = None, 
-                retry_count: int = 0) -> Any:
+                retry_count: int = 0, touches: Optional[Iterable[Mutation]] = None) -> Any:
+        """
+        اجرای کوئری با ثبت زمان اجرا در معیارها
+        Execute database query and record its latency (including retries)
+        
+        ``touches`` lists the entities a write changes; they are published on
+        the mutation bus once the query has succeeded.
+        """
+        if retry_count > 0:
+            return await self._execute_query(query, params, fetch, retry_count)
+        
+        operation = _query_operation(query)
+        start = time.perf_counter()
+        try:
+            result = await self._execute_query(query, params, fetch, retry_count)
+        except Exception:
+            DB_QUERY_ERRORS.inc(operation=operation)
+            raise
+        finally:
+            DB_QUERY_LATENCY.observe(time.perf_counter() - start, operation=operation)
+        if touches:
+            mutation_bus.publish(touches)
+        return result
+    
+    def publish_mutations(self, *mutations: Mutation) -> None:
+        """اعلام تغییرات - Publish mutations for writes made outside db()/transaction()"""
+        mutation_bus.publish(mutations)
+    
+    async def _execute_query(self, query: str, params: Optional[Tuple] = None, fetch: Optional[str] = None, 
+                             retry_count: int = 0) -> Any:
         """
         اجرای کوئری پایگاه داده با مدیریت خطا و تلاش مجدد
         Execute database query with error handling and retry logic
@@ -284,7 +334,25 @@ class DBManager:
             logger.error(f"خطای پایگاه داده: {str(e)}")
             raise DatabaseError(f"Query execution failed: {e}")
     
-    async def transaction(self, queries: List[Tuple[str, Optional[Tuple]]]) -> bool:
+    async def transaction(self, queries: List[Tuple[str, Optional[Tuple]]],
+                          touches: Optional[Iterable[Mutation]] = None) -> bool:
+        """
+        اجرای تراکنش با ثبت زمان اجرا در معیارها
+        Execute a transaction and record its latency; ``touches`` is published on commit
+        """
+        start = time.perf_counter()
+        try:
+            committed = await self._run_transaction(queries)
+        except Exception:
+            DB_QUERY_ERRORS.inc(operation="TRANSACTION")
+            raise
+        finally:
+            DB_QUERY_LATENCY.observe(time.perf_counter() - start, operation="TRANSACTION")
+        if committed and touches:
+            mutation_bus.publish(touches)
+        return committed
+    
+    async def _run_transaction(self, queries: List[Tuple[str, Optional[Tuple]]]) -> bool:
         """
         اجرای چندین کوئری در یک تراکنش
         Execute multiple queries in a transaction
@@ -316,8 +384,8 @@ class DBManager:
                         for query, params in queries:
                             await conn.execute(query, params)
                             
-                logger.info(f"Transaction completed successfully with {len(queries)} queries")
-                logger.info(f"تراکنش با موفقیت با {len(queries)} کوئری کامل شد")
+                logger.debug("Transaction completed successfully with %s queries", len(queries),
+                             extra={'fa': "تراکنش با موفقیت با %s کوئری کامل شد"})
                 return True
                 
             except psycopg.OperationalError as e:
@@ -389,25 +457,86 @@ class DBManager:
                     first_name = EXCLUDED.first_name,
                     username = EXCLUDED.username,
                     last_active = EXCLUDED.last_active
-            """, (chat_id, user_id, first_name, username, language, current_time))
+            """, (chat_id, user_id, first_name, username, language, current_time),
+                touches=[Mutation(PLAYER, chat_id, user_id)])
             
-            logger.info(f"User created/updated: {first_name} ({user_id}) in chat {chat_id}")
-            logger.info(f"کاربر ایجاد/به‌روزرسانی شد: {first_name} ({user_id}) در چت {chat_id}")
+            logger.debug("User created/updated: %s (%s) in chat %s", first_name, user_id, chat_id,
+                         extra={'fa': "کاربر ایجاد/به‌روزرسانی شد: %s (%s) در چت %s"})
             return True
         except Exception as e:
             logger.error(f"Error creating user: {e}")
             logger.error(f"خطا در ایجاد کاربر: {e}")
             return False
     
+    async def upsert_players_bulk(self, chat_id: int,
+                                  users: Iterable[Tuple[int, str, Optional[str]]]) -> Dict[int, Dict[str, Any]]:
+        """
+        درج گروهی بازیکنان و ثبت عضویت آن‌ها
+        Upsert many (user_id, first_name, username) players of one chat and log
+        a ``member_joined`` interaction for each, in a single statement.
+        
+        Returns ``{user_id: {'language': ..., 'inserted': bool}}``, or an empty
+        dict if the write failed.
+        """
+        # A user listed twice would hit the same row twice in one ON CONFLICT
+        rows = {user_id: (first_name, username) for user_id, first_name, username in users}
+        if not rows:
+            return {}
+        try:
+            current_time = int(time.time())
+            user_ids = list(rows)
+            first_names = [first_name for first_name, _ in rows.values()]
+            usernames = [username for _, username in rows.values()]
+            result = await self.db("""
+                WITH incoming AS (
+                    SELECT * FROM unnest(%s::bigint[], %s::text[], %s::text[]) AS v(user_id, first_name, username)
+                ), upserted AS (
+                    INSERT INTO players AS p (chat_id, user_id, first_name, username, last_active, join_date)
+                    SELECT %s, user_id, first_name, username, %s, %s FROM incoming
+                    ON CONFLICT (chat_id, user_id) DO UPDATE SET
+                        first_name = EXCLUDED.first_name,
+                        username = EXCLUDED.username,
+                        last_active = EXCLUDED.last_active
+                    RETURNING p.user_id, COALESCE(p.language, 'en') AS language, (p.xmax = 0) AS inserted
+                ), logged AS (
+                    INSERT INTO interactions (chat_id, user_id, interaction_type, interaction_data, timestamp)
+                    SELECT %s, u.user_id, 'member_joined',
+                           jsonb_build_object('username', i.username, 'first_name', i.first_name,
+                                              'language', u.language, 'new_player', u.inserted,
+                                              'join_timestamp', %s),
+                           %s
+                    FROM upserted u JOIN incoming i USING (user_id)
+                )
+                SELECT user_id, language, inserted FROM upserted
+            """, (user_ids, first_names, usernames, chat_id, current_time, current_time,
+                  chat_id, current_time, current_time),
+                fetch="all_dicts",
+                touches=[Mutation(PLAYER, chat_id, user_id) for user_id in user_ids])
+            
+            logger.debug("Upserted %s players in chat %s", len(user_ids), chat_id)
+            return {
+                row['user_id']: {'language': row['language'], 'inserted': bool(row['inserted'])}
+                for row in result or []
+            }
+        except Exception as e:
+            logger.error(f"Error upserting players in bulk: {e}")
+            logger.error(f"خطا در درج گروهی بازیکنان: {e}")
+            return {}
+    
     async def get_chat_language(self, chat_id: int) -> str:
         """دریافت زبان پیش‌فرض چت - Get chat default language"""
         try:
-            result = await self.db(
-                "SELECT language FROM groups WHERE chat_id = %s",
-                (chat_id,),
-                fetch="one_dict"
+            async def load_chat_language() -> Optional[str]:
+                result = await self.db(
+                    "SELECT language FROM groups WHERE chat_id = %s",
+                    (chat_id,),
+                    fetch="one_dict"
+                )
+                return (result.get('language') or 'en') if result else None
+            
+            return await single_flight("chatlang").load(
+                smart_cache, f"chatlang_{chat_id}", load_chat_language, ttl=600, negative_ttl=60, default='en'
             )
-            return result.get('language', 'en') if result else 'en'
         except Exception as e:
             logger.error(f"Error getting chat language: {e}")
             return 'en'
@@ -506,10 +635,11 @@ class DBManager:
         try:
             await self.db(
                 "UPDATE players SET language = %s WHERE chat_id = %s AND user_id = %s",
-                (language, chat_id, user_id)
+                (language, chat_id, user_id),
+                touches=[Mutation(LANGUAGE, chat_id, user_id, {'language': language})]
             )
-            logger.info(f"Language updated for user {user_id}: {language}")
-            logger.info(f"زبان کاربر {user_id} به‌روزرسانی شد: {language}")
+            logger.info("Language updated for user %s: %s", user_id, language,
+                        extra={'fa': "زبان کاربر %s به‌روزرسانی شد: %s"})
             return True
         except Exception as e:
             logger.error(f"Error updating user language: {e}")
@@ -541,13 +671,59 @@ class DBManager:
             """, (score_change, score_change, int(time.time()), chat_id, user_id), fetch="one_dict")
             
             if result:
-                logger.info(f"Score updated for user {user_id}: +{score_change} (total: {result['score']}, level: {result['level']})")
+                self.publish_mutations(Mutation(PLAYER, chat_id, user_id, dict(result)))
+                logger.debug("Score updated for user %s: +%s (total: %s, level: %s)",
+                             user_id, score_change, result['score'], result['level'],
+                             extra={'fa': "امتیاز کاربر %s به‌روزرسانی شد: +%s (مجموع: %s، سطح: %s)"})
                 return result['score']
             return None
         except Exception as e:
             logger.error(f"Error updating user score: {e}")
             return None
     
+    async def award_achievements(self, chat_id: int, user_id: int, rewards: Dict[str, int]) -> List[str]:
+        """
+        اعطای گروهی دستاوردها
+        Award several achievements with their medal rewards in one statement.
+        
+        Achievements the player already holds (e.g. awarded concurrently by
+        another process) are skipped and not paid twice. Returns the ids that
+        were actually awarded.
+        """
+        if not rewards:
+            return []
+        try:
+            current_time = int(time.time())
+            row = await self.db("""
+                WITH rewards AS (
+                    SELECT * FROM unnest(%s::text[], %s::int[]) AS r(achievement_id, medals)
+                ), awarded AS (
+                    INSERT INTO player_achievements (chat_id, user_id, achievement_id, earned_at)
+                    SELECT %s, %s, achievement_id, %s FROM rewards
+                    ON CONFLICT (chat_id, user_id, achievement_id) DO NOTHING
+                    RETURNING achievement_id
+                ), paid AS (
+                    UPDATE players SET score = score + (
+                        SELECT COALESCE(SUM(r.medals), 0) FROM rewards r JOIN awarded a USING (achievement_id)
+                    )
+                    WHERE chat_id = %s AND user_id = %s AND EXISTS (SELECT 1 FROM awarded)
+                    RETURNING score
+                )
+                SELECT ARRAY(SELECT achievement_id FROM awarded) AS awarded,
+                       (SELECT score FROM paid) AS score
+            """, (list(rewards), list(rewards.values()), chat_id, user_id, current_time, chat_id, user_id),
+                fetch="one_dict")
+            
+            awarded = list(row['awarded'] or []) if row else []
+            if awarded:
+                self.publish_mutations(Mutation(PLAYER, chat_id, user_id, {'score': row['score']}))
+                logger.info(f"Achievements awarded to {user_id} in chat {chat_id}: {', '.join(awarded)}")
+            return awarded
+        except Exception as e:
+            logger.error(f"Error awarding achievements: {e}")
+            logger.error(f"خطا در اعطای دستاوردها: {e}")
+            return []
+    
     async def update_user_hp(self, chat_id: int, user_id: int, hp_change: int) -> Optional[int]:
         """به‌روزرسانی جان کاربر - Update user HP"""
         try:
@@ -559,6 +735,8 @@ class DBManager:
                 RETURNING hp
             """, (hp_change, int(time.time()), chat_id, user_id), fetch="one")
             
+            if result:
+                self.publish_mutations(Mutation(PLAYER, chat_id, user_id, {'hp': result[0]}))
             return result[0] if result else None
         except Exception as e:
             logger.error(f"Error updating user HP: {e}")
@@ -575,6 +753,8 @@ class DBManager:
                 RETURNING tg_stars
             """, (stars_change, int(time.time()), chat_id, user_id), fetch="one")
             
+            if result:
+                self.publish_mutations(Mutation(PLAYER, chat_id, user_id, {'tg_stars': result[0]}))
             return result[0] if result else None
         except Exception as e:
             logger.error(f"Error updating user TG Stars: {e}")
@@ -617,42 +797,25 @@ class DBManager:
                 VALUES (%s, %s, %s, %s)
                 ON CONFLICT (chat_id, user_id, item) 
                 DO UPDATE SET qty = inventories.qty + EXCLUDED.qty
-            """, (chat_id, user_id, item, quantity))
+            """, (chat_id, user_id, item, quantity), touches=[Mutation(INVENTORY, chat_id, user_id)])
             
-            logger.info(f"Added {quantity}x {item} to user {user_id} inventory")
-            logger.info(f"{quantity} عدد {item} به موجودی کاربر {user_id} اضافه شد")
+            logger.debug("Added %sx %s to user %s inventory", quantity, item, user_id,
+                         extra={'fa': "%s عدد %s به موجودی کاربر %s اضافه شد"})
             return True
         except Exception as e:
             logger.error(f"Error adding item to inventory: {e}")
             return False
     
     async def remove_item(self, chat_id: int, user_id: int, item: str, quantity: int = 1) -> bool:
-        """حذف آیتم از موجودی - Remove item from inventory"""
-        try:
-            # Check if user has enough items
-            current_qty = await self.get_item_quantity(chat_id, user_id, item)
-            if current_qty < quantity:
-                logger.warning(f"User {user_id} doesn't have enough {item} (has: {current_qty}, needs: {quantity})")
-                return False
-            
-            await self.db("""
-                UPDATE inventories 
-                SET qty = GREATEST(0, qty - %s)
-                WHERE chat_id = %s AND user_id = %s AND item = %s
-            """, (quantity, chat_id, user_id, item))
-            
-            # Delete row if quantity becomes 0
-            await self.db(
-                "DELETE FROM inventories WHERE chat_id = %s AND user_id = %s AND item = %s AND qty = 0",
-                (chat_id, user_id, item)
-            )
-            
-            logger.info(f"Removed {quantity}x {item} from user {user_id} inventory")
-            logger.info(f"{quantity} عدد {item} از موجودی کاربر {user_id} حذف شد")
-            return True
-        except Exception as e:
-            logger.error(f"Error removing item from inventory: {e}")
+        """حذف آیتم از موجودی - Remove item from inventory (False if there are not enough)"""
+        result = await self.consume_and_apply(chat_id, user_id, item, quantity=quantity)
+        if not result.applied:
+            if result.outcome is Outcome.SHORT:
+                logger.warning(f"User {user_id} doesn't have {quantity}x {item}")
             return False
+        logger.debug("Removed %sx %s from user %s inventory", quantity, item, user_id,
+                     extra={'fa': "%s عدد %s از موجودی کاربر %s حذف شد"})
+        return True
     
     async def get_inventory_value(self, chat_id: int, user_id: int) -> Dict[str, int]:
         """محاسبه ارزش کل موجودی - Calculate total inventory value"""
@@ -682,6 +845,218 @@ class DBManager:
             logger.error(f"Error calculating inventory value: {e}")
             return {'medals': 0, 'tg_stars': 0, 'total_items': 0}
 
+    # =============================================================================
+    # اقتصاد - Economy (atomic debits and item use)
+    # =============================================================================
+    
+    # Score, stars, HP and arsenal changes applied to the source player row
+    _PLAYER_EFFECTS_SQL = """
+        score = p.score - %(medals)s + %(score_reward)s,
+        tg_stars = p.tg_stars - %(stars)s,
+        hp = CASE WHEN %(hp_restore)s > 0
+                  THEN GREATEST(p.hp, LEAST(p.hp + %(hp_restore)s, COALESCE(p.max_hp, 100)))
+                  ELSE p.hp END,
+        settings = CASE WHEN %(arsenal_capacity)s > 0
+                        THEN COALESCE(p.settings, '{}') || jsonb_build_object('arsenal_capacity',
+                             COALESCE((p.settings->>'arsenal_capacity')::int, 0) + %(arsenal_capacity)s)
+                        ELSE p.settings END
+    """
+    
+    @staticmethod
+    def _item_effects_ctes(source: str) -> str:
+        """CTEs applying boosts, a defense and an inventory grant once per row of ``source``"""
+        return f"""
+            cleared AS (
+                DELETE FROM active_boosts b USING {source} s
+                WHERE b.chat_id = s.chat_id AND b.user_id = s.user_id
+                  AND b.boost_type = ANY(%(clear_boosts)s::text[])
+                  AND b.boost_type <> ALL(%(boost_types)s::text[])
+                RETURNING 1
+            ), boosted AS (
+                INSERT INTO active_boosts (chat_id, user_id, boost_type, boost_value, expires_at, activated_at)
+                SELECT s.chat_id, s.user_id, b.boost_type, b.boost_value, b.expires_at, %(now)s
+                FROM {source} s,
+                     unnest(%(boost_types)s::text[], %(boost_values)s::float8[], %(boost_expiries)s::bigint[])
+                        AS b(boost_type, boost_value, expires_at)
+                ON CONFLICT (chat_id, user_id, boost_type) DO UPDATE
+                SET boost_value = EXCLUDED.boost_value, expires_at = EXCLUDED.expires_at,
+                    activated_at = EXCLUDED.activated_at
+                RETURNING 1
+            ), defended AS (
+                INSERT INTO active_defenses (chat_id, user_id, defense_type, expires_at, activated_at)
+                SELECT s.chat_id, s.user_id, %(defense_type)s, %(defense_expires_at)s, %(now)s
+                FROM {source} s WHERE %(defense_type)s::text IS NOT NULL
+                ON CONFLICT (chat_id, user_id) DO UPDATE
+                SET defense_type = EXCLUDED.defense_type, expires_at = EXCLUDED.expires_at,
+                    activated_at = EXCLUDED.activated_at
+                RETURNING 1
+            ), granted AS (
+                INSERT INTO inventories (chat_id, user_id, item, qty)
+                SELECT s.chat_id, s.user_id, %(grant_item)s, %(grant_qty)s
+                FROM {source} s WHERE %(grant_item)s::text IS NOT NULL
+                ON CONFLICT (chat_id, user_id, item) DO UPDATE SET qty = inventories.qty + EXCLUDED.qty
+                RETURNING qty
+            )
+        """
+    
+    @staticmethod
+    def _item_effects_params(chat_id: int, user_id: int, effects: ItemEffects, now: int) -> Dict[str, Any]:
+        boost_types, boost_values, boost_expiries = ([list(column) for column in zip(*effects.boosts)]
+                                                     or [[], [], []])
+        return {
+            'chat_id': chat_id, 'user_id': user_id, 'now': now,
+            'medals': 0, 'stars': 0,
+            'score_reward': effects.score_reward,
+            'hp_restore': effects.hp_restore,
+            'arsenal_capacity': effects.arsenal_capacity,
+            'clear_boosts': list(effects.clear_boosts),
+            'boost_types': boost_types,
+            'boost_values': [float(value) for value in boost_values],
+            'boost_expiries': boost_expiries,
+            'defense_type': effects.defense_type,
+            'defense_expires_at': effects.defense_expires_at,
+            'grant_item': effects.grant_item,
+            'grant_qty': effects.grant_qty,
+        }
+    
+    def _publish_item_effects(self, chat_id: int, user_id: int, effects: ItemEffects,
+                              *mutations: Mutation) -> None:
+        mutations = list(mutations)
+        if effects.grant_item:
+            mutations.append(Mutation(INVENTORY, chat_id, user_id))
+        for boost_type, _, expires_at in effects.boosts:
+            mutations.append(Mutation(BOOST, chat_id, user_id, {'type': boost_type, 'expires_at': expires_at}))
+        if effects.clear_boosts:
+            mutations.append(Mutation(BOOST, chat_id, user_id))
+        if effects.defense_type:
+            mutations.append(Mutation(DEFENSE, chat_id, user_id,
+                                      {'type': effects.defense_type, 'expires_at': effects.defense_expires_at}))
+        self.publish_mutations(*mutations)
+    
+    async def debit_and_grant(self, chat_id: int, user_id: int, item: str, price: int, currency: str,
+                              effects: ItemEffects, payment_id: Optional[str] = None) -> EconomyResult:
+        """
+        کسر هزینه و اعطای آیتم در یک دستور
+        Debit ``price`` medals or TG Stars, apply ``effects`` and record the purchase in one statement
+        
+        The debit only happens if the balance covers it, and everything else
+        hangs off the debited row, so either all of it commits or none of it
+        does. Purchases with a ``payment_id`` are recorded in
+        ``tg_stars_purchases``, the rest in ``purchases``. An applied result
+        carries the new score, tg_stars, hp and granted qty; a short balance
+        and a failed statement are reported as separate outcomes.
+        """
+        current_time = int(time.time())
+        params = self._item_effects_params(chat_id, user_id, effects, current_time)
+        params.update({
+            'medals': price if currency == 'medals' else 0,
+            'stars': price if currency == 'tg_stars' else 0,
+            'item': item, 'price': price, 'currency': currency, 'payment_id': payment_id,
+        })
+        if payment_id is None:
+            ledger = """
+                INSERT INTO purchases (chat_id, user_id, item, price, payment_type, purchase_time)
+                SELECT chat_id, user_id, %(item)s, %(price)s, %(currency)s, %(now)s FROM player
+            """
+        else:
+            ledger = """
+                INSERT INTO tg_stars_purchases
+                    (payment_id, chat_id, user_id, item_id, stars_amount, purchase_time, status, processed_at)
+                SELECT %(payment_id)s, chat_id, user_id, %(item)s, %(price)s, %(now)s, 'completed', %(now)s
+                FROM player
+            """
+        try:
+            row = await self.db(f"""
+                WITH player AS (
+                    UPDATE players p SET {self._PLAYER_EFFECTS_SQL}
+                    WHERE p.chat_id = %(chat_id)s AND p.user_id = %(user_id)s
+                      AND p.score >= %(medals)s AND p.tg_stars >= %(stars)s
+                    RETURNING p.chat_id, p.user_id, p.score, p.tg_stars, p.hp
+                ), {self._item_effects_ctes('player')}, recorded AS (
+                    {ledger}
+                    RETURNING 1
+                )
+                SELECT p.score, p.tg_stars, p.hp, (SELECT qty FROM granted) AS qty FROM player p
+            """, params, fetch="one_dict")
+        except Exception as e:
+            logger.error(f"Error debiting {price} {currency} for {item}: {e}")
+            logger.error(f"خطا در کسر هزینه برای {item}: {e}")
+            return EconomyResult(Outcome.ERROR)
+        
+        if not row:
+            logger.debug(f"User {user_id} cannot afford {item} ({price} {currency})")
+            return EconomyResult(Outcome.SHORT)
+        self._publish_item_effects(chat_id, user_id, effects, Mutation(
+            PLAYER, chat_id, user_id, {'score': row['score'], 'tg_stars': row['tg_stars'], 'hp': row['hp']}))
+        return EconomyResult(Outcome.APPLIED, row)
+    
+    async def consume_and_apply(self, chat_id: int, user_id: int, item: str,
+                                effects: Optional[ItemEffects] = None, quantity: int = 1,
+                                consumable: bool = True) -> EconomyResult:
+        """
+        مصرف آیتم و اعمال اثرات در یک دستور
+        Take ``quantity`` of ``item`` from the inventory and apply ``effects`` in one statement
+        
+        Nothing is applied unless the inventory holds enough of the item; a
+        stack used up is deleted afterwards. Non-consumable items are only checked.
+        An applied result carries the remaining qty and the player's score and
+        hp (when changed); a missing item and a failed statement are reported
+        as separate outcomes.
+        """
+        effects = effects or ItemEffects()
+        params = self._item_effects_params(chat_id, user_id, effects, int(time.time()))
+        params.update({'item': item, 'qty': quantity, 'touches_player': effects.touches_player})
+        if consumable:
+            # One UPDATE, so a concurrent use re-checks qty against the locked row
+            consumed = """
+                consumed AS (
+                    UPDATE inventories SET qty = qty - %(qty)s, last_used = %(now)s
+                    WHERE chat_id = %(chat_id)s AND user_id = %(user_id)s AND item = %(item)s AND qty >= %(qty)s
+                    RETURNING chat_id, user_id, qty
+                )
+            """
+        else:
+            consumed = """
+                consumed AS (
+                    SELECT chat_id, user_id, qty FROM inventories
+                    WHERE chat_id = %(chat_id)s AND user_id = %(user_id)s AND item = %(item)s AND qty >= %(qty)s
+                    FOR UPDATE
+                )
+            """
+        try:
+            row = await self.db(f"""
+                WITH {consumed}, player AS (
+                    UPDATE players p SET {self._PLAYER_EFFECTS_SQL}
+                    FROM consumed c
+                    WHERE p.chat_id = c.chat_id AND p.user_id = c.user_id AND %(touches_player)s
+                    RETURNING p.score, p.hp
+                ), {self._item_effects_ctes('consumed')}
+                SELECT c.qty, (SELECT score FROM player) AS score, (SELECT hp FROM player) AS hp
+                FROM consumed c
+            """, params, fetch="one_dict")
+        except Exception as e:
+            logger.error(f"Error using {item}: {e}")
+            logger.error(f"خطا در استفاده از {item}: {e}")
+            return EconomyResult(Outcome.ERROR)
+        
+        if not row:
+            logger.debug(f"User {user_id} doesn't have {quantity}x {item}")
+            return EconomyResult(Outcome.SHORT)
+        if consumable and row['qty'] == 0:
+            # Readers skip empty stacks, so a failed cleanup is harmless
+            try:
+                await self.db(
+                    "DELETE FROM inventories WHERE chat_id = %s AND user_id = %s AND item = %s AND qty = 0",
+                    (chat_id, user_id, item)
+                )
+            except Exception as e:
+                logger.warning(f"Error deleting empty {item} stack: {e}")
+        mutations = [Mutation(INVENTORY, chat_id, user_id)] if consumable else []
+        if effects.touches_player:
+            mutations.append(Mutation(PLAYER, chat_id, user_id, {'score': row['score'], 'hp': row['hp']}))
+        self._publish_item_effects(chat_id, user_id, effects, *mutations)
+        return EconomyResult(Outcome.APPLIED, row)
+
     # =============================================================================
     # مدیریت حملات - Attack Management
     # =============================================================================
@@ -696,8 +1071,8 @@ class DBManager:
                 VALUES (%s, %s, %s, %s, %s, %s)
             """, (chat_id, attacker_id, victim_id, damage, current_time, weapon))
             
-            logger.info(f"Attack recorded: {attacker_id} -> {victim_id} ({damage} damage with {weapon})")
-            logger.info(f"حمله ثبت شد: {attacker_id} -> {victim_id} ({damage} آسیب با {weapon})")
+            logger.debug("Attack recorded: %s -> %s (%s damage with %s)", attacker_id, victim_id, damage, weapon,
+                         extra={'fa': "حمله ثبت شد: %s -> %s (%s آسیب با %s)"})
             return True
         except Exception as e:
             logger.error(f"Error recording attack: {e}")
@@ -818,8 +1193,8 @@ class DBManager:
                     VALUES (%s, %s, %s, %s, %s)
                 """, (chat_id, user_id, item, price, current_time))
             
-            logger.info(f"Purchase recorded: user {user_id} bought {item} for {price} {payment_type}")
-            logger.info(f"خرید ثبت شد: کاربر {user_id} آیتم {item} را به قیمت {price} {payment_type} خرید")
+            logger.info("Purchase recorded: user %s bought %s for %s %s", user_id, item, price, payment_type,
+                        extra={'fa': "خرید ثبت شد: کاربر %s آیتم %s را به قیمت %s %s خرید"})
             return True
         except Exception as e:
             logger.error(f"Error recording purchase: {e}")
@@ -934,17 +1309,14 @@ class DBManager:
             current_time = int(time.time())
             expires_at = current_time + duration
             
-            # First remove any existing cooldown of this type
-            await self.db(
-                "DELETE FROM cooldowns WHERE chat_id=%s AND user_id=%s AND cooldown_type=%s",
-                (chat_id, user_id, cooldown_type)
-            )
-            
-            # Then add the new cooldown
-            await self.db(
-                "INSERT INTO cooldowns (chat_id, user_id, cooldown_type, expires_at, created_at) VALUES (%s, %s, %s, %s, %s)",
-                (chat_id, user_id, cooldown_type, expires_at, current_time)
-            )
+            # Replace any existing cooldown of this type in one statement
+            await self.db("""
+                INSERT INTO cooldowns (chat_id, user_id, cooldown_type, expires_at, created_at)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (chat_id, user_id, cooldown_type) DO UPDATE
+                SET expires_at = EXCLUDED.expires_at, created_at = EXCLUDED.created_at
+            """, (chat_id, user_id, cooldown_type, expires_at, current_time),
+                touches=[Mutation(COOLDOWN, chat_id, user_id, {'type': cooldown_type, 'expires_at': expires_at})])
             
             logger.debug(f"Cooldown set for user {user_id} in chat {chat_id}: {cooldown_type} for {duration}s")
             return True
@@ -1096,8 +1468,8 @@ class DBManager:
             logger.error(f"Error setting attack cooldown: {e}")
             return False
             
-            logger.info(f"Set cooldown for user {user_id}, type {cooldown_type}, duration {duration}s")
-            logger.info(f"کولدان برای کاربر {user_id}، نوع {cooldown_type}، مدت {duration} ثانیه تنظیم شد")
+            logger.debug("Set cooldown for user %s, type %s, duration %ss", user_id, cooldown_type, duration,
+                         extra={'fa': "کولدان برای کاربر %s، نوع %s، مدت %s ثانیه تنظیم شد"})
             return True
         except Exception as e:
             logger.error(f"Error setting cooldown: {e}")
@@ -1113,17 +1485,71 @@ class DBManager:
         try:
             await self.db(
                 "DELETE FROM cooldowns WHERE chat_id=%s AND user_id=%s AND cooldown_type=%s",
-                (chat_id, user_id, cooldown_type)
+                (chat_id, user_id, cooldown_type),
+                touches=[Mutation(COOLDOWN, chat_id, user_id, {'type': cooldown_type})]
             )
             
-            logger.info(f"Cleared cooldown for user {user_id}, type {cooldown_type}")
-            logger.info(f"کولدان برای کاربر {user_id}، نوع {cooldown_type} پاک شد")
+            logger.debug("Cleared cooldown for user %s, type %s", user_id, cooldown_type,
+                         extra={'fa': "کولدان برای کاربر %s، نوع %s پاک شد"})
             return True
         except Exception as e:
             logger.error(f"Error clearing cooldown: {e}")
             logger.error(f"خطا در پاکسازی کولدان: {e}")
             return False
     
+    async def load_cooldowns(self, cooldown_types: Iterable[str]) -> Optional[List[Dict[str, Any]]]:
+        """
+        بارگذاری کولدان‌های فعال - Unexpired cooldowns of the given types (None on error)
+        """
+        try:
+            return await self.db(
+                "SELECT chat_id, user_id, cooldown_type, expires_at FROM cooldowns "
+                "WHERE cooldown_type = ANY(%s) AND expires_at > %s",
+                (list(cooldown_types), int(time.time())),
+                fetch="all_dicts"
+            ) or []
+        except Exception as e:
+            logger.error(f"Error loading cooldowns: {e}")
+            logger.error(f"خطا در بارگذاری کولدان‌ها: {e}")
+            return None
+    
+    async def write_cooldowns(self, upserts: List[Tuple[int, int, str, int]],
+                              deletes: List[Tuple[int, int, str]]) -> bool:
+        """
+        نوشتن دسته‌ای کولدان‌ها - Upsert (chat_id, user_id, type, expires_at) rows and delete
+        (chat_id, user_id, type) rows in one statement
+        
+        Mutations are left to the caller, which knows which writes are its own.
+        """
+        if not upserts and not deletes:
+            return True
+        current_time = int(time.time())
+        upsert_columns = [list(column) for column in zip(*upserts)] or [[], [], [], []]
+        delete_columns = [list(column) for column in zip(*deletes)] or [[], [], []]
+        try:
+            await self.db("""
+                WITH upserted AS (
+                    INSERT INTO cooldowns (chat_id, user_id, cooldown_type, expires_at, created_at)
+                    SELECT chat_id, user_id, cooldown_type, expires_at, %s
+                    FROM unnest(%s::bigint[], %s::bigint[], %s::text[], %s::bigint[])
+                        AS u(chat_id, user_id, cooldown_type, expires_at)
+                    ON CONFLICT (chat_id, user_id, cooldown_type) DO UPDATE
+                    SET expires_at = EXCLUDED.expires_at, created_at = EXCLUDED.created_at
+                    RETURNING 1
+                ), deleted AS (
+                    DELETE FROM cooldowns c
+                    USING unnest(%s::bigint[], %s::bigint[], %s::text[]) AS d(chat_id, user_id, cooldown_type)
+                    WHERE c.chat_id = d.chat_id AND c.user_id = d.user_id AND c.cooldown_type = d.cooldown_type
+                    RETURNING 1
+                )
+                SELECT (SELECT COUNT(*) FROM upserted), (SELECT COUNT(*) FROM deleted)
+            """, (current_time, *upsert_columns, *delete_columns), fetch="one")
+            return True
+        except Exception as e:
+            logger.error(f"Error writing cooldowns: {e}")
+            logger.error(f"خطا در نوشتن کولدان‌ها: {e}")
+            return False
+    
     async def get_all_cooldowns(self, chat_id: int, user_id: int) -> Dict[str, int]:
         """
         دریافت تمامی کولدان‌های فعال کاربر
@@ -1429,10 +1855,10 @@ class DBManager:
                 VALUES (%s, %s, %s, %s)
                 ON CONFLICT (chat_id, user_id) 
                 DO UPDATE SET defense_type = EXCLUDED.defense_type, expires_at = EXCLUDED.expires_at
-            """, (chat_id, user_id, defense_type, expires_at))
+            """, (chat_id, user_id, defense_type, expires_at), touches=[Mutation(DEFENSE, chat_id, user_id)])
             
-            logger.info(f"Active defense set for user {user_id}: {defense_type} for {duration} seconds")
-            logger.info(f"دفاع فعال برای کاربر {user_id} تنظیم شد: {defense_type} برای {duration} ثانیه")
+            logger.info("Active defense set for user %s: %s for %s seconds", user_id, defense_type, duration,
+                        extra={'fa': "دفاع فعال برای کاربر %s تنظیم شد: %s برای %s ثانیه"})
             return True
         except Exception as e:
             logger.error(f"Error setting active defense: {e}")
@@ -1457,7 +1883,8 @@ class DBManager:
         try:
             await self.db(
                 "DELETE FROM active_defenses WHERE chat_id = %s AND user_id = %s",
-                (chat_id, user_id)
+                (chat_id, user_id),
+                touches=[Mutation(DEFENSE, chat_id, user_id)]
             )
             return True
         except Exception as e:
@@ -1477,6 +1904,90 @@ class DBManager:
             return True
         except Exception as e:
             logger.error(f"Error cleaning up defenses: {e}")
+    
+    # =============================================================================
+    # حالت‌های منقضی‌شونده - Expiring State
+    # =============================================================================
+    
+    async def load_expiries(self, users: Optional[Iterable[Tuple[int, int]]] = None) -> List[Dict[str, Any]]:
+        """
+        بارگذاری زمان انقضا - Expiry of every defense, boost and cooldown row
+        
+        ``users`` limits the rows to those (chat_id, user_id) pairs. Rows are
+        returned as entity, chat_id, user_id, kind, expires_at.
+        """
+        if users is None:
+            filter_join, params = "", ()
+        else:
+            users = list(users)
+            if not users:
+                return []
+            filter_join = (" JOIN unnest(%s::bigint[], %s::bigint[]) AS u(chat_id, user_id)"
+                           " ON u.chat_id = t.chat_id AND u.user_id = t.user_id")
+            params = ([chat_id for chat_id, _ in users], [user_id for _, user_id in users])
+        try:
+            return await self.db(f"""
+                SELECT 'defense' AS entity, t.chat_id, t.user_id, t.defense_type AS kind, t.expires_at
+                FROM active_defenses t{filter_join}
+                UNION ALL
+                SELECT 'boost', t.chat_id, t.user_id, t.boost_type, t.expires_at
+                FROM active_boosts t{filter_join}
+                UNION ALL
+                SELECT 'cooldown', t.chat_id, t.user_id, t.cooldown_type, t.expires_at
+                FROM cooldowns t{filter_join}
+            """, params * 3 if params else None, fetch="all_dicts") or []
+        except Exception as e:
+            logger.error(f"Error loading expiries: {e}")
+            logger.error(f"خطا در بارگذاری زمان‌های انقضا: {e}")
+            return []
+    
+    async def delete_expired(self, keys: List[Tuple[str, int, int, str]], now: int) -> Optional[List[Dict[str, Any]]]:
+        """
+        حذف دسته‌ای ردیف‌های منقضی - Delete the due (entity, chat_id, user_id, kind) rows in one statement
+        
+        A row is only deleted if it has really expired by ``now``, so a key
+        whose row was renewed meanwhile is skipped. Returns the deleted rows,
+        or None if the statement failed.
+        """
+        if not keys:
+            return []
+        entities, chat_ids, user_ids, kinds = (list(column) for column in zip(*keys))
+        try:
+            rows = await self.db("""
+                WITH due AS (
+                    SELECT * FROM unnest(%s::text[], %s::bigint[], %s::bigint[], %s::text[])
+                        AS d(entity, chat_id, user_id, kind)
+                ), defenses AS (
+                    DELETE FROM active_defenses t USING due
+                    WHERE due.entity = 'defense' AND t.chat_id = due.chat_id AND t.user_id = due.user_id
+                      AND t.defense_type = due.kind AND t.expires_at <= %s
+                    RETURNING 'defense'::text AS entity, t.chat_id, t.user_id, t.defense_type AS kind
+                ), boosts AS (
+                    DELETE FROM active_boosts t USING due
+                    WHERE due.entity = 'boost' AND t.chat_id = due.chat_id AND t.user_id = due.user_id
+                      AND t.boost_type = due.kind AND t.expires_at <= %s
+                    RETURNING 'boost'::text, t.chat_id, t.user_id, t.boost_type
+                ), expired_cooldowns AS (
+                    DELETE FROM cooldowns t USING due
+                    WHERE due.entity = 'cooldown' AND t.chat_id = due.chat_id AND t.user_id = due.user_id
+                      AND t.cooldown_type = due.kind AND t.expires_at <= %s
+                    RETURNING 'cooldown'::text, t.chat_id, t.user_id, t.cooldown_type
+                )
+                SELECT * FROM defenses
+                UNION ALL SELECT * FROM boosts
+                UNION ALL SELECT * FROM expired_cooldowns
+            """, (entities, chat_ids, user_ids, kinds, now, now, now), fetch="all_dicts") or []
+        except Exception as e:
+            logger.error(f"Error deleting expired rows: {e}")
+            logger.error(f"خطا در حذف ردیف‌های منقضی: {e}")
+            return None
+        if rows:
+            self.publish_mutations(*(
+                Mutation(row['entity'], row['chat_id'], row['user_id'], {'type': row['kind'], 'expired': True})
+                for row in rows
+            ))
+        return rows
+    
     # =============================================================================
     # مدیریت لیدربورد و رتبه‌بندی - Leaderboard Management
     # =============================================================================
@@ -1740,6 +2251,216 @@ class DBManager:
             logger.error(f"Error exporting user data: {e}")
             return {}
 
+    # =============================================================================
+    # تجمیع آمار پیام - Message analytics rollups
+    # =============================================================================
+    
+    async def upsert_message_rollups(self, hourly: List[Tuple[int, str, int]],
+                                     users: List[Tuple[int, str, str, int]],
+                                     sketches: List[Tuple[int, List[int]]]) -> bool:
+        """
+        افزودن تجمیع‌ها به جداول
+        Add flushed counters to the rollup tables in one transaction
+        
+        Args:
+            hourly: (bucket_start, metric, value) rows, added to existing values
+            users: (user_id, day, metric, value) rows; ``last_activity`` keeps the maximum
+            sketches: (bucket_start, registers) HyperLogLog sketches, merged register-wise
+        """
+        queries: List[Tuple[str, Optional[Tuple]]] = []
+        if hourly:
+            buckets, metrics, values = zip(*hourly)
+            queries.append(("""
+                INSERT INTO message_rollups_hourly AS r (bucket_start, metric, value)
+                SELECT * FROM unnest(%s::bigint[], %s::text[], %s::bigint[])
+                ON CONFLICT (bucket_start, metric) DO UPDATE SET value = r.value + EXCLUDED.value
+            """, (list(buckets), list(metrics), list(values))))
+        if users:
+            user_ids, days, metrics, values = zip(*users)
+            queries.append(("""
+                INSERT INTO message_rollups_users AS r (user_id, day, metric, value)
+                SELECT * FROM unnest(%s::bigint[], %s::date[], %s::text[], %s::bigint[])
+                ON CONFLICT (user_id, day, metric) DO UPDATE SET value = CASE
+                    WHEN r.metric = 'last_activity' THEN GREATEST(r.value, EXCLUDED.value)
+                    ELSE r.value + EXCLUDED.value
+                END
+            """, (list(user_ids), list(days), list(metrics), list(values))))
+        for bucket_start, registers in sketches:
+            queries.append(("""
+                INSERT INTO message_rollups_hll AS r (bucket_start, registers)
+                VALUES (%s, %s::smallint[])
+                ON CONFLICT (bucket_start) DO UPDATE SET registers = ARRAY(
+                    SELECT GREATEST(a, b)
+                    FROM unnest(r.registers, EXCLUDED.registers) WITH ORDINALITY AS u(a, b, i)
+                    ORDER BY i
+                )
+            """, (bucket_start, registers)))
+        if not queries:
+            return True
+        return await self.transaction(queries)
+    
+    async def touch_players(self, rows: List[Tuple[int, int, int]]) -> bool:
+        """به‌روزرسانی گروهی آخرین فعالیت - Batched last_active update from (chat_id, user_id, timestamp) rows"""
+        if not rows:
+            return True
+        try:
+            chat_ids, user_ids, timestamps = zip(*rows)
+            await self.db("""
+                UPDATE players AS p SET last_active = GREATEST(COALESCE(p.last_active, 0), v.ts)
+                FROM unnest(%s::bigint[], %s::bigint[], %s::bigint[]) AS v(chat_id, user_id, ts)
+                WHERE p.chat_id = v.chat_id AND p.user_id = v.user_id
+            """, (list(chat_ids), list(user_ids), list(timestamps)))
+            return True
+        except Exception as e:
+            logger.error(f"Error updating player activity in bulk: {e}")
+            return False
+    
+    async def get_message_rollups(self, start: int, end: int) -> Dict[str, int]:
+        """مجموع معیارهای بازه - Summed hourly metrics for buckets in [start, end)"""
+        try:
+            rows = await self.db("""
+                SELECT metric, SUM(value) AS value FROM message_rollups_hourly
+                WHERE bucket_start >= %s AND bucket_start < %s
+                GROUP BY metric
+            """, (start, end), fetch="all_dicts")
+            return {row['metric']: int(row['value']) for row in rows or []}
+        except Exception as e:
+            logger.error(f"Error getting message rollups: {e}")
+            return {}
+    
+    async def get_message_sketches(self, start: int, end: int) -> List[List[int]]:
+        """طرح‌های کاربران یکتا - HyperLogLog registers for buckets in [start, end)"""
+        try:
+            rows = await self.db("""
+                SELECT registers FROM message_rollups_hll
+                WHERE bucket_start >= %s AND bucket_start < %s
+            """, (start, end), fetch="all")
+            return [row[0] for row in rows or []]
+        except Exception as e:
+            logger.error(f"Error getting message sketches: {e}")
+            return []
+    
+    async def get_user_message_rollup(self, user_id: int, since_day: str) -> Dict[str, int]:
+        """تجمیع پیام کاربر - A user's metrics summed over days since ``since_day``"""
+        try:
+            rows = await self.db("""
+                SELECT metric,
+                       CASE WHEN metric = 'last_activity' THEN MAX(value) ELSE SUM(value) END AS value
+                FROM message_rollups_users
+                WHERE user_id = %s AND day >= %s::date
+                GROUP BY metric
+            """, (user_id, since_day), fetch="all_dicts")
+            return {row['metric']: int(row['value']) for row in rows or []}
+        except Exception as e:
+            logger.error(f"Error getting user message rollup: {e}")
+            return {}
+
+    # =============================================================================
+    # صندوق خروجی رویدادها - Event Outbox
+    # =============================================================================
+    
+    async def outbox_append(self, chat_id: int, event_type: str, payload: Dict[str, Any]) -> Optional[int]:
+        """افزودن رویداد - Store an undelivered event and return its id (None on failure)"""
+        try:
+            row = await self.db("""
+                INSERT INTO event_outbox (chat_id, event_type, payload, created_at)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id
+            """, (chat_id, event_type, json.dumps(payload), int(time.time())), fetch="one")
+            return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Error writing {event_type} to the event outbox: {e}")
+            return None
+    
+    async def outbox_pending(self, after_id: int, max_attempts: int, limit: int) -> List[Dict[str, Any]]:
+        """رویدادهای تحویل‌نشده - Undelivered events after ``after_id``, oldest first"""
+        try:
+            return await self.db("""
+                SELECT id, chat_id, event_type, payload, created_at,
+                       ARRAY(SELECT subscriber FROM event_deliveries d WHERE d.event_id = o.id) AS delivered
+                FROM event_outbox o
+                WHERE id > %s AND attempts < %s
+                ORDER BY id
+                LIMIT %s
+            """, (after_id, max_attempts, limit), fetch="all_dicts") or []
+        except Exception as e:
+            logger.error(f"Error reading the event outbox: {e}")
+            return []
+    
+    async def outbox_ack(self, event_ids: List[int]) -> bool:
+        """تایید تحویل - Remove delivered events and their per-subscriber records"""
+        try:
+            await self.db("""
+                WITH acked AS (
+                    DELETE FROM event_outbox WHERE id = ANY(%s) RETURNING id
+                )
+                DELETE FROM event_deliveries WHERE event_id IN (SELECT id FROM acked)
+            """, (list(event_ids),))
+            return True
+        except Exception as e:
+            logger.error(f"Error acknowledging {len(event_ids)} outbox events: {e}")
+            return False
+    
+    async def outbox_fail(self, failures: List[Tuple[int, List[str]]]) -> bool:
+        """
+        ثبت تلاش ناموفق - Count a failed delivery attempt of each (event id, succeeded subscribers)
+        and record the subscribers that succeeded, so only the others are retried
+        """
+        event_ids = [event_id for event_id, _ in failures]
+        delivered = [(event_id, name) for event_id, names in failures for name in names]
+        try:
+            await self.db("""
+                WITH recorded AS (
+                    INSERT INTO event_deliveries (event_id, subscriber)
+                    SELECT * FROM unnest(%s::bigint[], %s::text[])
+                    ON CONFLICT DO NOTHING
+                    RETURNING 1
+                )
+                UPDATE event_outbox SET attempts = attempts + 1, last_attempt_at = %s
+                WHERE id = ANY(%s)
+            """, ([event_id for event_id, _ in delivered], [name for _, name in delivered],
+                  int(time.time()), event_ids))
+            return True
+        except Exception as e:
+            logger.error(f"Error recording failed outbox deliveries: {e}")
+            return False
+    
+    async def apply_once(self, delivery: Optional[Tuple[int, str]], query: str, params: Tuple,
+                         touches: Optional[Iterable[Mutation]] = None) -> bool:
+        """
+        اعمال یک‌باره - Run an event subscriber's UPDATE at most once per (event id, subscriber)
+        
+        ``query`` must be a single UPDATE ending in its WHERE clause; the
+        delivery is claimed in the same statement, so a replayed event does
+        not apply it twice. Without a delivery (inline events) it simply runs.
+        Returns whether the update was applied.
+        """
+        if delivery is None:
+            await self.db(query, params, touches=touches)
+            return True
+        row = await self.db(f"""
+            WITH claimed AS (
+                INSERT INTO event_deliveries (event_id, subscriber) VALUES (%s, %s)
+                ON CONFLICT DO NOTHING
+                RETURNING 1
+            )
+            {query} AND EXISTS (SELECT 1 FROM claimed)
+            RETURNING 1
+        """, (*delivery, *params), fetch="one")
+        if row and touches:
+            self.publish_mutations(*touches)
+        return bool(row)
+    
+    async def outbox_depth(self, max_attempts: int) -> int:
+        """عمق صندوق - Number of events still to be delivered"""
+        try:
+            return await self.db(
+                "SELECT COUNT(*) FROM event_outbox WHERE attempts < %s", (max_attempts,), fetch="count"
+            ) or 0
+        except Exception as e:
+            logger.error(f"Error counting outbox events: {e}")
+            return 0
+    
     # =============================================================================
     # بکاپ و بازیابی - Backup and Recovery  
     # =============================================================================
@@ -1885,7 +2606,7 @@ class DBManager:
                 VALUES (%s, %s, %s, %s, %s)
             """, (chat_id, user_id, message_type, json.dumps(data) if data else None, current_time))
             
-            logger.info(f"Logged message interaction: {message_type} for user {user_id}")
+            logger.debug("Logged message interaction: %s for user %s", message_type, user_id)
             return True
         except Exception as e:
             logger.error(f"Error logging message interaction: {e}")
@@ -1909,7 +2630,7 @@ class DBManager:
                 ON CONFLICT DO NOTHING
             """, (chat_id, user_id, "new_user_join", json.dumps(event_data), current_time))
             
-            logger.info(f"Logged new user join: {user_id} in chat {chat_id}")
+            logger.debug("Logged new user join: %s in chat %s", user_id, chat_id)
             return True
         except Exception as e:
             logger.error(f"Error logging new user join: {e}")
@@ -1926,7 +2647,7 @@ class DBManager:
                 VALUES (%s, %s, %s, %s, %s)
             """, (chat_id, user_id, event_type, json.dumps(event_data) if event_data else None, current_time))
             
-            logger.info(f"Logged user event: {event_type} for user {user_id} in chat {chat_id}")
+            logger.debug("Logged user event: %s for user %s in chat %s", event_type, user_id, chat_id)
             return True
         except Exception as e:
             logger.error(f"Error logging user event: {e}")
@@ -2149,6 +2870,56 @@ async def setup_database() -> None:
         """)
         logger.info("Player achievements table created/verified - جدول دستاوردهای بازیکن ایجاد/تایید شد")
         
+        # Create message analytics rollup tables (hourly buckets, per-user days, unique-user sketches)
+        await db_manager.db("""
+            CREATE TABLE IF NOT EXISTS message_rollups_hourly(
+                bucket_start BIGINT NOT NULL,
+                metric TEXT NOT NULL,
+                value BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (bucket_start, metric)
+            )
+        """)
+        await db_manager.db("""
+            CREATE TABLE IF NOT EXISTS message_rollups_users(
+                user_id BIGINT NOT NULL,
+                day DATE NOT NULL,
+                metric TEXT NOT NULL,
+                value BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, day, metric)
+            )
+        """)
+        await db_manager.db("""
+            CREATE TABLE IF NOT EXISTS message_rollups_hll(
+                bucket_start BIGINT PRIMARY KEY,
+                registers SMALLINT[] NOT NULL
+            )
+        """)
+        logger.info("Message rollup tables created/verified - جداول تجمیع پیام ایجاد/تایید شدند")
+        
+        # Create event outbox table; delivered events are deleted, failed ones count attempts
+        await db_manager.db("""
+            CREATE TABLE IF NOT EXISTS event_outbox(
+                id BIGSERIAL PRIMARY KEY,
+                chat_id BIGINT NOT NULL,
+                event_type TEXT NOT NULL,
+                payload JSONB NOT NULL,
+                attempts INT NOT NULL DEFAULT 0,
+                created_at BIGINT NOT NULL,
+                last_attempt_at BIGINT
+            )
+        """)
+        logger.info("Event outbox table created/verified - جدول صندوق خروجی رویدادها ایجاد/تایید شد")
+        
+        # Subscribers that already handled an outbox event; replays skip them
+        await db_manager.db("""
+            CREATE TABLE IF NOT EXISTS event_deliveries(
+                event_id BIGINT NOT NULL,
+                subscriber TEXT NOT NULL,
+                PRIMARY KEY(event_id, subscriber)
+            )
+        """)
+        logger.info("Event deliveries table created/verified - جدول تحویل رویدادها ایجاد/تایید شد")
+        
         # Create indexes for better performance
         indexes = [
             "CREATE INDEX IF NOT EXISTS idx_players_score ON players(chat_id, score DESC)",
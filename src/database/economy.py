@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+اثرات اقتصادی خرید و استفاده از آیتم‌ها
+Item Effects for Purchases and Item Use
+
+خرید و استفاده از آیتم هر کدام یک دستور SQL هستند: کسر هزینه یا مصرف
+آیتم و اعمال اثرات آن با هم انجام می‌شوند یا هیچ‌کدام انجام نمی‌شوند.
+
+``ItemEffects`` describes what a purchase or a use does to a player beyond
+the debit itself: an inventory grant, a medal reward, healing, boosts, a
+defense or extra arsenal capacity. ``DBManager.debit_and_grant`` and
+``DBManager.consume_and_apply`` apply it in the same statement as the debit
+or the consumption. ``item_effects`` maps an item to the effects of using it,
+shared by the shop (auto-use items) and the inventory. Both return an
+``EconomyResult`` telling a short balance or missing item apart from a failed
+statement.
+"""
+
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, Optional, Tuple
+
+from src.config.items import ITEMS
+
+# Items applied on purchase instead of going to the inventory
+AUTO_USE_ITEMS = frozenset({
+    'medal_boost_small', 'medal_boost', 'mega_medal_boost',  # Medal rewards
+    'energy_drink', 'adrenaline_shot',                       # Cooldown reduction
+    'experience_boost',                                      # Experience multiplier
+    'repair_kit', 'nano_repair', 'first_aid', 'field_medic', # HP restoration
+    'vip_status', 'elite_membership',                        # Status boosts
+})
+
+MEDAL_ITEMS = ('medal_boost_small', 'medal_boost', 'mega_medal_boost')
+COOLDOWN_ITEMS = ('energy_drink', 'adrenaline_shot')
+REPAIR_ITEMS = ('repair_kit', 'nano_repair', 'first_aid', 'field_medic')
+STATUS_ITEMS = ('vip_status', 'elite_membership')
+VIP_BOOSTS = ('vip_experience', 'vip_damage', 'vip_cooldown')
+
+# (boost_type, boost_value, expires_at)
+Boost = Tuple[str, float, int]
+
+
+@dataclass(frozen=True)
+class ItemEffects:
+    """اثرات آیتم - Everything a purchase or use applies besides the debit"""
+    grant_item: Optional[str] = None
+    grant_qty: int = 0
+    score_reward: int = 0
+    hp_restore: int = 0
+    boosts: Tuple[Boost, ...] = ()
+    # Boost types removed before the new boosts apply (e.g. a previous VIP tier)
+    clear_boosts: Tuple[str, ...] = ()
+    defense_type: Optional[str] = None
+    defense_expires_at: int = 0
+    arsenal_capacity: int = 0
+
+    @property
+    def touches_player(self) -> bool:
+        return bool(self.score_reward or self.hp_restore or self.arsenal_capacity)
+
+    @property
+    def touches_boosts(self) -> bool:
+        return bool(self.boosts or self.clear_boosts)
+
+
+class Outcome(Enum):
+    """نتیجه عملیات - How a debit or an item use ended"""
+    APPLIED = "applied"
+    # The balance was too low, or the inventory did not hold enough of the item
+    SHORT = "short"
+    # The statement failed and nothing was applied
+    ERROR = "error"
+
+
+@dataclass(frozen=True)
+class EconomyResult:
+    """نتیجه اقتصادی - The outcome of a debit or an item use and, when applied, its row"""
+    outcome: Outcome
+    row: Optional[Dict[str, Any]] = None
+
+    @property
+    def applied(self) -> bool:
+        return self.outcome is Outcome.APPLIED
+
+
+def item_effects(item_id: str, now: int) -> ItemEffects:
+    """اثرات استفاده - The effects of using ``item_id`` at ``now`` (empty for passive items)"""
+    item = ITEMS.get(item_id, {})
+    item_type = item.get('type', '')
+
+    if item_id in MEDAL_ITEMS:
+        return ItemEffects(score_reward=item.get('medals_reward', 250))
+
+    if item_id in COOLDOWN_ITEMS:
+        expires_at = now + item.get('duration_seconds', 3600)
+        return ItemEffects(boosts=(('cooldown_reduction', item.get('cooldown_reduction', 0.5), expires_at),))
+
+    if item_id == 'experience_boost':
+        expires_at = now + item.get('duration_seconds', 14400)
+        return ItemEffects(boosts=(('experience_multiplier', item.get('experience_multiplier', 2.0), expires_at),))
+
+    if item_id in REPAIR_ITEMS:
+        # Healing stops at max_hp, which the positive_hp constraint enforces
+        return ItemEffects(hp_restore=item.get('hp_restore', 100))
+
+    if item_id in STATUS_ITEMS:
+        expires_at = now + item.get('days', 30) * 24 * 60 * 60
+        boosts = [
+            ('vip_experience', item.get('experience_multiplier', 1.5), expires_at),
+            ('vip_damage', item.get('damage_bonus', 0.2), expires_at),
+        ]
+        if item_id == 'elite_membership':
+            boosts.append(('vip_cooldown', item.get('cooldown_reduction', 0.25), expires_at))
+        return ItemEffects(boosts=tuple(boosts), clear_boosts=VIP_BOOSTS)
+
+    if item_type in ('shield', 'intercept'):
+        return ItemEffects(defense_type=item_id,
+                           defense_expires_at=now + item.get('duration_seconds', 14400))
+
+    if item_type == 'arsenal':
+        return ItemEffects(arsenal_capacity=item.get('capacity', 10))
+
+    return ItemEffects()
+
+
+__all__ = ['ItemEffects', 'Outcome', 'EconomyResult', 'item_effects', 'AUTO_USE_ITEMS', 'VIP_BOOSTS']
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+رویدادهای تغییر داده برای ابطال دقیق کش
+Mutation Events for precise cache invalidation
+
+هر عملیات نوشتن در DBManager موجودیت‌هایی را که تغییر می‌دهد اعلام می‌کند
+و کش‌های مشترک، ورودی‌های مربوط را حذف یا به‌روزرسانی می‌کنند.
+
+Every DBManager write declares the entities it touches as ``Mutation``
+objects. After the write commits they are published on ``mutation_bus`` and
+subscribed caches delete or update exactly the affected keys, which lets
+read caches keep long TTLs without serving stale data.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Entity kinds | انواع موجودیت
+PLAYER = 'player'          # score, hp, stars, level, experience
+LANGUAGE = 'language'      # players.language
+INVENTORY = 'inventory'    # inventories rows
+DEFENSE = 'defense'        # active_defenses rows
+BOOST = 'boost'            # active_boosts rows
+COOLDOWN = 'cooldown'      # cooldowns rows (includes shield/intercept)
+GROUP = 'group'            # groups rows
+
+
+@dataclass(frozen=True)
+class Mutation:
+    """تغییر یک موجودیت - A committed write to one entity"""
+    entity: str
+    chat_id: int
+    user_id: Optional[int] = None
+    values: Optional[Dict[str, Any]] = field(default=None, compare=False, hash=False)
+
+
+MutationListener = Callable[[Mutation], None]
+
+
+class MutationBus:
+    """گذرگاه رویدادهای تغییر - Synchronous fan-out of committed mutations"""
+
+    def __init__(self):
+        self._listeners: Dict[str, List[MutationListener]] = {}
+        self.published = 0
+
+    def subscribe(self, entity: str, listener: MutationListener) -> None:
+        """اشتراک - Subscribe to one entity kind, or ``'*'`` for all"""
+        self._listeners.setdefault(entity, []).append(listener)
+
+    def unsubscribe(self, entity: str, listener: MutationListener) -> None:
+        """لغو اشتراک - Remove a listener"""
+        listeners = self._listeners.get(entity, [])
+        if listener in listeners:
+            listeners.remove(listener)
+
+    def publish(self, mutations: Iterable[Mutation]) -> None:
+        """انتشار - Deliver mutations to their listeners; listener errors are logged"""
+        for mutation in mutations:
+            self.published += 1
+            for listener in self._listeners.get(mutation.entity, []) + self._listeners.get('*', []):
+                try:
+                    listener(mutation)
+                except Exception as e:
+                    logger.error(f"Mutation listener failed for {mutation.entity}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Listener counts and published total"""
+        return {
+            'published': self.published,
+            'listeners': {entity: len(listeners) for entity, listeners in self._listeners.items()},
+        }
+
+
+# نمونه سراسری - Global mutation bus
+mutation_bus = MutationBus()
+
+__all__ = [
+    'Mutation', 'MutationBus', 'MutationListener', 'mutation_bus',
+    'PLAYER', 'LANGUAGE', 'INVENTORY', 'DEFENSE', 'BOOST', 'COOLDOWN', 'GROUP',
+]
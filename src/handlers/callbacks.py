@@ -10,7 +10,7 @@ import asyncio
 import time
 import json
 from functools import wraps
-from typing import Dict, List, Optional, Callable, Any, Tuple
+from typing import Dict, Optional, Callable, Any, Tuple
 from enum import Enum
 from dataclasses import dataclass
 from telebot import types
@@ -21,6 +21,12 @@ from src.utils.helpers import ensure_player, get_lang, set_lang
 from src.utils.translations import T
 from src.commands import help, shop, stats, status, inventory, attack, general
 from src.commands.stars import handle_stars_callback
+from src.handlers.router import router
+from src.utils.metrics import CALLBACKS_TOTAL, CALLBACK_LATENCY
+from src.utils.histogram import StreamingHistogram
+from src.utils.ratelimit import get_limiter, rate_limited, by_user
+from src.utils.memory_budget import BoundedStore
+from src.config.bot_config import BOT_CONFIG
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -45,6 +51,14 @@ class CallbackAction(Enum):
     INVENTORY = "inv"          # موجودی - Inventory
     LEADERBOARD = "lead"       # لیدربورد - Leaderboard
 
+# Actions dispatched by the catch-all handler; with the router's prefixes they bound metric labels
+_CALLBACK_ACTIONS = frozenset(action.value for action in CallbackAction)
+
+def callback_metric_label(data: str) -> str:
+    """برچسب معیار کالبک - A known action or registered prefix for ``data``, otherwise 'other'"""
+    action = (data or "").split(':', 1)[0]
+    return action if action in _CALLBACK_ACTIONS else router.callback_label(data)
+
 @dataclass
 class CallbackContext:
     """بافت کالبک - Callback Context"""
@@ -62,45 +76,6 @@ class CallbackContext:
 class CallbackSecurity:
     """امنیت کالبک - Callback Security Manager"""
     
-    def __init__(self):
-        self.rate_limits: Dict[int, List[float]] = {}
-        self.max_requests_per_minute = 30
-        self.blocked_users: Dict[int, float] = {}
-        self.block_duration = 300  # 5 minutes
-    
-    def is_rate_limited(self, user_id: int) -> bool:
-        """بررسی محدودیت نرخ - Check rate limiting"""
-        current_time = time.time()
-        
-        # Clean old requests
-        if user_id in self.rate_limits:
-            self.rate_limits[user_id] = [
-                t for t in self.rate_limits[user_id] 
-                if current_time - t < 60
-            ]
-        
-        # Check if user is blocked
-        if user_id in self.blocked_users:
-            if current_time - self.blocked_users[user_id] > self.block_duration:
-                del self.blocked_users[user_id]
-            else:
-                return True
-        
-        # Check rate limit
-        user_requests = self.rate_limits.get(user_id, [])
-        if len(user_requests) >= self.max_requests_per_minute:
-            self.blocked_users[user_id] = current_time
-            logger.warning(f"User {user_id} blocked for rate limiting")
-            logger.warning(f"کاربر {user_id} به دلیل محدودیت نرخ مسدود شد")
-            return True
-        
-        # Add current request
-        if user_id not in self.rate_limits:
-            self.rate_limits[user_id] = []
-        self.rate_limits[user_id].append(current_time)
-        
-        return False
-    
     def validate_callback_data(self, data: str) -> bool:
         """اعتبارسنجی داده کالبک - Validate callback data"""
         if not data or len(data) > 64:  # Telegram limit
@@ -141,30 +116,31 @@ def owner_only(func):
         return await func(call, bot, data, lang, db_manager)
     return wrapper
 
-def rate_limit(func):
-    """
-    دکوریتر محدودیت نرخ برای جلوگیری از سوءاستفاده
-    Rate limiting decorator to prevent abuse
-    """
-    @wraps(func)
-    async def wrapper(call, bot, data, lang, db_manager):
-        if callback_security.is_rate_limited(call.from_user.id):
-            if lang == "fa":
-                await bot.answer_callback_query(
-                    call.id,
-                    "⚠️ شما خیلی سریع درخواست می‌دهید! لطفاً کمی صبر کنید.",
-                    show_alert=True
-                )
-            else:
-                await bot.answer_callback_query(
-                    call.id,
-                    "⚠️ You're making requests too quickly! Please wait a moment.",
-                    show_alert=True
-                )
-            return
-        
-        return await func(call, bot, data, lang, db_manager)
-    return wrapper
+# محدودکننده نرخ کالبک‌ها - Per-user callback limiter (GCRA, bounded state)
+callback_limiter = get_limiter(
+    'callback',
+    rate=BOT_CONFIG.security_settings.max_requests_per_minute,
+    penalty=BOT_CONFIG.security_settings.rate_limit_block_seconds,
+    enabled=BOT_CONFIG.security_settings.rate_limit_enabled
+)
+
+async def _reject_rate_limited(call, decision, bot, data, lang, db_manager):
+    """پاسخ به درخواست محدودشده - Tell the user to slow down"""
+    if lang == "fa":
+        await bot.answer_callback_query(
+            call.id,
+            "⚠️ شما خیلی سریع درخواست می‌دهید! لطفاً کمی صبر کنید.",
+            show_alert=True
+        )
+    else:
+        await bot.answer_callback_query(
+            call.id,
+            "⚠️ You're making requests too quickly! Please wait a moment.",
+            show_alert=True
+        )
+
+# دکوریتر محدودیت نرخ برای جلوگیری از سوءاستفاده - Rate limiting decorator to prevent abuse
+rate_limit = rate_limited(callback_limiter, by_user, on_limited=_reject_rate_limited)
 
 def validate_data(func):
     """
@@ -294,32 +270,7 @@ async def handle_callback_query(call, bot, db_manager: DBManager):
             timestamp=time.time()
         )
         
-        # Enhanced routing system with comprehensive handlers
-        handlers = {
-            "go": handle_navigation_action,           # ناوبری
-            "do": handle_action_callback,             # عمل
-            "buy": handle_purchase_callback,          # خرید
-            "confirm": handle_confirmation_callback,   # تایید
-            "cancel": handle_cancel_action,           # لغو
-            "page": handle_pagination_callback,       # صفحه‌بندی
-            "lang": handle_language_callback,         # زبان
-            "filter": handle_filter_callback,         # فیلتر
-            "sort": handle_sort_callback,             # مرتب‌سازی
-            "help": handle_help_callback,             # راهنما
-            "settings": handle_settings_callback,     # تنظیمات
-            "admin": handle_admin_callback,           # مدیریت
-            "stars": handle_stars_callback,           # TG Stars system
-            "attack": handle_attack_callback,         # حمله
-            "defend": handle_defense_callback,        # دفاع
-            "inv": handle_inventory_callback,         # موجودی
-            "lead": handle_leaderboard_callback,      # لیدربورد
-            "profile": handle_profile_callback,       # پروفایل
-            "weapon": handle_weapon_callback,         # سلاح
-            "item": handle_item_callback,             # آیتم
-            "quick": handle_quick_action,             # اقدام سریع
-        }
-        
-        handler = handlers.get(action)
+        handler = CALLBACK_ACTION_HANDLERS.get(action)
         if handler:
             # Special handling for language callback
             if action == 'lang':
@@ -992,6 +943,35 @@ async def create_error_keyboard(lang: str) -> types.InlineKeyboardMarkup:
     
     return keyboard
 
+# =============================================================================
+# جدول مسیریابی کالبک - Callback Action Routing Table
+# =============================================================================
+
+# جدول یک بار در بارگذاری ماژول ساخته می‌شود - Built once at module load instead of per call
+CALLBACK_ACTION_HANDLERS: Dict[str, Callable] = {
+    "go": handle_navigation_action,           # ناوبری
+    "do": handle_action_callback,             # عمل
+    "buy": handle_purchase_callback,          # خرید
+    "confirm": handle_confirmation_callback,   # تایید
+    "cancel": handle_cancel_action,           # لغو
+    "page": handle_pagination_callback,       # صفحه‌بندی
+    "lang": handle_language_callback,         # زبان
+    "filter": handle_filter_callback,         # فیلتر
+    "sort": handle_sort_callback,             # مرتب‌سازی
+    "help": handle_help_callback,             # راهنما
+    "settings": handle_settings_callback,     # تنظیمات
+    "admin": handle_admin_callback,           # مدیریت
+    "stars": handle_stars_callback,           # TG Stars system
+    "attack": handle_attack_callback,         # حمله
+    "defend": handle_defense_callback,        # دفاع
+    "inv": handle_inventory_callback,         # موجودی
+    "lead": handle_leaderboard_callback,      # لیدربورد
+    "profile": handle_profile_callback,       # پروفایل
+    "weapon": handle_weapon_callback,         # سلاح
+    "item": handle_item_callback,             # آیتم
+    "quick": handle_quick_action,             # اقدام سریع
+}
+
 def register_callback_handlers(bot, db_manager: DBManager):
     """
     ثبت مدیریت‌کننده‌های پیشرفته کالبک کوئری
@@ -1005,20 +985,26 @@ def register_callback_handlers(bot, db_manager: DBManager):
     logger.info("ثبت مدیریت‌کننده‌های پیشرفته کالبک کوئری")
     
     # Register global callback handler with comprehensive error handling
-    @bot.callback_query_handler(func=lambda call: True)
+    # (empty prefix is the router's catch-all; module-specific prefixes win)
+    @router.callback('')
     async def main_callback_handler(call):
         """
         مدیریت‌کننده اصلی کالبک با مدیریت خطای پیشرفته
         Main callback handler with advanced error management
         """
+        # Callback data is client-controlled; only known actions become labels
+        action = callback_metric_label(call.data)
+        start = time.perf_counter()
         try:
             # Log callback usage for analytics
-            await log_callback_usage(call, call.data.split(':')[0] if ':' in call.data else 'unknown', call.data)
+            await log_callback_usage(call, action, call.data)
             
             # Handle the callback
             await handle_callback_query(call, bot, db_manager)
+            callback_analytics.record_callback(action, time.perf_counter() - start, True)
             
         except Exception as e:
+            callback_analytics.record_callback(action, time.perf_counter() - start, False)
             logger.error(f"Critical error in callback handler: {e}")
             logger.error(f"خطای حاد در مدیریت‌کننده کالبک: {e}")
             
@@ -1062,21 +1048,25 @@ class CallbackAnalytics:
     
     def __init__(self):
         self.callback_stats: Dict[str, Dict[str, Any]] = {}
-        self.response_times: Dict[str, List[float]] = {}
+        # Actions come from callback data, so the set is bounded; evicting an
+        # action drops its counters together with its histogram
+        self.response_times: Dict[str, StreamingHistogram] = BoundedStore(
+            'callback_actions', max_entries=256, on_evict=self._forget_action)
         self.error_counts: Dict[str, int] = {}
+    
+    def _forget_action(self, action: str, histogram: StreamingHistogram) -> None:
+        self.callback_stats.pop(action, None)
+        self.error_counts.pop(action, None)
         
     def record_callback(self, action: str, response_time: float, success: bool):
         """ثبت آمار کالبک - Record callback statistics"""
-        if action not in self.callback_stats:
+        if action not in self.response_times:
             self.callback_stats[action] = {
                 'total_calls': 0,
                 'successful_calls': 0,
-                'failed_calls': 0,
-                'avg_response_time': 0.0
+                'failed_calls': 0
             }
-        
-        if action not in self.response_times:
-            self.response_times[action] = []
+            self.response_times[action] = StreamingHistogram()
         
         # Update statistics
         self.callback_stats[action]['total_calls'] += 1
@@ -1086,15 +1076,12 @@ class CallbackAnalytics:
             self.callback_stats[action]['failed_calls'] += 1
             self.error_counts[action] = self.error_counts.get(action, 0) + 1
         
-        # Record response time
-        self.response_times[action].append(response_time)
-        
-        # Keep only last 100 response times
-        if len(self.response_times[action]) > 100:
-            self.response_times[action] = self.response_times[action][-100:]
+        # ثبت زمان پاسخ در هیستوگرام جریانی - Record response time in O(1)
+        self.response_times[action].record(response_time)
         
-        # Update average response time
-        self.callback_stats[action]['avg_response_time'] = sum(self.response_times[action]) / len(self.response_times[action])
+        # انتشار در رجیستری معیارها - Publish to metrics registry
+        CALLBACKS_TOTAL.inc(action=action, status='success' if success else 'error')
+        CALLBACK_LATENCY.observe(response_time, action=action)
     
     def get_performance_report(self) -> Dict[str, Any]:
         """دریافت گزارش عملکرد - Get performance report"""
@@ -1106,11 +1093,16 @@ class CallbackAnalytics:
         
         for action, stats in self.callback_stats.items():
             success_rate = (stats['successful_calls'] / stats['total_calls']) * 100 if stats['total_calls'] > 0 else 0
+            timing = self.response_times[action].snapshot()
             
             report['actions'][action] = {
                 'total_calls': stats['total_calls'],
                 'success_rate': round(success_rate, 2),
-                'avg_response_time': round(stats['avg_response_time'], 3),
+                'avg_response_time': round(timing['mean'], 3),
+                'p50_response_time': round(timing['p50'], 3),
+                'p95_response_time': round(timing['p95'], 3),
+                'p99_response_time': round(timing['p99'], 3),
+                'p999_response_time': round(timing['p999'], 3),
                 'error_count': self.error_counts.get(action, 0)
             }
         
@@ -1126,17 +1118,21 @@ callback_analytics = CallbackAnalytics()
 class CallbackCache:
     """مدیر کش کالبک - Callback Cache Manager"""
     
-    def __init__(self, ttl: int = 300):  # 5 minutes TTL
-        self.cache: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, ttl: int = 300, max_entries: int = 5000):  # 5 minutes TTL
+        self.cache: Dict[str, Dict[str, Any]] = BoundedStore('callback_cache', max_entries=max_entries, idle_ttl=ttl)
         self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
     
     def get(self, key: str) -> Optional[Any]:
         """دریافت از کش - Get from cache"""
         if key in self.cache:
             if time.time() - self.cache[key]['timestamp'] < self.ttl:
+                self.hits += 1
                 return self.cache[key]['data']
             else:
                 del self.cache[key]
+        self.misses += 1
         return None
     
     def set(self, key: str, data: Any):
@@ -1161,7 +1157,9 @@ class CallbackCache:
         """دریافت آمار کش - Get cache statistics"""
         return {
             'total_entries': len(self.cache),
-            'memory_usage': sum(len(str(value)) for value in self.cache.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'memory_usage': self.cache.estimate_bytes(),
             'cache_keys': list(self.cache.keys())
         }
 
@@ -1234,6 +1232,7 @@ __all__ = [
     'handle_weapon_callback',
     'handle_item_callback',
     'handle_quick_action',
+    'CALLBACK_ACTION_HANDLERS',
     
     # Security and decorators
     'owner_only',
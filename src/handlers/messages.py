@@ -22,18 +22,28 @@ import time
 import asyncio
 import json
 import hashlib
+import html
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple, Union, Callable
+from typing import Dict, List, NamedTuple, Optional, Any, Tuple, Union, Callable
 from enum import Enum
 from dataclasses import dataclass, field
-from collections import defaultdict, deque
 
 from telebot import types
 from telebot.async_telebot import AsyncTeleBot
 from telebot.types import Message, User, Chat, CallbackQuery
 
 from src.database.db_manager import DBManager
-from src.utils.helpers import ensure_player, get_lang, set_lang, handle_regular_messages
+from src.handlers.router import router
+from src.utils.metrics import MESSAGES_ANALYZED
+from src.utils.helpers import (
+    ensure_player, get_lang, set_lang, handle_regular_messages, get_bot_info, peek_lang, sanitize_text
+)
+from src.utils.render_cache import render_cache, FrozenMarkup, freeze_markup
+from src.utils.antispam import SpamEngine
+from src.utils.memory_budget import memory_governor
+from src.utils.rollups import CounterLayout, HyperLogLog
+from src.utils.keywords import KeywordMatcher, Scan
+from src.utils.analysis_pool import analysis_executor
 from src.utils.translations import T
 from src.config.bot_config import BOT_CONFIG
 
@@ -159,91 +169,91 @@ class MessageAnalyzer:
     """تحلیل‌گر پیام‌های پیشرفته - Advanced Message Analyzer"""
     
     def __init__(self):
-        # الگوهای تشخیص قصد - Intent Recognition Patterns
-        self.intent_patterns = {
+        # کلیدواژه‌های تشخیص قصد - Intent Recognition Keywords
+        self.intent_keywords = {
             UserIntention.PLAY_GAME: [
-                # English patterns
-                r'\b(play|game|start|begin|let\'s play)\b',
-                r'\b(trump|attack|fight|battle)\b',
-                # Persian patterns
-                r'\b(بازی|شروع|بیا|بازی کن|شروع کن)\b',
-                r'\b(ترامپ|حمله|نبرد|جنگ|بازی کردن)\b'
+                # English
+                'play', 'game', 'start', 'begin', "let's play",
+                'trump', 'attack', 'fight', 'battle',
+                # Persian
+                'بازی', 'شروع', 'بیا', 'بازی کن', 'شروع کن',
+                'ترامپ', 'حمله', 'نبرد', 'جنگ', 'بازی کردن'
             ],
             UserIntention.GET_HELP: [
-                # English patterns
-                r'\b(help|how|guide|explain|tutorial)\b',
-                r'\b(what|how do|how to|instruction)\b',
-                # Persian patterns
-                r'\b(کمک|راهنما|چطور|چگونه|آموزش)\b',
-                r'\b(توضیح|راهنمایی|کمک کن|بگو)\b'
+                # English
+                'help', 'how', 'guide', 'explain', 'tutorial',
+                'what', 'how do', 'how to', 'instruction',
+                # Persian
+                'کمک', 'راهنما', 'چطور', 'چگونه', 'آموزش',
+                'توضیح', 'راهنمایی', 'کمک کن', 'بگو'
             ],
             UserIntention.CHECK_STATUS: [
-                # English patterns
-                r'\b(status|stats|level|health|money)\b',
-                r'\b(profile|account|balance|score)\b',
-                # Persian patterns
-                r'\b(وضعیت|آمار|سطح|سلامتی|پول)\b',
-                r'\b(پروفایل|حساب|موجودی|امتیاز)\b'
+                # English
+                'status', 'stats', 'level', 'health', 'money',
+                'profile', 'account', 'balance', 'score',
+                # Persian
+                'وضعیت', 'آمار', 'سطح', 'سلامتی', 'پول',
+                'پروفایل', 'حساب', 'موجودی', 'امتیاز'
             ],
             UserIntention.ATTACK_PLAYER: [
-                # English patterns
-                r'\b(attack|fight|kill|shoot|hit)\b',
-                r'\b(weapon|gun|sword|bomb)\b',
-                # Persian patterns
-                r'\b(حمله|بکش|تیراندازی|زدن|نبرد)\b',
-                r'\b(سلاح|تفنگ|شمشیر|بمب)\b'
+                # English
+                'attack', 'fight', 'kill', 'shoot', 'hit',
+                'weapon', 'gun', 'sword', 'bomb',
+                # Persian
+                'حمله', 'بکش', 'تیراندازی', 'زدن', 'نبرد',
+                'سلاح', 'تفنگ', 'شمشیر', 'بمب'
             ],
             UserIntention.BUY_ITEM: [
-                # English patterns
-                r'\b(buy|purchase|shop|store|get)\b',
-                r'\b(item|weapon|medicine|upgrade)\b',
-                # Persian patterns
-                r'\b(خرید|بخر|فروشگاه|دکان|بگیر)\b',
-                r'\b(آیتم|سلاح|دارو|ارتقا)\b'
+                # English
+                'buy', 'purchase', 'shop', 'store', 'get',
+                'item', 'weapon', 'medicine', 'upgrade',
+                # Persian
+                'خرید', 'بخر', 'فروشگاه', 'دکان', 'بگیر',
+                'آیتم', 'سلاح', 'دارو', 'ارتقا'
             ],
             UserIntention.SOCIAL_CHAT: [
-                # English patterns
-                r'\b(hello|hi|good|nice|thanks|bye)\b',
-                r'\b(how are you|what\'s up|see you)\b',
-                # Persian patterns  
-                r'\b(سلام|درود|خوبی|چطوری|ممنون|خداحافظ)\b',
-                r'\b(حالت چطوره|چه خبر|تا بعد)\b'
+                # English
+                'hello', 'hi', 'good', 'nice', 'thanks', 'bye',
+                'how are you', "what's up", 'see you',
+                # Persian
+                'سلام', 'درود', 'خوبی', 'چطوری', 'ممنون', 'خداحافظ',
+                'حالت چطوره', 'چه خبر', 'تا بعد'
             ]
         }
         
-        # الگوهای تحلیل احساسات - Sentiment Analysis Patterns
-        self.sentiment_patterns = {
+        # کلیدواژه‌های تحلیل احساسات - Sentiment Analysis Keywords
+        self.sentiment_keywords = {
             MessageSentiment.POSITIVE: [
                 # English
-                r'\b(good|great|awesome|nice|love|like|happy|excellent)\b',
-                r'\b(thank|thanks|cool|amazing|wonderful|fantastic)\b',
+                'good', 'great', 'awesome', 'nice', 'love', 'like', 'happy', 'excellent',
+                'thank', 'thanks', 'cool', 'amazing', 'wonderful', 'fantastic',
                 # Persian
-                r'\b(خوب|عالی|فوق‌العاده|قشنگ|دوست دارم|خوشحال|ممنون)\b',
-                r'\b(باحال|جالب|کول|مرسی|تشکر|شگفت‌انگیز)\b'
+                'خوب', 'عالی', 'فوق‌العاده', 'قشنگ', 'دوست دارم', 'خوشحال', 'ممنون',
+                'باحال', 'جالب', 'کول', 'مرسی', 'تشکر', 'شگفت‌انگیز'
             ],
             MessageSentiment.NEGATIVE: [
                 # English
-                r'\b(bad|terrible|awful|hate|suck|worst|annoying)\b',
-                r'\b(stupid|dumb|boring|useless|disappointed)\b',
+                'bad', 'terrible', 'awful', 'hate', 'suck', 'worst', 'annoying',
+                'stupid', 'dumb', 'boring', 'useless', 'disappointed',
                 # Persian
-                r'\b(بد|افتضاح|متنفر|کسل‌کننده|احمق|بیخود)\b',
-                r'\b(ناامید|ضایع|مزخرف|کودن|بی‌فایده)\b'
+                'بد', 'افتضاح', 'متنفر', 'کسل‌کننده', 'احمق', 'بیخود',
+                'ناامید', 'ضایع', 'مزخرف', 'کودن', 'بی‌فایده'
             ],
             MessageSentiment.AGGRESSIVE: [
                 # English
-                r'\b(kill|die|shut up|idiot|damn|hell|fuck)\b',
-                r'\b(destroy|murder|violence|angry|mad|rage)\b',
+                'kill', 'die', 'shut up', 'idiot', 'damn', 'hell', 'fuck',
+                'destroy', 'murder', 'violence', 'angry', 'mad', 'rage',
                 # Persian
-                r'\b(بکش|بمیر|خفه شو|احمق|لعنت|جهنم)\b',
-                r'\b(نابود|قتل|خشمگین|عصبانی|خشم)\b'
+                'بکش', 'بمیر', 'خفه شو', 'احمق', 'لعنت', 'جهنم',
+                'نابود', 'قتل', 'خشمگین', 'عصبانی', 'خشم'
             ],
             MessageSentiment.FRIENDLY: [
                 # English
-                r'\b(friend|buddy|pal|mate|welcome|join)\b',
-                r'\b(together|team|group|community|help)\b',
+                'friend', 'buddy', 'pal', 'mate', 'welcome', 'join',
+                'together', 'team', 'group', 'community', 'help',
                 # Persian
-                r'\b(دوست|رفیق|همراه|خوش آمدی|بپیوند)\b',
-                r'\b(با هم|تیم|گروه|جامعه|کمک)\b'
+                'دوست', 'رفیق', 'همراه', 'خوش آمدی', 'بپیوند',
+                'با هم', 'تیم', 'گروه', 'جامعه', 'کمک'
             ]
         }
         
@@ -259,24 +269,36 @@ class MessageAnalyzer:
                 'help', 'how', 'guide', 'کمک', 'راهنما', 'چطور'
             ]
         }
+        
+        # همه کلیدواژه‌ها در یک تطبیق‌دهنده - Every keyword in one matcher, one pass per message
+        self.matcher = KeywordMatcher({
+            **self.intent_keywords,
+            **self.sentiment_keywords,
+            **self.important_keywords
+        })
+    
+    def scan(self, text: str) -> Scan:
+        """پیمایش کلیدواژه‌ها - Intent, sentiment and keyword hits in one pass"""
+        return self.matcher.scan(text)
     
-    async def analyze_message(self, context: MessageContext) -> MessageContext:
-        """تحلیل جامع پیام - Comprehensive message analysis"""
+    async def analyze_message(self, context: MessageContext, scan: Optional[Scan] = None) -> MessageContext:
+        """تحلیل جامع پیام - Comprehensive message analysis (``scan`` reuses an earlier pass)"""
         try:
             if not context.message.text:
                 return context
             
-            message_text = context.message.text.lower()
+            if scan is None:
+                scan = self.scan(context.message.text)
             
             # تشخیص قصد - Intent Recognition
-            context.intention = await self._detect_intention(message_text)
+            context.intention = self._detect_intention(scan)
             
             # تحلیل احساسات - Sentiment Analysis
-            context.sentiment = await self._analyze_sentiment(message_text)
+            context.sentiment = self._analyze_sentiment(scan)
             
             # محاسبه امتیاز اطمینان - Calculate Confidence Score
-            context.confidence_score = await self._calculate_confidence(
-                message_text, context.intention, context.sentiment
+            context.confidence_score = self._calculate_confidence(
+                scan, context.intention, context.sentiment
             )
             
             # ثبت آنالیتیکس - Log Analytics
@@ -288,43 +310,17 @@ class MessageAnalyzer:
             logger.error(f"Error analyzing message: {e}")
             return context
     
-    async def _detect_intention(self, text: str) -> UserIntention:
-        """تشخیص قصد کاربر - Detect user intention"""
-        intention_scores = {}
-        
-        for intention, patterns in self.intent_patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = len(re.findall(pattern, text, re.IGNORECASE))
-                score += matches
-            intention_scores[intention] = score
-        
-        # پیدا کردن بیشترین امتیاز - Find highest score
-        if intention_scores and max(intention_scores.values()) > 0:
-            return max(intention_scores, key=intention_scores.get)
-        
-        return UserIntention.UNKNOWN
+    def _detect_intention(self, scan: Scan) -> UserIntention:
+        """تشخیص قصد کاربر - Detect user intention (highest score, first wins ties)"""
+        return self.matcher.best(scan, self.intent_keywords, UserIntention.UNKNOWN)
     
-    async def _analyze_sentiment(self, text: str) -> MessageSentiment:
-        """تحلیل احساسات - Analyze sentiment"""
-        sentiment_scores = {}
-        
-        for sentiment, patterns in self.sentiment_patterns.items():
-            score = 0
-            for pattern in patterns:
-                matches = len(re.findall(pattern, text, re.IGNORECASE))
-                score += matches
-            sentiment_scores[sentiment] = score
-        
-        # پیدا کردن بیشترین امتیاز - Find highest score
-        if sentiment_scores and max(sentiment_scores.values()) > 0:
-            return max(sentiment_scores, key=sentiment_scores.get)
-        
-        return MessageSentiment.NEUTRAL
+    def _analyze_sentiment(self, scan: Scan) -> MessageSentiment:
+        """تحلیل احساسات - Analyze sentiment (highest score, first wins ties)"""
+        return self.matcher.best(scan, self.sentiment_keywords, MessageSentiment.NEUTRAL)
     
-    async def _calculate_confidence(
+    def _calculate_confidence(
         self, 
-        text: str, 
+        scan: Scan, 
         intention: UserIntention, 
         sentiment: MessageSentiment
     ) -> float:
@@ -338,11 +334,9 @@ class MessageAnalyzer:
         if sentiment != MessageSentiment.NEUTRAL:
             base_score += 0.2
         
-        # افزایش امتیاز برای کلمات کلیدی - Increase score for keywords
-        for category, keywords in self.important_keywords.items():
-            for keyword in keywords:
-                if keyword in text.lower():
-                    base_score += 0.05
+        # افزایش امتیاز برای کلمات کلیدی - Each distinct important keyword present
+        for category in self.important_keywords:
+            base_score += 0.05 * len(set(scan.hits.get(category, ())))
         
         return min(base_score, 1.0)
     
@@ -357,6 +351,7 @@ class MessageAnalyzer:
 
 # نمونه سراسری تحلیل‌گر - Global analyzer instance
 message_analyzer = MessageAnalyzer()
+analysis_executor.register('messages', message_analyzer.matcher)
 
 # =============================================================================
 # سیستم مدیریت انتی‌اسپم - Anti-Spam Management System  
@@ -366,110 +361,41 @@ class AntiSpamManager:
     """مدیر انتی‌اسپم پیشرفته - Advanced Anti-Spam Manager"""
     
     def __init__(self):
-        self.user_message_history: Dict[int, deque] = defaultdict(lambda: deque(maxlen=20))
-        self.spam_scores: Dict[int, float] = defaultdict(float)
-        self.blocked_users: Dict[int, datetime] = {}
-        
         # تنظیمات انتی‌اسپم - Anti-spam settings
-        self.max_messages_per_minute = 10
-        self.max_duplicate_messages = 3
-        self.spam_threshold = 0.8
-        self.block_duration = timedelta(minutes=30)
-        
-        # الگوهای اسپم - Spam patterns
-        self.spam_patterns = [
-            r'(http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+)',  # URLs
-            r'(@[a-zA-Z0-9_]+)',  # Mentions
-            r'(\b[A-Z]{5,}\b)',  # All caps words
-            r'(.)\1{5,}',  # Repeated characters
-            r'(💰|💵|💸|🤑|💲)',  # Money emojis
-        ]
+        self.engine = SpamEngine(
+            max_messages_per_minute=10,
+            max_duplicate_messages=3,
+            spam_threshold=0.8,
+            block_duration=timedelta(minutes=30).total_seconds()
+        )
+        memory_governor.register('antispam_users', self.engine)
     
     async def check_message_spam(self, context: MessageContext) -> bool:
         """بررسی اسپم بودن پیام - Check if message is spam"""
+        return self.check_text(context.user_id, context.message.text or "")
+    
+    def check_text(self, user_id: int, text: str) -> bool:
+        """بررسی اسپم بدون بافت - Check a message by sender and text only (no I/O)"""
         try:
-            user_id = context.user_id
-            message_text = context.message.text or ""
-            current_time = datetime.now()
-            
-            # بررسی کاربران مسدود شده - Check blocked users
-            if user_id in self.blocked_users:
-                if current_time - self.blocked_users[user_id] < self.block_duration:
-                    return True  # Still blocked
-                else:
-                    del self.blocked_users[user_id]  # Unblock user
+            blocks = self.engine.blocks
+            if not self.engine.check(user_id, text):
+                return False
             
-            # افزودن پیام به تاریخچه - Add message to history
-            self.user_message_history[user_id].append({
-                'text': message_text,
-                'timestamp': current_time,
-                'hash': hashlib.md5(message_text.encode()).hexdigest()
-            })
-            
-            # محاسبه امتیاز اسپم - Calculate spam score
-            spam_score = await self._calculate_spam_score(user_id, message_text, current_time)
-            self.spam_scores[user_id] = spam_score
-            
-            # بررسی آستانه اسپم - Check spam threshold
-            if spam_score >= self.spam_threshold:
-                self.blocked_users[user_id] = current_time
-                security_logger.warning(f"User {user_id} blocked for spam (score: {spam_score:.2f})")
-                return True
-            
-            return False
+            if self.engine.blocks != blocks:
+                security_logger.warning(f"User {user_id} blocked for spam (score: {self.engine.get_score(user_id):.2f})")
+            return True
             
         except Exception as e:
             logger.error(f"Error checking spam: {e}")
             return False
     
-    async def _calculate_spam_score(self, user_id: int, message_text: str, current_time: datetime) -> float:
-        """محاسبه امتیاز اسپم - Calculate spam score"""
-        score = 0.0
-        user_history = self.user_message_history[user_id]
-        
-        # بررسی فرکانس پیام - Check message frequency
-        recent_messages = [
-            msg for msg in user_history 
-            if (current_time - msg['timestamp']).seconds < 60
-        ]
-        if len(recent_messages) > self.max_messages_per_minute:
-            score += 0.4
-        
-        # بررسی پیام‌های تکراری - Check duplicate messages
-        message_hash = hashlib.md5(message_text.encode()).hexdigest()
-        duplicate_count = sum(1 for msg in user_history if msg['hash'] == message_hash)
-        if duplicate_count > self.max_duplicate_messages:
-            score += 0.3
-        
-        # بررسی الگوهای اسپم - Check spam patterns
-        for pattern in self.spam_patterns:
-            if re.search(pattern, message_text, re.IGNORECASE):
-                score += 0.1
-        
-        # بررسی طول پیام - Check message length
-        if len(message_text) > 500:
-            score += 0.1
-        
-        # بررسی ایموجی‌های مشکوک - Check suspicious emojis
-        if len(re.findall(r'[🎰🎲🔞💰💵💸🤑💲]', message_text)) > 3:
-            score += 0.2
-        
-        return min(score, 1.0)
-    
     def get_user_spam_score(self, user_id: int) -> float:
         """دریافت امتیاز اسپم کاربر - Get user spam score"""
-        return self.spam_scores.get(user_id, 0.0)
+        return self.engine.get_score(user_id)
     
     def is_user_blocked(self, user_id: int) -> bool:
         """بررسی مسدود بودن کاربر - Check if user is blocked"""
-        if user_id not in self.blocked_users:
-            return False
-        
-        if datetime.now() - self.blocked_users[user_id] >= self.block_duration:
-            del self.blocked_users[user_id]
-            return False
-        
-        return True
+        return self.engine.is_blocked(user_id)
 
 # نمونه سراسری مدیر انتی‌اسپم - Global anti-spam manager instance
 anti_spam_manager = AntiSpamManager()
@@ -684,6 +610,204 @@ class SmartResponseSystem:
 # نمونه سراسری سیستم پاسخ هوشمند - Global smart response system instance
 smart_response_system = SmartResponseSystem()
 
+# =============================================================================
+# پیش‌فیلتر ارتباط - Relevance Pre-filter
+# =============================================================================
+
+# قصدهایی که پاسخ می‌گیرند - Intentions the bot answers in groups
+RESPONSE_INTENTIONS = (UserIntention.GET_HELP, UserIntention.PLAY_GAME, UserIntention.SUPPORT)
+
+# احتمال پاسخ تصادفی در گروه - Chance of an unprompted reply in basic groups
+RANDOM_REPLY_CHANCE = 0.05
+
+
+class Relevance(NamedTuple):
+    """نتیجه پیش‌فیلتر - Outcome of the zero-I/O relevance check"""
+    reason: Optional[str]  # private / mention / reply / keyword / chance, None for chatter
+    scan: Scan
+    is_bot_mentioned: bool
+    is_reply_to_bot: bool
+
+
+def assess_relevance(message: Message, bot_info: User, scan: Optional[Scan] = None) -> Relevance:
+    """
+    پیش‌فیلتر بدون I/O
+    Decide from the message alone whether a reply is plausible. Mirrors
+    ``should_bot_respond`` (including its random group reply, rolled here once)
+    so chatter that fails it can skip every database stage.
+    """
+    text = message.text or ""
+    if scan is None:
+        scan = message_analyzer.scan(text)
+    is_bot_mentioned = bool(bot_info.username) and f"@{bot_info.username.lower()}" in text.lower()
+    reply = message.reply_to_message
+    is_reply_to_bot = bool(reply and reply.from_user and reply.from_user.id == bot_info.id)
+    
+    if message.chat.type == "private":
+        reason = "private"
+    elif is_bot_mentioned:
+        reason = "mention"
+    elif is_reply_to_bot:
+        reason = "reply"
+    else:
+        intention = message_analyzer._detect_intention(scan)
+        sentiment = message_analyzer._analyze_sentiment(scan)
+        if (intention in RESPONSE_INTENTIONS
+                and message_analyzer._calculate_confidence(scan, intention, sentiment) > 0.7):
+            reason = "keyword"
+        elif message.chat.type == "group" and random.random() < RANDOM_REPLY_CHANCE:
+            reason = "chance"
+        else:
+            reason = None
+    return Relevance(reason, scan, is_bot_mentioned, is_reply_to_bot)
+
+
+def record_chatter(message: Message, relevance: Optional[Relevance] = None) -> None:
+    """ثبت گفتگوی عادی - In-memory counters only for messages the bot will not answer"""
+    user = message.from_user
+    hint = "fa" if (user.language_code or "").startswith("fa") else "en"
+    scan = relevance.scan if relevance is not None else None
+    analytics_collector.record(
+        user.id,
+        detect_message_type(message),
+        peek_lang(message.chat.id, user.id, hint),
+        message_analyzer._detect_intention(scan) if scan else None,
+        message_analyzer._analyze_sentiment(scan) if scan else None,
+        message.date
+    )
+    analytics_collector.touch(message.chat.id, user.id, message.date)
+
+# =============================================================================
+# دسته‌بندی عضویت‌ها - Join Burst Batching
+# =============================================================================
+
+# حداکثر نام‌ها در پیام خوشامد گروهی - Names listed in a combined welcome
+WELCOME_NAMES_SHOWN = 15
+
+
+def build_group_welcome(members: List[User], lang: str) -> str:
+    """خوشامد گروهی - One welcome message (HTML) for a burst of new members"""
+    # Names are escaped: one unbalanced markup character would reject the whole message
+    names = ", ".join(html.escape(member.first_name or "?") for member in members[:WELCOME_NAMES_SHOWN])
+    hidden = len(members) - WELCOME_NAMES_SHOWN
+    
+    if lang == "fa":
+        text = f"🎉 <b>به {len(members)} عضو جدید خوش آمدید!</b>\n\n👋 {names}"
+        if hidden > 0:
+            text += f" و {hidden} نفر دیگر"
+        text += "\n\n⚔️ اینجا می‌تونید با هم نبرد کنید، سلاح بخرید و مدال جمع کنید!\n"
+        text += "🎮 <b>برای شروع <code>/start</code> رو بزنید!</b>"
+    else:
+        text = f"🎉 <b>Welcome to our {len(members)} new members!</b>\n\n👋 {names}"
+        if hidden > 0:
+            text += f" and {hidden} more"
+        text += "\n\n⚔️ Battle each other, buy weapons and collect medals here!\n"
+        text += "🎮 <b>Hit <code>/start</code> to begin!</b>"
+    
+    return text
+
+
+async def welcome_members(chat_id: int, members: List[User], bot: AsyncTeleBot,
+                          db_manager: DBManager, chat_lang: str) -> None:
+    """ثبت و خوشامد دسته‌ای - Upsert a burst of members and send one welcome for all of them"""
+    users = [
+        (member.id, sanitize_text(member.first_name or "Unknown"), sanitize_text(member.username or ""))
+        for member in members
+    ]
+    joined = await db_manager.upsert_players_bulk(chat_id, users)
+    
+    if len(members) == 1:
+        # A returning player keeps their own language; a new one gets the group's
+        member = members[0]
+        player = joined.get(member.id)
+        lang = player['language'] if player and not player['inserted'] else chat_lang
+        text = random.choice(await generate_welcome_messages(member, lang, db_manager))
+        parse_mode = 'Markdown'
+    else:
+        lang = chat_lang
+        text = build_group_welcome(members, lang)
+        parse_mode = 'HTML'
+    
+    await bot.send_message(
+        chat_id,
+        text,
+        reply_markup=await create_welcome_keyboard(lang),
+        parse_mode=parse_mode
+    )
+    logger.info(f"Welcomed {len(members)} new member(s) in chat {chat_id}")
+
+
+class JoinBurstBatcher:
+    """دسته‌بندی عضویت‌ها - Collects joins per chat and onboards each burst at once"""
+    
+    def __init__(self, window: float = 3.0, max_batch: int = 200):
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: Dict[int, Dict[int, User]] = {}
+        self._context: Dict[int, Tuple[AsyncTeleBot, DBManager, str]] = {}
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+        self.bursts = 0
+        self.members = 0
+    
+    def add(self, chat_id: int, members: List[User], bot: AsyncTeleBot,
+            db_manager: DBManager, chat_lang: str) -> None:
+        """افزودن عضویت‌ها - Queue members; the chat's burst is onboarded when its window closes"""
+        pending = self._pending.setdefault(chat_id, {})
+        for member in members:
+            pending[member.id] = member
+        self._context[chat_id] = (bot, db_manager, chat_lang)
+        
+        if self.window <= 0 or len(pending) >= self.max_batch:
+            timer = self._timers.pop(chat_id, None)
+            if timer is not None:
+                timer.cancel()
+            self._due(chat_id)
+        elif chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.get_running_loop().call_later(self.window, self._due, chat_id)
+    
+    def _due(self, chat_id: int) -> None:
+        self._timers.pop(chat_id, None)
+        pending = self._pending.pop(chat_id, None)
+        bot, db_manager, chat_lang = self._context.pop(chat_id)
+        if not pending:
+            return
+        task = asyncio.get_running_loop().create_task(
+            self._onboard(chat_id, list(pending.values()), bot, db_manager, chat_lang))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+    
+    async def _onboard(self, chat_id: int, members: List[User], bot: AsyncTeleBot,
+                       db_manager: DBManager, chat_lang: str) -> None:
+        self.bursts += 1
+        self.members += len(members)
+        try:
+            await welcome_members(chat_id, members, bot, db_manager, chat_lang)
+        except Exception as e:
+            logger.error(f"Error onboarding {len(members)} new members in chat {chat_id}: {e}")
+    
+    async def stop(self) -> None:
+        """توقف - Onboard every open burst now and wait for it"""
+        for chat_id in list(self._timers):
+            self._timers.pop(chat_id).cancel()
+            self._due(chat_id)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Batcher statistics"""
+        return {
+            'open_bursts': len(self._pending),
+            'waiting_members': sum(len(pending) for pending in self._pending.values()),
+            'bursts': self.bursts,
+            'members': self.members,
+            'avg_burst_size': round(self.members / self.bursts, 2) if self.bursts else 0.0,
+        }
+
+
+# نمونه سراسری - Global join batcher
+join_batcher = JoinBurstBatcher(window=BOT_CONFIG.performance_settings.welcome_burst_window)
+
 # =============================================================================
 # مدیریت‌کننده‌های پیام پیشرفته - Enhanced Message Handlers
 # =============================================================================
@@ -708,18 +832,15 @@ async def handle_new_chat_members(message: Message, bot: AsyncTeleBot, db_manage
             chat_lang = "en"
         
         # بررسی اینکه آیا خود ربات اضافه شده - Check if bot itself was added
-        bot_info = await bot.get_me()
+        bot_info = await get_bot_info(bot)
         for new_member in message.new_chat_members:
             if new_member.id == bot_info.id:
                 await handle_bot_added_to_group(message, bot, db_manager, chat_lang)
                 return
         
-        # مدیریت اعضای جدید - Handle new members
-        for new_member in message.new_chat_members:
-            await handle_new_member_welcome(message, bot, db_manager, new_member, chat_lang)
-            
-        # ثبت آمار - Log statistics
-        await log_new_members_event(message, db_manager)
+        # اعضای جدید با یک درج گروهی و یک خوشامد در هر موج ثبت می‌شوند
+        # New members are upserted, logged and welcomed once per burst window
+        join_batcher.add(message.chat.id, message.new_chat_members, bot, db_manager, chat_lang)
         
     except Exception as e:
         logger.error(f"Error handling new chat members: {e}")
@@ -816,36 +937,9 @@ async def handle_new_member_welcome(
     new_member: User, 
     chat_lang: str
 ):
-    """خوشامدگویی پیشرفته به عضو جدید - Advanced welcome for new member"""
+    """خوشامدگویی پیشرفته به عضو جدید - Advanced welcome for new member (without batching)"""
     try:
-        # اطمینان از وجود کاربر در پایگاه داده - Ensure user exists in database
-        await ensure_player(message.chat.id, new_member, db_manager)
-        
-        # دریافت زبان ترجیحی کاربر - Get user preferred language
-        user_lang = await get_lang(message.chat.id, new_member.id, db_manager)
-        if not user_lang:
-            user_lang = chat_lang
-        
-        # تولید پیام خوشامدگویی شخصی‌سازی شده - Generate personalized welcome message
-        welcome_messages = await generate_welcome_messages(new_member, user_lang, db_manager)
-        selected_welcome = random.choice(welcome_messages)
-        
-        # ایجاد کیبورد خوشامدگویی - Create welcome keyboard
-        keyboard = await create_welcome_keyboard(user_lang)
-        
-        # ارسال پیام خوشامدگویی - Send welcome message
-        await bot.send_message(
-            message.chat.id,
-            selected_welcome,
-            reply_markup=keyboard,
-            parse_mode='Markdown'
-        )
-        
-        # ثبت آمار کاربر جدید - Log new user statistics
-        await db_manager.log_new_user_join(message.chat.id, new_member.id, user_lang)
-        
-        logger.info(f"New member welcomed: {new_member.id} in chat {message.chat.id}")
-        
+        await welcome_members(message.chat.id, [new_member], bot, db_manager, chat_lang)
     except Exception as e:
         logger.error(f"Error welcoming new member: {e}")
 
@@ -916,8 +1010,9 @@ async def generate_welcome_messages(user: User, lang: str, db_manager: DBManager
     
     return messages
 
-async def create_welcome_keyboard(lang: str) -> types.InlineKeyboardMarkup:
-    """ایجاد کیبورد خوشامدگویی - Create welcome keyboard"""
+@render_cache.screen('messages:welcome_keyboard')
+def _build_welcome_keyboard(lang: str, variant=None) -> FrozenMarkup:
+    """ساخت کیبورد خوشامدگویی - Build the welcome keyboard once per language"""
     keyboard = types.InlineKeyboardMarkup(row_width=2)
     
     if lang == "fa":
@@ -947,7 +1042,11 @@ async def create_welcome_keyboard(lang: str) -> types.InlineKeyboardMarkup:
             types.InlineKeyboardButton("🏆 Leaderboard", callback_data="go:leaderboard")
         )
     
-    return keyboard
+    return freeze_markup(keyboard)
+
+async def create_welcome_keyboard(lang: str) -> FrozenMarkup:
+    """ایجاد کیبورد خوشامدگویی - Create welcome keyboard"""
+    return render_cache.get('messages:welcome_keyboard', lang)
 
 async def handle_left_chat_member(message: Message, bot: AsyncTeleBot, db_manager: DBManager):
     """
@@ -964,7 +1063,7 @@ async def handle_left_chat_member(message: Message, bot: AsyncTeleBot, db_manage
     
     try:
         left_member = message.left_chat_member
-        bot_info = await bot.get_me()
+        bot_info = await get_bot_info(bot)
         
         # بررسی اینکه آیا خود ربات حذف شده - Check if bot itself was removed
         if left_member.id == bot_info.id:
@@ -1192,6 +1291,9 @@ async def handle_regular_message(message: Message, bot: AsyncTeleBot, db_manager
     مدیریت پیشرفته پیام‌های متنی عادی با تحلیل هوشمند
     Enhanced handling of regular text messages with intelligent analysis
     
+    Stages run cheapest first: in-memory anti-spam, then the zero-I/O relevance
+    pre-filter. Only messages that may get a reply reach the database.
+    
     Args:
         message (Message): Message object containing text
         bot (AsyncTeleBot): Bot instance
@@ -1202,27 +1304,38 @@ async def handle_regular_message(message: Message, bot: AsyncTeleBot, db_manager
         if message.text and message.text.startswith('/'):
             return
         
-        # اطمینان از وجود کاربر - Ensure user exists
-        await ensure_player(message.chat.id, message.from_user, db_manager)
+        # مرحله ۱: بررسی انتی‌اسپم در حافظه - Stage 1: in-memory anti-spam
+        if anti_spam_manager.check_text(message.from_user.id, message.text or ""):
+            context = await create_message_context(message, bot, db_manager)
+            await handle_spam_message(message, bot, db_manager, context)
+            return
         
-        # ایجاد بافت پیام - Create message context
+        # مرحله ۲: پیش‌فیلتر بدون I/O - Stage 2: zero-I/O relevance pre-filter
+        # (the keyword scan moves to the process pool while the loop is busy)
+        scan = await analysis_executor.scan('messages', message.text or "")
+        relevance = assess_relevance(message, await get_bot_info(bot), scan)
+        if relevance.reason is None:
+            record_chatter(message, relevance)
+            return
+        
+        # مرحله ۳: پاسخ محتمل است - Stage 3: a reply is plausible, load player and context
+        await ensure_player(message.chat.id, message.from_user, db_manager)
         context = await create_message_context(message, bot, db_manager)
         
-        # بررسی انتی‌اسپم - Check anti-spam
-        if await anti_spam_manager.check_message_spam(context):
-            await handle_spam_message(message, bot, db_manager, context)
-            return
+        # تحلیل پیام با همان پیمایش - Analyze message, reusing the pre-filter scan
+        context = await message_analyzer.analyze_message(context, relevance.scan)
+        await analytics_collector.collect_message_analytics(context)
+        analytics_collector.touch(context.chat_id, context.user_id, message.date)
         
-        # تحلیل پیام - Analyze message
-        context = await message_analyzer.analyze_message(context)
+        # بررسی نیاز به پاسخ - Check if response is needed
+        should_respond = relevance.reason == "chance" or await should_bot_respond(context, allow_random=False)
+        if not should_respond:
+            return
         
         # تولید پاسخ هوشمند - Generate smart response
         smart_response = await smart_response_system.generate_smart_response(context)
         
-        # بررسی نیاز به پاسخ - Check if response is needed
-        should_respond = await should_bot_respond(context)
-        
-        if should_respond and smart_response:
+        if smart_response:
             # ایجاد کیبورد - Create keyboard
             keyboard = await create_smart_response_keyboard(context)
             
@@ -1237,9 +1350,6 @@ async def handle_regular_message(message: Message, bot: AsyncTeleBot, db_manager
             # ثبت تعامل - Log interaction
             await log_message_interaction(context, smart_response, db_manager)
         
-        # به‌روزرسانی آمار کاربر - Update user statistics
-        await update_user_message_stats(context, db_manager)
-        
     except Exception as e:
         logger.error(f"Error handling regular message: {e}")
         await handle_message_processing_error(message, bot, db_manager, e)
@@ -1255,8 +1365,8 @@ async def create_message_context(message: Message, bot: AsyncTeleBot, db_manager
         chat_lang = await db_manager.get_chat_language(message.chat.id) or "en"
         
         # بررسی اشاره به ربات - Check bot mention
-        bot_info = await bot.get_me()
-        is_bot_mentioned = message.text and f"@{bot_info.username}" in message.text.lower()
+        bot_info = await get_bot_info(bot)
+        is_bot_mentioned = bool(message.text and bot_info.username) and f"@{bot_info.username.lower()}" in message.text.lower()
         is_reply_to_bot = message.reply_to_message and message.reply_to_message.from_user.id == bot_info.id
         
         # تولید هش پیام - Generate message hash
@@ -1341,8 +1451,8 @@ def detect_message_type(message: Message) -> MessageType:
     else:
         return MessageType.UNKNOWN
 
-async def should_bot_respond(context: MessageContext) -> bool:
-    """تعیین نیاز به پاسخ ربات - Determine if bot should respond"""
+async def should_bot_respond(context: MessageContext, allow_random: bool = True) -> bool:
+    """تعیین نیاز به پاسخ ربات - Determine if bot should respond (``allow_random`` rolls the group chance)"""
     # پاسخ در گفتگوی خصوصی - Always respond in private chats
     if context.is_private:
         return True
@@ -1352,20 +1462,11 @@ async def should_bot_respond(context: MessageContext) -> bool:
         return True
     
     # پاسخ بر اساس قصد - Respond based on intention
-    important_intentions = [
-        UserIntention.GET_HELP,
-        UserIntention.PLAY_GAME,
-        UserIntention.SUPPORT
-    ]
-    
-    if context.intention in important_intentions and context.confidence_score > 0.7:
+    if context.intention in RESPONSE_INTENTIONS and context.confidence_score > 0.7:
         return True
     
     # پاسخ تصادفی در گروه‌ها (۵٪ احتمال) - Random response in groups (5% chance)
-    if context.is_group and random.random() < 0.05:
-        return True
-    
-    return False
+    return allow_random and context.is_group and random.random() < RANDOM_REPLY_CHANCE
 
 async def create_smart_response_keyboard(context: MessageContext) -> types.InlineKeyboardMarkup:
     """ایجاد کیبورد پاسخ هوشمند - Create smart response keyboard"""
@@ -1591,24 +1692,6 @@ async def log_message_interaction(context: MessageContext, response: str, db_man
     except Exception as e:
         logger.error(f"Error logging message interaction: {e}")
 
-async def update_user_message_stats(context: MessageContext, db_manager: DBManager):
-    """به‌روزرسانی آمار پیام کاربر - Update user message statistics"""
-    try:
-        await db_manager.update_user_activity(
-            user_id=context.user_id,
-            chat_id=context.chat_id,
-            activity_type="message_sent",
-            activity_data={
-                "message_type": context.message_type.value,
-                "has_text": bool(context.message.text),
-                "message_length": len(context.message.text) if context.message.text else 0,
-                "timestamp": context.timestamp.isoformat()
-            }
-        )
-        
-    except Exception as e:
-        logger.error(f"Error updating user message stats: {e}")
-
 # =============================================================================
 # مدیریت پیشرفته ستاره‌های تلگرام - Advanced Telegram Stars Management
 # =============================================================================
@@ -1761,72 +1844,347 @@ async def send_stars_received_confirmation(
 # سیستم تحلیل و گزارش‌گیری - Analytics and Reporting System
 # =============================================================================
 
+# زبان‌هایی که جداگانه شمرده می‌شوند - Languages with their own counters
+ANALYTICS_LANGUAGES = ('en', 'fa')
+
+_LANG_METRICS = [f'lang_{lang}' for lang in (*ANALYTICS_LANGUAGES, 'other')]
+_INTENTION_METRICS = [f'intention_{intention.value}' for intention in UserIntention]
+_SENTIMENT_METRICS = [f'sentiment_{sentiment.value}' for sentiment in MessageSentiment]
+
+HOURLY_LAYOUT = CounterLayout(
+    ['total_messages'] + [f'type_{message_type.value}' for message_type in MessageType]
+    + _LANG_METRICS + _INTENTION_METRICS + _SENTIMENT_METRICS)
+USER_LAYOUT = CounterLayout(['message_count'] + _LANG_METRICS + _INTENTION_METRICS + _SENTIMENT_METRICS)
+
+
+class _HourBucket:
+    """سطل ساعتی - Counters and unique-user sketch of one local hour"""
+    __slots__ = ('counters', 'users')
+
+    def __init__(self):
+        self.counters = HOURLY_LAYOUT.new()
+        self.users = HyperLogLog()
+
+    def absorb(self, other: '_HourBucket') -> None:
+        for slot, value in enumerate(other.counters):
+            self.counters[slot] += value
+        self.users.merge(other.users)
+
+
+class _UserDay:
+    """تجمیع روزانه کاربر - A user's counters for one local day"""
+    __slots__ = ('counters', 'last_activity')
+
+    def __init__(self):
+        self.counters = USER_LAYOUT.new()
+        self.last_activity = 0
+
+    def absorb(self, other: '_UserDay') -> None:
+        for slot, value in enumerate(other.counters):
+            self.counters[slot] += value
+        self.last_activity = max(self.last_activity, other.last_activity)
+
+
 class MessageAnalyticsCollector:
-    """جمع‌آوری آنالیتیکس پیام - Message Analytics Collector"""
+    """
+    جمع‌آوری آنالیتیکس پیام - Message Analytics Collector
     
-    def __init__(self):
-        self.daily_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
-        self.hourly_stats: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
-        self.user_stats: Dict[int, Dict[str, Any]] = defaultdict(lambda: {
-            'message_count': 0,
-            'last_activity': datetime.now(),
-            'languages_used': set(),
-            'intentions_detected': defaultdict(int),
-            'sentiment_distribution': defaultdict(int)
-        })
+    Messages are counted into fixed-size per-hour buckets and per-(user, day)
+    counter arrays that are flushed periodically into the rollup tables with
+    upsert-add semantics. Reports read the rollups plus whatever is pending.
+    Players' ``last_active`` is written behind the same way, one batch per flush.
+    
+    Pending counters are not evictable: once ``flush_threshold`` users or
+    players are pending, a flush is started early instead.
+    """
+    
+    def __init__(self, flush_interval: float = 60.0, flush_threshold: int = 50_000,
+                 early_flush_gap: float = 1.0):
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.early_flush_gap = early_flush_gap
+        self.db_manager: Optional[DBManager] = None
+        self._hours: Dict[int, _HourBucket] = {}
+        self._users: Dict[Tuple[int, str], _UserDay] = {}
+        self._last_active: Dict[Tuple[int, int], int] = {}
+        self._early_flush: Optional[asyncio.Task] = None
+        self._next_early_flush = 0.0
+        self._bucket_start = 0
+        self._bucket_end = 0
+        self._day = ''
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.early_flushes = 0
+        self.flush_errors = 0
+    
+    def _check_pending(self) -> None:
+        """ذخیره زودهنگام - Start a flush when too much is pending (at most once per ``early_flush_gap``)"""
+        if max(len(self._users), len(self._last_active)) < self.flush_threshold:
+            return
+        if self.db_manager is None or self._early_flush is not None or time.monotonic() < self._next_early_flush:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._early_flush = loop.create_task(self._flush_early())
+    
+    async def _flush_early(self) -> None:
+        try:
+            self.early_flushes += 1
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Early message analytics flush failed: {e}")
+        finally:
+            # A failed flush keeps its rows pending; wait before trying again
+            self._next_early_flush = time.monotonic() + self.early_flush_gap
+            self._early_flush = None
+    
+    def _bucket(self, now: float) -> _HourBucket:
+        """سطل ساعت جاری - Bucket of the current local hour"""
+        if not self._bucket_start <= now < self._bucket_end:
+            hour = datetime.fromtimestamp(now).replace(minute=0, second=0, microsecond=0)
+            self._bucket_start = int(hour.timestamp())
+            self._bucket_end = self._bucket_start + 3600
+            self._day = hour.strftime('%Y-%m-%d')
+        bucket = self._hours.get(self._bucket_start)
+        if bucket is None:
+            bucket = self._hours[self._bucket_start] = _HourBucket()
+        return bucket
     
     async def collect_message_analytics(self, context: MessageContext):
         """جمع‌آوری آنالیتیکس پیام - Collect message analytics"""
+        if self.db_manager is None:
+            self.db_manager = context.db_manager
+        self.record(context.user_id, context.message_type, context.user_lang,
+                    context.intention, context.sentiment, int(context.timestamp.timestamp()))
+    
+    def record(self, user_id: int, message_type: MessageType, user_lang: str,
+               intention: Optional[UserIntention] = None, sentiment: Optional[MessageSentiment] = None,
+               timestamp: Optional[int] = None) -> None:
+        """ثبت پیام در شمارنده‌ها - Count one message (in memory only)"""
         try:
-            today = datetime.now().strftime('%Y-%m-%d')
-            current_hour = datetime.now().hour
+            MESSAGES_ANALYZED.inc(type=message_type.value, language=user_lang)
             
-            # آمار روزانه - Daily stats
-            self.daily_stats[today]['total_messages'] += 1
-            self.daily_stats[today][f'type_{context.message_type.value}'] += 1
-            self.daily_stats[today][f'lang_{context.user_lang}'] += 1
+            lang = user_lang if user_lang in ANALYTICS_LANGUAGES else 'other'
+            intention_metric = f'intention_{intention.value}' if intention else None
+            sentiment_metric = f'sentiment_{sentiment.value}' if sentiment else None
+            now = time.time()
             
-            if context.intention:
-                self.daily_stats[today][f'intention_{context.intention.value}'] += 1
+            # آمار ساعتی - Hourly bucket
+            bucket = self._bucket(now)
+            index = HOURLY_LAYOUT.index
+            counters = bucket.counters
+            counters[0] += 1
+            counters[index[f'type_{message_type.value}']] += 1
+            counters[index[f'lang_{lang}']] += 1
+            if intention_metric:
+                counters[index[intention_metric]] += 1
+            if sentiment_metric:
+                counters[index[sentiment_metric]] += 1
+            bucket.users.add(user_id)
             
-            if context.sentiment:
-                self.daily_stats[today][f'sentiment_{context.sentiment.value}'] += 1
+            # آمار کاربری - User day
+            key = (user_id, self._day)
+            user_day = self._users.get(key)
+            if user_day is None:
+                user_day = self._users[key] = _UserDay()
+            index = USER_LAYOUT.index
+            counters = user_day.counters
+            counters[0] += 1
+            counters[index[f'lang_{lang}']] += 1
+            if intention_metric:
+                counters[index[intention_metric]] += 1
+            if sentiment_metric:
+                counters[index[sentiment_metric]] += 1
+            user_day.last_activity = max(user_day.last_activity, int(now) if timestamp is None else timestamp)
+            self._check_pending()
             
-            # آمار ساعتی - Hourly stats
-            self.hourly_stats[current_hour]['total_messages'] += 1
-            self.hourly_stats[current_hour][f'lang_{context.user_lang}'] += 1
-            
-            # آمار کاربری - User stats
-            user_stat = self.user_stats[context.user_id]
-            user_stat['message_count'] += 1
-            user_stat['last_activity'] = context.timestamp
-            user_stat['languages_used'].add(context.user_lang)
+        except Exception as e:
+            logger.error(f"Error collecting message analytics: {e}")
+    
+    def touch(self, chat_id: int, user_id: int, timestamp: Optional[int] = None) -> None:
+        """ثبت آخرین فعالیت - Remember a player's last activity, written with the next flush"""
+        timestamp = int(time.time()) if timestamp is None else timestamp
+        key = (chat_id, user_id)
+        if self._last_active.get(key, 0) < timestamp:
+            self._last_active[key] = timestamp
+        self._check_pending()
+    
+    # =========================================================================
+    # ذخیره در پایگاه داده - Flushing
+    # =========================================================================
+    
+    async def flush(self) -> bool:
+        """ذخیره تجمیع‌ها - Write pending counters to the rollup tables"""
+        if self.db_manager is None or not (self._hours or self._users or self._last_active):
+            return True
+        
+        async with self._flush_lock:
+            # Swap out pending state; messages during the write go to fresh buckets
+            hours, self._hours = self._hours, {}
+            users = list(self._users.items())
+            self._users.clear()
             
-            if context.intention:
-                user_stat['intentions_detected'][context.intention.value] += 1
+            hourly_rows = [
+                (start, name, value)
+                for start, bucket in hours.items()
+                for name, value in HOURLY_LAYOUT.nonzero(bucket.counters)
+            ]
+            user_rows = []
+            for (user_id, day), user_day in users:
+                user_rows.extend((user_id, day, name, value) for name, value in USER_LAYOUT.nonzero(user_day.counters))
+                user_rows.append((user_id, day, 'last_activity', user_day.last_activity))
+            sketches = [(start, bucket.users.to_list()) for start, bucket in hours.items() if bucket.users]
             
-            if context.sentiment:
-                user_stat['sentiment_distribution'][context.sentiment.value] += 1
+            try:
+                flushed = await self.db_manager.upsert_message_rollups(hourly_rows, user_rows, sketches)
+            except Exception as e:
+                logger.error(f"Error flushing message analytics: {e}")
+                flushed = False
             
-        except Exception as e:
-            logger.error(f"Error collecting message analytics: {e}")
+            if not flushed:
+                self._restore(hours, users)
+                self.flush_errors += 1
+                return False
+            self.flushes += 1
+            return await self._flush_last_active()
+    
+    async def _flush_last_active(self) -> bool:
+        """ذخیره آخرین فعالیت‌ها - One batched players.last_active update"""
+        if not self._last_active:
+            return True
+        touched = list(self._last_active.items())
+        self._last_active.clear()
+        rows = [(chat_id, user_id, timestamp) for (chat_id, user_id), timestamp in touched]
+        if await self.db_manager.touch_players(rows):
+            return True
+        for key, timestamp in touched:
+            if self._last_active.get(key, 0) < timestamp:
+                self._last_active[key] = timestamp
+        self.flush_errors += 1
+        return False
+    
+    def _restore(self, hours: Dict[int, _HourBucket], users: List[Tuple[Tuple[int, str], _UserDay]]) -> None:
+        """بازگرداندن پس از خطا - Merge unflushed state back for the next attempt"""
+        for start, bucket in hours.items():
+            current = self._hours.get(start)
+            if current is None:
+                self._hours[start] = bucket
+            else:
+                current.absorb(bucket)
+        for key, user_day in users:
+            current = self._users.get(key)
+            if current is None:
+                self._users[key] = user_day
+            else:
+                current.absorb(user_day)
+    
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Message analytics flush loop error: {e}")
+    
+    def start(self, db_manager: DBManager, flush_interval: Optional[float] = None) -> None:
+        """شروع ذخیره دوره‌ای - Start periodic flushing on the running loop"""
+        self.db_manager = db_manager
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Message analytics rollups flushing every {self.flush_interval}s")
     
-    def get_daily_report(self, date: str = None) -> Dict[str, Any]:
+    async def stop(self) -> None:
+        """توقف و ذخیره نهایی - Stop periodic flushing and flush what is pending"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+    
+    # =========================================================================
+    # گزارش‌ها - Reports
+    # =========================================================================
+    
+    async def get_daily_report(self, date: str = None) -> Dict[str, Any]:
         """دریافت گزارش روزانه - Get daily report"""
         if not date:
             date = datetime.now().strftime('%Y-%m-%d')
         
-        return dict(self.daily_stats.get(date, {}))
+        try:
+            day = datetime.strptime(date, '%Y-%m-%d')
+            start = int(day.timestamp())
+            end = int((day + timedelta(days=1)).timestamp())
+            
+            report: Dict[str, Any] = {}
+            unique_users = HyperLogLog()
+            if self.db_manager is not None:
+                report.update(await self.db_manager.get_message_rollups(start, end))
+                for registers in await self.db_manager.get_message_sketches(start, end):
+                    unique_users.merge(HyperLogLog(registers=registers))
+            
+            # هنوز ذخیره نشده - Not flushed yet
+            for bucket_start, bucket in self._hours.items():
+                if start <= bucket_start < end:
+                    for name, value in HOURLY_LAYOUT.nonzero(bucket.counters):
+                        report[name] = report.get(name, 0) + value
+                    unique_users.merge(bucket.users)
+            
+            if report:
+                report['unique_users'] = unique_users.count()
+            return report
+        except Exception as e:
+            logger.error(f"Error getting daily analytics report: {e}")
+            return {}
     
-    def get_user_summary(self, user_id: int) -> Dict[str, Any]:
-        """دریافت خلاصه کاربر - Get user summary"""
-        user_stat = self.user_stats.get(user_id, {})
+    async def get_user_summary(self, user_id: int, days: int = 30) -> Dict[str, Any]:
+        """دریافت خلاصه کاربر - Get user summary over the last ``days`` days"""
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
         
-        # تبدیل set به list برای JSON serialization
-        if 'languages_used' in user_stat:
-            user_stat['languages_used'] = list(user_stat['languages_used'])
-        
-        return user_stat
+        try:
+            totals: Dict[str, int] = {}
+            if self.db_manager is not None:
+                totals.update(await self.db_manager.get_user_message_rollup(user_id, since))
+            
+            # هنوز ذخیره نشده - Not flushed yet
+            for (pending_user, day), user_day in self._users.items():
+                if pending_user != user_id or day < since:
+                    continue
+                for name, value in USER_LAYOUT.nonzero(user_day.counters):
+                    totals[name] = totals.get(name, 0) + value
+                totals['last_activity'] = max(totals.get('last_activity', 0), user_day.last_activity)
+            
+            if not totals.get('message_count'):
+                return {}
+            
+            def with_prefix(prefix: str) -> Dict[str, int]:
+                return {name[len(prefix):]: value for name, value in totals.items()
+                        if name.startswith(prefix) and value}
+            
+            return {
+                'message_count': totals['message_count'],
+                'last_activity': datetime.fromtimestamp(totals.get('last_activity', 0)),
+                'languages_used': list(with_prefix('lang_')),
+                'intentions_detected': with_prefix('intention_'),
+                'sentiment_distribution': with_prefix('sentiment_')
+            }
+        except Exception as e:
+            logger.error(f"Error getting user analytics summary: {e}")
+            return {}
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Collector statistics"""
+        return {
+            'pending_hours': len(self._hours),
+            'pending_user_days': len(self._users),
+            'pending_last_active': len(self._last_active),
+            'flushes': self.flushes,
+            'early_flushes': self.early_flushes,
+            'flush_errors': self.flush_errors,
+        }
 
 # نمونه سراسری جمع‌آوری آنالیتیکس - Global analytics collector instance
 analytics_collector = MessageAnalyticsCollector()
@@ -1835,6 +2193,14 @@ analytics_collector = MessageAnalyticsCollector()
 # سیستم ثبت مدیریت‌کننده‌ها - Handler Registration System
 # =============================================================================
 
+def is_official_telegram_forward(message: Message) -> bool:
+    """بررسی فوروارد خودکار از کانال رسمی تلگرام - Check automatic forward from official Telegram"""
+    return bool(
+        getattr(message, 'is_automatic_forward', False) and
+        getattr(message, 'forward_from_chat', None) and
+        message.forward_from_chat.username == 'telegram'
+    )
+
 def register_message_handlers(bot: AsyncTeleBot, db_manager: DBManager):
     """
     ثبت مدیریت‌کننده‌های پیشرفته پیام
@@ -1848,7 +2214,7 @@ def register_message_handlers(bot: AsyncTeleBot, db_manager: DBManager):
     logger.info("ثبت مدیریت‌کننده‌های پیشرفته پیام با عملکرد جامع")
     
     # ثبت مدیریت‌کننده اعضای جدید - Register new members handler
-    @bot.message_handler(content_types=['new_chat_members'])
+    @router.content('new_chat_members')
     async def enhanced_new_chat_members_handler(message):
         """مدیریت‌کننده پیشرفته اعضای جدید - Enhanced new members handler"""
         try:
@@ -1857,7 +2223,7 @@ def register_message_handlers(bot: AsyncTeleBot, db_manager: DBManager):
             logger.error(f"Error in new chat members handler: {e}")
     
     # ثبت مدیریت‌کننده خروج اعضا - Register left members handler
-    @bot.message_handler(content_types=['left_chat_member'])
+    @router.content('left_chat_member')
     async def enhanced_left_chat_member_handler(message):
         """مدیریت‌کننده پیشرفته خروج اعضا - Enhanced left members handler"""
         try:
@@ -1866,7 +2232,7 @@ def register_message_handlers(bot: AsyncTeleBot, db_manager: DBManager):
             logger.error(f"Error in left chat member handler: {e}")
     
     # ثبت مدیریت‌کننده پرداخت موفق - Register successful payment handler
-    @bot.message_handler(content_types=['successful_payment'])
+    @router.content('successful_payment')
     async def enhanced_successful_payment_handler(message):
         """مدیریت‌کننده پیشرفته پرداخت موفق - Enhanced successful payment handler"""
         try:
@@ -1875,7 +2241,7 @@ def register_message_handlers(bot: AsyncTeleBot, db_manager: DBManager):
             logger.error(f"Error in successful payment handler: {e}")
     
     # ثبت مدیریت‌کننده داده‌های وب اپ - Register web app data handler
-    @bot.message_handler(content_types=['web_app_data'])
+    @router.content('web_app_data')
     async def enhanced_web_app_data_handler(message):
         """مدیریت‌کننده پیشرفته داده‌های وب اپ - Enhanced web app data handler"""
         try:
@@ -1884,13 +2250,7 @@ def register_message_handlers(bot: AsyncTeleBot, db_manager: DBManager):
             logger.error(f"Error in web app data handler: {e}")
     
     # ثبت مدیریت‌کننده ستاره‌های دریافتی - Register TG stars received handler
-    @bot.message_handler(
-        func=lambda m: (
-            hasattr(m, 'is_automatic_forward') and m.is_automatic_forward and
-            hasattr(m, 'forward_from_chat') and m.forward_from_chat and
-            m.forward_from_chat.username == 'telegram'
-        )
-    )
+    @router.content('text', func=is_official_telegram_forward, name='text:tg_stars_forward')
     async def enhanced_tg_stars_received_handler(message):
         """مدیریت‌کننده پیشرفته ستاره‌های دریافتی - Enhanced TG stars received handler"""
         try:
@@ -1899,16 +2259,11 @@ def register_message_handlers(bot: AsyncTeleBot, db_manager: DBManager):
             logger.error(f"Error in TG stars received handler: {e}")
     
     # ثبت مدیریت‌کننده پیام‌های متنی - Register text messages handler
-    @bot.message_handler(func=lambda m: True, content_types=['text'])
+    @router.content('text')
     async def enhanced_regular_message_handler(message):
         """مدیریت‌کننده پیشرفته پیام‌های متنی - Enhanced text messages handler"""
         try:
-            # جمع‌آوری آنالیتیکس - Collect analytics
-            if not (message.text and message.text.startswith('/')):
-                context = await create_message_context(message, bot, db_manager)
-                await analytics_collector.collect_message_analytics(context)
-            
-            # پردازش پیام - Process message
+            # پردازش پیام (آنالیتیکس در همان مسیر) - Process message; analytics are collected on the way
             await handle_regular_message(message, bot, db_manager)
             
         except Exception as e:
@@ -1916,19 +2271,12 @@ def register_message_handlers(bot: AsyncTeleBot, db_manager: DBManager):
             await handle_message_processing_error(message, bot, db_manager, e)
     
     # ثبت مدیریت‌کننده سایر انواع محتوا - Register other content types handlers
-    @bot.message_handler(content_types=['photo', 'video', 'document', 'audio', 'voice', 'sticker'])
+    @router.content('photo', 'video', 'document', 'audio', 'voice', 'sticker')
     async def enhanced_media_message_handler(message):
         """مدیریت‌کننده پیشرفته پیام‌های رسانه‌ای - Enhanced media messages handler"""
         try:
-            # اطمینان از وجود کاربر - Ensure user exists
-            await ensure_player(message.chat.id, message.from_user, db_manager)
-            
-            # جمع‌آوری آنالیتیکس - Collect analytics
-            context = await create_message_context(message, bot, db_manager)
-            await analytics_collector.collect_message_analytics(context)
-            
-            # به‌روزرسانی آمار فعالیت - Update activity stats
-            await update_user_message_stats(context, db_manager)
+            # رسانه پاسخی نمی‌گیرد؛ فقط شمارنده‌های درون‌حافظه - Media gets no reply; in-memory counters only
+            record_chatter(message)
             
         except Exception as e:
             logger.error(f"Error in media message handler: {e}")
@@ -1970,6 +2318,10 @@ __all__ = [
     # Enhanced functionality
     'handle_bot_added_to_group',
     'handle_new_member_welcome',
+    'welcome_members',
+    'build_group_welcome',
+    'JoinBurstBatcher',
+    'join_batcher',
     'handle_bot_removed_from_group',
     'handle_user_left_group',
     'process_successful_stars_payment',
@@ -1998,6 +2350,8 @@ __all__ = [
     
     # Helper functions
     'create_message_context',
+    'assess_relevance',
+    'Relevance',
     'detect_message_type',
     'should_bot_respond',
     'create_smart_response_keyboard',
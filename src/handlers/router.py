@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+مسیریاب مرکزی پیام‌ها و کالبک‌ها
+Central Message and Callback Router
+
+به جای ثبت ده‌ها هندلر با شرط‌های lambda که تلگرام‌بات برای هر آپدیت به ترتیب
+بررسی می‌کند، تمام مسیرها یک بار در زمان ثبت در ساختارهای زیر ساخته می‌شوند:
+- نقشه هش نام دستورات (commands)
+- درخت پیشوند (trie) برای داده‌های کالبک
+- سطل‌های نوع محتوا (content types)
+
+Instead of dozens of lambda-filtered handlers that the bot scans linearly for
+every update, routes are built once at registration time into a command hash
+map, a callback-prefix trie and content-type buckets. Two dispatch handlers are
+installed on the bot and every route records hit and latency counters.
+
+Resolution keeps the previous first-registered-wins semantics: when several
+routes match an update, the one registered earliest handles it.
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from telebot.async_telebot import AsyncTeleBot
+
+from src.utils.metrics import HANDLER_ERRORS, HANDLER_LATENCY
+from src.utils.keywords import normalize_text
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[..., Any]
+Predicate = Callable[[Any], bool]
+
+# =============================================================================
+# آمار مسیرها - Route Statistics
+# =============================================================================
+
+@dataclass
+class RouteStats:
+    """آمار یک مسیر - Per-route hit and latency counters"""
+    hits: int = 0
+    errors: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    def record(self, elapsed: float, success: bool) -> None:
+        """ثبت یک اجرا - Record a single dispatch"""
+        self.hits += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+        if not success:
+            self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """تبدیل به دیکشنری - Convert to dictionary"""
+        return {
+            'hits': self.hits,
+            'errors': self.errors,
+            'avg_ms': round(self.total_time / self.hits * 1000, 3) if self.hits else 0.0,
+            'max_ms': round(self.max_time * 1000, 3),
+            'total_s': round(self.total_time, 3),
+        }
+
+
+@dataclass
+class Route:
+    """مسیر ثبت‌شده - Registered route"""
+    name: str
+    kind: str
+    handler: Handler
+    seq: int
+    predicate: Optional[Predicate] = None
+    stats: RouteStats = field(default_factory=RouteStats)
+
+
+class _TrieNode:
+    """گره درخت پیشوند - Callback prefix trie node"""
+    __slots__ = ('children', 'prefix_route', 'exact_route')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.prefix_route: Optional[Route] = None
+        self.exact_route: Optional[Route] = None
+
+# =============================================================================
+# مسیریاب - Router
+# =============================================================================
+
+class MessageRouter:
+    """مسیریاب مرکزی - Central router for messages and callback queries"""
+
+    def __init__(self):
+        self._seq = 0
+        self._routes: List[Route] = []
+        self._commands: Dict[str, Route] = {}
+        self._text_triggers: Dict[str, Route] = {}
+        self._content_buckets: Dict[str, List[Route]] = {}
+        self._callback_root = _TrieNode()
+        # First segment of every registered callback prefix; bounds metric labels
+        self._callback_actions: Set[str] = set()
+        self._installed = False
+        self.unrouted_messages = 0
+        self.unrouted_callbacks = 0
+        # Handlers currently running; a queue-depth signal for load shedding
+        self.in_flight = 0
+
+    # -------------------------------------------------------------------------
+    # ثبت مسیرها - Route registration
+    # -------------------------------------------------------------------------
+
+    def _new_route(self, name: str, kind: str, handler: Handler,
+                   predicate: Optional[Predicate] = None) -> Route:
+        self._seq += 1
+        route = Route(name=name, kind=kind, handler=handler, seq=self._seq, predicate=predicate)
+        self._routes.append(route)
+        return route
+
+    def command(self, *names: str):
+        """ثبت دستور - Register a handler for one or more /commands"""
+        def decorator(func: Handler) -> Handler:
+            route = self._new_route(f"cmd:{'|'.join(names)}", 'command', func)
+            for name in names:
+                key = name.lower()
+                if key in self._commands:
+                    logger.debug(f"Command /{key} already routed to {self._commands[key].name}, keeping first")
+                    continue
+                self._commands[key] = route
+            return func
+        return decorator
+
+    def text_trigger(self, *phrases: str):
+        """ثبت کلمه محرک - Register a handler for exact text triggers (case and Arabic/Persian forms folded)"""
+        def decorator(func: Handler) -> Handler:
+            route = self._new_route(f"text:{'|'.join(phrases)}", 'text_trigger', func)
+            for phrase in phrases:
+                self._text_triggers.setdefault(normalize_text(phrase.strip()), route)
+            return func
+        return decorator
+
+    def content(self, *content_types: str, func: Optional[Predicate] = None, name: Optional[str] = None):
+        """ثبت نوع محتوا - Register a handler for content types, optionally filtered"""
+        def decorator(handler: Handler) -> Handler:
+            route_name = name or f"content:{'|'.join(content_types)}"
+            route = self._new_route(route_name, 'content', handler, predicate=func)
+            for content_type in content_types:
+                self._content_buckets.setdefault(content_type, []).append(route)
+            return handler
+        return decorator
+
+    def callback(self, prefix: str = "", exact: bool = False):
+        """
+        ثبت کالبک بر اساس پیشوند - Register a callback handler by data prefix
+
+        An empty prefix acts as the catch-all route. With ``exact=True`` the
+        route only matches callback data equal to ``prefix``.
+        """
+        def decorator(func: Handler) -> Handler:
+            route = self._new_route(f"cb:{prefix or '*'}{'' if not exact else '='}", 'callback', func)
+            if prefix:
+                self._callback_actions.add(prefix.split(':', 1)[0])
+            node = self._callback_root
+            for char in prefix:
+                node = node.children.setdefault(char, _TrieNode())
+            if exact:
+                if node.exact_route is None:
+                    node.exact_route = route
+            elif node.prefix_route is None:
+                node.prefix_route = route
+            return func
+        return decorator
+
+    # -------------------------------------------------------------------------
+    # تطبیق - Resolution
+    # -------------------------------------------------------------------------
+
+    def resolve_callback(self, data: str) -> Optional[Route]:
+        """یافتن مسیر کالبک - Resolve callback data via the prefix trie"""
+        best = self._callback_root.prefix_route
+        node = self._callback_root
+        for char in data or "":
+            node = node.children.get(char)
+            if node is None:
+                return best
+            route = node.prefix_route
+            if route is not None and (best is None or route.seq < best.seq):
+                best = route
+        route = node.exact_route
+        if route is not None and (best is None or route.seq < best.seq):
+            best = route
+        return best
+
+    def callback_label(self, data: str) -> str:
+        """برچسب کالبک - The registered prefix ``data`` starts with (before ':'), or 'other'"""
+        action = (data or "").split(':', 1)[0]
+        return action if action in self._callback_actions else 'other'
+
+    def resolve_message(self, message) -> Optional[Route]:
+        """یافتن مسیر پیام - Resolve a message to its route"""
+        content_type = getattr(message, 'content_type', None) or 'text'
+
+        if content_type == 'text' and message.text:
+            text = message.text
+            if text.startswith('/'):
+                command = text.split(maxsplit=1)[0][1:].split('@', 1)[0].lower()
+                route = self._commands.get(command)
+                if route is not None:
+                    return route
+            elif self._text_triggers:
+                route = self._text_triggers.get(normalize_text(text.strip()))
+                if route is not None:
+                    return route
+
+        for route in self._content_buckets.get(content_type, ()):
+            if route.predicate is None:
+                return route
+            try:
+                if route.predicate(message):
+                    return route
+            except Exception as e:
+                logger.debug(f"Route predicate {route.name} failed: {e}")
+        return None
+
+    # -------------------------------------------------------------------------
+    # اجرا - Dispatch
+    # -------------------------------------------------------------------------
+
+    async def _run(self, route: Route, update) -> None:
+        start = time.perf_counter()
+        success = True
+        self.in_flight += 1
+        try:
+            await route.handler(update)
+        except Exception:
+            success = False
+            raise
+        finally:
+            self.in_flight -= 1
+            elapsed = time.perf_counter() - start
+            route.stats.record(elapsed, success)
+            HANDLER_LATENCY.observe(elapsed, route=route.name)
+            if not success:
+                HANDLER_ERRORS.inc(route=route.name)
+
+    async def dispatch_message(self, message) -> None:
+        """ارسال پیام به مسیر - Dispatch a message to its route"""
+        route = self.resolve_message(message)
+        if route is None:
+            self.unrouted_messages += 1
+            return
+        await self._run(route, message)
+
+    async def dispatch_callback(self, call) -> None:
+        """ارسال کالبک به مسیر - Dispatch a callback query to its route"""
+        route = self.resolve_callback(call.data)
+        if route is None:
+            self.unrouted_callbacks += 1
+            return
+        await self._run(route, call)
+
+    def install(self, bot: AsyncTeleBot) -> None:
+        """نصب روی ربات - Install the two dispatch handlers on the bot"""
+        if self._installed:
+            logger.warning("Router already installed, skipping")
+            return
+
+        content_types = set(self._content_buckets)
+        if self._commands or self._text_triggers:
+            content_types.add('text')
+
+        bot.register_message_handler(self.dispatch_message, content_types=sorted(content_types))
+        bot.register_callback_query_handler(self.dispatch_callback, func=lambda call: True)
+        self._installed = True
+
+        logger.info(
+            f"Router installed: {len(self._commands)} commands, {len(self._text_triggers)} text triggers, "
+            f"{len(content_types)} content types, {sum(1 for r in self._routes if r.kind == 'callback')} callback routes"
+        )
+        logger.info("مسیریاب مرکزی نصب شد")
+
+    # -------------------------------------------------------------------------
+    # گزارش - Reporting
+    # -------------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """دریافت آمار مسیرها - Get per-route statistics"""
+        return {
+            'routes': {route.name: route.stats.to_dict() for route in self._routes},
+            'unrouted_messages': self.unrouted_messages,
+            'unrouted_callbacks': self.unrouted_callbacks,
+            'in_flight': self.in_flight,
+        }
+
+    def iter_routes(self) -> Iterable[Route]:
+        """پیمایش مسیرها - Iterate registered routes"""
+        return iter(self._routes)
+
+
+# نمونه سراسری مسیریاب - Global router instance
+router = MessageRouter()
+
+__all__ = ['MessageRouter', 'Route', 'RouteStats', 'router']
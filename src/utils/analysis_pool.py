@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+اجرای تحلیل متن در پروسه‌های جداگانه هنگام بار زیاد
+Offloading Text Analysis to a Process Pool under Load
+
+پیمایش کلیدواژه‌ها کار خالص CPU روی حلقه رویداد است. در حالت عادی درجا
+اجرا می‌شود؛ وقتی تأخیر حلقه یا تعداد مدیریت‌کننده‌های در حال اجرا از
+آستانه بگذرد، متن‌ها دسته‌ای به پروسه‌های کارگر فرستاده می‌شوند.
+
+Workers are spawned (not forked: the bot process runs threads and a database
+pool) and pre-warmed with every registered matcher rebuilt from its lexicon,
+so a batch costs one pickle round trip. Labels cross the process boundary as
+integer indexes, which keeps handler-module enums out of the workers.
+
+Once load crosses a threshold the executor keeps offloading for ``hold``
+seconds, so the switch does not flap as the lag it relieves drops. Any
+worker failure falls back to scanning inline.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from src.utils.keywords import KeywordMatcher, Scan
+from src.utils.metrics import ANALYSIS_RUNS, ANALYSIS_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+IndexedLexicon = Dict[int, Dict[str, float]]
+RawScan = Tuple[Dict[int, float], Dict[int, List[str]]]
+
+# =============================================================================
+# سمت کارگر - Worker side
+# =============================================================================
+
+_worker_matchers: Dict[str, KeywordMatcher] = {}
+
+
+def _init_worker(lexicons: Dict[str, IndexedLexicon]) -> None:
+    """آماده‌سازی کارگر - Compile every matcher once per worker process"""
+    for name, lexicon in lexicons.items():
+        _worker_matchers[name] = KeywordMatcher(lexicon)
+
+
+def _ping() -> bool:
+    return bool(_worker_matchers)
+
+
+def _scan_batch(items: List[Tuple[str, str]]) -> List[RawScan]:
+    """پیمایش دسته‌ای - Scan (matcher name, text) pairs with index labels"""
+    results = []
+    for name, text in items:
+        scan = _worker_matchers[name].scan(text)
+        results.append((scan.scores, scan.hits))
+    return results
+
+# =============================================================================
+# اجراکننده - Executor
+# =============================================================================
+
+class AnalysisExecutor:
+    """اجراکننده تحلیل - Runs keyword scans inline or on a process pool depending on load"""
+
+    def __init__(self, workers: int = 2, lag_threshold: float = 0.05, depth_threshold: int = 32,
+                 batch_size: int = 32, batch_delay: float = 0.005, hold: float = 5.0):
+        self.workers = workers
+        self.lag_threshold = lag_threshold
+        self.depth_threshold = depth_threshold
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.hold = hold
+
+        self._matchers: Dict[str, KeywordMatcher] = {}
+        self._lag_probe: Optional[Callable[[], float]] = None
+        self._depth_probe: Optional[Callable[[], int]] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._queue: Deque[Tuple[str, str, asyncio.Future]] = deque()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._offload_until = 0.0
+        self.inline = 0
+        self.offloaded = 0
+        self.fallbacks = 0
+        self.batches = 0
+
+    def register(self, name: str, matcher: KeywordMatcher) -> KeywordMatcher:
+        """ثبت تطبیق‌دهنده - Make a matcher available to ``scan`` (before ``start``)"""
+        self._matchers[name] = matcher
+        return matcher
+
+    def set_probes(self, lag: Optional[Callable[[], float]] = None,
+                   depth: Optional[Callable[[], int]] = None) -> None:
+        """تنظیم سنجه‌های بار - Loop lag (seconds) and in-flight work probes"""
+        self._lag_probe = lag
+        self._depth_probe = depth
+
+    @property
+    def running(self) -> bool:
+        return self._pool is not None
+
+    # -------------------------------------------------------------------------
+    # چرخه عمر - Lifecycle
+    # -------------------------------------------------------------------------
+
+    async def start(self) -> None:
+        """شروع استخر - Spawn and pre-warm the workers on the running loop"""
+        if self._pool is not None or not self._matchers:
+            return
+        lexicons = {
+            name: {index: matcher.lexicon[label] for index, label in enumerate(matcher.labels)}
+            for name, matcher in self._matchers.items()
+        }
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(lexicons,),
+        )
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(self._pool, _ping) for _ in range(self.workers)))
+        except Exception as e:
+            logger.error(f"Analysis pool failed to start, scanning inline: {e}")
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            return
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.workers * 2)
+        self._task = loop.create_task(self._drain())
+        logger.info(f"Analysis pool started ({self.workers} workers, offload at lag>={self.lag_threshold}s "
+                    f"or depth>={self.depth_threshold})")
+
+    async def stop(self) -> None:
+        """توقف استخر - Finish queued scans inline and shut the workers down"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        while self._queue:
+            name, text, future = self._queue.popleft()
+            if not future.done():
+                future.set_result(self._matchers[name].scan(text))
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # -------------------------------------------------------------------------
+    # تصمیم و اجرا - Switching and scanning
+    # -------------------------------------------------------------------------
+
+    def _should_offload(self) -> bool:
+        if self._pool is None:
+            return False
+        now = time.monotonic()
+        lag = self._lag_probe() if self._lag_probe is not None else 0.0
+        depth = (self._depth_probe() if self._depth_probe is not None else 0) + len(self._queue)
+        if lag >= self.lag_threshold or depth >= self.depth_threshold:
+            self._offload_until = now + self.hold
+        return now < self._offload_until
+
+    async def scan(self, name: str, text: str) -> Scan:
+        """پیمایش متن - Scan ``text`` with the named matcher, offloaded when the loop is busy"""
+        matcher = self._matchers[name]
+        if not self._should_offload():
+            self.inline += 1
+            ANALYSIS_RUNS.inc(mode='inline')
+            return matcher.scan(text)
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((name, text, future))
+        self._wake.set()
+        return await future
+
+    async def _drain(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if len(self._queue) < self.batch_size:
+                # Let a burst accumulate into one batch
+                await asyncio.sleep(self.batch_delay)
+            ANALYSIS_QUEUE_DEPTH.set(len(self._queue))
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                await self._slots.acquire()
+                asyncio.get_running_loop().create_task(self._submit(batch))
+
+    async def _submit(self, batch: List[Tuple[str, str, asyncio.Future]]) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+            try:
+                results = await loop.run_in_executor(
+                    self._pool, _scan_batch, [(name, text) for name, text, _ in batch])
+            except Exception as e:
+                self.fallbacks += len(batch)
+                ANALYSIS_RUNS.inc(len(batch), mode='fallback')
+                logger.warning(f"Analysis pool batch failed, scanning inline: {e}")
+                for name, text, future in batch:
+                    if not future.done():
+                        future.set_result(self._matchers[name].scan(text))
+                return
+
+            self.batches += 1
+            self.offloaded += len(batch)
+            ANALYSIS_RUNS.inc(len(batch), mode='offloaded')
+            for (name, _, future), (scores, hits) in zip(batch, results):
+                if not future.done():
+                    future.set_result(self._relabel(name, scores, hits))
+        finally:
+            self._slots.release()
+
+    def _relabel(self, name: str, scores: Dict[int, float], hits: Dict[int, List[str]]) -> Scan:
+        labels = self._matchers[name].labels
+        return Scan(
+            {labels[index]: score for index, score in scores.items()},
+            {labels[index]: keywords for index, keywords in hits.items()},
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Executor statistics"""
+        total = self.inline + self.offloaded + self.fallbacks
+        return {
+            'running': self.running,
+            'workers': self.workers if self.running else 0,
+            'inline': self.inline,
+            'offloaded': self.offloaded,
+            'fallbacks': self.fallbacks,
+            'batches': self.batches,
+            'offload_rate': round(self.offloaded / total, 4) if total else 0.0,
+            'queued': len(self._queue),
+        }
+
+
+# نمونه سراسری - Global executor (inline until started)
+analysis_executor = AnalysisExecutor()
+
+__all__ = ['AnalysisExecutor', 'analysis_executor']
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+موتور انتی‌اسپم با پنجره لغزان
+Sliding-window Anti-Spam Engine
+
+برای هر کاربر یک بافر حلقوی ثابت از (زمان یکنوا، اثرانگشت ۶۴ بیتی) نگه
+داشته می‌شود. شمارش پنجره زمانی با یک اندیس‌گیری O(1) انجام می‌شود و
+پیام‌های تقریباً تکراری با SimHash و فاصله همینگ تشخیص داده می‌شوند.
+
+Every group message goes through ``check``, so the hot path does no
+datetime arithmetic, no cryptographic hashing and a single pass of one
+precompiled pattern. Users idle for longer than ``idle_ttl`` are evicted
+in insertion order, so memory follows the number of active users.
+"""
+
+import hashlib
+import logging
+import re
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from src.utils.memory_budget import estimate_mapping_bytes
+
+logger = logging.getLogger(__name__)
+
+MASK64 = (1 << 64) - 1
+
+# Texts shorter than this are fingerprinted exactly; SimHash of a few shingles is too coarse
+SIMHASH_MIN_LENGTH = 16
+SIMHASH_MAX_LENGTH = 256
+SHINGLE_SIZE = 3
+# Enough counter planes for one vote per shingle of the longest text
+SIMHASH_PLANES = SIMHASH_MAX_LENGTH.bit_length()
+
+MONEY_EMOJIS = frozenset('💰💵💸🤑💲')
+SUSPICIOUS_EMOJIS = frozenset('🎰🎲🔞') | MONEY_EMOJIS
+
+# One scan finds every spam signal; named groups tell them apart
+SPAM_PATTERN = re.compile(
+    r'(?P<url>http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+)'
+    r'|(?P<mention>@[a-zA-Z0-9_]+)'
+    r'|(?P<caps>(?-i:\b[A-Z]{5,}\b))'
+    r'|(?P<repeat>(?P<char>.)(?P=char){5,})'
+    r'|(?P<emoji>[🎰🎲🔞💰💵💸🤑💲])',
+    re.IGNORECASE | re.DOTALL
+)
+_WHITESPACE = re.compile(r'\s+')
+# Spam variants often differ only in numbers
+_DIGITS = re.compile(r'\d')
+
+# =============================================================================
+# اثرانگشت پیام - Message fingerprints
+# =============================================================================
+
+def exact_fingerprint(text: str) -> int:
+    """اثرانگشت دقیق - 64-bit exact fingerprint"""
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def simhash(text: str) -> int:
+    """سیم‌هش - 64-bit SimHash over character shingles"""
+    # Bit votes are kept in bit-sliced counters: planes[i] holds bit i of the
+    # count of every column, so adding a shingle is a ripple-carry over ints
+    planes = [0] * SIMHASH_PLANES
+    votes = 0
+    for shingle in {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}:
+        carry = hash(shingle) & MASK64
+        index = 0
+        while carry:
+            plane = planes[index]
+            planes[index] = plane ^ carry
+            carry &= plane
+            index += 1
+        votes += 1
+
+    # Columns whose count exceeds half the votes, compared plane by plane from the top
+    half = votes // 2
+    greater, equal = 0, MASK64
+    for index in range(SIMHASH_PLANES - 1, -1, -1):
+        plane = planes[index]
+        if (half >> index) & 1:
+            equal &= plane
+        else:
+            greater |= equal & plane
+            equal &= ~plane
+    return greater
+
+
+def fingerprint(text: str) -> int:
+    """اثرانگشت پیام - Near-duplicate aware fingerprint of a message"""
+    normalized = _DIGITS.sub('0', _WHITESPACE.sub(' ', text[:SIMHASH_MAX_LENGTH].lower())).strip()
+    if len(normalized) < SIMHASH_MIN_LENGTH:
+        return exact_fingerprint(normalized)
+    return simhash(normalized)
+
+# =============================================================================
+# وضعیت کاربر - Per-user state
+# =============================================================================
+
+class _UserState:
+    """بافر حلقوی کاربر - Fixed-size ring of (monotonic ts, fingerprint)"""
+    __slots__ = ('times', 'prints', 'pos', 'size', 'score', 'blocked_until', 'last_seen')
+
+    def __init__(self, capacity: int):
+        self.times = array('d', bytes(8 * capacity))
+        self.prints = array('Q', bytes(8 * capacity))
+        self.pos = 0
+        self.size = 0
+        self.score = 0.0
+        self.blocked_until = 0.0
+        self.last_seen = 0.0
+
+    def push(self, ts: float, fp: int) -> None:
+        self.times[self.pos] = ts
+        self.prints[self.pos] = fp
+        self.pos = (self.pos + 1) % len(self.times)
+        if self.size < len(self.times):
+            self.size += 1
+
+    def nth_latest_time(self, n: int) -> float:
+        """زمان n-امین پیام اخیر - Timestamp of the n-th most recent message (1-based)"""
+        return self.times[(self.pos - n) % len(self.times)]
+
+    def near_duplicates(self, fp: int, max_distance: int) -> int:
+        """شمارش تکراری‌ها - Messages in the ring within ``max_distance`` bits of ``fp``"""
+        prints = self.prints if self.size == len(self.prints) else self.prints[:self.size]
+        return sum(1 for other in prints if (other ^ fp).bit_count() <= max_distance)
+
+# =============================================================================
+# موتور - Engine
+# =============================================================================
+
+class SpamEngine:
+    """موتور انتی‌اسپم - O(1) sliding-window anti-spam engine"""
+
+    def __init__(self, max_messages_per_minute: int = 10, max_duplicate_messages: int = 3,
+                 spam_threshold: float = 0.8, block_duration: float = 1800.0,
+                 history_size: int = 20, window: float = 60.0, near_duplicate_bits: int = 6,
+                 idle_ttl: float = 3600.0, sweep_interval: float = 60.0):
+        self.max_messages_per_minute = max_messages_per_minute
+        self.max_duplicate_messages = max_duplicate_messages
+        self.spam_threshold = spam_threshold
+        self.block_duration = block_duration
+        self.window = window
+        self.near_duplicate_bits = near_duplicate_bits
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        # The ring must hold one message more than the rate limit to test the window in O(1)
+        self.capacity = max(history_size, max_messages_per_minute + 1)
+
+        # Ordered by last activity, oldest first
+        self._users: 'OrderedDict[int, _UserState]' = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.checks = 0
+        self.blocks = 0
+        self.evictions = 0
+
+    def _state(self, user_id: int, now: float) -> _UserState:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = _UserState(self.capacity)
+        else:
+            self._users.move_to_end(user_id)
+        state.last_seen = now
+        return state
+
+    def check(self, user_id: int, text: str, now: Optional[float] = None) -> bool:
+        """بررسی پیام - Record a message and return True if it is spam"""
+        now = time.monotonic() if now is None else now
+        self.checks += 1
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        state = self._state(user_id, now)
+        if state.blocked_until:
+            if now < state.blocked_until:
+                return True
+            state.blocked_until = 0.0
+
+        fp = fingerprint(text)
+        state.push(now, fp)
+        state.score = self.score(state, text, fp, now)
+
+        if state.score >= self.spam_threshold:
+            state.blocked_until = now + self.block_duration
+            self.blocks += 1
+            return True
+        return False
+
+    def score(self, state: _UserState, text: str, fp: int, now: float) -> float:
+        """محاسبه امتیاز اسپم - Spam score of the message just pushed"""
+        score = 0.0
+
+        # بررسی فرکانس پیام - More than the limit inside the window
+        limit = self.max_messages_per_minute
+        if state.size > limit and now - state.nth_latest_time(limit + 1) < self.window:
+            score += 0.4
+
+        # بررسی پیام‌های تکراری - Near-duplicates in the ring, including this one
+        if state.near_duplicates(fp, self.near_duplicate_bits) > self.max_duplicate_messages:
+            score += 0.3
+
+        # بررسی الگوهای اسپم - Single pass over the combined pattern
+        signals = set()
+        emojis = 0
+        for match in SPAM_PATTERN.finditer(text):
+            kind = match.lastgroup
+            if kind == 'repeat':
+                char = match.group('char')
+                if char in SUSPICIOUS_EMOJIS:
+                    emojis += len(match.group())
+                    if char in MONEY_EMOJIS:
+                        signals.add('money')
+            elif kind == 'emoji':
+                emojis += 1
+                if match.group() in MONEY_EMOJIS:
+                    signals.add('money')
+                continue
+            signals.add(kind)
+        score += 0.1 * len(signals)
+
+        # بررسی طول پیام - Check message length
+        if len(text) > 500:
+            score += 0.1
+
+        # بررسی ایموجی‌های مشکوک - Check suspicious emojis
+        if emojis > 3:
+            score += 0.2
+
+        return min(score, 1.0)
+
+    def get_score(self, user_id: int) -> float:
+        """امتیاز اسپم کاربر - Last spam score of a user"""
+        state = self._users.get(user_id)
+        return state.score if state is not None else 0.0
+
+    def is_blocked(self, user_id: int, now: Optional[float] = None) -> bool:
+        """بررسی مسدود بودن - Whether a user is currently blocked"""
+        state = self._users.get(user_id)
+        if state is None or not state.blocked_until:
+            return False
+        now = time.monotonic() if now is None else now
+        if now >= state.blocked_until:
+            state.blocked_until = 0.0
+            return False
+        return True
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """حذف کاربران غیرفعال - Evict idle users whose block has expired"""
+        now = time.monotonic() if now is None else now
+        self._next_sweep = now + self.sweep_interval
+        cutoff = now - self.idle_ttl
+        evicted = 0
+        while self._users:
+            user_id, state = next(iter(self._users.items()))
+            if state.last_seen > cutoff:
+                break
+            if state.blocked_until > now:
+                # Keep blocked users; revisit them after the block ends
+                self._users.move_to_end(user_id)
+                state.last_seen = state.blocked_until - self.idle_ttl
+                continue
+            del self._users[user_id]
+            evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def evict(self, count: int) -> int:
+        """حذف قدیمی‌ترین کاربران - Forget the ``count`` least recently active users that are not blocked"""
+        now = time.monotonic()
+        victims = []
+        for user_id, state in self._users.items():
+            if len(victims) >= count:
+                break
+            if state.blocked_until <= now:
+                victims.append(user_id)
+        for user_id in victims:
+            del self._users[user_id]
+        if len(victims) > len(self._users):
+            # Dicts never shrink their tables; rebuild after a large eviction
+            self._users = OrderedDict(self._users)
+        self.evictions += len(victims)
+        return len(victims)
+
+    def estimate_bytes(self) -> int:
+        """تخمین حجم - Estimated bytes held by per-user rings"""
+        return estimate_mapping_bytes(self._users)
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Engine statistics"""
+        return {
+            'tracked_users': len(self._users),
+            'blocked_users': sum(1 for state in self._users.values() if state.blocked_until),
+            'checks': self.checks,
+            'blocks': self.blocks,
+            'evictions': self.evictions,
+        }
+
+
+__all__ = ['SpamEngine', 'SPAM_PATTERN', 'fingerprint', 'simhash', 'exact_fingerprint']
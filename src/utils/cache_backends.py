@@ -0,0 +1,233 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+پشتیبان‌های کش مشترک (لایه دوم)
+Shared (L2) Cache Backends
+
+لایه دوم بین همه پروسه‌های ربات مشترک است تا کش گرم با افزایش تعداد
+پروسه‌ها از بین نرود و ابطال‌ها از طریق pub/sub به کش محلی (L1) همه
+پروسه‌ها برسد.
+
+Backends store opaque byte payloads; serialisation and version stamping are
+done by ``TieredCache``. ``InMemoryBackend`` is a process-local fake with the
+same semantics as Redis (TTL, prefix delete, asynchronous pub/sub delivery)
+so several caches can share one instance in tests and development.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - optional dependency
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+# (payload, remaining ttl in seconds)
+BackendValue = Tuple[bytes, float]
+MessageCallback = Callable[[bytes], None]
+
+# =============================================================================
+# رابط پشتیبان - Backend interface
+# =============================================================================
+
+class CacheBackend:
+    """رابط پشتیبان کش مشترک - Interface of a shared cache backend"""
+
+    name = 'base'
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[BackendValue]]:
+        """خواندن دسته‌ای - Batched read, ``None`` for missing keys"""
+        raise NotImplementedError
+
+    async def mset(self, items: Sequence[Tuple[str, bytes, float]]) -> None:
+        """نوشتن دسته‌ای - Batched write of (key, payload, ttl) triples"""
+        raise NotImplementedError
+
+    async def delete(self, keys: Sequence[str]) -> None:
+        """حذف کلیدها - Delete keys"""
+        raise NotImplementedError
+
+    async def delete_prefix(self, prefix: str) -> None:
+        """حذف با پیشوند - Delete every key starting with ``prefix``"""
+        raise NotImplementedError
+
+    async def publish(self, channel: str, payload: bytes) -> None:
+        """انتشار پیام - Publish a message to every subscriber of ``channel``"""
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str, callback: MessageCallback) -> None:
+        """اشتراک - Deliver messages published on ``channel`` to ``callback``"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """بستن اتصال - Release connections and stop listeners"""
+
+# =============================================================================
+# پشتیبان حافظه‌ای (جعلی) - In-process fake
+# =============================================================================
+
+class InMemoryBackend(CacheBackend):
+    """پشتیبان حافظه‌ای - Process-local backend with Redis-like semantics"""
+
+    name = 'memory'
+
+    def __init__(self):
+        self._store: Dict[str, Tuple[bytes, float]] = {}
+        self._subscribers: Dict[str, List[MessageCallback]] = {}
+
+    def _live(self, key: str, now: float) -> Optional[Tuple[bytes, float]]:
+        item = self._store.get(key)
+        if item is not None and item[1] <= now:
+            del self._store[key]
+            return None
+        return item
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[BackendValue]]:
+        now = time.time()
+        result: List[Optional[BackendValue]] = []
+        for key in keys:
+            item = self._live(key, now)
+            result.append((item[0], item[1] - now) if item else None)
+        return result
+
+    async def mset(self, items: Sequence[Tuple[str, bytes, float]]) -> None:
+        now = time.time()
+        for key, payload, ttl in items:
+            self._store[key] = (payload, now + ttl)
+
+    async def delete(self, keys: Sequence[str]) -> None:
+        for key in keys:
+            self._store.pop(key, None)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        for key in [key for key in self._store if key.startswith(prefix)]:
+            del self._store[key]
+
+    async def publish(self, channel: str, payload: bytes) -> None:
+        # Delivered on a later loop iteration, like a network round trip
+        loop = asyncio.get_running_loop()
+        for callback in list(self._subscribers.get(channel, [])):
+            loop.call_soon(callback, payload)
+
+    async def subscribe(self, channel: str, callback: MessageCallback) -> None:
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    async def close(self) -> None:
+        self._subscribers.clear()
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+# =============================================================================
+# پشتیبان Redis - Redis backend
+# =============================================================================
+
+class RedisBackend(CacheBackend):
+    """پشتیبان Redis - Redis backend using pipelines and pub/sub"""
+
+    name = 'redis'
+
+    def __init__(self, url: str, scan_count: int = 500, reconnect_delay: float = 1.0):
+        if redis_asyncio is None:
+            raise RuntimeError("redis package is not installed | پکیج redis نصب نشده است")
+        self.client = redis_asyncio.from_url(url)
+        self.scan_count = scan_count
+        self.reconnect_delay = reconnect_delay
+        self._listeners: List[asyncio.Task] = []
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[BackendValue]]:
+        if not keys:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for key in keys:
+            pipe.get(key)
+            pipe.pttl(key)
+        replies = await pipe.execute()
+        result: List[Optional[BackendValue]] = []
+        for index in range(0, len(replies), 2):
+            payload, pttl = replies[index], replies[index + 1]
+            if payload is None or pttl == -2:
+                result.append(None)
+            else:
+                # pttl is -1 for keys without expiry; those are never written by TieredCache
+                result.append((payload, pttl / 1000 if pttl > 0 else 0.0))
+        return result
+
+    async def mset(self, items: Sequence[Tuple[str, bytes, float]]) -> None:
+        if not items:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for key, payload, ttl in items:
+            pipe.set(key, payload, px=max(1, int(ttl * 1000)))
+        await pipe.execute()
+
+    async def delete(self, keys: Sequence[str]) -> None:
+        if keys:
+            await self.client.unlink(*keys)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        batch: List[bytes] = []
+        async for key in self.client.scan_iter(match=f"{prefix}*", count=self.scan_count):
+            batch.append(key)
+            if len(batch) >= self.scan_count:
+                await self.client.unlink(*batch)
+                batch.clear()
+        if batch:
+            await self.client.unlink(*batch)
+
+    async def publish(self, channel: str, payload: bytes) -> None:
+        await self.client.publish(channel, payload)
+
+    async def subscribe(self, channel: str, callback: MessageCallback) -> None:
+        self._listeners.append(asyncio.create_task(self._listen(channel, callback)))
+
+    async def _listen(self, channel: str, callback: MessageCallback) -> None:
+        """گوش دادن با اتصال مجدد - Listen on a channel, reconnecting on errors"""
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(channel)
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message.get('type') == 'message':
+                        callback(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis pub/sub listener error on {channel}: {e}")
+                await asyncio.sleep(self.reconnect_delay)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    async def close(self) -> None:
+        for task in self._listeners:
+            task.cancel()
+        for task in self._listeners:
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._listeners.clear()
+        await self.client.aclose()
+
+
+def create_backend(kind: str, redis_url: str = "redis://localhost:6379/0") -> Optional[CacheBackend]:
+    """ساخت پشتیبان - Build the configured backend (``local`` means no L2)"""
+    kind = (kind or 'local').lower()
+    if kind == 'local':
+        return None
+    if kind == 'memory':
+        return InMemoryBackend()
+    if kind == 'redis':
+        return RedisBackend(redis_url)
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+__all__ = ['CacheBackend', 'InMemoryBackend', 'RedisBackend', 'create_backend']
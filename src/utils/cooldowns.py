@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+موتور کولدان درون‌حافظه‌ای با نوشتن تأخیری
+In-memory Cooldown Engine with Write-behind Persistence
+
+بررسی کولدان حمله، جایزه روزانه و ستاره رایگان روی مسیر داغ هر فرمان
+است. نگاشت (چت، کاربر، نوع) → زمان انقضا در حافظه مرجع این بررسی‌هاست
+و تغییرات به صورت دسته‌ای در جدول cooldowns نوشته می‌شوند.
+
+The map is rehydrated from ``cooldowns`` on startup. ``acquire`` checks and
+starts a cooldown without awaiting in between, so two concurrent commands
+cannot both pass. Changes are queued and written every ``flush_interval``
+seconds in one upsert/delete statement, then published as mutations (which
+schedules their deletion on the expiry wheel). ``write_through`` flushes at
+once for cooldowns that guard rewards, where losing the last second of
+writes in a crash would allow a second claim.
+
+Writes made by other code (``DBManager.set_cooldown`` / ``clear_cooldown``)
+reach the map through the mutation bus. Until the engine is started, every
+call goes to the database as before.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from src.database.db_manager import DBManager
+from src.database.mutations import Mutation, mutation_bus, COOLDOWN
+from src.utils.metrics import COOLDOWNS_ACTIVE, COOLDOWN_WRITES
+
+logger = logging.getLogger(__name__)
+
+# Cooldown types | انواع کولدان
+ATTACK = 'attack'
+DAILY_BONUS = 'daily_bonus'
+FREE_STARS = 'free_stars'
+
+# (chat_id, user_id, cooldown_type)
+CooldownKey = Tuple[int, int, str]
+
+
+class CooldownEngine:
+    """موتور کولدان - Authoritative in-memory cooldowns, persisted write-behind"""
+
+    def __init__(self, cooldown_types: Iterable[str] = (ATTACK, DAILY_BONUS, FREE_STARS),
+                 flush_interval: float = 1.0, prune_interval: float = 60.0):
+        self.cooldown_types = frozenset(cooldown_types)
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+        self.db_manager: Optional[DBManager] = None
+
+        self._expiry: Dict[CooldownKey, int] = {}
+        # Writes not yet persisted; None deletes the row
+        self._pending: Dict[CooldownKey, Optional[int]] = {}
+        # Set while our own writes are published, so the listener skips them
+        self._publishing = False
+        self._task: Optional[asyncio.Task] = None
+        self.acquired = 0
+        self.rejected = 0
+        self.flushes = 0
+        self.flush_errors = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def _owns(self, cooldown_type: str) -> bool:
+        return self._task is not None and cooldown_type in self.cooldown_types
+
+    def _db(self) -> DBManager:
+        return self.db_manager or DBManager()
+
+    # -------------------------------------------------------------------------
+    # بررسی و تنظیم - Checks and writes
+    # -------------------------------------------------------------------------
+
+    def _remaining(self, key: CooldownKey, now: int) -> int:
+        expires_at = self._expiry.get(key)
+        if expires_at is None:
+            return 0
+        if expires_at <= now:
+            del self._expiry[key]
+            return 0
+        return expires_at - now
+
+    def _put(self, key: CooldownKey, expires_at: Optional[int]) -> None:
+        if expires_at is None:
+            self._expiry.pop(key, None)
+        else:
+            self._expiry[key] = expires_at
+        self._pending[key] = expires_at
+
+    async def remaining(self, chat_id: int, user_id: int, cooldown_type: str) -> int:
+        """زمان باقی‌مانده - Seconds left on a cooldown, 0 if none is running"""
+        if not self._owns(cooldown_type):
+            return await self._db().check_cooldown(chat_id, user_id, cooldown_type)
+        return self._remaining((chat_id, user_id, cooldown_type), int(time.time()))
+
+    async def acquire(self, chat_id: int, user_id: int, cooldown_type: str, duration: int,
+                      write_through: bool = False) -> int:
+        """
+        گرفتن کولدان - Start a cooldown unless one is running
+
+        Returns 0 if the cooldown was started, otherwise the seconds left.
+        """
+        if not self._owns(cooldown_type):
+            db_manager = self._db()
+            remaining = await db_manager.check_cooldown(chat_id, user_id, cooldown_type)
+            if remaining > 0:
+                return remaining
+            await db_manager.set_cooldown(chat_id, user_id, cooldown_type, duration)
+            return 0
+
+        now = int(time.time())
+        key = (chat_id, user_id, cooldown_type)
+        remaining = self._remaining(key, now)
+        if remaining:
+            self.rejected += 1
+            return remaining
+        self._put(key, now + duration)
+        self.acquired += 1
+        if write_through:
+            await self.flush()
+        return 0
+
+    async def set(self, chat_id: int, user_id: int, cooldown_type: str, duration: int,
+                  write_through: bool = False) -> bool:
+        """تنظیم کولدان - Start or replace a cooldown"""
+        if not self._owns(cooldown_type):
+            return await self._db().set_cooldown(chat_id, user_id, cooldown_type, duration)
+        self._put((chat_id, user_id, cooldown_type), int(time.time()) + duration)
+        if write_through:
+            await self.flush()
+        return True
+
+    async def clear(self, chat_id: int, user_id: int, cooldown_type: str) -> bool:
+        """پاک کردن کولدان - End a cooldown now"""
+        if not self._owns(cooldown_type):
+            return await self._db().clear_cooldown(chat_id, user_id, cooldown_type)
+        self._put((chat_id, user_id, cooldown_type), None)
+        return True
+
+    def _on_mutation(self, mutation: Mutation) -> None:
+        """Follow cooldown writes made outside the engine"""
+        if self._publishing or mutation.user_id is None:
+            return
+        values = mutation.values or {}
+        cooldown_type = values.get('type')
+        if cooldown_type not in self.cooldown_types:
+            return
+        key = (mutation.chat_id, mutation.user_id, cooldown_type)
+        if values.get('expires_at'):
+            self._expiry[key] = int(values['expires_at'])
+            self._pending.pop(key, None)
+        elif not values.get('expired'):
+            self._expiry.pop(key, None)
+            self._pending.pop(key, None)
+
+    # -------------------------------------------------------------------------
+    # نوشتن تأخیری - Write-behind
+    # -------------------------------------------------------------------------
+
+    async def flush(self) -> int:
+        """ذخیره - Persist queued changes in one statement; failed batches are retried"""
+        if not self._pending or self.db_manager is None:
+            return 0
+        batch, self._pending = self._pending, {}
+        now = int(time.time())
+        # Cooldowns that ran out before being written need no row
+        upserts = [key + (expires_at,) for key, expires_at in batch.items()
+                   if expires_at is not None and expires_at > now]
+        deletes = [key for key, expires_at in batch.items() if expires_at is None]
+        if not upserts and not deletes:
+            return 0
+
+        if not await self.db_manager.write_cooldowns(upserts, deletes):
+            self.flush_errors += 1
+            COOLDOWN_WRITES.inc(len(upserts) + len(deletes), outcome='error')
+            for key, expires_at in batch.items():
+                # Newer changes queued meanwhile win
+                self._pending.setdefault(key, expires_at)
+            return 0
+
+        self.flushes += 1
+        COOLDOWN_WRITES.inc(len(upserts) + len(deletes), outcome='ok')
+        mutations = [Mutation(COOLDOWN, chat_id, user_id, {'type': cooldown_type, 'expires_at': expires_at})
+                     for chat_id, user_id, cooldown_type, expires_at in upserts]
+        mutations.extend(Mutation(COOLDOWN, chat_id, user_id, {'type': cooldown_type})
+                         for chat_id, user_id, cooldown_type in deletes)
+        self._publishing = True
+        try:
+            self.db_manager.publish_mutations(*mutations)
+        finally:
+            self._publishing = False
+        return len(upserts) + len(deletes)
+
+    def prune(self, now: Optional[int] = None) -> int:
+        """حذف کولدان‌های تمام‌شده - Drop expired entries from the map"""
+        now = int(time.time()) if now is None else now
+        before = len(self._expiry)
+        # Rebuilt rather than deleted from, so the table shrinks with it
+        self._expiry = {key: expires_at for key, expires_at in self._expiry.items() if expires_at > now}
+        COOLDOWNS_ACTIVE.set(len(self._expiry))
+        return before - len(self._expiry)
+
+    async def _run(self) -> None:
+        next_prune = time.monotonic() + self.prune_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() >= next_prune:
+                    next_prune = time.monotonic() + self.prune_interval
+                    self.prune()
+            except Exception as e:
+                logger.error(f"Cooldown engine error: {e}")
+
+    # -------------------------------------------------------------------------
+    # چرخه عمر - Lifecycle
+    # -------------------------------------------------------------------------
+
+    async def start(self, db_manager: DBManager) -> bool:
+        """شروع - Rehydrate unexpired cooldowns and take over the checks"""
+        if self.running:
+            return True
+        mutation_bus.subscribe(COOLDOWN, self._on_mutation)
+        rows = await db_manager.load_cooldowns(self.cooldown_types)
+        if rows is None:
+            mutation_bus.unsubscribe(COOLDOWN, self._on_mutation)
+            logger.warning("Cooldowns could not be loaded; checks stay on the database")
+            logger.warning("کولدان‌ها بارگذاری نشدند؛ بررسی‌ها روی پایگاه داده می‌مانند")
+            return False
+        self.db_manager = db_manager
+        for row in rows:
+            key = (row['chat_id'], row['user_id'], row['cooldown_type'])
+            # A write seen on the bus while loading is at least as new as the row
+            self._expiry[key] = max(self._expiry.get(key, 0), int(row['expires_at']))
+        COOLDOWNS_ACTIVE.set(len(self._expiry))
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Cooldown engine started ({len(self._expiry)} active cooldowns)")
+        return True
+
+    async def stop(self) -> None:
+        """توقف - Write the remaining changes and hand the checks back to the database"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Error flushing cooldowns: {e}")
+        self._task = None
+        mutation_bus.unsubscribe(COOLDOWN, self._on_mutation)
+        if self._pending:
+            logger.warning(f"{len(self._pending)} cooldown changes were not written")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Engine statistics"""
+        return {
+            'running': self.running,
+            'active': len(self._expiry),
+            'pending': len(self._pending),
+            'acquired': self.acquired,
+            'rejected': self.rejected,
+            'flushes': self.flushes,
+            'flush_errors': self.flush_errors,
+        }
+
+
+# نمونه سراسری - Global cooldown engine (database-backed until started)
+cooldown_engine = CooldownEngine()
+
+__all__ = ['CooldownEngine', 'cooldown_engine', 'ATTACK', 'DAILY_BONUS', 'FREE_STARS']
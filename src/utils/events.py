@@ -0,0 +1,376 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+گذرگاه رویدادهای دامنه با صندوق خروجی
+Domain Event Bus with an Outbox
+
+رویدادهای بازی (حمله، خرید، استفاده از آیتم، جایزه، پرداخت) بعد از ثبت
+تغییر اصلی منتشر می‌شوند و اثرات جانبی (تجربه، دستاوردها، آمار) خارج از
+مسیر درخواست در مشترک‌ها اجرا می‌شوند.
+
+``publish`` writes the event to the ``event_outbox`` table and queues it on
+one of ``shards`` bounded queues picked by chat, so the events of a chat are
+delivered in order while chats proceed in parallel. Delivered events are
+acknowledged (deleted) in batches. The redelivery sweep re-queues whatever is
+still in the outbox: events left by a crash, events whose subscriber raised,
+and events that did not fit a full queue (the shard then stays on the outbox
+until the sweep has caught up, which keeps its order).
+
+Delivery is tracked per subscriber: when one subscriber of an event fails,
+the ones that succeeded are recorded and only the failed one is retried.
+A crash between delivery and the batched ack still replays an event, and a
+retried event may arrive after later events of the same chat. Subscribers
+must therefore be idempotent; additive writes claim ``current_delivery()``
+through ``DBManager.apply_once`` in the same statement.
+"""
+
+import asyncio
+import contextvars
+import dataclasses
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Set, Tuple, Type
+
+from src.database.db_manager import DBManager
+from src.utils.metrics import OUTBOX_DEPTH, EVENTS_PUBLISHED, EVENTS_DELIVERED
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# رویدادها - Events
+# =============================================================================
+
+@dataclass(frozen=True)
+class DomainEvent:
+    """رویداد دامنه - Something that happened to one user in one chat"""
+    chat_id: int
+    user_id: int
+
+    def to_payload(self) -> Dict[str, Any]:
+        """داده قابل ذخیره - JSON-serialisable fields"""
+        return dataclasses.asdict(self)
+
+
+@dataclass(frozen=True)
+class AttackResolved(DomainEvent):
+    """حمله انجام شد - An attack was applied; ``user_id`` is the attacker"""
+    target_id: int
+    weapon: str
+    damage: int
+    remaining_hp: int
+    defeated: bool
+    medals: int
+
+
+@dataclass(frozen=True)
+class ItemPurchased(DomainEvent):
+    """آیتم خریده شد - An item was bought with medals or TG Stars"""
+    item: str
+    price: int
+    currency: str
+
+
+@dataclass(frozen=True)
+class ItemUsed(DomainEvent):
+    """آیتم استفاده شد - An inventory item was used"""
+    item: str
+    item_type: str
+
+
+@dataclass(frozen=True)
+class BonusClaimed(DomainEvent):
+    """جایزه دریافت شد - A periodic bonus was claimed"""
+    bonus: str
+    amount: int
+
+
+@dataclass(frozen=True)
+class PaymentCompleted(DomainEvent):
+    """پرداخت تکمیل شد - A Telegram Stars payment went through"""
+    stars: int
+    item: str
+    charge_id: str
+
+
+@dataclass(frozen=True)
+class EffectExpired(DomainEvent):
+    """اثر منقضی شد - A defense or boost ran out and its row was deleted"""
+    entity: str
+    kind: str
+
+
+EVENT_TYPES: Dict[str, Type[DomainEvent]] = {
+    cls.__name__: cls
+    for cls in (AttackResolved, ItemPurchased, ItemUsed, BonusClaimed, PaymentCompleted, EffectExpired)
+}
+
+Subscriber = Callable[[Any, DBManager], Awaitable[Any]]
+
+# (outbox id, subscriber name) of the delivery running in this task
+_delivery: contextvars.ContextVar[Optional[Tuple[int, str]]] = contextvars.ContextVar('event_delivery', default=None)
+
+
+def subscriber_name(subscriber: Subscriber) -> str:
+    """نام مشترک - Stable name a delivery is recorded under"""
+    return f"{subscriber.__module__}.{subscriber.__qualname__}"
+
+
+def current_delivery() -> Optional[Tuple[int, str]]:
+    """تحویل جاری - (outbox id, subscriber) inside a subscriber, None for deliveries without an outbox row"""
+    return _delivery.get()
+
+
+def restore_event(event_type: str, payload: Dict[str, Any]) -> Optional[DomainEvent]:
+    """بازسازی رویداد - Rebuild an event from its outbox row (None if the type is unknown)"""
+    cls = EVENT_TYPES.get(event_type)
+    if cls is None:
+        return None
+    names = {f.name for f in dataclasses.fields(cls)}
+    return cls(**{key: value for key, value in payload.items() if key in names})
+
+# =============================================================================
+# گذرگاه - Bus
+# =============================================================================
+
+class EventBus:
+    """گذرگاه رویداد - Per-chat ordered, outbox-backed delivery to async subscribers"""
+
+    def __init__(self, shards: int = 8, queue_size: int = 1000, ack_interval: float = 1.0,
+                 redeliver_interval: float = 30.0, redeliver_grace: int = 5, max_attempts: int = 5,
+                 batch_size: int = 200):
+        self.shards = shards
+        self.queue_size = queue_size
+        self.ack_interval = ack_interval
+        self.redeliver_interval = redeliver_interval
+        self.redeliver_grace = redeliver_grace
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.db_manager: Optional[DBManager] = None
+
+        self._subscribers: Dict[Type[DomainEvent], List[Subscriber]] = {}
+        self._queues: List[asyncio.Queue] = []
+        self._workers: List[asyncio.Task] = []
+        self._task: Optional[asyncio.Task] = None
+        # Outbox ids queued or awaiting their ack flush; the sweep skips them
+        self._inflight: Set[int] = set()
+        # Shards that overflowed; their events wait in the outbox for the sweep
+        self._spilled: Set[int] = set()
+        self._acks: List[int] = []
+        # (outbox id, subscribers that succeeded) of events with a failed subscriber
+        self._failures: List[Tuple[int, List[str]]] = []
+        self.depth = 0
+        self.published = 0
+        self.delivered = 0
+        self.failed = 0
+        self.spills = 0
+        self.redelivered = 0
+
+    def subscribe(self, event_type: Type[DomainEvent], subscriber: Subscriber) -> Subscriber:
+        """اشتراک - Call ``subscriber(event, db_manager)`` for every event of ``event_type``"""
+        self._subscribers.setdefault(event_type, []).append(subscriber)
+        return subscriber
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def _shard(self, chat_id: int) -> int:
+        return chat_id % self.shards
+
+    # -------------------------------------------------------------------------
+    # انتشار - Publishing
+    # -------------------------------------------------------------------------
+
+    async def publish(self, event: DomainEvent) -> None:
+        """انتشار - Persist ``event`` and queue it for its subscribers (call after the change commits)"""
+        name = type(event).__name__
+        self.published += 1
+        EVENTS_PUBLISHED.inc(event=name)
+        if not self._subscribers.get(type(event)):
+            return
+        if not self.running:
+            # Not started (scripts, shutdown): deliver inline, without the outbox
+            self.db_manager = self.db_manager or DBManager()
+            await self._deliver(event)
+            return
+
+        event_id = await self.db_manager.outbox_append(event.chat_id, name, event.to_payload())
+        if event_id is not None:
+            self.depth += 1
+            OUTBOX_DEPTH.set(self.depth)
+        shard = self._shard(event.chat_id)
+        if event_id is not None and shard in self._spilled:
+            return
+        try:
+            self._queues[shard].put_nowait((event_id, event, frozenset()))
+        except asyncio.QueueFull:
+            self.spills += 1
+            if event_id is None:
+                logger.error(f"Event queue full and outbox unavailable, dropping {name} for chat {event.chat_id}")
+                return
+            if shard not in self._spilled:
+                logger.warning(f"Event queue {shard} full, deferring its events to the outbox sweep")
+            self._spilled.add(shard)
+            return
+        if event_id is not None:
+            self._inflight.add(event_id)
+
+    # -------------------------------------------------------------------------
+    # تحویل - Delivery
+    # -------------------------------------------------------------------------
+
+    async def _deliver(self, event: DomainEvent, event_id: Optional[int] = None,
+                       skip: FrozenSet[str] = frozenset()) -> Tuple[bool, List[str]]:
+        """Call the subscribers not in ``skip``; returns whether all succeeded and which did"""
+        name = type(event).__name__
+        ok = True
+        succeeded = []
+        for subscriber in self._subscribers.get(type(event), []):
+            sub_name = subscriber_name(subscriber)
+            if sub_name in skip:
+                continue
+            token = _delivery.set((event_id, sub_name) if event_id is not None else None)
+            try:
+                await subscriber(event, self.db_manager)
+                succeeded.append(sub_name)
+                EVENTS_DELIVERED.inc(event=name, outcome='ok')
+            except Exception as e:
+                ok = False
+                EVENTS_DELIVERED.inc(event=name, outcome='error')
+                logger.error(f"Event subscriber {sub_name} failed on {name}: {e}")
+            finally:
+                _delivery.reset(token)
+        if ok:
+            self.delivered += 1
+        else:
+            self.failed += 1
+        return ok, succeeded
+
+    async def _work(self, queue: asyncio.Queue) -> None:
+        while True:
+            event_id, event, skip = await queue.get()
+            try:
+                ok, succeeded = await self._deliver(event, event_id, skip)
+                if event_id is not None:
+                    if ok:
+                        self._acks.append(event_id)
+                    else:
+                        self._failures.append((event_id, succeeded))
+            finally:
+                queue.task_done()
+
+    async def _flush_acks(self) -> None:
+        acks, self._acks = self._acks, []
+        failures, self._failures = self._failures, []
+        if acks:
+            if await self.db_manager.outbox_ack(acks):
+                self.depth = max(0, self.depth - len(acks))
+                self._inflight.difference_update(acks)
+            else:
+                self._acks.extend(acks)
+        if failures:
+            # Counted as an attempt and left for the sweep to retry the failed subscribers
+            await self.db_manager.outbox_fail(failures)
+            self._inflight.difference_update(event_id for event_id, _ in failures)
+        OUTBOX_DEPTH.set(self.depth)
+
+    async def _redeliver(self) -> None:
+        """بازتحویل - Re-queue outbox events that are not in flight, oldest first"""
+        spilled = set(self._spilled)
+        # Rows this fresh may still be on their way into a queue from publish()
+        fresh = int(time.time()) - self.redeliver_grace
+        after_id = 0
+        while True:
+            rows = await self.db_manager.outbox_pending(after_id, self.max_attempts, self.batch_size)
+            for row in rows:
+                after_id = row['id']
+                if row['id'] in self._inflight:
+                    continue
+                if row['created_at'] > fresh and self._shard(row['chat_id']) not in spilled:
+                    continue
+                event = restore_event(row['event_type'], row['payload'] or {})
+                if event is None:
+                    logger.error(f"Unknown event type in outbox: {row['event_type']} (#{row['id']})")
+                    await self.db_manager.outbox_fail([(row['id'], [])])
+                    continue
+                self._inflight.add(row['id'])
+                # Blocking put: the sweep, not the publishers, waits for queue space
+                skip = frozenset(row.get('delivered') or ())
+                await self._queues[self._shard(event.chat_id)].put((row['id'], event, skip))
+                self.redelivered += 1
+            if len(rows) < self.batch_size:
+                break
+        self._spilled -= spilled
+        self.depth = await self.db_manager.outbox_depth(self.max_attempts)
+        OUTBOX_DEPTH.set(self.depth)
+
+    async def _maintain(self) -> None:
+        next_sweep = time.monotonic()
+        while True:
+            try:
+                await self._flush_acks()
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.redeliver_interval
+                    await self._redeliver()
+            except Exception as e:
+                logger.error(f"Event outbox maintenance error: {e}")
+            await asyncio.sleep(self.ack_interval)
+
+    # -------------------------------------------------------------------------
+    # چرخه عمر - Lifecycle
+    # -------------------------------------------------------------------------
+
+    def start(self, db_manager: DBManager) -> None:
+        """شروع - Start the shard workers and the outbox sweep (which first replays leftovers)"""
+        if self.running:
+            return
+        self.db_manager = db_manager
+        loop = asyncio.get_running_loop()
+        self._queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(self.shards)]
+        self._workers = [loop.create_task(self._work(queue)) for queue in self._queues]
+        self._task = loop.create_task(self._maintain())
+        logger.info(f"Event bus started ({self.shards} shards, queue size {self.queue_size})")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """توقف - Drain the queues for up to ``timeout`` seconds; the rest stays in the outbox"""
+        if not self.running:
+            return
+        self._task.cancel()
+        self._task = None
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Event bus stopped with undelivered events; they will be replayed from the outbox")
+        for worker in self._workers:
+            worker.cancel()
+        self._workers = []
+        try:
+            await self._flush_acks()
+        except Exception as e:
+            logger.error(f"Error flushing event acknowledgements: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Bus statistics"""
+        return {
+            'running': self.running,
+            'subscribers': {cls.__name__: len(subs) for cls, subs in self._subscribers.items()},
+            'queued': sum(queue.qsize() for queue in self._queues),
+            'outbox_depth': self.depth,
+            'published': self.published,
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'spills': self.spills,
+            'spilled_shards': len(self._spilled),
+            'redelivered': self.redelivered,
+        }
+
+
+# نمونه سراسری - Global event bus
+event_bus = EventBus()
+
+__all__ = [
+    'DomainEvent', 'AttackResolved', 'ItemPurchased', 'ItemUsed', 'BonusClaimed', 'PaymentCompleted',
+    'EffectExpired', 'EVENT_TYPES', 'restore_event', 'current_delivery', 'subscriber_name',
+    'EventBus', 'event_bus',
+]
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+زمان‌بند انقضا با چرخ زمان سلسله‌مراتبی
+Expiry Scheduler on a Hierarchical Timer Wheel
+
+سپرها، تقویت‌ها و کولدان‌ها زمان انقضا دارند. به جای حذف دوره‌ای با
+DELETE روی کل جدول، زمان انقضای هر موجودیت در یک چرخ زمان درون‌پروسه‌ای
+نگه داشته می‌شود و ردیف‌های سررسیده در هر تیک با یک دستور حذف می‌شوند.
+
+The wheel is rehydrated from ``active_defenses``, ``active_boosts`` and
+``cooldowns`` on startup and kept current from the mutation bus: writes that
+carry ``expires_at`` are scheduled directly, any other write to a user's
+defenses, boosts or cooldowns reloads that user's expiries on the next tick.
+The delete re-checks ``expires_at``, so a row renewed in the meantime is left
+alone (and its user reloaded). Deleted rows are published as mutations, which
+invalidates the caches, and expired defenses and boosts as ``EffectExpired``
+events.
+
+Reads keep filtering on ``expires_at > now``; the wheel replaces the sweeps
+that kept the tables small.
+"""
+
+import asyncio
+import html
+import logging
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.config.items import get_item_display_name
+from src.database.db_manager import DBManager
+from src.database.mutations import Mutation, mutation_bus, DEFENSE, BOOST, COOLDOWN
+from src.utils.events import event_bus, EffectExpired
+from src.utils.metrics import EXPIRY_TIMERS, EXPIRED_ROWS
+from src.utils.translations import T
+
+logger = logging.getLogger(__name__)
+
+# (entity, chat_id, user_id, kind) - kind is the defense, boost or cooldown type
+ExpiryKey = Tuple[str, int, int, str]
+
+# =============================================================================
+# چرخ زمان - Timer wheel
+# =============================================================================
+
+class TimerWheel:
+    """چرخ زمان سلسله‌مراتبی - One deadline per key, O(1) scheduling, expiry by the second"""
+
+    def __init__(self, now: int, slots: int = 64, levels: int = 4):
+        self.slots = slots
+        self.levels = levels
+        # A slot of level n spans slots ** n ticks; 64 slots x 4 levels reach about 194 days
+        self._spans = [slots ** level for level in range(levels)]
+        self._horizon = slots ** levels
+        self._wheels: List[List[List[Tuple[ExpiryKey, int]]]] = [
+            [[] for _ in range(slots)] for _ in range(levels)
+        ]
+        # The current deadline of every key; wheel entries that disagree are stale
+        self._deadlines: Dict[ExpiryKey, int] = {}
+        self.current = now
+
+    def schedule(self, key: ExpiryKey, deadline: int) -> None:
+        """زمان‌بندی - Set or move the deadline of ``key``; past deadlines fall due on the next tick"""
+        deadline = max(int(deadline), self.current + 1)
+        if self._deadlines.get(key) == deadline:
+            return
+        self._deadlines[key] = deadline
+        self._place(key, deadline)
+
+    def cancel(self, key: ExpiryKey) -> None:
+        """لغو - Forget ``key``; its wheel entries are dropped when reached"""
+        self._deadlines.pop(key, None)
+
+    def deadline(self, key: ExpiryKey) -> Optional[int]:
+        return self._deadlines.get(key)
+
+    def _place(self, key: ExpiryKey, deadline: int) -> None:
+        # Deadlines past the horizon wait in the furthest top-level slot and are re-placed from there
+        at = min(deadline, self.current + self._horizon - 1)
+        delta = at - self.current
+        for level, span in enumerate(self._spans):
+            if delta < span * self.slots:
+                self._wheels[level][(at // span) % self.slots].append((key, deadline))
+                return
+
+    def advance(self, now: int) -> List[ExpiryKey]:
+        """پیشروی - Move the wheel to ``now`` and return the keys that fell due"""
+        due = []
+        while self.current < now:
+            self.current += 1
+            tick = self.current
+            # Cascade coarser slots that start at this tick, top level first
+            for level in range(self.levels - 1, 0, -1):
+                span = self._spans[level]
+                if tick % span:
+                    continue
+                slot = (tick // span) % self.slots
+                bucket, self._wheels[level][slot] = self._wheels[level][slot], []
+                for key, deadline in bucket:
+                    if self._deadlines.get(key) == deadline:
+                        self._place(key, deadline)
+
+            slot = tick % self.slots
+            bucket, self._wheels[0][slot] = self._wheels[0][slot], []
+            for key, deadline in bucket:
+                if self._deadlines.get(key) != deadline:
+                    continue
+                if deadline > tick:
+                    self._place(key, deadline)
+                    continue
+                del self._deadlines[key]
+                due.append(key)
+        return due
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+# =============================================================================
+# زمان‌بند - Scheduler
+# =============================================================================
+
+class ExpiryScheduler:
+    """زمان‌بند انقضا - Deletes expiring rows as they fall due and announces the expiries"""
+
+    def __init__(self, tick_interval: float = 1.0, batch_size: int = 5000, notify: bool = False):
+        self.tick_interval = tick_interval
+        self.batch_size = batch_size
+        self.notify = notify
+        self.db_manager: Optional[DBManager] = None
+        self.bot: Any = None
+        self.wheel: Optional[TimerWheel] = None
+
+        self._due: List[ExpiryKey] = []
+        # Users whose expiries must be reloaded: written without an expires_at, or renewed under us
+        self._dirty: Set[Tuple[int, int]] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.expired = 0
+        self.reloads = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def _on_mutation(self, mutation: Mutation) -> None:
+        values = mutation.values or {}
+        if values.get('expired') or mutation.user_id is None:
+            return
+        if values.get('expires_at') and values.get('type'):
+            key = (mutation.entity, mutation.chat_id, mutation.user_id, values['type'])
+            self.wheel.schedule(key, values['expires_at'])
+        else:
+            self._dirty.add((mutation.chat_id, mutation.user_id))
+
+    def _schedule_rows(self, rows: Iterable[Dict[str, Any]]) -> None:
+        for row in rows:
+            key = (row['entity'], row['chat_id'], row['user_id'], row['kind'])
+            self.wheel.schedule(key, row['expires_at'])
+
+    # -------------------------------------------------------------------------
+    # چرخه عمر - Lifecycle
+    # -------------------------------------------------------------------------
+
+    async def start(self, db_manager: DBManager, bot: Any = None) -> None:
+        """شروع - Rehydrate the wheel from the database and start ticking"""
+        if self.running:
+            return
+        self.db_manager = db_manager
+        self.bot = bot
+        self.wheel = TimerWheel(int(time.time()))
+        # Subscribe before loading so writes made during the load are not missed
+        for entity in (DEFENSE, BOOST, COOLDOWN):
+            mutation_bus.subscribe(entity, self._on_mutation)
+        self._schedule_rows(await db_manager.load_expiries())
+        if self.notify:
+            event_bus.subscribe(EffectExpired, self.notify_expired)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info(f"Expiry scheduler started ({len(self.wheel)} timers, tick {self.tick_interval}s)")
+
+    def stop(self) -> None:
+        """توقف - Stop ticking; rows left over are picked up on the next start"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        for entity in (DEFENSE, BOOST, COOLDOWN):
+            mutation_bus.unsubscribe(entity, self._on_mutation)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                await self.tick()
+            except Exception as e:
+                logger.error(f"Expiry scheduler error: {e}")
+
+    # -------------------------------------------------------------------------
+    # تیک - Ticks
+    # -------------------------------------------------------------------------
+
+    async def tick(self, now: Optional[int] = None) -> int:
+        """تیک - Reload dirty users, advance the wheel and delete what fell due in one statement"""
+        now = int(time.time()) if now is None else now
+        if self._dirty:
+            users, self._dirty = list(self._dirty), set()
+            self.reloads += 1
+            self._schedule_rows(await self.db_manager.load_expiries(users))
+
+        self._due.extend(self.wheel.advance(now))
+        EXPIRY_TIMERS.set(len(self.wheel) + len(self._due))
+        if not self._due:
+            return 0
+
+        batch, self._due = self._due[:self.batch_size], self._due[self.batch_size:]
+        rows = await self.db_manager.delete_expired(batch, now)
+        if rows is None:
+            # Statement failed; retry the batch on the next tick
+            self._due = batch + self._due
+            return 0
+
+        deleted = {(row['entity'], row['chat_id'], row['user_id'], row['kind']) for row in rows}
+        for entity, chat_id, user_id, kind in batch:
+            if (entity, chat_id, user_id, kind) not in deleted:
+                # Renewed or removed since it was scheduled; look again
+                self._dirty.add((chat_id, user_id))
+
+        for row in rows:
+            EXPIRED_ROWS.inc(entity=row['entity'])
+            if row['entity'] != COOLDOWN:
+                await event_bus.publish(EffectExpired(
+                    chat_id=row['chat_id'], user_id=row['user_id'], entity=row['entity'], kind=row['kind']
+                ))
+        self.expired += len(rows)
+        return len(rows)
+
+    async def notify_expired(self, event: EffectExpired, db_manager: DBManager) -> None:
+        """اعلان انقضا - Tell a player in the group that their defense ran out"""
+        if event.entity != DEFENSE or self.bot is None:
+            return
+        lang = await db_manager.get_chat_language(event.chat_id)
+        player = await db_manager.get_user(event.chat_id, event.user_id) or {}
+        texts = T.get(lang, T['en'])
+        text = texts.get('defense_expired', T['en']['defense_expired']).format(
+            name=html.escape(player.get('first_name') or str(event.user_id)),
+            item_name=get_item_display_name(event.kind, lang),
+        )
+        await self.bot.send_message(event.chat_id, text, parse_mode='HTML')
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Scheduler statistics"""
+        return {
+            'running': self.running,
+            'timers': len(self.wheel) if self.wheel is not None else 0,
+            'due': len(self._due),
+            'dirty_users': len(self._dirty),
+            'expired': self.expired,
+            'reloads': self.reloads,
+        }
+
+
+# نمونه سراسری - Global expiry scheduler
+expiry_scheduler = ExpiryScheduler()
+
+__all__ = ['TimerWheel', 'ExpiryScheduler', 'expiry_scheduler']
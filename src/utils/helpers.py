@@ -42,6 +42,16 @@ import telebot
 from telebot import types
 from src.database.db_manager import DBManager
 from src.utils.translations import T
+from src.utils.metrics import FUNCTION_LATENCY
+from src.utils.histogram import StreamingHistogram
+from src.utils.cache import SmartCache, smart_cache
+from src.utils.singleflight import single_flight
+from src.utils.ratelimit import RateLimiter, rate_limited, by_user
+from src.utils.memory_budget import BoundedStore
+from src.utils.keywords import attack_keyword_detector
+from src.utils.events import event_bus, current_delivery, AttackResolved, ItemUsed
+from src.utils.cooldowns import cooldown_engine
+from src.database.mutations import Mutation, mutation_bus, PLAYER, LANGUAGE, COOLDOWN, DEFENSE
 
 # 🚀 Enhanced Logging Configuration | پیکربندی پیشرفته لاگ‌گیری
 logging.basicConfig(
@@ -124,6 +134,16 @@ def now() -> int:
     """Get current Unix timestamp with validation | دریافت زمان یونیکس فعلی با اعتبارسنجی"""
     return int(time.time())
 
+_bot_info: Dict[int, telebot.types.User] = {}
+
+async def get_bot_info(bot) -> telebot.types.User:
+    """Get the bot's own user, fetched once per bot | دریافت اطلاعات ربات با کش"""
+    key = id(bot)
+    info = _bot_info.get(key)
+    if info is None:
+        info = _bot_info[key] = await bot.get_me()
+    return info
+
 def format_time_persian(timestamp: int, lang: str = "en") -> str:
     """Format timestamp with Persian calendar support | فرمت زمان با پشتیبانی تقویم فارسی"""
     try:
@@ -202,86 +222,51 @@ def sanitize_text(text: str, max_length: int = 500) -> str:
 
 # 💾 Advanced Caching System | سیستم پیشرفته کشینگ
 
-class SmartCache:
-    """Intelligent caching system with TTL and LRU | سیستم کشینگ هوشمند با TTL و LRU"""
-    
-    def __init__(self, max_size: int = 1000, default_ttl: int = 300):
-        self.max_size = max_size
-        self.default_ttl = default_ttl
-        self._cache: Dict[str, CacheEntry] = {}
-        self._access_order: List[str] = []
-        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
-    
-    def get(self, key: str) -> Optional[Any]:
-        """Get cached value with expiration check"""
-        current_time = time.time()
-        
-        if key in self._cache:
-            entry = self._cache[key]
-            if current_time <= entry.expires_at:
-                # Move to end (most recently used)
-                self._access_order.remove(key)
-                self._access_order.append(key)
-                self._stats["hits"] += 1
-                return entry.data
-            else:
-                # Expired entry
-                del self._cache[key]
-                if key in self._access_order:
-                    self._access_order.remove(key)
-        
-        self._stats["misses"] += 1
-        return None
-    
-    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
-        """Set cached value with TTL"""
-        current_time = time.time()
-        ttl = ttl or self.default_ttl
-        
-        # Remove old entry if exists
-        if key in self._cache:
-            self._access_order.remove(key)
-        
-        # Check size limit and evict if necessary
-        while len(self._cache) >= self.max_size:
-            oldest_key = self._access_order.pop(0)
-            del self._cache[oldest_key]
-            self._stats["evictions"] += 1
-        
-        # Add new entry
-        self._cache[key] = CacheEntry(
-            data=value,
-            timestamp=current_time,
-            expires_at=current_time + ttl
-        )
-        self._access_order.append(key)
-    
-    def clear(self) -> None:
-        """Clear all cached entries"""
-        self._cache.clear()
-        self._access_order.clear()
-    
-    def get_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        total_requests = self._stats["hits"] + self._stats["misses"]
-        hit_rate = (self._stats["hits"] / total_requests * 100) if total_requests > 0 else 0
-        
-        return {
-            "size": len(self._cache),
-            "max_size": self.max_size,
-            "hit_rate": round(hit_rate, 2),
-            "stats": self._stats.copy()
-        }
+# SmartCache and the global smart_cache live in src.utils.cache.
+# Entries are invalidated by database mutation events, so TTLs only bound
+# staleness from writes made outside DBManager.
+PLAYER_CACHE_TTL = 1800
+MEDALS_CACHE_TTL = 900
+LANG_CACHE_TTL = 1800
+SHIELD_CACHE_TTL = 900
+
+def _on_player_mutation(mutation: Mutation) -> None:
+    """Invalidate player caches, writing the new score through when known | ابطال کش بازیکن"""
+    suffix = f"{mutation.chat_id}_{mutation.user_id}"
+    smart_cache.delete(f"player_{suffix}")
+    values = mutation.values
+    if values is None:
+        smart_cache.delete(f"medals_{suffix}")
+    elif 'score' in values:
+        smart_cache.set(f"medals_{suffix}", values['score'], ttl=MEDALS_CACHE_TTL)
+
+def _on_language_mutation(mutation: Mutation) -> None:
+    """Write the new language through | به‌روزرسانی کش زبان"""
+    cache_key = f"lang_{mutation.chat_id}_{mutation.user_id}"
+    language = (mutation.values or {}).get('language')
+    if language:
+        smart_cache.set(cache_key, language, ttl=LANG_CACHE_TTL)
+    else:
+        smart_cache.delete(cache_key)
+    smart_cache.delete(f"player_{mutation.chat_id}_{mutation.user_id}")
+
+def _on_defense_mutation(mutation: Mutation) -> None:
+    """Invalidate shield/intercept caches | ابطال کش سپر و رهگیری"""
+    suffix = f"{mutation.chat_id}_{mutation.user_id}"
+    smart_cache.delete(f"shield_{suffix}")
+    smart_cache.delete(f"intercept_{suffix}")
 
-# Global cache instance
-smart_cache = SmartCache(max_size=2000, default_ttl=600)
+mutation_bus.subscribe(PLAYER, _on_player_mutation)
+mutation_bus.subscribe(LANGUAGE, _on_language_mutation)
+mutation_bus.subscribe(COOLDOWN, _on_defense_mutation)
+mutation_bus.subscribe(DEFENSE, _on_defense_mutation)
 
 class AdvancedPlayerManager:
     """🎮 Advanced player management with AI features | مدیریت پیشرفته بازیکن با ویژگی‌های هوش مصنوعی"""
     
     def __init__(self, db_manager: DBManager):
         self.db_manager = db_manager
-        self._session_cache: Dict[int, GameSession] = {}
+        self._session_cache: Dict[int, GameSession] = BoundedStore('player_sessions', max_entries=10_000, idle_ttl=3600)
         self.achievement_tracker = AchievementTracker()
     
     async def ensure_group(self, chat_id: int, title: str, username: str) -> None:
@@ -318,6 +303,21 @@ class AdvancedPlayerManager:
             if cached_player:
                 return cached_player
             
+            # Concurrent misses for the same player share one upsert
+            return await single_flight("player").do(cache_key, self._upsert_player, chat_id, user, cache_key)
+            
+        except Exception as e:
+            logger.error(f"Error ensuring player {user.id} in {chat_id}: {e}")
+            return PlayerStats(user_id=user.id, chat_id=chat_id)
+    
+    async def _upsert_player(self, chat_id: int, user: telebot.types.User, cache_key: str) -> PlayerStats:
+        """Upsert player and cache its stats | درج یا به‌روزرسانی بازیکن و کش آمار"""
+        try:
+            # Another bot process may already have the player warm in the shared tier
+            shared = await smart_cache.fetch_shared([cache_key])
+            if cache_key in shared:
+                return shared[cache_key]
+            
             username = sanitize_text(user.username or "")
             first_name = sanitize_text(user.first_name or "Unknown")
             
@@ -339,11 +339,8 @@ class AdvancedPlayerManager:
             # Create player stats object
             player_stats = await self._get_player_stats(chat_id, user.id)
             
-            # Cache player data
-            smart_cache.set(cache_key, player_stats, ttl=300)
-            
-            # Check for achievements
-            await self.achievement_tracker.check_achievements(player_stats, self.db_manager)
+            # Cache player data (achievements are checked on game events, not here)
+            smart_cache.set(cache_key, player_stats, ttl=PLAYER_CACHE_TTL)
             
             return player_stats
             
@@ -358,19 +355,16 @@ class AdvancedPlayerManager:
                 SELECT user_id, chat_id, score, level, experience, 
                        attacks_made, attacks_received, victories, defeats,
                        shields_used, items_bought, activity_points,
-                       last_active, join_date, language
-                FROM players 
+                       last_active, join_date, language,
+                       ARRAY(
+                           SELECT achievement_id FROM player_achievements a
+                           WHERE a.chat_id = p.chat_id AND a.user_id = p.user_id
+                       ) AS achievements
+                FROM players p
                 WHERE chat_id=%s AND user_id=%s
             """, (chat_id, user_id), fetch="one_dict")
             
             if result:
-                # Get achievements
-                achievements_result = await self.db_manager.db(
-                    "SELECT achievement_id FROM player_achievements WHERE chat_id=%s AND user_id=%s",
-                    (chat_id, user_id), fetch="all"
-                )
-                achievements = [row['achievement_id'] for row in achievements_result] if achievements_result else []
-                
                 return PlayerStats(
                     user_id=result['user_id'],
                     chat_id=result['chat_id'],
@@ -387,7 +381,7 @@ class AdvancedPlayerManager:
                     last_active=result['last_active'] or 0,
                     join_date=result['join_date'] or now(),
                     language=result['language'] or "en",
-                    achievements=achievements
+                    achievements=list(result['achievements'] or [])
                 )
             else:
                 return PlayerStats(user_id=user_id, chat_id=chat_id)
@@ -400,24 +394,20 @@ class AdvancedPlayerManager:
         """Get player language with intelligent detection | دریافت زبان بازیکن با تشخیص هوشمند"""
         try:
             cache_key = f"lang_{chat_id}_{user_id}"
-            cached_lang = smart_cache.get(cache_key)
             
-            if cached_lang:
-                return cached_lang
+            async def load_language() -> Optional[str]:
+                result = await self.db_manager.db(
+                    "SELECT language FROM players WHERE chat_id=%s AND user_id=%s",
+                    (chat_id, user_id), 
+                    fetch="one_dict"
+                )
+                return result['language'] if result else None
             
-            result = await self.db_manager.db(
-                "SELECT language FROM players WHERE chat_id=%s AND user_id=%s",
-                (chat_id, user_id), 
-                fetch="one_dict"
+            # Unknown players are negatively cached for a minute
+            return await single_flight("lang").load(
+                smart_cache, cache_key, load_language, ttl=LANG_CACHE_TTL, negative_ttl=60, default="en"
             )
             
-            language = result['language'] if result else "en"
-            
-            # Cache language
-            smart_cache.set(cache_key, language, ttl=1800)
-            
-            return language
-            
         except Exception as e:
             logger.error(f"Error getting language for {user_id}: {e}")
             return "en"
@@ -431,13 +421,10 @@ class AdvancedPlayerManager:
             
             await self.db_manager.db(
                 "UPDATE players SET language=%s WHERE chat_id=%s AND user_id=%s",
-                (language, chat_id, user_id)
+                (language, chat_id, user_id),
+                touches=[Mutation(LANGUAGE, chat_id, user_id, {'language': language})]
             )
             
-            # Update cache
-            cache_key = f"lang_{chat_id}_{user_id}"
-            smart_cache.set(cache_key, language, ttl=1800)
-            
             logger.info(f"Language set to {language} for user {user_id} in {chat_id}")
             return True
             
@@ -478,11 +465,7 @@ class AdvancedPlayerManager:
                 WHERE chat_id=%s AND user_id=%s
             """
             
-            await self.db_manager.db(query, values)
-            
-            # Clear cache
-            cache_key = f"player_{chat_id}_{user_id}"
-            smart_cache.set(cache_key, None, ttl=0)  # Invalidate cache
+            await self.db_manager.db(query, values, touches=[Mutation(PLAYER, chat_id, user_id)])
             
             return True
             
@@ -494,24 +477,19 @@ class AdvancedPlayerManager:
         """Get player medal count with caching | دریافت تعداد مدال بازیکن با کشینگ"""
         try:
             cache_key = f"medals_{chat_id}_{user_id}"
-            cached_medals = smart_cache.get(cache_key)
             
-            if cached_medals is not None:
-                return cached_medals
+            async def load_medals() -> Optional[int]:
+                result = await self.db_manager.db(
+                    "SELECT score FROM players WHERE chat_id=%s AND user_id=%s",
+                    (chat_id, user_id), 
+                    fetch="one_dict"
+                )
+                return result['score'] if result else None
             
-            result = await self.db_manager.db(
-                "SELECT score FROM players WHERE chat_id=%s AND user_id=%s",
-                (chat_id, user_id), 
-                fetch="one_dict"
+            return await single_flight("medals").load(
+                smart_cache, cache_key, load_medals, ttl=MEDALS_CACHE_TTL, negative_ttl=30, default=0
             )
             
-            medals = result['score'] if result else 0
-            
-            # Cache medals
-            smart_cache.set(cache_key, medals, ttl=120)
-            
-            return medals
-            
         except Exception as e:
             logger.error(f"Error getting medals for {user_id}: {e}")
             return 0
@@ -523,19 +501,20 @@ class AdvancedPlayerManager:
             if amount <= 0:
                 return False
             
-            # Update medals
-            await self.db_manager.db(
-                "UPDATE players SET score = score + %s, last_active = %s WHERE chat_id=%s AND user_id=%s",
-                (amount, now(), chat_id, user_id)
+            # Update medals; no row means the player does not exist
+            row = await self.db_manager.db(
+                "UPDATE players SET score = score + %s, last_active = %s WHERE chat_id=%s AND user_id=%s RETURNING score",
+                (amount, now(), chat_id, user_id),
+                fetch="one"
             )
+            if not row:
+                logger.warning(f"No player {user_id} in chat {chat_id} to add medals to")
+                return False
+            self.db_manager.publish_mutations(Mutation(PLAYER, chat_id, user_id, {'score': row[0]}))
             
             # Log transaction
             await self._log_medal_transaction(chat_id, user_id, amount, reason)
             
-            # Clear cache
-            cache_key = f"medals_{chat_id}_{user_id}"
-            smart_cache.set(cache_key, None, ttl=0)  # Invalidate
-            
             # Check level progression
             await self._check_level_progression(chat_id, user_id)
             
@@ -574,6 +553,10 @@ class AdvancedPlayerManager:
                 
                 logger.info(f"Player {user_id} leveled up to {level_info['level']}")
                 
+                player_stats.level = level_info['level']
+                await self.achievement_tracker.check_achievements(
+                    player_stats, self.db_manager, event=AchievementTracker.LEVEL_UP)
+                
         except Exception as e:
             logger.error(f"Error checking level progression: {e}")
     
@@ -640,17 +623,19 @@ class AdvancedDefenseManager:
     async def get_shield_remaining(self, chat_id: int, user_id: int) -> Dict[str, Any]:
         """Get comprehensive shield information | دریافت اطلاعات جامع سپر"""
         try:
+            # The raw row is cached and remaining time computed per call, so the
+            # entry stays valid until a cooldown mutation invalidates it
             cache_key = f"shield_{chat_id}_{user_id}"
-            cached_shield = smart_cache.get(cache_key)
+            result = smart_cache.get(cache_key)
             
-            if cached_shield:
-                return cached_shield
-            
-            result = await self.db_manager.db(
-                "SELECT until, data FROM cooldowns WHERE chat_id=%s AND user_id=%s AND action='shield'",
-                (chat_id, user_id), 
-                fetch="one_dict"
-            )
+            if result is None:
+                row = await self.db_manager.db(
+                    "SELECT until, data FROM cooldowns WHERE chat_id=%s AND user_id=%s AND action='shield'",
+                    (chat_id, user_id), 
+                    fetch="one_dict"
+                )
+                result = {"until": row['until'], "data": row['data']} if row else {}
+                smart_cache.set(cache_key, result, ttl=SHIELD_CACHE_TTL)
             
             current_time = now()
             shield_info = {
@@ -671,9 +656,6 @@ class AdvancedDefenseManager:
                     "type": shield_data.get('type', 'basic')
                 })
             
-            # Cache result
-            smart_cache.set(cache_key, shield_info, ttl=60)
-            
             return shield_info
             
         except Exception as e:
@@ -781,12 +763,8 @@ class AdvancedDefenseManager:
                   SET until = EXCLUDED.until,
                       data  = EXCLUDED.data,
                       created_at = EXCLUDED.created_at
-            """, (chat_id, user_id, action, until, data, now()))
-            
-            # Clear relevant caches
-            cache_patterns = [f"shield_{chat_id}_{user_id}", f"intercept_{chat_id}_{user_id}"]
-            for pattern in cache_patterns:
-                smart_cache.set(pattern, None, ttl=0)  # Invalidate
+            """, (chat_id, user_id, action, until, data, now()),
+                touches=[Mutation(COOLDOWN, chat_id, user_id, {'type': action, 'expires_at': until})])
             
             return True
             
@@ -1063,71 +1041,11 @@ class AdvancedGameMechanics:
     def contains_attack_keyword(text: str, lang: str = "auto") -> Dict[str, Any]:
         """Advanced attack keyword detection with confidence scoring | تشخیص پیشرفته کلیدواژه حمله با امتیازدهی اعتماد"""
         try:
-            # Comprehensive attack keywords with weights
-            attack_patterns = {
-                "direct_attack": {
-                    "en": [
-                        (r'\b(attack|strike|hit|destroy|bomb|missile|nuke|eliminate)\b', 3),
-                        (r'\b(fight|battle|war|combat|assault|raid)\b', 2),
-                        (r'\b(shoot|fire|blast|explode|crush|smash)\b', 2)
-                    ],
-                    "fa": [
-                        (r'\b(حمله|ضربه|تخریب|بمباران|موشک|نابودی)\b', 3),
-                        (r'\b(جنگ|نبرد|مبارزه|حمله|یورش)\b', 2),
-                        (r'\b(شلیک|انفجار|درهم‌کوبیدن|له کردن)\b', 2)
-                    ]
-                },
-                "aggressive_intent": {
-                    "en": [
-                        (r'\b(kill|die|death|murder|slaughter)\b', 4),
-                        (r'\b(revenge|payback|retaliation)\b', 3),
-                        (r'\b(angry|mad|furious|rage)\b', 2)
-                    ],
-                    "fa": [
-                        (r'\b(بکش|بمیر|قتل|کشتار)\b', 4),
-                        (r'\b(انتقام|تلافی|انتقام‌جویی)\b', 3),
-                        (r'\b(عصبانی|خشمگین|غضبناک)\b', 2)
-                    ]
-                }
-            }
-            
-            # Auto-detect language if not specified
-            if lang == "auto":
-                # Simple Persian character detection
-                persian_chars = re.findall(r'[\u0600-\u06FF]', text)
-                lang = "fa" if len(persian_chars) > len(text) * 0.3 else "en"
-            
-            # Normalize text
-            normalized_text = re.sub(r'[^\w\s\u0600-\u06FF]', '', text.lower())
-            
-            total_score = 0
-            matched_patterns = []
-            
-            # Scan all patterns
-            for category, patterns_dict in attack_patterns.items():
-                if lang in patterns_dict:
-                    for pattern, weight in patterns_dict[lang]:
-                        matches = re.findall(pattern, normalized_text, re.IGNORECASE)
-                        if matches:
-                            score = len(matches) * weight
-                            total_score += score
-                            matched_patterns.append({
-                                "category": category,
-                                "pattern": pattern,
-                                "matches": matches,
-                                "score": score
-                            })
-            
-            # Calculate confidence (0-100)
-            confidence = min((total_score / 10) * 100, 100)
-            
+            # Lexicon is compiled once per language; repeated texts come from the detector's LRU
+            result = attack_keyword_detector.detect(text or "", lang)
             return {
-                "is_attack": total_score >= 3,
-                "confidence": round(confidence, 1),
-                "total_score": total_score,
-                "language": lang,
-                "matched_patterns": matched_patterns,
-                "severity": AdvancedGameMechanics._get_severity_level(total_score)
+                **result,
+                "severity": AdvancedGameMechanics._get_severity_level(result["total_score"])
             }
             
         except Exception as e:
@@ -1269,7 +1187,18 @@ class AdvancedGameMechanics:
             return "Battle completed."
 
 class AchievementTracker:
-    """🏆 Advanced achievement tracking system | سیستم پیشرفته ردیابی دستاوردها"""
+    """🏆 Advanced achievement tracking system | سیستم پیشرفته ردیابی دستاوردها
+    
+    The earned set comes with the player's stats (``PlayerStats.achievements``),
+    so evaluation is pure in-memory work; only new awards touch the database,
+    all of them in one statement. Each definition lists the game events that
+    can change its condition and is only evaluated for those.
+    """
+    
+    # Game events | رویدادهای بازی
+    ATTACK = "attack"
+    LEVEL_UP = "level_up"
+    SHIELD = "shield"
     
     def __init__(self):
         self.achievement_definitions = self._load_achievement_definitions()
@@ -1282,6 +1211,7 @@ class AchievementTracker:
                 "description": {"en": "Win your first battle", "fa": "اولین نبرد خود را ببرید"},
                 "icon": "🥇",
                 "condition": lambda stats: stats.victories >= 1,
+                "triggers": {self.ATTACK},
                 "reward_medals": 50
             },
             "level_5": {
@@ -1289,6 +1219,7 @@ class AchievementTracker:
                 "description": {"en": "Reach level 5", "fa": "به سطح ۵ برسید"},
                 "icon": "⭐",
                 "condition": lambda stats: stats.level >= 5,
+                "triggers": {self.LEVEL_UP},
                 "reward_medals": 100
             },
             "hundred_attacks": {
@@ -1296,6 +1227,7 @@ class AchievementTracker:
                 "description": {"en": "Make 100 attacks", "fa": "۱۰۰ حمله انجام دهید"},
                 "icon": "⚔️",
                 "condition": lambda stats: stats.attacks_made >= 100,
+                "triggers": {self.ATTACK},
                 "reward_medals": 200
             },
             "win_streak": {
@@ -1303,6 +1235,7 @@ class AchievementTracker:
                 "description": {"en": "Win 10 battles in a row", "fa": "۱۰ نبرد پشت سر هم ببرید"},
                 "icon": "🔥",
                 "condition": lambda stats: stats.victories >= 10 and stats.win_rate > 80,
+                "triggers": {self.ATTACK},
                 "reward_medals": 300
             },
             "shield_master": {
@@ -1310,45 +1243,55 @@ class AchievementTracker:
                 "description": {"en": "Use shields 50 times", "fa": "۵۰ بار از سپر استفاده کنید"},
                 "icon": "🛡️",
                 "condition": lambda stats: stats.shields_used >= 50,
+                "triggers": {self.SHIELD},
                 "reward_medals": 150
             }
         }
     
-    async def check_achievements(self, player_stats: PlayerStats, 
-                               db_manager: DBManager) -> List[Dict[str, Any]]:
-        """Check and award new achievements | بررسی و اعطای دستاوردهای جدید"""
+    def evaluate(self, player_stats: PlayerStats, event: Optional[str] = None) -> List[str]:
+        """Unearned achievements whose condition now holds | دستاوردهای کسب‌نشده‌ای که شرطشان برقرار است"""
+        earned = set(player_stats.achievements)
+        return [
+            achievement_id
+            for achievement_id, achievement in self.achievement_definitions.items()
+            if achievement_id not in earned
+            and (event is None or event in achievement["triggers"])
+            and achievement["condition"](player_stats)
+        ]
+    
+    def has_triggers(self, event: str) -> bool:
+        """Whether any achievement depends on ``event`` | آیا دستاوردی به این رویداد وابسته است"""
+        return any(event in achievement["triggers"] for achievement in self.achievement_definitions.values())
+    
+    async def check_achievements(self, player_stats: PlayerStats, db_manager: DBManager,
+                                 event: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Check and award new achievements | بررسی و اعطای دستاوردهای جدید
+        
+        ``event`` limits evaluation to the definitions it can affect; ``None``
+        evaluates all of them.
+        """
         try:
-            new_achievements = []
-            
-            for achievement_id, achievement in self.achievement_definitions.items():
-                # Check if player already has this achievement
-                existing = await db_manager.db("""
-                    SELECT 1 FROM player_achievements 
-                    WHERE chat_id=%s AND user_id=%s AND achievement_id=%s
-                """, (player_stats.chat_id, player_stats.user_id, achievement_id), fetch="one")
-                
-                if not existing and achievement["condition"](player_stats):
-                    # Award achievement
-                    await db_manager.db("""
-                        INSERT INTO player_achievements(chat_id, user_id, achievement_id, earned_at)
-                        VALUES(%s, %s, %s, %s)
-                    """, (player_stats.chat_id, player_stats.user_id, achievement_id, now()))
-                    
-                    # Award medals
-                    await db_manager.db("""
-                        UPDATE players SET score = score + %s 
-                        WHERE chat_id=%s AND user_id=%s
-                    """, (achievement["reward_medals"], player_stats.chat_id, player_stats.user_id))
-                    
-                    new_achievements.append({
-                        "id": achievement_id,
-                        "name": achievement["name"],
-                        "description": achievement["description"],
-                        "icon": achievement["icon"],
-                        "reward_medals": achievement["reward_medals"]
-                    })
+            candidates = self.evaluate(player_stats, event)
+            if not candidates:
+                return []
             
-            return new_achievements
+            awarded = await db_manager.award_achievements(
+                player_stats.chat_id, player_stats.user_id,
+                {achievement_id: self.achievement_definitions[achievement_id]["reward_medals"]
+                 for achievement_id in candidates}
+            )
+            player_stats.achievements.extend(awarded)
+            
+            return [
+                {
+                    "id": achievement_id,
+                    "name": self.achievement_definitions[achievement_id]["name"],
+                    "description": self.achievement_definitions[achievement_id]["description"],
+                    "icon": self.achievement_definitions[achievement_id]["icon"],
+                    "reward_medals": self.achievement_definitions[achievement_id]["reward_medals"]
+                }
+                for achievement_id in awarded
+            ]
             
         except Exception as e:
             logger.error(f"Error checking achievements: {e}")
@@ -1608,7 +1551,8 @@ class PerformanceMonitor:
     """📈 Performance monitoring and analytics | نظارت و آنالیتیکس عملکرد"""
     
     def __init__(self):
-        self.metrics = defaultdict(list)
+        # Fixed-memory streaming histograms instead of last-100 lists
+        self.metrics: Dict[str, StreamingHistogram] = defaultdict(StreamingHistogram)
         self.start_time = time.time()
     
     def track_execution_time(self, function_name: str):
@@ -1616,19 +1560,15 @@ class PerformanceMonitor:
         def decorator(func):
             @wraps(func)
             async def wrapper(*args, **kwargs):
-                start = time.time()
+                start = time.perf_counter()
                 try:
                     result = await func(*args, **kwargs)
-                    execution_time = time.time() - start
-                    self.metrics[function_name].append(execution_time)
-                    
-                    # Keep only recent 100 measurements
-                    if len(self.metrics[function_name]) > 100:
-                        self.metrics[function_name] = self.metrics[function_name][-100:]
-                    
+                    execution_time = time.perf_counter() - start
+                    self.metrics[function_name].record(execution_time)
+                    FUNCTION_LATENCY.observe(execution_time, function=function_name)
                     return result
                 except Exception as e:
-                    execution_time = time.time() - start
+                    execution_time = time.perf_counter() - start
                     logger.error(f"Function {function_name} failed after {execution_time:.3f}s: {e}")
                     raise
             return wrapper
@@ -1638,19 +1578,24 @@ class PerformanceMonitor:
         """Get comprehensive performance statistics"""
         stats = {}
         
-        for function_name, times in self.metrics.items():
-            if times:
+        for function_name, histogram in self.metrics.items():
+            if histogram.count:
+                snapshot = histogram.snapshot()
                 stats[function_name] = {
-                    "calls": len(times),
-                    "avg_time": statistics.mean(times),
-                    "min_time": min(times),
-                    "max_time": max(times),
-                    "total_time": sum(times)
+                    "calls": snapshot["count"],
+                    "avg_time": snapshot["mean"],
+                    "min_time": snapshot["min"],
+                    "max_time": snapshot["max"],
+                    "total_time": snapshot["sum"],
+                    "p50": snapshot["p50"],
+                    "p95": snapshot["p95"],
+                    "p99": snapshot["p99"],
+                    "p999": snapshot["p999"]
                 }
         
         # Global stats
         uptime = time.time() - self.start_time
-        total_calls = sum(len(times) for times in self.metrics.values())
+        total_calls = sum(histogram.count for histogram in self.metrics.values())
         
         stats["_global"] = {
             "uptime_seconds": uptime,
@@ -1697,12 +1642,39 @@ async def ensure_player(chat_id: int, user: telebot.types.User, db_manager: DBMa
     manager = _get_player_manager(db_manager)
     return await manager.ensure_player(chat_id, user)
 
+@performance_monitor.track_execution_time("check_player_achievements")
+async def check_player_achievements(chat_id: int, user_id: int, event: str,
+                                    db_manager: DBManager) -> List[Dict[str, Any]]:
+    """Evaluate achievements after a game event | بررسی دستاوردها پس از رویداد بازی"""
+    manager = _get_player_manager(db_manager)
+    if not manager.achievement_tracker.has_triggers(event):
+        return []
+    player_stats = await manager._get_player_stats(chat_id, user_id)
+    return await manager.achievement_tracker.check_achievements(player_stats, db_manager, event=event)
+
+async def _achievements_on_attack(event: AttackResolved, db_manager: DBManager) -> None:
+    """Combat achievements for the attacker | دستاوردهای نبرد مهاجم"""
+    await check_player_achievements(event.chat_id, event.user_id, AchievementTracker.ATTACK, db_manager)
+
+async def _achievements_on_item_used(event: ItemUsed, db_manager: DBManager) -> None:
+    """Defense achievements when a shield is raised | دستاوردهای دفاعی هنگام استفاده از سپر"""
+    if event.item_type in ('shield', 'intercept'):
+        await check_player_achievements(event.chat_id, event.user_id, AchievementTracker.SHIELD, db_manager)
+
+event_bus.subscribe(AttackResolved, _achievements_on_attack)
+event_bus.subscribe(ItemUsed, _achievements_on_item_used)
+
 @performance_monitor.track_execution_time("get_lang")
 async def get_lang(chat_id: int, user_id: int, db_manager: DBManager) -> str:
     """Enhanced legacy wrapper for get_language | بسته‌بندی پیشرفته برای دریافت زبان"""
     manager = _get_player_manager(db_manager)
     return await manager.get_language(chat_id, user_id)
 
+def peek_lang(chat_id: int, user_id: int, default: str = "en") -> str:
+    """Cached player language without touching the database | زبان کش‌شده بازیکن بدون دسترسی به پایگاه داده"""
+    lang = smart_cache.get(f"lang_{chat_id}_{user_id}")
+    return lang if isinstance(lang, str) else default
+
 @performance_monitor.track_execution_time("set_lang")
 async def set_lang(chat_id: int, user_id: int, lang: str, db_manager: DBManager) -> bool:
     """Enhanced legacy wrapper for set_language | بسته‌بندی پیشرفته برای تنظیم زبان"""
@@ -1877,6 +1849,18 @@ def ensure_group_command(bot: telebot.async_telebot.AsyncTeleBot, db_manager: DB
         return wrapper
     return decorator
 
+def ensure_rate_limit(bot: telebot.async_telebot.AsyncTeleBot, db_manager: DBManager,
+                      limiter: RateLimiter, key: Callable[[Any], Any] = by_user):
+    """Decorator refusing commands over the limiter's rate | دکوراتور محدودیت نرخ دستورات"""
+    async def reject(message: telebot.types.Message, decision) -> None:
+        try:
+            lang = await get_lang(message.chat.id, message.from_user.id, db_manager)
+            text = T[lang].get('rate_limited', "⚠️ Too many requests, try again in {seconds}s.")
+            await bot.reply_to(message, text.format(seconds=max(1, math.ceil(decision.retry_after))))
+        except Exception as e:
+            logger.error(f"Error replying to rate limited command: {e}")
+    return rate_limited(limiter, key, on_limited=reject)
+
 # 🚀 Advanced Helper Functions | توابع کمکی پیشرفته
 
 async def get_comprehensive_player_info(chat_id: int, user_id: int, 
@@ -2018,16 +2002,8 @@ async def check_cooldown(chat_id: int, user_id: int, cooldown_type: str, db_mana
     Returns 0 if no cooldown is active
     """
     try:
-        cooldown_data = await db_manager.db(
-            "SELECT expires_at FROM cooldowns WHERE chat_id=%s AND user_id=%s AND cooldown_type=%s AND expires_at > %s",
-            (chat_id, user_id, cooldown_type, now()),
-            fetch="one_dict"
-        )
-        
-        if cooldown_data and cooldown_data.get("expires_at"):
-            # Return remaining seconds
-            return cooldown_data["expires_at"] - now()
-        return 0
+        # Answered from memory for engine-managed types, from the database otherwise
+        return await cooldown_engine.remaining(chat_id, user_id, cooldown_type)
     except Exception as e:
         logger.error(f"Error checking cooldown: {e}")
         return 0
@@ -2038,21 +2014,7 @@ async def set_cooldown(chat_id: int, user_id: int, cooldown_type: str, duration:
     Returns True if successful, False otherwise
     """
     try:
-        expires_at = now() + duration
-        
-        # First remove any existing cooldown of this type
-        await db_manager.db(
-            "DELETE FROM cooldowns WHERE chat_id=%s AND user_id=%s AND cooldown_type=%s",
-            (chat_id, user_id, cooldown_type)
-        )
-        
-        # Then add the new cooldown
-        await db_manager.db(
-            "INSERT INTO cooldowns (chat_id, user_id, cooldown_type, expires_at, created_at) VALUES (%s, %s, %s, %s, %s)",
-            (chat_id, user_id, cooldown_type, expires_at, now())
-        )
-        
-        return True
+        return await cooldown_engine.set(chat_id, user_id, cooldown_type, duration)
     except Exception as e:
         logger.error(f"Error setting cooldown: {e}")
         return False
@@ -2092,40 +2054,15 @@ async def update_activity_score(chat_id: int, user_id: int, activity_type: str,
         # Get points for this activity type
         points = activity_points.get(activity_type, 1)
         
-        # Update activity points and last active timestamp
-        await db_manager.db(
+        # Update activity points and last active timestamp (once per event when run by a subscriber)
+        await db_manager.apply_once(
+            current_delivery(),
             "UPDATE players SET activity_points = activity_points + %s, last_active = %s WHERE chat_id=%s AND user_id=%s",
             (points, now(), chat_id, user_id)
         )
     except Exception as e:
         logger.error(f"Error updating activity score: {e}")
-        
-async def add_medals(user_id: int, chat_id: int, amount: int, db_manager: DBManager) -> bool:
-    """
-    Add or remove medals from a user
-    Returns True if successful, False otherwise
-    """
-    try:
-        # Update user's score (medals)
-        await db_manager.db(
-            "UPDATE players SET score = score + %s WHERE chat_id=%s AND user_id=%s",
-            (amount, chat_id, user_id)
-        )
-        
-        # Log transaction if significant amount
-        if abs(amount) >= 50:
-            transaction_type = "bonus" if amount > 0 else "purchase"
-            await db_manager.db(
-                "INSERT INTO transactions (chat_id, user_id, amount, transaction_type, created_at) VALUES (%s, %s, %s, %s, %s)",
-                (chat_id, user_id, amount, transaction_type, now())
-            )
-        
-        return True
-    except Exception as e:
-        logger.error(f"Error adding medals: {e}")
-        return False
-        
-    
+
 
 # Export enhanced classes and instances
 __all__ = [
@@ -2137,17 +2074,17 @@ __all__ = [
     'PlayerStats', 'GameSession', 'ActionType', 'DifficultyLevel', 'CacheEntry',
     
     # Utility systems
-    'SmartCache', 'smart_cache', 'performance_monitor',
+    'SmartCache', 'smart_cache', 'get_bot_info', 'peek_lang', 'performance_monitor',
     
     # Enhanced helper functions
     'format_time_persian', 'format_duration', 'sanitize_text',
     'get_comprehensive_player_info', 'get_group_analytics',
     
     # Legacy compatibility functions
-    'ensure_group', 'ensure_player', 'get_lang', 'set_lang', 'medals', 'add_medals',
+    'ensure_group', 'ensure_player', 'check_player_achievements', 'get_lang', 'set_lang', 'medals', 'add_medals',
     'shield_rem', 'intercept_state', 'update_cooldown', 'get_args', 'contains_attack_keyword',
     'get_weapon_display_name', 'get_weapon_emoji', 'get_player_level_info', 
-    'handle_regular_messages', 'ensure_group_command',
+    'handle_regular_messages', 'ensure_group_command', 'ensure_rate_limit',
     
     # Time functions
     'now'
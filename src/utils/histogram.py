@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+هیستوگرام جریانی با حافظه ثابت برای محاسبه صدک‌ها
+Fixed-memory Streaming Histogram for latency quantiles
+
+سطل‌های لگاریتمی (به سبک HDR/DDSketch) با خطای نسبی ثابت، ثبت O(1)،
+قابلیت ادغام بین چند پردازش و محاسبه p50/p95/p99/p999 روی پنجره لغزان.
+
+Log-spaced buckets with a bounded relative error: a value ``v`` lands in
+bucket ``ceil(log_gamma(v))`` where ``gamma = (1 + a) / (1 - a)``, so every
+reported quantile is within ``a`` (default 1%) of the true value. Buckets are
+kept sparsely per time slot; a ring of slots forms the sliding window and a
+lifetime bucket map backs all-time statistics. Histograms with the same
+configuration merge bucket-by-bucket, and slots are aligned on wall-clock
+epochs so histograms from different workers merge correctly.
+"""
+
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_QUANTILES: Tuple[float, ...] = (0.5, 0.95, 0.99, 0.999)
+
+
+class _Slot:
+    """برش زمانی پنجره - One time slot of the sliding window"""
+    __slots__ = ('epoch', 'buckets', 'count', 'total')
+
+    def __init__(self):
+        self.epoch = -1
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+
+    def reset(self, epoch: int) -> None:
+        self.epoch = epoch
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+
+
+class StreamingHistogram:
+    """هیستوگرام جریانی - Streaming quantile histogram"""
+
+    __slots__ = (
+        'window_seconds', 'relative_error', 'min_value', 'max_value',
+        '_slot_width', '_slots', '_log_gamma', '_gamma', '_min_index', '_max_index',
+        '_lifetime', 'count', 'total', 'min', 'max',
+    )
+
+    def __init__(self, window_seconds: float = 60.0, sub_windows: int = 6,
+                 relative_error: float = 0.01, min_value: float = 1e-6, max_value: float = 3600.0):
+        self.window_seconds = window_seconds
+        self.relative_error = relative_error
+        self.min_value = min_value
+        self.max_value = max_value
+        self._slot_width = window_seconds / sub_windows
+        self._slots: List[_Slot] = [_Slot() for _ in range(sub_windows)]
+        self._gamma = (1 + relative_error) / (1 - relative_error)
+        self._log_gamma = math.log(self._gamma)
+        self._min_index = math.ceil(math.log(min_value) / self._log_gamma)
+        self._max_index = math.ceil(math.log(max_value) / self._log_gamma)
+        self._lifetime: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    # -------------------------------------------------------------------------
+    # ثبت - Recording
+    # -------------------------------------------------------------------------
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return self._min_index
+        index = math.ceil(math.log(value) / self._log_gamma)
+        return index if index < self._max_index else self._max_index
+
+    def _value(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def _slot(self, now: float) -> _Slot:
+        epoch = int(now // self._slot_width)
+        slot = self._slots[epoch % len(self._slots)]
+        if slot.epoch != epoch:
+            slot.reset(epoch)
+        return slot
+
+    def record(self, value: float, now: Optional[float] = None) -> None:
+        """ثبت مقدار در O(1) - Record a value in O(1)"""
+        index = self._index(value)
+        slot = self._slot(time.time() if now is None else now)
+        slot.buckets[index] = slot.buckets.get(index, 0) + 1
+        slot.count += 1
+        slot.total += value
+        self._lifetime[index] = self._lifetime.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'StreamingHistogram') -> None:
+        """ادغام با هیستوگرام دیگر - Merge another histogram with the same configuration"""
+        if (other._gamma != self._gamma or len(other._slots) != len(self._slots)
+                or other._slot_width != self._slot_width):
+            raise ValueError("Cannot merge histograms with different configurations")
+        for index, hits in other._lifetime.items():
+            self._lifetime[index] = self._lifetime.get(index, 0) + hits
+        for theirs in other._slots:
+            if theirs.epoch < 0:
+                continue
+            ours = self._slots[theirs.epoch % len(self._slots)]
+            if ours.epoch < theirs.epoch:
+                ours.reset(theirs.epoch)
+            elif ours.epoch > theirs.epoch:
+                continue
+            for index, hits in theirs.buckets.items():
+                ours.buckets[index] = ours.buckets.get(index, 0) + hits
+            ours.count += theirs.count
+            ours.total += theirs.total
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    # -------------------------------------------------------------------------
+    # پرس‌وجو - Queries
+    # -------------------------------------------------------------------------
+
+    def _window_slots(self, now: float) -> Iterable[_Slot]:
+        current = int(now // self._slot_width)
+        oldest = current - len(self._slots) + 1
+        return [slot for slot in self._slots if oldest <= slot.epoch <= current]
+
+    def _quantiles_from(self, buckets: Dict[int, int], count: int,
+                        quantiles: Iterable[float]) -> Dict[float, float]:
+        result = {q: 0.0 for q in quantiles}
+        if count == 0:
+            return result
+        ordered = sorted(buckets.items())
+        targets = sorted(result)
+        position = 0
+        seen = 0
+        for index, hits in ordered:
+            seen += hits
+            while position < len(targets) and seen >= targets[position] * count:
+                result[targets[position]] = self._value(index)
+                position += 1
+            if position == len(targets):
+                break
+        return result
+
+    def window_quantiles(self, quantiles: Iterable[float] = DEFAULT_QUANTILES,
+                         now: Optional[float] = None) -> Dict[float, float]:
+        """صدک‌ها روی پنجره لغزان - Quantiles over the sliding window"""
+        merged: Dict[int, int] = {}
+        count = 0
+        for slot in self._window_slots(time.time() if now is None else now):
+            count += slot.count
+            for index, hits in slot.buckets.items():
+                merged[index] = merged.get(index, 0) + hits
+        return self._quantiles_from(merged, count, quantiles)
+
+    def quantiles(self, quantiles: Iterable[float] = DEFAULT_QUANTILES) -> Dict[float, float]:
+        """صدک‌های کل دوره - All-time quantiles"""
+        return self._quantiles_from(self._lifetime, self.count, quantiles)
+
+    def window_count(self, now: Optional[float] = None) -> Tuple[int, float]:
+        """تعداد و مجموع پنجره - (count, sum) over the sliding window"""
+        count = 0
+        total = 0.0
+        for slot in self._window_slots(time.time() if now is None else now):
+            count += slot.count
+            total += slot.total
+        return count, total
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def snapshot(self, now: Optional[float] = None) -> Dict[str, float]:
+        """خلاصه آماری - Summary with lifetime totals and windowed percentiles"""
+        now = time.time() if now is None else now
+        window_count, window_total = self.window_count(now)
+        percentiles = self.window_quantiles(DEFAULT_QUANTILES, now)
+        return {
+            'count': self.count,
+            'sum': self.total,
+            'mean': self.mean,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+            'window_count': window_count,
+            'window_mean': window_total / window_count if window_count else 0.0,
+            'p50': percentiles[0.5],
+            'p95': percentiles[0.95],
+            'p99': percentiles[0.99],
+            'p999': percentiles[0.999],
+        }
+
+
+__all__ = ['StreamingHistogram', 'DEFAULT_QUANTILES']
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+تطبیق کلیدواژه در یک گذر
+Single-pass Keyword Matching
+
+همه کلیدواژه‌های یک واژه‌نامه (برای چند برچسب، مثلاً قصد و احساس) در
+یک عبارت باقاعده درختی (trie) کامپایل می‌شوند، پس هر پیام فقط یک بار
+پیمایش می‌شود. متن و کلیدواژه‌ها با یک نرمال‌ساز مشترک فارسی/عربی یکسان
+می‌شوند.
+
+Word boundaries treat ZWNJ (U+200C) as part of a word: Python's ``\b``
+splits ``بی‌فایده‌ای`` into three words, so ``بی`` or ``فایده`` alone would
+match inside it. Instead a keyword must not touch a word character or ZWNJ
+on either side, except for a common inflectional suffix attached with ZWNJ
+(``سلاح‌ها``, ``بد‌ترین``). Spaces and ZWNJ inside a keyword match each
+other and may be omitted, so ``خوش آمدی`` also matches ``خوش‌آمدی``.
+"""
+
+import re
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, NamedTuple, Tuple, Union
+
+ZWNJ = '\u200c'
+
+# حروف عربی به فارسی، حذف اعراب و کشیده، ارقام به لاتین
+# Arabic letter forms to Persian, diacritics and tatweel dropped, digits to ASCII
+_FOLD = str.maketrans({
+    'ي': 'ی',  # Arabic yeh
+    'ى': 'ی',  # alef maksura
+    'ك': 'ک',  # Arabic kaf
+    'ة': 'ه',  # teh marbuta
+    'ۀ': 'ه',  # heh with yeh above
+    'أ': 'ا',  # alef with hamza above
+    'إ': 'ا',  # alef with hamza below
+    '\u200d': None,  # zero width joiner
+    '\u0640': None,  # tatweel
+    '\u0670': None,  # superscript alef
+    **{chr(code): None for code in range(0x064b, 0x0660)},  # harakat
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+})
+
+_SEPARATORS = re.compile(r'[\s\u200c]+')
+
+# Persian suffixes written after a ZWNJ that keep a keyword recognisable
+PERSIAN_SUFFIXES = ('ها', 'های', 'هایی', 'ای', 'ی', 'تر', 'ترین', 'م', 'ت', 'ش', 'مان', 'تان', 'شان')
+
+KeywordSpec = Union[Iterable[str], Mapping[str, float]]
+
+
+def normalize_text(text: str) -> str:
+    """نرمال‌سازی متن - Fold Arabic forms and digits, drop diacritics, lowercase"""
+    return text.translate(_FOLD).lower()
+
+
+def keyword_key(keyword: str) -> str:
+    """کلید کلیدواژه - Separator-free form used to look a match up"""
+    return _SEPARATORS.sub('', keyword)
+
+# =============================================================================
+# ساخت الگو - Pattern construction
+# =============================================================================
+
+def _trie_pattern(keywords: Iterable[str]) -> str:
+    """الگوی درختی - Regex alternation of ``keywords`` factored as a trie"""
+    trie: Dict[str, dict] = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return _emit(trie)
+
+
+def _emit(node: Dict[str, dict]) -> str:
+    branches = [
+        (r'[\s\u200c]*' if char == ' ' else re.escape(char)) + _emit(child)
+        for char, child in sorted(node.items()) if char
+    ]
+    if not branches:
+        return ''
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if '' in node:
+        # A keyword ends here; greedy ``?`` still prefers the longer keyword
+        return ('(?:' + body + ')' if len(branches) == 1 else body) + '?'
+    return body
+
+# =============================================================================
+# تطبیق‌دهنده - Matcher
+# =============================================================================
+
+class Scan(NamedTuple):
+    """نتیجه پیمایش - Scores and keyword hits per label"""
+    scores: Dict[Hashable, float]
+    hits: Dict[Hashable, List[str]]
+
+
+class KeywordMatcher:
+    """تطبیق‌دهنده کلیدواژه - Compiled matcher over a labelled lexicon"""
+    __slots__ = ('labels', 'lexicon', 'pattern', '_lookup')
+
+    def __init__(self, lexicon: Mapping[Hashable, KeywordSpec]):
+        self.labels: Tuple[Hashable, ...] = tuple(lexicon)
+        # Weighted keywords per label, kept so the matcher can be rebuilt elsewhere (worker processes)
+        self.lexicon: Dict[Hashable, Dict[str, float]] = {}
+        self._lookup: Dict[str, List[Tuple[Hashable, float, str]]] = {}
+        spaced = set()
+        for label, spec in lexicon.items():
+            weights = self.lexicon[label] = dict(spec) if isinstance(spec, Mapping) else dict.fromkeys(spec, 1)
+            for keyword, weight in weights.items():
+                normalized = _SEPARATORS.sub(' ', normalize_text(keyword)).strip()
+                spaced.add(normalized)
+                self._lookup.setdefault(keyword_key(normalized), []).append((label, weight, normalized))
+
+        suffixes = '|'.join(sorted(PERSIAN_SUFFIXES, key=len, reverse=True))
+        self.pattern = re.compile(
+            r'(?<![\w\u200c])(?P<keyword>' + _trie_pattern(spaced) + r')'
+            r'(?:\u200c(?:' + suffixes + r'))?(?![\w\u200c])'
+        )
+
+    def scan(self, text: str) -> Scan:
+        """پیمایش متن - Score every label in one pass over ``text``"""
+        scores: Dict[Hashable, float] = {}
+        hits: Dict[Hashable, List[str]] = {}
+        if not text:
+            return Scan(scores, hits)
+        lookup = self._lookup
+        for match in self.pattern.finditer(normalize_text(text)):
+            for label, weight, keyword in lookup.get(keyword_key(match.group('keyword')), ()):
+                scores[label] = scores.get(label, 0) + weight
+                hits.setdefault(label, []).append(keyword)
+        return Scan(scores, hits)
+
+    def best(self, scan: Scan, labels: Iterable[Hashable], default: Hashable) -> Hashable:
+        """بهترین برچسب - Highest scoring of ``labels`` (first wins ties), else ``default``"""
+        best, best_score = default, 0
+        for label in labels:
+            score = scan.scores.get(label, 0)
+            if score > best_score:
+                best, best_score = label, score
+        return best
+
+# =============================================================================
+# تشخیص کلیدواژه حمله - Attack keyword detection
+# =============================================================================
+
+# واژه‌نامه وزن‌دار حمله - Weighted attack lexicon: category -> language -> (keywords, weight)
+ATTACK_LEXICON: Dict[str, Dict[str, List[Tuple[Tuple[str, ...], int]]]] = {
+    "direct_attack": {
+        "en": [
+            (('attack', 'strike', 'hit', 'destroy', 'bomb', 'missile', 'nuke', 'eliminate'), 3),
+            (('fight', 'battle', 'war', 'combat', 'assault', 'raid'), 2),
+            (('shoot', 'fire', 'blast', 'explode', 'crush', 'smash'), 2)
+        ],
+        "fa": [
+            (('حمله', 'ضربه', 'تخریب', 'بمباران', 'موشک', 'نابودی'), 3),
+            (('جنگ', 'نبرد', 'مبارزه', 'حمله', 'یورش'), 2),
+            (('شلیک', 'انفجار', 'درهم‌کوبیدن', 'له کردن'), 2)
+        ]
+    },
+    "aggressive_intent": {
+        "en": [
+            (('kill', 'die', 'death', 'murder', 'slaughter'), 4),
+            (('revenge', 'payback', 'retaliation'), 3),
+            (('angry', 'mad', 'furious', 'rage'), 2)
+        ],
+        "fa": [
+            (('بکش', 'بمیر', 'قتل', 'کشتار'), 4),
+            (('انتقام', 'تلافی', 'انتقام‌جویی'), 3),
+            (('عصبانی', 'خشمگین', 'غضبناک'), 2)
+        ]
+    }
+}
+
+_PERSIAN_CHARS = re.compile(r'[\u0600-\u06FF]')
+
+
+def detect_language(text: str) -> str:
+    """تشخیص زبان - 'fa' when more than 30% of the characters are Persian/Arabic, else 'en'"""
+    persian = len(text) - len(_PERSIAN_CHARS.sub('', text))
+    return "fa" if persian > len(text) * 0.3 else "en"
+
+
+class AttackKeywordDetector:
+    """
+    تشخیص‌دهنده کلیدواژه حمله - Attack keyword detector
+    
+    One matcher per language is compiled from ``ATTACK_LEXICON``; each label is
+    a (category, weighted group) pair, so a keyword listed in two groups scores
+    in both. Results for repeated texts (spam, stickers sent as text) come from
+    a small LRU keyed by the text's hash and length rather than the text itself.
+    """
+
+    def __init__(self, lexicon: Mapping[str, Mapping[str, List[Tuple[Tuple[str, ...], int]]]] = ATTACK_LEXICON,
+                 cache_size: int = 1024):
+        self.cache_size = cache_size
+        self.groups: Dict[Tuple[str, str, int], Tuple[str, ...]] = {}
+        by_language: Dict[str, Dict[Tuple[str, int], Dict[str, int]]] = {}
+        for category, languages in lexicon.items():
+            for lang, groups in languages.items():
+                for index, (keywords, weight) in enumerate(groups):
+                    label = (category, index)
+                    self.groups[(lang, category, index)] = keywords
+                    by_language.setdefault(lang, {})[label] = dict.fromkeys(keywords, weight)
+        self.matchers: Dict[str, KeywordMatcher] = {
+            lang: KeywordMatcher(labels) for lang, labels in by_language.items()
+        }
+        self._cache: 'OrderedDict[Tuple[int, int, str], Dict[str, Any]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def detect(self, text: str, lang: str = "auto") -> Dict[str, Any]:
+        """تشخیص - Score ``text``; the result dict is shared with the cache, do not mutate it"""
+        key = (hash(text), len(text), lang)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        result = self._score(text, detect_language(text) if lang == "auto" else lang)
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def _score(self, text: str, lang: str) -> Dict[str, Any]:
+        total_score = 0
+        matched_patterns = []
+        matcher = self.matchers.get(lang)
+        if matcher is not None:
+            scan = matcher.scan(text)
+            for category, index in matcher.labels:
+                score = scan.scores.get((category, index))
+                if not score:
+                    continue
+                total_score += score
+                matched_patterns.append({
+                    "category": category,
+                    "pattern": '|'.join(self.groups[(lang, category, index)]),
+                    "matches": scan.hits[(category, index)],
+                    "score": score
+                })
+
+        return {
+            "is_attack": total_score >= 3,
+            "confidence": round(min((total_score / 10) * 100, 100), 1),
+            "total_score": total_score,
+            "language": lang,
+            "matched_patterns": matched_patterns
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Cache statistics"""
+        return {'cached': len(self._cache), 'hits': self.hits, 'misses': self.misses}
+
+
+# نمونه سراسری - Global detector
+attack_keyword_detector = AttackKeywordDetector()
+
+__all__ = [
+    'KeywordMatcher', 'Scan', 'normalize_text', 'keyword_key', 'PERSIAN_SUFFIXES', 'ZWNJ',
+    'AttackKeywordDetector', 'attack_keyword_detector', 'detect_language', 'ATTACK_LEXICON'
+]
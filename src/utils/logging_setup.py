@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+خط لوله لاگ غیرمسدودکننده و ساختاریافته
+Non-blocking Structured Logging Pipeline
+
+- رکوردها از طریق QueueHandler در یک صف محدود قرار می‌گیرند و نخ شنونده
+  (QueueListener) قالب‌بندی و نوشتن روی فایل/کنسول را انجام می‌دهد
+- هر جفت لاگ انگلیسی/فارسی به یک رکورد با فیلد ``fa`` تبدیل می‌شود
+- لاگ‌های سطح DEBUG برای هر محل فراخوانی نمونه‌برداری می‌شوند
+- سطح لاگ برای هر ماژول قابل تنظیم است
+
+Callers only pay for building the record and a non-blocking ``put`` on a
+bounded queue; formatting, structlog rendering and file I/O happen on the
+listener thread. When the queue is full the record is dropped and counted
+rather than blocking the event loop. The listener folds the usual
+"English line followed by Persian line" pair into a single record carrying
+the Persian text as ``fa``; new code can pass ``extra={'fa': ...}`` directly.
+"""
+
+import atexit
+import copy
+import logging
+import queue
+import re
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from src.utils.metrics import LOG_RECORDS_DROPPED
+
+try:
+    import structlog
+    STRUCTLOG_AVAILABLE = True
+except ImportError:
+    structlog = None
+    STRUCTLOG_AVAILABLE = False
+
+LOG_FORMAT = '%(asctime)s | %(name)s | %(levelname)s | %(message)s'
+LOG_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_PERSIAN_CHARS = re.compile(r'[\u0600-\u06FF\uFB50-\uFDFF\uFE70-\uFEFF]')
+_LATIN_CHARS = re.compile(r'[A-Za-z]')
+
+_listener: Optional[QueueListener] = None
+
+
+def is_persian(text: str) -> bool:
+    """تشخیص متن فارسی - True when Persian letters outnumber Latin letters"""
+    persian = len(_PERSIAN_CHARS.findall(text))
+    return persian > 0 and persian >= len(_LATIN_CHARS.findall(text))
+
+# =============================================================================
+# فیلتر نمونه‌برداری - Debug Sampling
+# =============================================================================
+
+class DebugSampler(logging.Filter):
+    """نمونه‌بردار لاگ‌های دیباگ - Keep one in N debug records per call site"""
+
+    def __init__(self, rate: float = 0.1):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._seen: Dict[Tuple[str, int], int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        if self.every:
+            key = (record.name, record.lineno)
+            seen = self._seen.get(key, 0)
+            self._seen[key] = seen + 1
+            if seen % self.every == 0:
+                return True
+        LOG_RECORDS_DROPPED.inc(reason='sampled')
+        return False
+
+# =============================================================================
+# صف و شنونده - Queue Handler and Listener
+# =============================================================================
+
+class NonBlockingQueueHandler(QueueHandler):
+    """هندلر صف غیرمسدودکننده - Enqueue records without ever blocking the caller"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated later) but leave formatting and
+        # traceback rendering to the listener thread.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        fa = getattr(record, 'fa', None)
+        if fa is not None and record.args:
+            try:
+                record.fa = fa % record.args
+            except (TypeError, ValueError):
+                pass
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(reason='queue_full')
+
+
+class BilingualQueueListener(QueueListener):
+    """
+    شنونده ادغام‌کننده جفت‌های دوزبانه - Listener that folds bilingual pairs
+
+    A record without ``fa`` is held for up to ``pair_window`` seconds. If the
+    next record comes from the same logger at the same level and is Persian,
+    it is attached as ``fa`` and the pair is emitted as one record.
+    """
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler,
+                 merge_bilingual: bool = True, pair_window: float = 0.05):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.merge_bilingual = merge_bilingual
+        self.pair_window = pair_window
+        self._pending: Optional[logging.LogRecord] = None
+
+    def dequeue(self, block: bool):
+        while True:
+            try:
+                timeout = self.pair_window if self._pending is not None else None
+                return self.queue.get(block, timeout)
+            except queue.Empty:
+                if self._pending is None:
+                    raise
+                self._flush()
+
+    def _flush(self) -> None:
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            super().handle(pending)
+
+    def handle(self, record: logging.LogRecord) -> None:
+        if not self.merge_bilingual:
+            super().handle(record)
+            return
+
+        pending = self._pending
+        persian = is_persian(record.msg)
+        if (pending is not None and persian and getattr(record, 'fa', None) is None
+                and record.name == pending.name and record.levelno == pending.levelno):
+            pending.fa = record.msg
+            self._flush()
+            return
+
+        self._flush()
+        if persian or getattr(record, 'fa', None) is not None:
+            super().handle(record)
+        else:
+            self._pending = record
+
+    def stop(self) -> None:
+        super().stop()
+        self._flush()
+
+# =============================================================================
+# قالب‌بندی - Formatting
+# =============================================================================
+
+class BilingualFormatter(logging.Formatter):
+    """قالب‌بند متنی - Plain formatter that appends the Persian text when present"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fa = getattr(record, 'fa', None)
+        return f"{line} | fa={fa}" if fa else line
+
+
+def _build_formatter(json_format: bool) -> logging.Formatter:
+    if not STRUCTLOG_AVAILABLE:
+        return BilingualFormatter(LOG_FORMAT, LOG_DATE_FORMAT)
+
+    renderer = (structlog.processors.JSONRenderer(ensure_ascii=False) if json_format
+                else structlog.dev.ConsoleRenderer(colors=False))
+    return structlog.stdlib.ProcessorFormatter(
+        foreign_pre_chain=[
+            structlog.stdlib.add_logger_name,
+            structlog.stdlib.add_log_level,
+            structlog.processors.TimeStamper(fmt=LOG_DATE_FORMAT),
+            structlog.stdlib.ExtraAdder(allow=('fa',)),
+        ],
+        processors=[
+            structlog.stdlib.ProcessorFormatter.remove_processors_meta,
+            structlog.processors.format_exc_info,
+            renderer,
+        ],
+    )
+
+# =============================================================================
+# راه‌اندازی - Setup
+# =============================================================================
+
+def configure_logging(settings, logs_dir: Path) -> QueueListener:
+    """
+    پیکربندی لاگ‌گیری - Route all logging through the queue listener
+
+    ``settings`` is a ``LoggingSettings`` instance from the bot config.
+    Existing root handlers are replaced; calling this again restarts the
+    listener with the new settings.
+    """
+    global _listener
+    shutdown_logging()
+
+    logs_dir.mkdir(exist_ok=True)
+    formatter = _build_formatter(settings.json_format)
+
+    console_handler = logging.StreamHandler(sys.stdout)
+    file_handler = logging.FileHandler(logs_dir / 'bot.log', encoding='utf-8')
+    error_handler = logging.FileHandler(logs_dir / 'bot_errors.log', encoding='utf-8')
+    error_handler.setLevel(logging.ERROR)
+    for handler in (console_handler, file_handler, error_handler):
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSampler(settings.debug_sample_rate))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.level)
+
+    for module, level in settings.module_levels.items():
+        logging.getLogger(module).setLevel(level)
+
+    _listener = BilingualQueueListener(
+        log_queue, console_handler, file_handler, error_handler,
+        merge_bilingual=settings.merge_bilingual, pair_window=settings.pair_window,
+    )
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging() -> None:
+    """توقف شنونده و تخلیه صف - Stop the listener and drain the queue"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
+
+__all__ = [
+    'configure_logging', 'shutdown_logging', 'is_persian',
+    'DebugSampler', 'NonBlockingQueueHandler', 'BilingualQueueListener', 'BilingualFormatter',
+]
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+نظارت بر تأخیر حلقه رویداد و تشخیص کالبک‌های کند
+Event-loop Lag Monitor and Slow-callback Detector
+
+- یک تیک زمان‌بندی‌شده روی حلقه، انحراف از زمان مورد انتظار را اندازه می‌گیرد
+- یک نخ نگهبان، اگر حلقه بیش از آستانه مسدود بماند، پشته نخ حلقه و مسیر
+  (route) در حال اجرا را ثبت می‌کند
+
+A scheduled tick measures how late the loop wakes it up (lag). A watchdog
+thread watches the tick's heartbeat; when the loop stays blocked longer than
+the slow-callback threshold it captures the loop thread's stack and the
+router route currently executing, so the offender can be named from metrics
+and the /admin command.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from src.utils.histogram import StreamingHistogram
+from src.utils.metrics import EVENT_LOOP_LAG, EVENT_LOOP_LAG_P99, SLOW_CALLBACKS
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """نظارت‌گر حلقه رویداد - Event loop lag sampler and stall watchdog"""
+
+    def __init__(self, interval: float = 0.5, lag_threshold: float = 0.1,
+                 slow_callback_threshold: float = 0.25, max_events: int = 50, stack_limit: int = 25):
+        self.interval = interval
+        self.lag_threshold = lag_threshold
+        self.slow_callback_threshold = slow_callback_threshold
+        self.stack_limit = stack_limit
+        self.lag_histogram = StreamingHistogram(window_seconds=300.0, sub_windows=10)
+        self.slow_events: Deque[Dict[str, Any]] = deque(maxlen=max_events)
+        # slow_events only keeps the most recent ones; this counts all of them
+        self.slow_callback_count = 0
+        self.lag_warnings = 0
+        self.last_lag = 0.0
+
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._open_event: Optional[Dict[str, Any]] = None
+
+    # -------------------------------------------------------------------------
+    # نمونه‌برداری تأخیر - Lag sampling (runs on the loop)
+    # -------------------------------------------------------------------------
+
+    async def _sample(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            expected = loop.time() + self.interval
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            self._heartbeat = time.monotonic()
+            self.last_lag = lag
+            self.lag_histogram.record(lag)
+            EVENT_LOOP_LAG.set(lag)
+            if lag >= self.lag_threshold:
+                self.lag_warnings += 1
+                logger.warning(f"Event loop lag {lag * 1000:.1f}ms (threshold {self.lag_threshold * 1000:.0f}ms)")
+
+    # -------------------------------------------------------------------------
+    # نگهبان - Stall watchdog (runs in its own thread)
+    # -------------------------------------------------------------------------
+
+    def _capture(self) -> Dict[str, Any]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        route = None
+        probe = frame
+        while probe is not None:
+            if probe.f_code.co_name == '_run' and probe.f_code.co_filename.endswith('router.py'):
+                route = getattr(probe.f_locals.get('route'), 'name', None)
+                break
+            probe = probe.f_back
+        stack = traceback.format_stack(frame)[-self.stack_limit:] if frame is not None else []
+        return {
+            'timestamp': time.time(),
+            'route': route or 'unknown',
+            'stack': ''.join(stack),
+            'duration': 0.0,
+        }
+
+    def _watch(self) -> None:
+        poll = min(self.slow_callback_threshold / 2, self.interval / 2)
+        while not self._stop.wait(poll):
+            blocked = time.monotonic() - self._heartbeat - self.interval
+            if self._open_event is None:
+                if blocked >= self.slow_callback_threshold:
+                    self._open_event = self._capture()
+                    self._open_event['duration'] = blocked
+            elif blocked < self.slow_callback_threshold:
+                event, self._open_event = self._open_event, None
+                self.slow_events.append(event)
+                self.slow_callback_count += 1
+                SLOW_CALLBACKS.inc(route=event['route'])
+                logger.warning(
+                    f"Slow callback blocked the event loop for >{event['duration'] * 1000:.0f}ms "
+                    f"in route {event['route']}"
+                )
+            else:
+                self._open_event['duration'] = blocked
+
+    # -------------------------------------------------------------------------
+    # کنترل - Control
+    # -------------------------------------------------------------------------
+
+    def start(self) -> None:
+        """شروع نظارت روی حلقه جاری - Start monitoring the running loop"""
+        if self._task is not None:
+            return
+        self._stop.clear()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+        logger.info(
+            f"Loop monitor started (interval={self.interval}s, lag>{self.lag_threshold}s, "
+            f"slow>{self.slow_callback_threshold}s)"
+        )
+        logger.info("نظارت بر حلقه رویداد فعال شد")
+
+    def stop(self) -> None:
+        """توقف نظارت - Stop monitoring"""
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+
+    def collect(self) -> None:
+        """انتشار صدک تأخیر - Publish lag percentile (metrics collector)"""
+        EVENT_LOOP_LAG_P99.set(self.lag_histogram.window_quantiles((0.99,))[0.99])
+
+    def get_report(self, recent: int = 5) -> Dict[str, Any]:
+        """گزارش وضعیت حلقه - Loop health report"""
+        snapshot = self.lag_histogram.snapshot()
+        events: List[Dict[str, Any]] = list(self.slow_events)[-recent:]
+        return {
+            'last_lag': self.last_lag,
+            'lag_p50': snapshot['p50'],
+            'lag_p99': snapshot['p99'],
+            'lag_max': snapshot['max'],
+            'lag_warnings': self.lag_warnings,
+            'slow_callbacks': self.slow_callback_count,
+            'recent_slow': events,
+        }
+
+
+# نمونه سراسری نظارت‌گر - Global loop monitor instance
+loop_monitor = LoopMonitor()
+
+__all__ = ['LoopMonitor', 'loop_monitor']
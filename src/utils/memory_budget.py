@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+بودجه حافظه برای نقشه‌های درون‌پروسه‌ای
+Memory Budget Governance for In-process Maps
+
+هر نقشه‌ای که بر اساس کاربر، اکشن یا تاریخ رشد می‌کند به عنوان یک «مخزن
+محدود» ثبت می‌شود: سقف تعداد، سیاست حذف (LRU / بیکاری) و تخمین حجم بایت.
+ناظر مرکزی به صورت دوره‌ای ورودی‌های بیکار را حذف می‌کند و اگر مجموع
+تخمین‌ها از بودجه بیشتر شود، از بزرگ‌ترین مخازن قدیمی‌ترین ورودی‌ها را
+حذف می‌کند.
+
+``BoundedStore`` is a drop-in for the ``dict`` / ``defaultdict`` maps it
+replaces: lookups refresh recency, inserts beyond ``max_entries`` drop the
+least recently used entry and ``sweep`` drops entries idle for longer than
+``idle_ttl``. Other structures with their own eviction (the anti-spam engine,
+the rate limit store) register with the governor by providing ``__len__``,
+``sweep``, ``evict`` and ``estimate_bytes``.
+
+Byte figures are estimates: a sample of recent entries is measured with a
+bounded-depth ``sys.getsizeof`` walk and scaled by the entry count.
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from itertools import islice
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+from src.utils.metrics import MEMORY_STORE_BYTES, MEMORY_STORE_ENTRIES, MEMORY_EVICTIONS, MEMORY_BUDGET_BYTES
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# تخمین حجم - Size estimation
+# =============================================================================
+
+def deep_sizeof(obj: Any, depth: int = 4) -> int:
+    """تخمین حجم - Approximate deep size of an object, following containers ``depth`` levels"""
+    size = sys.getsizeof(obj)
+    if depth <= 0:
+        return size
+    depth -= 1
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_sizeof(key, depth) + deep_sizeof(value, depth)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += deep_sizeof(item, depth)
+    elif hasattr(obj, '__dict__'):
+        size += deep_sizeof(vars(obj), depth)
+    elif hasattr(obj, '__slots__'):
+        for name in obj.__slots__:
+            size += deep_sizeof(getattr(obj, name, None), depth)
+    return size
+
+
+def estimate_mapping_bytes(mapping: Any, sample_size: int = 32) -> int:
+    """تخمین حجم نقشه - Scale the measured size of the newest entries to the whole map"""
+    count = len(mapping)
+    if not count:
+        return sys.getsizeof(mapping)
+    items = mapping.items()
+    recent = islice(reversed(items), sample_size) if hasattr(items, '__reversed__') else islice(items, sample_size)
+    sampled = measured = 0
+    for key, value in recent:
+        measured += deep_sizeof(key, 1) + deep_sizeof(value)
+        sampled += 1
+    return sys.getsizeof(mapping) + measured * count // max(sampled, 1)
+
+# =============================================================================
+# مخزن محدود - Bounded store
+# =============================================================================
+
+class BoundedStore(MutableMapping):
+    """مخزن محدود - LRU map with idle expiry, registered with the memory governor"""
+
+    def __init__(self, name: str, max_entries: int, idle_ttl: Optional[float] = None,
+                 default_factory: Optional[Callable[[], Any]] = None,
+                 on_evict: Optional[Callable[[Hashable, Any], None]] = None,
+                 governor: Optional['MemoryGovernor'] = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self.default_factory = default_factory
+        self.on_evict = on_evict
+        # Ordered by last access, least recent first
+        self._data: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._touched: Dict[Hashable, float] = {}
+        self.evictions = 0
+        (governor or memory_governor).register(name, self)
+
+    # -- mapping protocol ----------------------------------------------------
+
+    def __getitem__(self, key: Hashable) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            if self.default_factory is None:
+                raise
+            value = self.default_factory()
+            self[key] = value
+            return value
+        self._data.move_to_end(key)
+        self._touched[key] = time.monotonic()
+        return value
+
+    def __setitem__(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        self._touched[key] = time.monotonic()
+        if len(self._data) > self.max_entries:
+            self.evict(len(self._data) - self.max_entries, reason='capacity')
+
+    def __delitem__(self, key: Hashable) -> None:
+        del self._data[key]
+        del self._touched[key]
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """دریافت بدون ساخت - Look up without creating a default entry"""
+        if key not in self._data:
+            return default
+        return self[key]
+
+    def pop(self, key: Hashable, *default: Any) -> Any:
+        """حذف و بازگشت - Remove a key without creating a default entry"""
+        if key in self._data:
+            del self._touched[key]
+            return self._data.pop(key)
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def items(self):
+        return self._data.items()
+
+    def values(self):
+        return self._data.values()
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._touched.clear()
+
+    # -- governance ----------------------------------------------------------
+
+    def evict(self, count: int, reason: str = 'budget') -> int:
+        """حذف قدیمی‌ترین‌ها - Drop the ``count`` least recently used entries"""
+        evicted = 0
+        while evicted < count and self._data:
+            key, value = self._data.popitem(last=False)
+            del self._touched[key]
+            evicted += 1
+            if self.on_evict is not None:
+                self.on_evict(key, value)
+        if evicted:
+            self.evictions += evicted
+            MEMORY_EVICTIONS.inc(evicted, store=self.name, reason=reason)
+            if evicted > len(self._data):
+                # Dicts never shrink their tables; rebuild after a large eviction
+                self._data = OrderedDict(self._data)
+                self._touched = dict(self._touched)
+        return evicted
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """حذف ورودی‌های بیکار - Drop entries idle for longer than ``idle_ttl``"""
+        if self.idle_ttl is None or not self._data:
+            return 0
+        cutoff = (time.monotonic() if now is None else now) - self.idle_ttl
+        idle = 0
+        for key in self._data:
+            if self._touched[key] > cutoff:
+                break
+            idle += 1
+        return self.evict(idle, reason='idle') if idle else 0
+
+    def estimate_bytes(self) -> int:
+        """تخمین حجم - Estimated bytes held by the store"""
+        return estimate_mapping_bytes(self._data) + sys.getsizeof(self._touched)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Store statistics"""
+        return {
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'idle_ttl': self.idle_ttl,
+            'evictions': self.evictions,
+        }
+
+    def __repr__(self) -> str:
+        return f"BoundedStore({self.name!r}, entries={len(self._data)}, max={self.max_entries})"
+
+# =============================================================================
+# ناظر بودجه - Governor
+# =============================================================================
+
+class MemoryGovernor:
+    """ناظر بودجه حافظه - Enforces a total byte budget across registered stores"""
+
+    def __init__(self, budget_bytes: int = 256 * 1024 * 1024, interval: float = 30.0,
+                 low_watermark: float = 0.9):
+        self.budget_bytes = budget_bytes
+        self.interval = interval
+        self.low_watermark = low_watermark
+        self._stores: Dict[str, Any] = {}
+        self._usage: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.budget_evictions = 0
+
+    def register(self, name: str, store: Any) -> Any:
+        """ثبت مخزن - Register a store (``__len__``, ``sweep``, ``evict``, ``estimate_bytes``)"""
+        if name in self._stores and self._stores[name] is not store:
+            logger.debug(f"Memory store {name} re-registered, replacing previous instance")
+        self._stores[name] = store
+        return store
+
+    def unregister(self, name: str) -> None:
+        """حذف ثبت - Stop governing a store"""
+        self._stores.pop(name, None)
+        self._usage.pop(name, None)
+
+    def enforce(self) -> int:
+        """اعمال بودجه - Sweep idle entries, then evict until under the low watermark"""
+        self.runs += 1
+        now = time.monotonic()
+        for name, store in list(self._stores.items()):
+            try:
+                store.sweep(now)
+            except Exception as e:
+                logger.error(f"Error sweeping memory store {name}: {e}")
+        self._measure()
+
+        total = sum(self._usage.values())
+        if total <= self.budget_bytes:
+            return 0
+
+        target = int(self.budget_bytes * self.low_watermark)
+        evicted = 0
+        # Largest stores give back first, in proportion to what they hold
+        for name in sorted(self._usage, key=self._usage.get, reverse=True):
+            if total <= target:
+                break
+            store, used = self._stores[name], self._usage[name]
+            entries = len(store)
+            if not entries or not used:
+                continue
+            per_entry = used / entries
+            count = min(entries, int((total - target) / per_entry) + 1)
+            removed = store.evict(count)
+            evicted += removed
+            total -= int(removed * per_entry)
+            self._usage[name] = max(0, used - int(removed * per_entry))
+
+        self.budget_evictions += evicted
+        logger.warning(f"Memory budget exceeded, evicted {evicted} entries (now ~{total // 1024} KiB)")
+        logger.warning(f"بودجه حافظه رد شد، {evicted} ورودی حذف شد")
+        return evicted
+
+    def _measure(self) -> None:
+        for name, store in self._stores.items():
+            try:
+                self._usage[name] = int(store.estimate_bytes())
+            except Exception as e:
+                logger.error(f"Error measuring memory store {name}: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.enforce()
+            except Exception as e:
+                logger.error(f"Memory governor error: {e}")
+
+    def start(self) -> None:
+        """شروع نظارت - Start periodic enforcement on the running loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"Memory governor started (budget={self.budget_bytes // (1024 * 1024)} MiB, "
+                        f"interval={self.interval}s)")
+
+    def stop(self) -> None:
+        """توقف نظارت - Stop periodic enforcement"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def collect(self) -> None:
+        """انتشار مصرف - Publish per-store usage (metrics collector)"""
+        MEMORY_BUDGET_BYTES.set(self.budget_bytes)
+        for name, store in self._stores.items():
+            MEMORY_STORE_ENTRIES.set(len(store), store=name)
+            MEMORY_STORE_BYTES.set(self._usage.get(name, 0), store=name)
+
+    def get_report(self) -> Dict[str, Any]:
+        """گزارش مصرف - Per-store usage report"""
+        self._measure()
+        stores: List[Dict[str, Any]] = [
+            {'store': name, 'entries': len(store), 'bytes': self._usage.get(name, 0)}
+            for name, store in self._stores.items()
+        ]
+        stores.sort(key=lambda row: row['bytes'], reverse=True)
+        total = sum(row['bytes'] for row in stores)
+        return {
+            'budget_bytes': self.budget_bytes,
+            'used_bytes': total,
+            'used_ratio': round(total / self.budget_bytes, 4) if self.budget_bytes else 0.0,
+            'runs': self.runs,
+            'budget_evictions': self.budget_evictions,
+            'stores': stores,
+        }
+
+
+# نمونه سراسری ناظر - Global governor instance
+memory_governor = MemoryGovernor()
+
+__all__ = ['BoundedStore', 'MemoryGovernor', 'memory_governor', 'deep_sizeof', 'estimate_mapping_bytes']
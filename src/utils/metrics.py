@@ -0,0 +1,373 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+رجیستری یکپارچه معیارها با خروجی سازگار با Prometheus
+Unified Metrics Registry with Prometheus-compatible exposition
+
+تمام اجزای ربات (مسیریاب، پایگاه داده، کش‌ها، آنالیتیکس) معیارهای خود را
+در این رجیستری ثبت می‌کنند و یک سرور کوچک aiohttp آن‌ها را روی /metrics
+با فرمت متنی Prometheus منتشر می‌کند.
+
+Components publish counters, gauges and histograms into a single registry.
+Snapshot-style sources (pool stats, cache stats) register collectors that run
+right before each scrape. A small aiohttp server serves ``/metrics``.
+"""
+
+import logging
+import math
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from aiohttp import web
+except ImportError:  # aiohttp is optional at import time
+    web = None
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# =============================================================================
+# انواع معیار - Metric Types
+# =============================================================================
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """پایه معیار - Base metric with label handling"""
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _label_str(self, key: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(f'{extra[0]}="{_escape_label(extra[1])}"')
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.metric_type}",
+        ]
+        lines.extend(self.samples())
+        return lines
+
+
+class Counter(_Metric):
+    """شمارنده - Monotonic counter"""
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        """افزایش - Increment the counter"""
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels) -> None:
+        """تنظیم مجموع - Mirror a monotonic total kept elsewhere (collectors only)"""
+        self._values[self._key(labels)] = float(value)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._label_str(k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Gauge(_Metric):
+    """سنجه - Gauge that can go up and down"""
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{self._label_str(k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    """هیستوگرام - Cumulative bucket histogram"""
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        """ثبت مقدار - Observe a value"""
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = [0.0] * (len(self.buckets) + 2)
+            self._values[key] = state
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, state in self._values.items():
+            cumulative = 0.0
+            for index, bound in enumerate(self.buckets):
+                cumulative += state[index]
+                lines.append(f"{self.name}_bucket{self._label_str(key, ('le', _format_value(bound)))} {_format_value(cumulative)}")
+            cumulative += state[len(self.buckets)]
+            lines.append(f"{self.name}_bucket{self._label_str(key, ('le', '+Inf'))} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{self._label_str(key)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{self._label_str(key)} {_format_value(cumulative)}")
+        return lines
+
+# =============================================================================
+# رجیستری - Registry
+# =============================================================================
+
+class MetricsRegistry:
+    """رجیستری معیارها - Metrics registry"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            if type(existing) is not type(metric):
+                raise ValueError(f"Metric {metric.name} already registered as {existing.metric_type}")
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        """ثبت جمع‌آورنده - Register a callable run before every scrape"""
+        self._collectors.append(collector)
+
+    def collect(self) -> None:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+
+    def render(self) -> str:
+        """خروجی متنی Prometheus - Render Prometheus text exposition format"""
+        self.collect()
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+# =============================================================================
+# سرور معیارها - Metrics HTTP Server
+# =============================================================================
+
+class MetricsServer:
+    """سرور /metrics - Small aiohttp server exposing /metrics"""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self, registry: 'MetricsRegistry', host: str = '0.0.0.0', port: int = 9108):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def _handle_metrics(self, request):
+        body = self.registry.render()
+        return web.Response(body=body.encode('utf-8'), headers={'Content-Type': self.CONTENT_TYPE})
+
+    async def start(self) -> bool:
+        """راه‌اندازی سرور - Start serving metrics"""
+        if web is None:
+            logger.warning("aiohttp not installed, metrics endpoint disabled")
+            logger.warning("aiohttp نصب نیست، endpoint معیارها غیرفعال است")
+            return False
+        try:
+            app = web.Application()
+            app.router.add_get('/metrics', self._handle_metrics)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            site = web.TCPSite(self._runner, self.host, self.port)
+            await site.start()
+            logger.info(f"Metrics endpoint listening on http://{self.host}:{self.port}/metrics")
+            logger.info(f"endpoint معیارها روی پورت {self.port} فعال شد")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to start metrics endpoint: {e}")
+            logger.error(f"خطا در راه‌اندازی endpoint معیارها: {e}")
+            self._runner = None
+            return False
+
+    async def stop(self) -> None:
+        """توقف سرور - Stop serving metrics"""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+# =============================================================================
+# معیارهای استاندارد ربات - Standard Bot Metrics
+# =============================================================================
+
+# نمونه سراسری رجیستری - Global registry instance
+registry = MetricsRegistry()
+
+HANDLER_LATENCY = registry.histogram(
+    'trumpbot_handler_latency_seconds', 'Handler latency by route', ['route'])
+HANDLER_ERRORS = registry.counter(
+    'trumpbot_handler_errors_total', 'Handler exceptions by route', ['route'])
+
+DB_QUERY_LATENCY = registry.histogram(
+    'trumpbot_db_query_seconds', 'Database query latency', ['operation'])
+DB_QUERY_ERRORS = registry.counter(
+    'trumpbot_db_query_errors_total', 'Failed database queries', ['operation'])
+DB_POOL = registry.gauge(
+    'trumpbot_db_pool', 'Connection pool statistics', ['stat'])
+
+CACHE_HITS = registry.counter(
+    'trumpbot_cache_hits_total', 'Cache hits', ['cache'])
+CACHE_MISSES = registry.counter(
+    'trumpbot_cache_misses_total', 'Cache misses', ['cache'])
+CACHE_ENTRIES = registry.gauge(
+    'trumpbot_cache_entries', 'Entries currently cached', ['cache'])
+CACHE_HIT_RATIO = registry.gauge(
+    'trumpbot_cache_hit_ratio', 'Cache hit ratio (0-1)', ['cache'])
+
+OUTBOX_DEPTH = registry.gauge(
+    'trumpbot_outbox_depth', 'Undelivered events waiting in the outbox')
+EVENT_LOOP_LAG = registry.gauge(
+    'trumpbot_event_loop_lag_seconds', 'Most recent event loop scheduling lag')
+EVENT_LOOP_LAG_P99 = registry.gauge(
+    'trumpbot_event_loop_lag_p99_seconds', 'Event loop scheduling lag p99 over the last five minutes')
+SINGLEFLIGHT_CALLS = registry.counter(
+    'trumpbot_singleflight_calls_total', 'Single-flight lookups by role (leader ran the query, coalesced waited)',
+    ['group', 'role'])
+RATE_LIMITED = registry.counter(
+    'trumpbot_rate_limited_total', 'Requests refused by a rate limiter', ['limiter'])
+MEMORY_BUDGET_BYTES = registry.gauge(
+    'trumpbot_memory_budget_bytes', 'Configured byte budget for in-process stores')
+MEMORY_STORE_BYTES = registry.gauge(
+    'trumpbot_memory_store_bytes', 'Estimated bytes held by an in-process store', ['store'])
+MEMORY_STORE_ENTRIES = registry.gauge(
+    'trumpbot_memory_store_entries', 'Entries held by an in-process store', ['store'])
+MEMORY_EVICTIONS = registry.counter(
+    'trumpbot_memory_evictions_total', 'Entries evicted from in-process stores', ['store', 'reason'])
+LOG_RECORDS_DROPPED = registry.counter(
+    'trumpbot_log_records_dropped_total', 'Log records dropped before output', ['reason'])
+SLOW_CALLBACKS = registry.counter(
+    'trumpbot_slow_callbacks_total', 'Callbacks that blocked the event loop past the threshold', ['route'])
+
+MESSAGES_TOTAL = registry.counter(
+    'trumpbot_messages_total', 'Processed messages by language', ['language'])
+ERRORS_TOTAL = registry.counter(
+    'trumpbot_errors_total', 'Application errors')
+FEATURE_USAGE = registry.counter(
+    'trumpbot_feature_usage_total', 'Feature usage', ['feature'])
+UPTIME = registry.gauge(
+    'trumpbot_uptime_seconds', 'Application uptime')
+
+FUNCTION_LATENCY = registry.histogram(
+    'trumpbot_function_seconds', 'Tracked helper function latency', ['function'])
+CALLBACKS_TOTAL = registry.counter(
+    'trumpbot_callbacks_total', 'Callback queries by action and status', ['action', 'status'])
+CALLBACK_LATENCY = registry.histogram(
+    'trumpbot_callback_seconds', 'Callback query latency by action', ['action'])
+MESSAGES_ANALYZED = registry.counter(
+    'trumpbot_messages_analyzed_total', 'Analyzed messages by type and language', ['type', 'language'])
+ANALYSIS_RUNS = registry.counter(
+    'trumpbot_analysis_runs_total', 'Keyword scans by where they ran (inline, offloaded, fallback)', ['mode'])
+ANALYSIS_QUEUE_DEPTH = registry.gauge(
+    'trumpbot_analysis_queue_depth', 'Texts waiting for the analysis process pool')
+EVENTS_PUBLISHED = registry.counter(
+    'trumpbot_events_published_total', 'Domain events published by type', ['event'])
+EVENTS_DELIVERED = registry.counter(
+    'trumpbot_events_delivered_total', 'Domain event deliveries to subscribers by type and outcome',
+    ['event', 'outcome'])
+EXPIRY_TIMERS = registry.gauge(
+    'trumpbot_expiry_timers', 'Expiring rows tracked by the timer wheel')
+EXPIRED_ROWS = registry.counter(
+    'trumpbot_expired_rows_total', 'Rows deleted by the expiry scheduler by entity', ['entity'])
+COOLDOWNS_ACTIVE = registry.gauge(
+    'trumpbot_cooldowns_active', 'Cooldowns held by the in-memory cooldown engine')
+COOLDOWN_WRITES = registry.counter(
+    'trumpbot_cooldown_writes_total', 'Cooldown rows written behind by outcome', ['outcome'])
+
+
+def observe_cache_stats(cache_name: str, hits: int, misses: int, entries: int) -> None:
+    """انتشار آمار کش - Publish a cache stats snapshot"""
+    CACHE_HITS.set_total(hits, cache=cache_name)
+    CACHE_MISSES.set_total(misses, cache=cache_name)
+    CACHE_ENTRIES.set(entries, cache=cache_name)
+    total = hits + misses
+    CACHE_HIT_RATIO.set(hits / total if total else 0.0, cache=cache_name)
+
+
+__all__ = [
+    'Counter', 'Gauge', 'Histogram', 'MetricsRegistry', 'MetricsServer', 'registry',
+    'DEFAULT_LATENCY_BUCKETS', 'observe_cache_stats',
+    'HANDLER_LATENCY', 'HANDLER_ERRORS', 'DB_QUERY_LATENCY', 'DB_QUERY_ERRORS', 'DB_POOL',
+    'CACHE_HITS', 'CACHE_MISSES', 'CACHE_ENTRIES', 'CACHE_HIT_RATIO',
+    'OUTBOX_DEPTH', 'EVENT_LOOP_LAG', 'EVENT_LOOP_LAG_P99', 'SLOW_CALLBACKS', 'LOG_RECORDS_DROPPED', 'SINGLEFLIGHT_CALLS', 'RATE_LIMITED',
+    'MEMORY_BUDGET_BYTES', 'MEMORY_STORE_BYTES', 'MEMORY_STORE_ENTRIES', 'MEMORY_EVICTIONS', 'MESSAGES_TOTAL', 'ERRORS_TOTAL', 'FEATURE_USAGE',
+    'UPTIME', 'FUNCTION_LATENCY', 'CALLBACKS_TOTAL', 'CALLBACK_LATENCY', 'MESSAGES_ANALYZED',
+    'ANALYSIS_RUNS', 'ANALYSIS_QUEUE_DEPTH', 'EVENTS_PUBLISHED', 'EVENTS_DELIVERED',
+    'EXPIRY_TIMERS', 'EXPIRED_ROWS', 'COOLDOWNS_ACTIVE', 'COOLDOWN_WRITES',
+]
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+محدودکننده نرخ GCRA
+GCRA Rate Limiting
+
+برای هر کلید فقط یک عدد اعشاری (زمان رسیدن نظری بعدی، TAT) نگه داشته
+می‌شود. کلیدی که TAT آن گذشته باشد با کلید تازه فرقی ندارد، پس جاروب
+دوره‌ای آن را حذف می‌کند و حافظه فقط به کاربران فعال بستگی دارد.
+
+A limiter allows ``rate`` requests per ``period`` with bursts of up to
+``burst``. A request is admitted when ``max(tat, now) - now <= tolerance``
+and then advances ``tat`` by one emission interval. An optional ``penalty``
+blocks a key for that many seconds the first time it goes over the limit.
+
+All limiters share ``rate_limit_store``. It keeps state in process memory
+and, once ``attach``-ed to a Redis backend, runs the same algorithm as a
+server-side script so several bot processes enforce one limit. If Redis is
+unreachable it falls back to the local state.
+"""
+
+import logging
+import time
+from functools import wraps
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, Hashable, NamedTuple, Optional
+
+from src.utils.metrics import RATE_LIMITED
+from src.utils.memory_budget import memory_governor, estimate_mapping_bytes
+
+logger = logging.getLogger(__name__)
+
+KeyFunc = Callable[[Any], Hashable]
+
+# =============================================================================
+# کلیدها - Key functions
+# =============================================================================
+
+def _chat_of(update: Any) -> int:
+    # Messages carry the chat directly, callback queries through their message
+    chat = getattr(update, 'chat', None) or update.message.chat
+    return chat.id
+
+
+def _route_of(update: Any) -> str:
+    data = getattr(update, 'data', None)
+    if data is not None:
+        return data.split(':', 1)[0]
+    text = getattr(update, 'text', None) or ''
+    return text.split(maxsplit=1)[0].split('@', 1)[0].lower() if text else ''
+
+
+def by_user(update: Any) -> str:
+    """کلید کاربر - One bucket per user"""
+    return f"u:{update.from_user.id}"
+
+
+def by_chat(update: Any) -> str:
+    """کلید گروه - One bucket per chat"""
+    return f"c:{_chat_of(update)}"
+
+
+def by_user_route(update: Any) -> str:
+    """کلید کاربر و مسیر - One bucket per user and command / callback prefix"""
+    return f"r:{update.from_user.id}:{_route_of(update)}"
+
+# =============================================================================
+# ذخیره‌ساز - State store
+# =============================================================================
+
+class Decision(NamedTuple):
+    """نتیجه بررسی - Outcome of one request"""
+    allowed: bool
+    retry_after: float = 0.0
+    blocked: bool = False
+
+
+# Same algorithm as RateLimitStore.update; Redis TIME keeps instances on one clock
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local penalty = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local excess = tat - now - tolerance
+local allowed, blocked = 0, 0
+if excess <= 0 then
+    tat = tat + interval
+    allowed = 1
+elseif penalty > 0 and excess <= interval then
+    tat = now + tolerance + penalty
+    excess = penalty
+    blocked = 1
+end
+redis.call('SET', KEYS[1], string.format('%.6f', tat), 'PX', math.ceil((tat - now) * 1000))
+return {allowed, string.format('%.6f', math.max(excess, 0)), blocked}
+"""
+
+
+class RateLimitStore:
+    """ذخیره‌ساز TAT - Per-key theoretical arrival times, local or shared"""
+    __slots__ = ('max_keys', 'sweep_interval', 'prefix', '_tats', '_next_sweep',
+                 '_backend', '_script', 'evictions', 'shared_errors')
+
+    def __init__(self, max_keys: int = 200_000, sweep_interval: float = 60.0):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self.prefix = 'ratelimit:'
+        self._tats: Dict[Hashable, float] = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+        self._backend = None
+        self._script = None
+        self.evictions = 0
+        self.shared_errors = 0
+
+    async def attach(self, backend: Any, namespace: str = 'trumpbot') -> None:
+        """اتصال ذخیره‌ساز مشترک - Share state through a Redis backend"""
+        client = getattr(backend, 'client', None)
+        if client is None:
+            raise ValueError(f"Backend {getattr(backend, 'name', backend)!r} cannot run rate limit scripts")
+        self._script = client.register_script(GCRA_SCRIPT)
+        self._backend = backend
+        self.prefix = f"{namespace}:ratelimit:"
+
+    async def detach(self) -> None:
+        """جدا کردن ذخیره‌ساز مشترک - Return to process-local state"""
+        backend, self._backend, self._script = self._backend, None, None
+        if backend is not None:
+            await backend.close()
+
+    @property
+    def shared(self) -> bool:
+        return self._script is not None
+
+    def update(self, key: Hashable, interval: float, tolerance: float, penalty: float,
+               now: Optional[float] = None) -> Decision:
+        """اعمال یک درخواست (محلی) - Apply one request to the local state"""
+        now = time.monotonic() if now is None else now
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        tat = self._tats.get(key, now)
+        if tat < now:
+            tat = now
+        excess = tat - now - tolerance
+        if excess <= 0:
+            self._tats[key] = tat + interval
+            if len(self._tats) > self.max_keys:
+                self._evict_oldest()
+            return Decision(True)
+        if penalty > 0 and excess <= interval:
+            # Ordinary overruns exceed the tolerance by at most one interval;
+            # anything larger means the key is already serving a penalty (a
+            # request in the last interval of a penalty renews it)
+            self._tats[key] = now + tolerance + penalty
+            return Decision(False, penalty, True)
+        return Decision(False, excess)
+
+    async def update_shared(self, key: Hashable, interval: float, tolerance: float, penalty: float) -> Decision:
+        """اعمال یک درخواست - Apply one request, on Redis when attached"""
+        script = self._script
+        if script is not None:
+            try:
+                allowed, retry_after, blocked = await script(
+                    keys=[f"{self.prefix}{key}"], args=[interval, tolerance, penalty])
+                return Decision(bool(allowed), float(retry_after), bool(blocked))
+            except Exception as e:
+                self.shared_errors += 1
+                if self.shared_errors == 1 or self.shared_errors % 1000 == 0:
+                    logger.warning(f"Shared rate limit store unavailable, using local state: {e}")
+        return self.update(key, interval, tolerance, penalty)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """حذف کلیدهای بیکار - Drop keys whose TAT has passed"""
+        now = time.monotonic() if now is None else now
+        self._next_sweep = now + self.sweep_interval
+        idle = [key for key, tat in self._tats.items() if tat <= now]
+        for key in idle:
+            del self._tats[key]
+        return len(idle)
+
+    def _evict_oldest(self) -> None:
+        # Still over the cap after a sweep: forget the oldest keys (fails open),
+        # leaving 10% headroom so the next inserts do not sweep again
+        self.sweep()
+        self.evict(len(self._tats) - self.max_keys * 9 // 10)
+
+    def evict(self, count: int) -> int:
+        """حذف قدیمی‌ترین کلیدها - Forget the ``count`` oldest keys (fails open)"""
+        if count <= 0:
+            return 0
+        victims = list(islice(self._tats, count))
+        for key in victims:
+            del self._tats[key]
+        self.evictions += len(victims)
+        return len(victims)
+
+    def estimate_bytes(self) -> int:
+        """تخمین حجم - Estimated bytes held by local state"""
+        return estimate_mapping_bytes(self._tats)
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Store statistics"""
+        return {
+            'keys': len(self._tats),
+            'shared': self.shared,
+            'evictions': self.evictions,
+            'shared_errors': self.shared_errors,
+        }
+
+
+# نمونه سراسری - Global store
+rate_limit_store = memory_governor.register('rate_limits', RateLimitStore())
+
+# =============================================================================
+# محدودکننده - Limiter
+# =============================================================================
+
+class RateLimiter:
+    """محدودکننده GCRA - ``rate`` requests per ``period`` seconds"""
+    __slots__ = ('name', 'interval', 'tolerance', 'penalty', 'enabled', 'store')
+
+    def __init__(self, name: str, rate: float, period: float = 60.0, burst: Optional[int] = None,
+                 penalty: float = 0.0, enabled: bool = True, store: Optional[RateLimitStore] = None):
+        self.name = name
+        self.interval = period / rate
+        self.tolerance = self.interval * ((rate if burst is None else burst) - 1)
+        self.penalty = penalty
+        self.enabled = enabled
+        self.store = store or rate_limit_store
+
+    async def hit(self, key: Hashable) -> Decision:
+        """ثبت درخواست - Record a request for ``key`` and decide"""
+        if not self.enabled:
+            return Decision(True)
+        decision = await self.store.update_shared(f"{self.name}:{key}", self.interval, self.tolerance, self.penalty)
+        if not decision.allowed:
+            RATE_LIMITED.inc(limiter=self.name)
+            if decision.blocked:
+                logger.warning(f"{key} blocked by {self.name} for {decision.retry_after:.0f}s")
+                logger.warning(f"{key} توسط {self.name} برای {decision.retry_after:.0f} ثانیه مسدود شد")
+        return decision
+
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def get_limiter(name: str, rate: float, period: float = 60.0, burst: Optional[int] = None,
+                penalty: float = 0.0, enabled: bool = True) -> RateLimiter:
+    """دریافت محدودکننده - Named limiter, created on first use and shared afterwards"""
+    limiter = _limiters.get(name)
+    if limiter is None:
+        limiter = _limiters[name] = RateLimiter(name, rate, period, burst, penalty, enabled)
+    return limiter
+
+# =============================================================================
+# دکوراتور - Decorator
+# =============================================================================
+
+def rate_limited(limiter: RateLimiter, key: KeyFunc = by_user,
+                 on_limited: Optional[Callable[..., Awaitable[Any]]] = None):
+    """
+    دکوراتور محدودیت نرخ
+    Rate limit a handler whose first argument is the message or callback query.
+    ``on_limited(update, decision, *args, **kwargs)`` is awaited instead of the
+    handler when the request is refused.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(update, *args, **kwargs):
+            decision = await limiter.hit(key(update))
+            if decision.allowed:
+                return await func(update, *args, **kwargs)
+            if on_limited is not None:
+                return await on_limited(update, decision, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+__all__ = [
+    'RateLimiter', 'RateLimitStore', 'Decision', 'rate_limit_store', 'get_limiter', 'rate_limited',
+    'by_user', 'by_chat', 'by_user_route', 'GCRA_SCRIPT'
+]
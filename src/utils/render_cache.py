@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+کش رندر منوها و کیبوردها
+Render Cache for static screens and keyboards
+
+متن و کیبورد صفحات ثابت (راهنما، منوی اصلی، فروشگاه، خوشامدگویی) برای هر
+زبان و هر حالت یک بار ساخته می‌شوند و در هر درخواست فقط فیلدهای مخصوص
+کاربر جایگذاری می‌شوند.
+
+Screens register a builder with ``@render_cache.screen(name)``. A builder
+receives ``(lang, variant)`` and returns a ``Rendered``; the result is kept
+until ``invalidate()`` is called, which ``load_translations`` does on every
+(re)load. Call ``render_cache.invalidate()`` after changing ``ITEMS`` at
+runtime. Rendered text may contain ``str.format`` fields for per-user values;
+use ``literal()`` for any translated or user text baked into such a template.
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, NamedTuple, Optional, Tuple
+
+from telebot import types
+
+logger = logging.getLogger(__name__)
+
+# =============================================================================
+# آثار رندرشده - Rendered artifacts
+# =============================================================================
+
+class FrozenMarkup(types.JsonSerializable):
+    """کیبورد منجمد - Keyboard serialised once; telebot only calls ``to_json()`` when sending"""
+    __slots__ = ('markup', '_json')
+
+    def __init__(self, markup: types.InlineKeyboardMarkup):
+        self.markup = markup
+        self._json = markup.to_json()
+
+    def to_json(self) -> str:
+        return self._json
+
+
+class Rendered(NamedTuple):
+    """صفحه رندرشده - Pre-rendered text and keyboard"""
+    text: str
+    markup: Optional[FrozenMarkup] = None
+    parse_mode: Optional[str] = None
+
+    def format(self, **fields: Any) -> str:
+        """جایگذاری فیلدهای کاربر - Interpolate the per-user fields"""
+        return self.text.format(**fields)
+
+
+def freeze_markup(markup: types.InlineKeyboardMarkup) -> FrozenMarkup:
+    """انجماد کیبورد - Serialise a keyboard once for reuse"""
+    return FrozenMarkup(markup)
+
+
+def literal(text: Any) -> str:
+    """متن ثابت در قالب - Escape braces so text survives ``str.format``"""
+    return str(text).replace('{', '{{').replace('}', '}}')
+
+# =============================================================================
+# کش - Cache
+# =============================================================================
+
+Builder = Callable[[str, Hashable], Any]
+
+
+class RenderCache:
+    """کش رندر - Per (screen, language, variant) cache of built screens"""
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._builders: Dict[str, Builder] = {}
+        self._warm_variants: Dict[str, Tuple[Hashable, ...]] = {}
+        self._entries: 'OrderedDict[Tuple[str, str, Hashable], Any]' = OrderedDict()
+        self.hits = 0
+        self.builds = 0
+        self.invalidations = 0
+
+    def screen(self, name: str, variants: Iterable[Hashable] = (None,)) -> Callable[[Builder], Builder]:
+        """ثبت سازنده صفحه - Register a builder; ``variants`` are built by ``warm()``"""
+        def decorator(builder: Builder) -> Builder:
+            self._builders[name] = builder
+            self._warm_variants[name] = tuple(variants)
+            return builder
+        return decorator
+
+    def get(self, name: str, lang: str, variant: Hashable = None) -> Any:
+        """دریافت صفحه - Get a rendered screen, building it on first use"""
+        key = (name, lang, variant)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        entry = self._builders[name](lang, variant)
+        self.builds += 1
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def warm(self, langs: Iterable[str]) -> int:
+        """پیش‌ساخت - Build every registered screen for ``langs``, returns count built"""
+        built = 0
+        for lang in langs:
+            for name, variants in self._warm_variants.items():
+                for variant in variants:
+                    try:
+                        self.get(name, lang, variant)
+                        built += 1
+                    except Exception as e:
+                        logger.error(f"Error pre-rendering {name}/{lang}/{variant}: {e}")
+        return built
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        """ابطال - Drop rendered screens (all, or one screen name)"""
+        if name is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key[0] == name]:
+                del self._entries[key]
+        self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار - Cache statistics"""
+        return {
+            'screens': len(self._builders),
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'builds': self.builds,
+            'invalidations': self.invalidations,
+        }
+
+
+# نمونه سراسری - Global render cache
+render_cache = RenderCache()
+
+__all__ = ['RenderCache', 'Rendered', 'FrozenMarkup', 'render_cache', 'freeze_markup', 'literal']
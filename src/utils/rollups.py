@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ساختارهای فشرده تجمیع آمار
+Compact Rollup Structures
+
+شمارنده‌ها به جای دیکشنری‌های تو در تو در آرایه‌هایی با طول ثابت نگه
+داشته می‌شوند (هر معیار یک خانه ثابت دارد) و تعداد کاربران یکتا با
+HyperLogLog تخمین زده می‌شود، پس حافظه هر سطل ساعتی ثابت است.
+
+``CounterLayout`` maps metric names to fixed slots of an ``array('q')``.
+``HyperLogLog`` estimates distinct counts in ``2 ** precision`` one-byte
+registers; two sketches merge by taking the register-wise maximum, which is
+also how the database rollup merges them, so flushing is idempotent.
+"""
+
+import math
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+MASK64 = (1 << 64) - 1
+
+# =============================================================================
+# چیدمان شمارنده‌ها - Counter layout
+# =============================================================================
+
+class CounterLayout:
+    """چیدمان شمارنده - Fixed metric name -> slot mapping"""
+    __slots__ = ('names', 'index')
+
+    def __init__(self, names: Iterable[str]):
+        self.names: Tuple[str, ...] = tuple(dict.fromkeys(names))
+        self.index: Dict[str, int] = {name: slot for slot, name in enumerate(self.names)}
+
+    def new(self) -> array:
+        """آرایه صفر - A zeroed counter array"""
+        return array('q', bytes(8 * len(self.names)))
+
+    def slot(self, name: str) -> Optional[int]:
+        return self.index.get(name)
+
+    def nonzero(self, counters: array) -> Iterator[Tuple[str, int]]:
+        """معیارهای غیرصفر - (name, value) pairs with a non-zero count"""
+        names = self.names
+        return ((names[slot], value) for slot, value in enumerate(counters) if value)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+# =============================================================================
+# هایپرلاگ‌لاگ - HyperLogLog
+# =============================================================================
+
+def mix64(value: int) -> int:
+    """درهم‌سازی ۶۴ بیتی - splitmix64 finaliser, spreads sequential ids over 64 bits"""
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+class HyperLogLog:
+    """هایپرلاگ‌لاگ - Distinct count sketch (about 3% error at precision 10)"""
+    __slots__ = ('precision', 'registers')
+
+    def __init__(self, precision: int = 10, registers: Optional[Iterable[int]] = None):
+        self.precision = precision
+        size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(size)
+        if len(self.registers) != size:
+            raise ValueError(f"Expected {size} registers, got {len(self.registers)}")
+
+    def add(self, item: int) -> None:
+        """افزودن - Add an integer id"""
+        hashed = mix64(item)
+        width = 64 - self.precision
+        index = hashed >> width
+        rank = width - (hashed & ((1 << width) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        """ادغام - Register-wise maximum with another sketch"""
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        """تخمین تعداد یکتا - Estimated number of distinct items"""
+        size = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size * size / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * size and zeros:
+            # Small-range correction: linear counting
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def to_list(self) -> List[int]:
+        """تبدیل به لیست - Registers as a list (SMALLINT[] column)"""
+        return list(self.registers)
+
+    def __bool__(self) -> bool:
+        return any(self.registers)
+
+
+__all__ = ['CounterLayout', 'HyperLogLog', 'mix64']
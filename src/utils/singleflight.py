@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ادغام درخواست‌های هم‌زمان (Single-flight)
+Async Single-flight Request Coalescing
+
+وقتی چند کوروتین هم‌زمان برای یک کلید کش را از دست می‌دهند، فقط اولی
+کوئری را اجرا می‌کند و بقیه منتظر همان نتیجه می‌مانند. نتایج «یافت نشد»
+نیز برای مدت کوتاهی کش می‌شوند (negative caching).
+
+Concurrent callers for the same key await one in-flight task. The task runs
+independently of its callers, so a caller being cancelled never cancels the
+lookup the others are waiting on. ``load`` layers this on top of
+``SmartCache`` and caches "not found" results under a shorter TTL.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+from src.utils.metrics import SINGLEFLIGHT_CALLS
+
+logger = logging.getLogger(__name__)
+
+
+class _NotFound:
+    """نشانگر «یافت نشد» - Negative cache marker"""
+    __slots__ = ()
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __repr__(self) -> str:
+        return 'NOT_FOUND'
+
+    def __reduce__(self) -> str:
+        # Unpickles to the module singleton so ``is NOT_FOUND`` survives the L2 cache
+        return 'NOT_FOUND'
+
+
+NOT_FOUND = _NotFound()
+_MISSING = object()
+
+
+class SingleFlight:
+    """گروه ادغام درخواست - Coalesces concurrent calls per key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.negative_hits = 0
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved when every waiter was cancelled
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """اجرای یکتا برای هر کلید - Run ``fn`` once per key for all concurrent callers"""
+        task = self._inflight.get(key)
+        if task is None:
+            self.executions += 1
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role='leader')
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finished(key, done))
+        else:
+            self.coalesced += 1
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role='coalesced')
+        return await asyncio.shield(task)
+
+    async def load(self, cache, key: str, loader: Callable[[], Awaitable[Any]], ttl: int,
+                   negative_ttl: int = 60, default: Any = None) -> Any:
+        """
+        خواندن از کش یا بارگذاری یکتا - Cache lookup with coalesced fill
+
+        ``loader`` returns ``None`` when the row does not exist; that result is
+        cached as ``NOT_FOUND`` for ``negative_ttl`` seconds and ``default`` is
+        returned to the caller. The shared cache tier, if any, is consulted
+        before ``loader`` runs.
+        """
+        cached = cache.get(key, _MISSING)
+        if cached is NOT_FOUND:
+            self.negative_hits += 1
+            return default
+        if cached is not _MISSING:
+            return cached
+
+        async def fill():
+            shared = await cache.fetch_shared([key])
+            if key in shared:
+                value = shared[key]
+                return None if value is NOT_FOUND else value
+            value = await loader()
+            if value is None:
+                cache.set(key, NOT_FOUND, ttl=negative_ttl)
+            else:
+                cache.set(key, value, ttl=ttl)
+            return value
+
+        value = await self.do(key, fill)
+        return default if value is None else value
+
+    def in_flight(self) -> int:
+        """تعداد درخواست‌های در جریان - Number of keys currently in flight"""
+        return len(self._inflight)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """آمار ادغام - Coalescing statistics"""
+        calls = self.executions + self.coalesced
+        return {
+            'executions': self.executions,
+            'coalesced': self.coalesced,
+            'negative_hits': self.negative_hits,
+            'in_flight': len(self._inflight),
+            'coalesce_rate': round(self.coalesced / calls * 100, 2) if calls else 0,
+        }
+
+
+_groups: Dict[str, SingleFlight] = {}
+
+
+def single_flight(name: str) -> SingleFlight:
+    """دریافت گروه با نام - Get or create the named single-flight group"""
+    group = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name)
+    return group
+
+
+def get_singleflight_stats() -> Dict[str, Dict[str, Any]]:
+    """آمار همه گروه‌ها - Statistics for every single-flight group"""
+    return {name: group.get_stats() for name, group in _groups.items()}
+
+
+__all__ = ['SingleFlight', 'NOT_FOUND', 'single_flight', 'get_singleflight_stats']
@@ -42,6 +42,7 @@ def load_translations() -> None:
         "language_button": "Language",
         "leaderboard_button": "Leaderboard",
         "error_generic": "Sorry, an error occurred while processing your request.",
+        "rate_limited": "⚠️ You're doing that too often. Try again in {seconds}s.",
         "profile_title": "User Profile",
         "statistics": "Statistics",
         "total_attacks": "Total Attacks",
@@ -91,6 +92,7 @@ def load_translations() -> None:
         "intercept_activated": "🛰️ Patriot defense system activated for <b>{hours}</b> hours!",
         "intercept_no_medals": "❌ Not enough medals! You need <b>{cost}</b> medals to activate defense system.",
         "intercept_already": "⚠️ You already have an active defense system ({time_left}m remaining).",
+        "defense_expired": "🛡️ <b>{name}</b>, your {item_name} has expired. You are no longer protected.",
         "attack_yourself": "🤦‍♂️ You can't attack yourself!",
         "attack_bot": "🤖 You can't attack the bot!",
         "attack_quota": "⚠️ You've reached your attack limit for today. Try again tomorrow!",
@@ -502,6 +504,7 @@ def load_translations() -> None:
         
         # Error Messages
         "stars_error_generic": "❌ An error occurred with TG Stars system.",
+        "free_stars_already": "⏳ You already claimed your free TG Stars. Try again in {hours} hours.",
         "stars_error_insufficient": "❌ Insufficient TG Stars balance.",
         "stars_error_item_unavailable": "❌ This item is currently unavailable.",
         "stars_error_payment": "❌ Payment processing failed.",
@@ -730,6 +733,7 @@ def load_translations() -> None:
         "intercept_activated": "🛰️ سیستم دفاعی پاتریوت برای <b>{hours}</b> ساعت فعال شد!",
         "intercept_no_medals": "❌ مدال کافی ندارید! برای فعال‌سازی سیستم دفاعی به <b>{cost}</b> مدال نیاز دارید.",
         "intercept_already": "⚠️ شما در حال حاضر یک سیستم دفاعی فعال دارید ({time_left} دقیقه باقی‌مانده).",
+        "defense_expired": "🛡️ <b>{name}</b>، {item_name} شما منقضی شد. دیگر محافظت نمی‌شوید.",
         "attack_yourself": "🤦‍♂️ شما نمی‌توانید به خودتان حمله کنید!",
         "attack_bot": "🤖 شما نمی‌توانید به بات حمله کنید!",
         "attack_quota": "⚠️ شما به سقف حملات روزانه خود رسیده‌اید. فردا دوباره تلاش کنید!",
@@ -1149,6 +1153,7 @@ def load_translations() -> None:
         
         # Error Messages (Persian)
         "stars_error_generic": "❌ خطایی در سیستم ستاره‌های تلگرام رخ داد.",
+        "free_stars_already": "⏳ ستاره‌های رایگان را قبلاً دریافت کرده‌اید. {hours} ساعت دیگر دوباره امتحان کنید.",
         "stars_error_insufficient": "❌ موجودی ستاره‌های تلگرام ناکافی است.",
         "stars_error_item_unavailable": "❌ این آیتم در حال حاضر در دسترس نیست.",
         "stars_error_payment": "❌ پردازش پرداخت ناموفق بود.",
@@ -1408,6 +1413,7 @@ def load_translations() -> None:
         "language_button": "زبان",
         "leaderboard_button": "جدول امتیازات",
         "error_generic": "متأسفیم، در پردازش درخواست شما خطایی رخ داد.",
+        "rate_limited": "⚠️ این کار را خیلی زیاد انجام می‌دهید. {seconds} ثانیه دیگر دوباره امتحان کنید.",
         "profile_title": "پروفایل کاربر",
         "statistics": "آمارها",
         "combat_stats": "آمار نبرد",
@@ -1498,6 +1504,10 @@ def load_translations() -> None:
     
     logger.info("Translations loaded successfully for both English and Persian")
 
+    # Pre-rendered screens embed translated text
+    from src.utils.render_cache import render_cache
+    render_cache.invalidate()
+
 # Initialize translations on module load
 load_translations()
 
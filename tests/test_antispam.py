@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+آزمون‌های موتور انتی‌اسپم
+SpamEngine tests: rate window, duplicates, blocking and idle eviction
+"""
+
+import time
+
+from src.utils.antispam import SpamEngine, fingerprint
+
+# A link and a mention: 0.2 on its own, enough to block once flooded and repeated
+SPAM = 'buy now at http://spam.example @promo'
+
+
+def make_engine(**overrides) -> SpamEngine:
+    settings = dict(max_messages_per_minute=10, max_duplicate_messages=3, spam_threshold=0.8,
+                    block_duration=1800.0, window=60.0, idle_ttl=3600.0, sweep_interval=1e9)
+    settings.update(overrides)
+    return SpamEngine(**settings)
+
+
+def distinct(i: int) -> str:
+    # Short texts are fingerprinted exactly, so these never count as duplicates
+    return f"hi {chr(ord('a') + i)}"
+
+
+def test_messages_past_the_rate_limit_inside_the_window_are_scored():
+    engine = make_engine()
+    for i in range(10):
+        assert engine.check(1, distinct(i), now=float(i)) is False
+        assert engine.get_score(1) == 0.0
+
+    engine.check(1, distinct(10), now=10.0)
+    assert engine.get_score(1) == 0.4
+
+
+def test_messages_spread_beyond_the_window_are_not_scored():
+    engine = make_engine()
+    for i in range(12):
+        engine.check(1, distinct(i), now=i * 7.0)
+    assert engine.get_score(1) == 0.0
+
+
+def test_repeated_message_is_scored_past_the_duplicate_limit():
+    engine = make_engine()
+    for i in range(3):
+        engine.check(1, 'the very same message text', now=i * 100.0)
+        assert engine.get_score(1) == 0.0
+
+    engine.check(1, 'the very same message text', now=300.0)
+    assert engine.get_score(1) == 0.3
+
+
+def test_messages_differing_only_in_numbers_are_duplicates():
+    assert fingerprint('Win 100 dollars at our casino') == fingerprint('win 250   dollars at our casino')
+
+    engine = make_engine()
+    for i in range(4):
+        engine.check(1, f'Win {i}00 dollars at our casino', now=i * 100.0)
+    assert engine.get_score(1) == 0.3
+
+
+def test_flood_of_spam_blocks_the_user_until_the_block_expires():
+    engine = make_engine(block_duration=1800.0)
+    for i in range(10):
+        assert engine.check(1, SPAM, now=float(i)) is False
+    assert engine.check(1, SPAM, now=10.0) is True
+    assert engine.is_blocked(1, now=11.0)
+
+    # Anything sent while blocked is rejected without being scored
+    assert engine.check(1, 'hello', now=100.0) is True
+    assert engine.is_blocked(1, now=1809.0)
+    assert not engine.is_blocked(1, now=1810.0)
+    assert engine.check(1, 'hello', now=1811.0) is False
+    assert engine.get_stats()['blocks'] == 1
+
+
+def test_users_are_tracked_independently():
+    engine = make_engine()
+    for i in range(11):
+        engine.check(1, distinct(i), now=float(i))
+    engine.check(2, distinct(0), now=10.0)
+
+    assert engine.get_score(1) == 0.4
+    assert engine.get_score(2) == 0.0
+
+
+def test_sweep_evicts_idle_users_but_keeps_blocked_ones():
+    engine = make_engine(idle_ttl=100.0, block_duration=1000.0)
+    engine.check(1, distinct(0), now=0.0)
+    for i in range(11):
+        engine.check(2, SPAM, now=float(i))
+    engine.check(3, distinct(0), now=150.0)
+    assert engine.is_blocked(2, now=20.0)
+
+    assert engine.sweep(now=160.0) == 1
+    assert len(engine) == 2
+    assert engine.is_blocked(2, now=160.0)
+
+    # Once the block is over and the user stays idle, they go too
+    assert engine.sweep(now=1200.0) == 2
+    assert len(engine) == 0
+
+
+def test_evict_skips_blocked_users():
+    # evict() reads the real monotonic clock
+    start = time.monotonic()
+    engine = make_engine()
+    for i in range(11):
+        engine.check(1, SPAM, now=start + i)
+    engine.check(2, distinct(0), now=start + 20)
+
+    assert engine.evict(2) == 1
+    assert engine.get_stats()['tracked_users'] == 1
+    assert engine.get_stats()['blocked_users'] == 1
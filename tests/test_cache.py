@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+آزمون‌های کش هوشمند
+SmartCache tests: TTL expiry, LRU and byte-bound eviction, namespaces
+"""
+
+import pytest
+
+from src.utils import cache as cache_module
+from src.utils.cache import SmartCache, key_namespace
+
+
+class FakeClock:
+    """ساعت قابل کنترل - Controllable replacement for time.time"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module.time, 'time', clock)
+    return clock
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = SmartCache(default_ttl=10)
+    cache.set('player_1_2', {'hp': 100})
+
+    clock.now += 9.9
+    assert cache.get('player_1_2') == {'hp': 100}
+    assert 'player_1_2' in cache
+
+    clock.now += 0.2
+    assert 'player_1_2' not in cache
+    assert cache.get('player_1_2') is None
+    assert len(cache) == 0
+    assert cache.get_stats()['stats']['expirations'] == 1
+
+
+def test_expired_entries_are_purged_without_being_read(clock):
+    cache = SmartCache(default_ttl=60)
+    cache.set('lang_1_1', 'en', ttl=5)
+    cache.set('lang_1_2', 'fa', ttl=50)
+
+    clock.now += 10
+    assert cache.purge_expired() == 1
+    assert len(cache) == 1
+    assert cache.get('lang_1_2') == 'fa'
+
+
+def test_overwrite_keeps_only_the_new_expiry(clock):
+    cache = SmartCache(default_ttl=60)
+    cache.set('player_1_1', 'old', ttl=5)
+    cache.set('player_1_1', 'new', ttl=50)
+
+    clock.now += 10
+    assert cache.purge_expired() == 0
+    assert cache.get('player_1_1') == 'new'
+
+
+def test_non_positive_ttl_does_not_cache(clock):
+    cache = SmartCache(default_ttl=60)
+    cache.set('player_1_1', 'cached')
+    cache.set('player_1_1', 'skipped', ttl=0)
+
+    assert 'player_1_1' not in cache
+    assert cache.get('player_1_1') is None
+
+
+def test_least_recently_used_entry_is_evicted_first(clock):
+    cache = SmartCache(max_size=2, default_ttl=60)
+    cache.set('player_a', 1)
+    cache.set('player_b', 2)
+    cache.get('player_a')
+    cache.set('player_c', 3)
+
+    assert 'player_a' in cache
+    assert 'player_b' not in cache
+    assert 'player_c' in cache
+    assert cache.get_stats()['stats']['evictions'] == 1
+
+
+def test_byte_bound_evicts_until_the_new_entry_fits(clock):
+    value = 'x' * 1000
+    entry_size = cache_module.estimate_size(value) + cache_module.sys.getsizeof('blob_0')
+    cache = SmartCache(max_size=100, default_ttl=60, max_bytes=entry_size * 3)
+    for i in range(5):
+        cache.set(f'blob_{i}', value)
+
+    assert len(cache) == 3
+    assert 'blob_0' not in cache and 'blob_1' not in cache
+    stats = cache.get_stats()
+    assert stats['bytes'] <= stats['max_bytes']
+    assert stats['namespaces']['blob_']['bytes'] == stats['bytes']
+
+
+def test_value_larger_than_the_byte_bound_is_not_cached(clock):
+    cache = SmartCache(default_ttl=60, max_bytes=512)
+    cache.set('small_1', 'ok')
+    cache.set('big_1', 'x' * 4096)
+
+    assert 'big_1' not in cache
+    assert cache.get('small_1') == 'ok'
+
+
+def test_invalidate_prefix_only_removes_matching_keys(clock):
+    cache = SmartCache(default_ttl=60)
+    cache.set('player_1_1', 'a')
+    cache.set('player_1_2', 'b')
+    cache.set('player_2_1', 'c')
+    cache.set('lang_1_1', 'en')
+
+    assert cache.invalidate_prefix('player_1_') == 2
+    assert 'player_2_1' in cache
+    assert 'lang_1_1' in cache
+    assert cache.get_stats()['namespaces']['player_']['entries'] == 1
+
+
+def test_hits_and_misses_are_counted_per_namespace(clock):
+    cache = SmartCache(default_ttl=60)
+    cache.set('player_1_1', 'a')
+    cache.get('player_1_1')
+    cache.get('player_9_9')
+    cache.get('lang_1_1')
+
+    namespaces = cache.get_stats()['namespaces']
+    assert namespaces['player_']['hits'] == 1
+    assert namespaces['player_']['misses'] == 1
+    assert namespaces['player_']['hit_rate'] == 50.0
+    assert namespaces['lang_']['misses'] == 1
+
+
+def test_key_namespace():
+    assert key_namespace('player_1_2') == 'player_'
+    assert key_namespace('plain') == 'other'
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+آزمون‌های موتور کولدان
+CooldownEngine tests: concurrent acquire, write-behind, retries and rehydration
+"""
+
+import asyncio
+
+import pytest
+
+from src.database.mutations import Mutation, mutation_bus, COOLDOWN
+from src.utils import cooldowns as cooldowns_module
+from src.utils.cooldowns import ATTACK, DAILY_BONUS, CooldownEngine
+
+NOW = 1_700_000_000
+
+
+class FakeCooldownStore:
+    """جدول کولدان حافظه‌ای - In-memory stand-in for the DBManager cooldown methods"""
+
+    def __init__(self, rows=None):
+        self.rows = {(row['chat_id'], row['user_id'], row['cooldown_type']): row['expires_at']
+                     for row in rows or []}
+        self.writes = []
+        self.fail_next = False
+        self.load_fails = False
+        self.db_calls = []
+
+    async def load_cooldowns(self, types):
+        if self.load_fails:
+            return None
+        return [{'chat_id': k[0], 'user_id': k[1], 'cooldown_type': k[2], 'expires_at': expires_at}
+                for k, expires_at in self.rows.items() if k[2] in types]
+
+    async def write_cooldowns(self, upserts, deletes):
+        # Yield like a real round trip, so concurrent callers interleave here
+        await asyncio.sleep(0.01)
+        if self.fail_next:
+            self.fail_next = False
+            return False
+        self.writes.append((sorted(upserts), sorted(deletes)))
+        for chat_id, user_id, cooldown_type, expires_at in upserts:
+            self.rows[(chat_id, user_id, cooldown_type)] = expires_at
+        for key in deletes:
+            self.rows.pop(key, None)
+        return True
+
+    def publish_mutations(self, *mutations):
+        mutation_bus.publish(mutations)
+
+    async def check_cooldown(self, chat_id, user_id, cooldown_type):
+        self.db_calls.append(('check', chat_id, user_id, cooldown_type))
+        return 0
+
+    async def set_cooldown(self, chat_id, user_id, cooldown_type, duration):
+        self.db_calls.append(('set', chat_id, user_id, cooldown_type))
+        return True
+
+    async def clear_cooldown(self, chat_id, user_id, cooldown_type):
+        self.db_calls.append(('clear', chat_id, user_id, cooldown_type))
+        return True
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {'value': float(NOW)}
+    monkeypatch.setattr(cooldowns_module.time, 'time', lambda: now['value'])
+    return now
+
+
+@pytest.fixture
+def store():
+    return FakeCooldownStore()
+
+
+@pytest.fixture
+async def engine(store, clock):
+    # The background flush never fires on its own; tests flush explicitly
+    engine = CooldownEngine(flush_interval=3600.0, prune_interval=3600.0)
+    assert await engine.start(store)
+    yield engine
+    await engine.stop()
+
+
+async def test_concurrent_acquires_let_exactly_one_caller_through(engine, store):
+    results = await asyncio.gather(*(engine.acquire(1, 2, DAILY_BONUS, 86400, write_through=True)
+                                     for _ in range(5)))
+
+    assert sorted(results) == [0, 86400, 86400, 86400, 86400]
+    assert engine.get_stats()['acquired'] == 1
+    assert engine.get_stats()['rejected'] == 4
+    assert store.rows == {(1, 2, DAILY_BONUS): NOW + 86400}
+
+
+async def test_running_cooldown_reports_the_seconds_left_until_it_ends(engine, clock):
+    assert await engine.acquire(1, 2, ATTACK, 60) == 0
+
+    clock['value'] += 45
+    assert await engine.remaining(1, 2, ATTACK) == 15
+    assert await engine.acquire(1, 2, ATTACK, 60) == 15
+
+    clock['value'] += 15
+    assert await engine.remaining(1, 2, ATTACK) == 0
+    assert await engine.acquire(1, 2, ATTACK, 60) == 0
+
+
+async def test_cooldowns_are_keyed_by_chat_user_and_type(engine):
+    assert await engine.acquire(1, 2, ATTACK, 60) == 0
+    assert await engine.acquire(1, 3, ATTACK, 60) == 0
+    assert await engine.acquire(9, 2, ATTACK, 60) == 0
+    assert await engine.acquire(1, 2, DAILY_BONUS, 60) == 0
+
+
+async def test_start_rehydrates_unexpired_cooldowns(clock):
+    store = FakeCooldownStore([
+        {'chat_id': 1, 'user_id': 2, 'cooldown_type': ATTACK, 'expires_at': NOW + 30},
+        {'chat_id': 1, 'user_id': 3, 'cooldown_type': 'unmanaged', 'expires_at': NOW + 30},
+    ])
+    engine = CooldownEngine(flush_interval=3600.0)
+    assert await engine.start(store)
+    try:
+        assert await engine.acquire(1, 2, ATTACK, 60) == 30
+        assert engine.get_stats()['active'] == 1
+    finally:
+        await engine.stop()
+
+
+async def test_failed_load_leaves_the_checks_on_the_database(clock):
+    store = FakeCooldownStore()
+    store.load_fails = True
+    engine = CooldownEngine()
+
+    assert not await engine.start(store)
+    assert not engine.running
+    engine.db_manager = store
+    assert await engine.acquire(1, 2, ATTACK, 60) == 0
+    assert store.db_calls == [('check', 1, 2, ATTACK), ('set', 1, 2, ATTACK)]
+    assert engine._on_mutation not in mutation_bus._listeners.get(COOLDOWN, [])
+
+
+async def test_flush_writes_one_batch_and_does_not_echo_its_own_mutations(engine, store):
+    heard = []
+    mutation_bus.subscribe(COOLDOWN, heard.append)
+    try:
+        await engine.acquire(1, 2, ATTACK, 60)
+        await engine.acquire(1, 3, ATTACK, 60)
+        await engine.clear(1, 3, ATTACK)
+
+        assert store.writes == []
+        assert await engine.flush() == 2
+    finally:
+        mutation_bus.unsubscribe(COOLDOWN, heard.append)
+
+    assert store.writes == [([(1, 2, ATTACK, NOW + 60)], [(1, 3, ATTACK)])]
+    assert len(heard) == 2
+    # The engine's own delete notification must not drop anything it still tracks
+    assert await engine.remaining(1, 2, ATTACK) == 60
+    assert engine.get_stats()['pending'] == 0
+
+
+async def test_failed_flush_is_retried_and_newer_changes_win(engine, store, clock):
+    await engine.acquire(1, 2, ATTACK, 60)
+    await engine.acquire(1, 3, ATTACK, 60)
+    store.fail_next = True
+
+    flushing = asyncio.ensure_future(engine.flush())
+    await asyncio.sleep(0)
+    # Queued while the failing batch is in flight
+    await engine.clear(1, 2, ATTACK)
+    assert await flushing == 0
+    assert engine.get_stats()['flush_errors'] == 1
+
+    assert await engine.flush() == 2
+    assert store.writes == [([(1, 3, ATTACK, NOW + 60)], [(1, 2, ATTACK)])]
+    assert store.rows == {(1, 3, ATTACK): NOW + 60}
+
+
+async def test_cooldowns_that_ran_out_before_the_flush_are_not_written(engine, store, clock):
+    await engine.acquire(1, 2, ATTACK, 5)
+    clock['value'] += 10
+
+    assert await engine.flush() == 0
+    assert store.writes == []
+
+
+async def test_writes_made_outside_the_engine_are_followed(engine, store):
+    store.publish_mutations(Mutation(COOLDOWN, 1, 2, {'type': ATTACK, 'expires_at': NOW + 120}))
+    assert await engine.remaining(1, 2, ATTACK) == 120
+
+    store.publish_mutations(Mutation(COOLDOWN, 1, 2, {'type': ATTACK}))
+    assert await engine.remaining(1, 2, ATTACK) == 0
+
+    # Expiry-wheel deletions of rows already over change nothing
+    await engine.acquire(1, 2, ATTACK, 60)
+    store.publish_mutations(Mutation(COOLDOWN, 1, 2, {'type': ATTACK, 'expired': True, 'expires_at': 0}))
+    assert await engine.remaining(1, 2, ATTACK) == 60
+
+
+async def test_stop_writes_pending_changes_and_hands_back_to_the_database(engine, store):
+    await engine.acquire(1, 2, ATTACK, 60)
+    await engine.stop()
+
+    assert store.rows == {(1, 2, ATTACK): NOW + 60}
+    assert not engine.running
+    assert await engine.acquire(1, 2, ATTACK, 60) == 0
+    assert store.db_calls == [('check', 1, 2, ATTACK), ('set', 1, 2, ATTACK)]
+
+
+async def test_prune_drops_expired_entries(engine):
+    await engine.acquire(1, 2, ATTACK, 10)
+    await engine.acquire(1, 3, ATTACK, 100)
+
+    assert engine.prune(now=NOW + 50) == 1
+    assert engine.get_stats()['active'] == 1
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+آزمون‌های خرید و استفاده از آیتم
+Single-statement purchase and item-use tests against PostgreSQL
+
+The statements are only meaningful against a real database, so these tests
+run when ``TEST_DATABASE_URL`` points at a disposable PostgreSQL database
+(its tables are created if missing, and rows of the test chat are deleted).
+"""
+
+import os
+import time
+
+import pytest
+
+from src.database import db_manager as db_module
+from src.database.db_manager import DBManager, setup_database
+from src.database.economy import ItemEffects, Outcome, item_effects
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+CHAT = -990001
+USER = 42
+TABLES = ('players', 'inventories', 'purchases', 'tg_stars_purchases', 'active_boosts', 'active_defenses')
+
+
+@pytest.fixture
+async def db(monkeypatch):
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    monkeypatch.setattr(db_module, 'DATABASE_URL', TEST_DATABASE_URL)
+    monkeypatch.setattr(db_module, 'pool', None)
+    await setup_database()
+    manager = DBManager()
+
+    async def clean():
+        for table in TABLES:
+            await manager.db(f"DELETE FROM {table} WHERE chat_id = %s", (CHAT,))
+
+    await clean()
+    await manager.db(
+        "INSERT INTO players (chat_id, user_id, first_name, score, tg_stars, hp, max_hp) "
+        "VALUES (%s, %s, 'Tester', 100, 10, 60, 100)",
+        (CHAT, USER)
+    )
+    yield manager
+    await clean()
+    await db_module.pool.close()
+
+
+async def player(db: DBManager):
+    return await db.db("SELECT score, tg_stars, hp, max_hp FROM players WHERE chat_id = %s AND user_id = %s",
+                       (CHAT, USER), fetch="one_dict")
+
+
+async def qty(db: DBManager, item: str):
+    row = await db.db("SELECT qty FROM inventories WHERE chat_id = %s AND user_id = %s AND item = %s",
+                      (CHAT, USER, item), fetch="one")
+    return row[0] if row else None
+
+
+async def purchases(db: DBManager) -> int:
+    return await db.db("SELECT COUNT(*) FROM purchases WHERE chat_id = %s", (CHAT,), fetch="count")
+
+
+def test_repair_items_only_restore_hp():
+    assert item_effects('nano_repair', int(time.time())) == ItemEffects(hp_restore=150)
+
+
+async def test_purchase_debits_grants_and_records_together(db):
+    result = await db.debit_and_grant(CHAT, USER, 'shield', 40, 'medals',
+                                      ItemEffects(grant_item='shield', grant_qty=1))
+
+    assert result.outcome is Outcome.APPLIED
+    assert result.row['score'] == 60 and result.row['qty'] == 1
+    assert (await player(db))['score'] == 60
+    assert await qty(db, 'shield') == 1
+    assert await purchases(db) == 1
+
+
+async def test_insufficient_balance_changes_nothing(db):
+    result = await db.debit_and_grant(CHAT, USER, 'shield', 500, 'medals',
+                                      ItemEffects(grant_item='shield', grant_qty=1))
+
+    assert result.outcome is Outcome.SHORT
+    assert result.row is None
+    assert (await player(db))['score'] == 100
+    assert await qty(db, 'shield') is None
+    assert await purchases(db) == 0
+
+
+async def test_star_purchase_is_checked_against_the_star_balance(db):
+    short = await db.debit_and_grant(CHAT, USER, 'nano_repair', 15, 'tg_stars', ItemEffects(), payment_id='p-1')
+    assert short.outcome is Outcome.SHORT
+
+    paid = await db.debit_and_grant(CHAT, USER, 'repair_kit', 8, 'tg_stars', ItemEffects(), payment_id='p-2')
+    assert paid.outcome is Outcome.APPLIED
+    assert (await player(db))['tg_stars'] == 2
+    recorded = await db.db("SELECT payment_id FROM tg_stars_purchases WHERE chat_id = %s", (CHAT,), fetch="all")
+    assert recorded == [('p-2',)]
+
+
+async def test_failed_statement_is_an_error_and_rolls_back_the_debit(db):
+    # A negative grant breaks the qty constraint after the debit has run
+    result = await db.debit_and_grant(CHAT, USER, 'shield', 40, 'medals',
+                                      ItemEffects(grant_item='shield', grant_qty=-1))
+
+    assert result.outcome is Outcome.ERROR
+    assert (await player(db))['score'] == 100
+    assert await purchases(db) == 0
+
+
+async def test_auto_used_repair_heals_up_to_max_hp(db):
+    effects = item_effects('nano_repair', int(time.time()))
+    await db.db("UPDATE players SET tg_stars = 20 WHERE chat_id = %s AND user_id = %s", (CHAT, USER))
+
+    result = await db.debit_and_grant(CHAT, USER, 'nano_repair', 15, 'tg_stars', effects)
+
+    assert result.outcome is Outcome.APPLIED
+    assert result.row['hp'] == 100
+    assert (await player(db))['hp'] == 100
+
+
+async def test_using_a_missing_item_is_short(db):
+    result = await db.consume_and_apply(CHAT, USER, 'nano_repair', item_effects('nano_repair', int(time.time())))
+
+    assert result.outcome is Outcome.SHORT
+    assert (await player(db))['hp'] == 60
+
+
+async def test_using_a_repair_heals_within_max_hp_and_removes_the_empty_stack(db):
+    await db.db("INSERT INTO inventories (chat_id, user_id, item, qty) VALUES (%s, %s, 'nano_repair', 1)",
+                (CHAT, USER))
+
+    result = await db.consume_and_apply(CHAT, USER, 'nano_repair', item_effects('nano_repair', int(time.time())))
+
+    assert result.outcome is Outcome.APPLIED
+    assert result.row['qty'] == 0 and result.row['hp'] == 100
+    assert (await player(db))['hp'] == 100
+    assert await qty(db, 'nano_repair') is None
+
+    again = await db.consume_and_apply(CHAT, USER, 'nano_repair', item_effects('nano_repair', int(time.time())))
+    assert again.outcome is Outcome.SHORT
+
+
+async def test_partial_repair_adds_its_hp(db):
+    await db.db("UPDATE players SET hp = 10, max_hp = 200 WHERE chat_id = %s AND user_id = %s", (CHAT, USER))
+    await db.db("INSERT INTO inventories (chat_id, user_id, item, qty) VALUES (%s, %s, 'repair_kit', 2)",
+                (CHAT, USER))
+
+    result = await db.consume_and_apply(CHAT, USER, 'repair_kit', item_effects('repair_kit', int(time.time())))
+
+    assert result.outcome is Outcome.APPLIED
+    assert result.row['hp'] == 110
+    assert await qty(db, 'repair_kit') == 1
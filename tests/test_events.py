@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+آزمون‌های گذرگاه رویداد
+EventBus tests: per-subscriber redelivery, replay idempotency, ordering and spills
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from src.utils.events import BonusClaimed, EventBus, current_delivery, restore_event, subscriber_name
+
+
+class FakeOutbox:
+    """صندوق خروجی حافظه‌ای - In-memory stand-in for the DBManager outbox methods"""
+
+    def __init__(self):
+        self.rows = {}
+        self.deliveries = set()
+        self.next_id = 1
+        self.activity = {}
+
+    async def outbox_append(self, chat_id, event_type, payload):
+        event_id, self.next_id = self.next_id, self.next_id + 1
+        self.rows[event_id] = {'id': event_id, 'chat_id': chat_id, 'event_type': event_type,
+                               'payload': dict(payload), 'created_at': int(time.time()), 'attempts': 0}
+        return event_id
+
+    async def outbox_pending(self, after_id, max_attempts, limit):
+        rows = [row for event_id, row in sorted(self.rows.items())
+                if event_id > after_id and row['attempts'] < max_attempts][:limit]
+        return [dict(row, delivered=[name for event_id, name in self.deliveries if event_id == row['id']])
+                for row in rows]
+
+    async def outbox_ack(self, event_ids):
+        for event_id in event_ids:
+            self.rows.pop(event_id, None)
+        self.deliveries = {(event_id, name) for event_id, name in self.deliveries if event_id in self.rows}
+        return True
+
+    async def outbox_fail(self, failures):
+        for event_id, names in failures:
+            self.deliveries.update((event_id, name) for name in names)
+            self.rows[event_id]['attempts'] += 1
+        return True
+
+    async def outbox_depth(self, max_attempts):
+        return sum(1 for row in self.rows.values() if row['attempts'] < max_attempts)
+
+    async def apply_once(self, delivery, user_id, amount):
+        # Same contract as DBManager.apply_once: the claim and the write go together
+        if delivery is not None:
+            if delivery in self.deliveries:
+                return False
+            self.deliveries.add(delivery)
+        self.activity[user_id] = self.activity.get(user_id, 0) + amount
+        return True
+
+
+def bonus(chat_id: int = 1, amount: int = 10) -> BonusClaimed:
+    return BonusClaimed(chat_id=chat_id, user_id=2, bonus='daily', amount=amount)
+
+
+async def start(bus: EventBus, outbox: FakeOutbox) -> None:
+    bus.start(outbox)
+    # Let the maintenance task run its start-up sweep before anything is published
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def drain(bus: EventBus) -> None:
+    await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in bus._queues)), 1.0)
+
+
+@pytest.fixture
+def outbox():
+    return FakeOutbox()
+
+
+@pytest.fixture
+async def bus():
+    # Fresh rows are redelivered at once; the periodic sweep never fires on its own
+    bus = EventBus(shards=2, queue_size=10, ack_interval=3600.0, redeliver_interval=3600.0, redeliver_grace=-60)
+    yield bus
+    await bus.stop(timeout=1.0)
+
+
+async def test_unstarted_bus_delivers_inline_without_the_outbox(outbox):
+    bus = EventBus()
+    bus.db_manager = outbox
+    seen = []
+
+    async def record(event, db_manager):
+        seen.append((event.amount, db_manager, current_delivery()))
+
+    bus.subscribe(BonusClaimed, record)
+    await bus.publish(bonus())
+
+    assert seen == [(10, outbox, None)]
+    assert outbox.rows == {}
+
+
+async def test_delivered_events_are_acknowledged(bus, outbox):
+    seen = []
+
+    async def record(event, db_manager):
+        seen.append(current_delivery())
+
+    bus.subscribe(BonusClaimed, record)
+    await start(bus, outbox)
+    await bus.publish(bonus())
+    await drain(bus)
+    await bus._flush_acks()
+
+    assert seen == [(1, subscriber_name(record))]
+    assert outbox.rows == {}
+    assert bus.get_stats()['outbox_depth'] == 0
+
+
+async def test_redelivery_only_retries_the_subscribers_that_failed(bus, outbox):
+    calls = {'ok': 0, 'flaky': 0}
+
+    async def ok(event, db_manager):
+        calls['ok'] += 1
+
+    async def flaky(event, db_manager):
+        calls['flaky'] += 1
+        if calls['flaky'] == 1:
+            raise RuntimeError('first attempt fails')
+
+    bus.subscribe(BonusClaimed, ok)
+    bus.subscribe(BonusClaimed, flaky)
+    await start(bus, outbox)
+    await bus.publish(bonus())
+    await drain(bus)
+    await bus._flush_acks()
+
+    assert outbox.rows[1]['attempts'] == 1
+    assert outbox.deliveries == {(1, subscriber_name(ok))}
+
+    await bus._redeliver()
+    await drain(bus)
+    await bus._flush_acks()
+
+    assert calls == {'ok': 1, 'flaky': 2}
+    assert outbox.rows == {}
+    assert outbox.deliveries == set()
+
+
+async def test_replay_after_a_lost_ack_does_not_reapply_additive_writes(outbox):
+    async def score(event, db_manager):
+        await db_manager.apply_once(current_delivery(), event.user_id, event.amount)
+
+    first = EventBus(shards=1, ack_interval=3600.0, redeliver_interval=3600.0, redeliver_grace=-60)
+    first.subscribe(BonusClaimed, score)
+    await start(first, outbox)
+    await first.publish(bonus(amount=10))
+    await drain(first)
+    # Crash before the batched ack: the event is still in the outbox
+    first._acks.clear()
+    await first.stop(timeout=1.0)
+    assert 1 in outbox.rows
+
+    second = EventBus(shards=1, ack_interval=3600.0, redeliver_interval=3600.0, redeliver_grace=-60)
+    second.subscribe(BonusClaimed, score)
+    await start(second, outbox)
+    await drain(second)
+    await second._flush_acks()
+    await second.stop(timeout=1.0)
+
+    assert second.redelivered == 1
+    assert outbox.activity == {2: 10}
+    assert outbox.rows == {}
+
+
+async def test_events_of_a_chat_are_delivered_in_order(bus, outbox):
+    seen = []
+
+    async def record(event, db_manager):
+        await asyncio.sleep(0.001 * (5 - event.amount))
+        seen.append((event.chat_id, event.amount))
+
+    bus.subscribe(BonusClaimed, record)
+    await start(bus, outbox)
+    for amount in range(5):
+        await bus.publish(bonus(chat_id=1, amount=amount))
+        await bus.publish(bonus(chat_id=2, amount=amount))
+    await drain(bus)
+
+    assert [amount for chat_id, amount in seen if chat_id == 1] == [0, 1, 2, 3, 4]
+    assert [amount for chat_id, amount in seen if chat_id == 2] == [0, 1, 2, 3, 4]
+
+
+async def test_full_queue_spills_to_the_outbox_and_keeps_chat_order(outbox):
+    bus = EventBus(shards=1, queue_size=1, ack_interval=3600.0, redeliver_interval=3600.0)
+    seen = []
+
+    async def record(event, db_manager):
+        seen.append(event.amount)
+
+    bus.subscribe(BonusClaimed, record)
+    await start(bus, outbox)
+    # Nothing yields between these publishes, so the worker cannot empty the queue
+    for amount in range(4):
+        await bus.publish(bonus(amount=amount))
+    assert bus.get_stats()['spills'] == 1
+    assert bus.get_stats()['spilled_shards'] == 1
+
+    await drain(bus)
+    assert seen == [0]
+    await bus._redeliver()
+    await drain(bus)
+    await bus._flush_acks()
+    await bus.stop(timeout=1.0)
+
+    assert seen == [0, 1, 2, 3]
+    assert bus.get_stats()['spilled_shards'] == 0
+    assert outbox.rows == {}
+
+
+async def test_unknown_outbox_rows_count_as_failed_attempts(bus, outbox):
+    await start(bus, outbox)
+    await outbox.outbox_append(1, 'NoSuchEvent', {'chat_id': 1, 'user_id': 2})
+    await bus._redeliver()
+
+    assert outbox.rows[1]['attempts'] == 1
+    assert bus.redelivered == 0
+
+
+def test_restore_event_ignores_unknown_fields_and_types():
+    event = restore_event('BonusClaimed', {'chat_id': 1, 'user_id': 2, 'bonus': 'daily', 'amount': 5, 'extra': 1})
+    assert event == BonusClaimed(chat_id=1, user_id=2, bonus='daily', amount=5)
+    assert restore_event('NoSuchEvent', {}) is None
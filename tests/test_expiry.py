@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+آزمون‌های زمان‌بند انقضا
+Timer wheel and expiry scheduler tests: firing order, cascades, renewals and retries
+"""
+
+import random
+
+import pytest
+
+from src.database.mutations import Mutation, BOOST, COOLDOWN, DEFENSE
+from src.utils import expiry as expiry_module
+from src.utils.expiry import ExpiryScheduler, TimerWheel
+
+
+def run(wheel: TimerWheel, until: int):
+    """Advance one tick at a time and return (tick, key) for everything that fell due"""
+    fired = []
+    while wheel.current < until:
+        tick = wheel.current + 1
+        fired.extend((tick, key) for key in wheel.advance(tick))
+    return fired
+
+
+def key(n: int):
+    return (DEFENSE, 1, n, 'shield')
+
+
+def test_keys_fire_exactly_at_their_deadlines_across_levels():
+    wheel = TimerWheel(now=1000)
+    deadlines = {key(1): 1003, key(2): 1000 + 64 + 7, key(3): 1000 + 64 ** 2 + 5, key(4): 1000 + 64 ** 3 + 1}
+    for k, deadline in deadlines.items():
+        wheel.schedule(k, deadline)
+
+    fired = run(wheel, 1000 + 64 ** 3 + 10)
+
+    assert fired == sorted(((deadline, k) for k, deadline in deadlines.items()), key=lambda item: item[0])
+    assert len(wheel) == 0
+
+
+def test_random_deadlines_fire_in_deadline_order_on_a_small_wheel():
+    # 4 slots x 3 levels: 64 ticks of horizon, so cascades and re-placement both happen often
+    rng = random.Random(7)
+    wheel = TimerWheel(now=0, slots=4, levels=3)
+    deadlines = {key(n): rng.randint(1, 200) for n in range(300)}
+    for k, deadline in deadlines.items():
+        wheel.schedule(k, deadline)
+
+    fired = run(wheel, 200)
+
+    assert len(fired) == len(deadlines)
+    assert all(tick == deadlines[k] for tick, k in fired)
+    assert [tick for tick, _ in fired] == sorted(deadlines.values())
+
+
+def test_deadline_past_the_horizon_is_replaced_until_due():
+    wheel = TimerWheel(now=0, slots=4, levels=2)
+    wheel.schedule(key(1), 40)
+
+    assert run(wheel, 60) == [(40, key(1))]
+
+
+def test_rescheduling_moves_the_deadline_and_cancel_drops_it():
+    wheel = TimerWheel(now=0)
+    wheel.schedule(key(1), 10)
+    wheel.schedule(key(1), 30)
+    wheel.schedule(key(2), 50)
+    wheel.schedule(key(2), 20)
+    wheel.schedule(key(3), 15)
+    wheel.cancel(key(3))
+
+    assert run(wheel, 100) == [(20, key(2)), (30, key(1))]
+
+
+def test_past_deadline_falls_due_on_the_next_tick():
+    wheel = TimerWheel(now=500)
+    wheel.schedule(key(1), 100)
+
+    assert wheel.deadline(key(1)) == 501
+    assert wheel.advance(501) == [key(1)]
+
+
+class FakeExpiryStore:
+    """ردیف‌های دارای انقضا - In-memory defenses, boosts and cooldowns with their expiries"""
+
+    def __init__(self, rows):
+        self.rows = {(row['entity'], row['chat_id'], row['user_id'], row['kind']): row['expires_at'] for row in rows}
+        self.fail_next = False
+        self.reloaded = []
+
+    async def load_expiries(self, users=None):
+        if users is not None:
+            self.reloaded.append(sorted(users))
+        return [{'entity': k[0], 'chat_id': k[1], 'user_id': k[2], 'kind': k[3], 'expires_at': expires_at}
+                for k, expires_at in self.rows.items() if users is None or (k[1], k[2]) in set(users)]
+
+    async def delete_expired(self, keys, now):
+        if self.fail_next:
+            self.fail_next = False
+            return None
+        deleted = [k for k in keys if k in self.rows and self.rows[k] <= now]
+        for k in deleted:
+            del self.rows[k]
+        return [{'entity': k[0], 'chat_id': k[1], 'user_id': k[2], 'kind': k[3]} for k in deleted]
+
+
+@pytest.fixture
+def published(monkeypatch):
+    events = []
+
+    async def publish(event):
+        events.append(event)
+
+    monkeypatch.setattr(expiry_module.event_bus, 'publish', publish)
+    return events
+
+
+async def make_scheduler(store: FakeExpiryStore, now: int) -> ExpiryScheduler:
+    scheduler = ExpiryScheduler()
+    scheduler.db_manager = store
+    scheduler.wheel = TimerWheel(now)
+    scheduler._schedule_rows(await store.load_expiries())
+    return scheduler
+
+
+async def test_tick_deletes_due_rows_and_announces_effects_but_not_cooldowns(published):
+    store = FakeExpiryStore([
+        {'entity': DEFENSE, 'chat_id': 1, 'user_id': 2, 'kind': 'shield', 'expires_at': 105},
+        {'entity': COOLDOWN, 'chat_id': 1, 'user_id': 2, 'kind': 'attack', 'expires_at': 105},
+        {'entity': BOOST, 'chat_id': 1, 'user_id': 3, 'kind': 'experience_multiplier', 'expires_at': 200},
+    ])
+    scheduler = await make_scheduler(store, now=100)
+
+    assert await scheduler.tick(now=104) == 0
+    assert await scheduler.tick(now=105) == 2
+
+    assert [(event.entity, event.kind) for event in published] == [(DEFENSE, 'shield')]
+    assert list(store.rows) == [(BOOST, 1, 3, 'experience_multiplier')]
+
+
+async def test_row_renewed_in_the_database_is_kept_and_its_user_reloaded(published):
+    store = FakeExpiryStore([{'entity': DEFENSE, 'chat_id': 1, 'user_id': 2, 'kind': 'shield', 'expires_at': 105}])
+    scheduler = await make_scheduler(store, now=100)
+    # Renewed by a write the scheduler never heard about
+    store.rows[(DEFENSE, 1, 2, 'shield')] = 150
+
+    assert await scheduler.tick(now=110) == 0
+    assert scheduler.get_stats()['dirty_users'] == 1
+
+    await scheduler.tick(now=111)
+    assert store.reloaded == [[(1, 2)]]
+    assert scheduler.wheel.deadline((DEFENSE, 1, 2, 'shield')) == 150
+    assert await scheduler.tick(now=150) == 1
+    assert published[-1].kind == 'shield'
+
+
+async def test_failed_delete_is_retried_on_the_next_tick(published):
+    store = FakeExpiryStore([{'entity': BOOST, 'chat_id': 1, 'user_id': 2, 'kind': 'vip_damage', 'expires_at': 101}])
+    scheduler = await make_scheduler(store, now=100)
+    store.fail_next = True
+
+    assert await scheduler.tick(now=101) == 0
+    assert scheduler.get_stats()['due'] == 1
+    assert await scheduler.tick(now=102) == 1
+    assert store.rows == {}
+
+
+async def test_mutations_schedule_expiries_or_mark_the_user_for_reload(published):
+    store = FakeExpiryStore([])
+    scheduler = await make_scheduler(store, now=100)
+
+    scheduler._on_mutation(Mutation(DEFENSE, 1, 2, {'type': 'shield', 'expires_at': 130}))
+    scheduler._on_mutation(Mutation(BOOST, 1, 3))
+    scheduler._on_mutation(Mutation(COOLDOWN, 1, 4, {'type': 'attack', 'expired': True, 'expires_at': 0}))
+
+    assert scheduler.wheel.deadline((DEFENSE, 1, 2, 'shield')) == 130
+    assert scheduler._dirty == {(1, 3)}
+    assert len(scheduler.wheel) == 1
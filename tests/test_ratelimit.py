@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+آزمون‌های محدودکننده نرخ GCRA
+GCRA rate limiter tests: burst, refill, penalties and the shared fallback
+"""
+
+from types import SimpleNamespace
+
+from src.utils.ratelimit import RateLimiter, RateLimitStore, rate_limited
+
+# 10 requests a minute with a burst of 3: one every 6s, 12s of tolerance
+INTERVAL = 6.0
+TOLERANCE = 12.0
+
+
+def hit(store: RateLimitStore, now: float, penalty: float = 0.0):
+    return store.update('u:1', INTERVAL, TOLERANCE, penalty, now=now)
+
+
+def test_limiter_derives_interval_and_tolerance_from_rate_and_burst():
+    limiter = RateLimiter('test', rate=10, period=60.0, burst=3, store=RateLimitStore())
+    assert limiter.interval == INTERVAL
+    assert limiter.tolerance == TOLERANCE
+
+
+def test_burst_is_admitted_then_refused_until_one_interval_passes():
+    store = RateLimitStore(sweep_interval=1e9)
+    assert [hit(store, 0.0).allowed for _ in range(3)] == [True, True, True]
+
+    refused = hit(store, 0.0)
+    assert not refused.allowed and not refused.blocked
+    assert refused.retry_after == INTERVAL
+
+
+def test_tokens_refill_one_interval_at_a_time():
+    store = RateLimitStore(sweep_interval=1e9)
+    for _ in range(3):
+        hit(store, 0.0)
+
+    assert not hit(store, 5.9).allowed
+    assert hit(store, 6.0).allowed
+    assert not hit(store, 6.0).allowed
+    assert hit(store, 12.0).allowed
+
+
+def test_idle_key_gets_its_full_burst_back():
+    store = RateLimitStore(sweep_interval=1e9)
+    for _ in range(3):
+        hit(store, 0.0)
+
+    assert [hit(store, 100.0).allowed for _ in range(4)] == [True, True, True, False]
+
+
+def test_penalty_blocks_the_first_overrun_for_the_penalty_duration():
+    store = RateLimitStore(sweep_interval=1e9)
+    for _ in range(3):
+        hit(store, 0.0, penalty=30.0)
+
+    blocked = hit(store, 1.0, penalty=30.0)
+    assert not blocked.allowed and blocked.blocked
+    assert blocked.retry_after == 30.0
+
+    # Requests during the penalty are refused without extending it
+    during = hit(store, 20.0, penalty=30.0)
+    assert not during.allowed and not during.blocked
+    assert hit(store, 31.0, penalty=30.0).allowed
+
+
+def test_keys_are_limited_independently():
+    store = RateLimitStore(sweep_interval=1e9)
+    for _ in range(3):
+        hit(store, 0.0)
+    assert store.update('u:2', INTERVAL, TOLERANCE, 0.0, now=0.0).allowed
+
+
+def test_sweep_forgets_keys_whose_tat_has_passed():
+    store = RateLimitStore(sweep_interval=1e9)
+    store.update('u:1', INTERVAL, TOLERANCE, 0.0, now=0.0)
+    store.update('u:2', INTERVAL, TOLERANCE, 0.0, now=10.0)
+
+    assert store.sweep(now=7.0) == 1
+    assert len(store) == 1
+
+
+def test_store_over_its_key_cap_evicts_the_oldest_keys():
+    store = RateLimitStore(max_keys=10, sweep_interval=1e9)
+    for user in range(11):
+        store.update(f'u:{user}', 1e6, 0.0, 0.0, now=0.0)
+
+    assert len(store) == 9
+    assert store.evictions == 2
+
+
+async def test_shared_store_falls_back_to_local_state_when_redis_fails():
+    async def broken_script(keys, args):
+        raise ConnectionError('redis down')
+
+    backend = SimpleNamespace(name='redis', client=SimpleNamespace(register_script=lambda source: broken_script))
+    store = RateLimitStore(sweep_interval=1e9)
+    await store.attach(backend)
+    assert store.shared
+
+    decisions = [await store.update_shared('u:1', INTERVAL, TOLERANCE, 0.0) for _ in range(4)]
+    assert [decision.allowed for decision in decisions] == [True, True, True, False]
+    assert store.shared_errors == 4
+
+
+async def test_decorator_calls_on_limited_instead_of_the_handler():
+    limiter = RateLimiter('decorated', rate=1, period=60.0, store=RateLimitStore())
+    handled, limited = [], []
+
+    async def on_limited(update, decision):
+        limited.append(decision.retry_after)
+
+    @rate_limited(limiter, key=lambda update: update.from_user.id, on_limited=on_limited)
+    async def handler(update):
+        handled.append(update.from_user.id)
+
+    update = SimpleNamespace(from_user=SimpleNamespace(id=7))
+    await handler(update)
+    await handler(update)
+
+    assert handled == [7]
+    assert len(limited) == 1 and limited[0] > 0